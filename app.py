@@ -1,12 +1,17 @@
 """Main Flask application"""
+import threading
 from flask import Flask
 from flask_cors import CORS
 from routes.pages import pages_bp
 from routes.prices import prices_bp
 from routes.analysis import analysis_bp
 from routes.settings import settings_bp
+from routes.jobs import jobs_bp
+from routes.metrics import metrics_bp
+from services.crypto_stream import ticker_stream
 from services.gemini_service import configure_gemini
-from config import GEMINI_API_KEY
+from services.market_service import warm_up_connections
+from config import GEMINI_API_KEY, WARM_UP_CONNECTIONS, CRYPTO_STREAM
 
 app = Flask(__name__)
 CORS(app)
@@ -16,11 +21,21 @@ app.register_blueprint(pages_bp)
 app.register_blueprint(prices_bp)
 app.register_blueprint(analysis_bp)
 app.register_blueprint(settings_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(metrics_bp)
 
 # Initialize Gemini if API key is available
 if GEMINI_API_KEY:
     configure_gemini()
 
+# Connect to Yahoo and Binance before the first quote needs them, without delaying startup
+if WARM_UP_CONNECTIONS:
+    threading.Thread(target=warm_up_connections, name='warm-up', daemon=True).start()
+
+# Keep the crypto quotes current from Binance's ticker stream instead of polling REST
+if CRYPTO_STREAM:
+    ticker_stream.start()
+
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,303 @@
+"""ASGI entry point: async API routes in front of the Flask app
+
+Endpoints that spend their time waiting on Yahoo Finance, Binance or
+Gemini are served by coroutines on the async service layer, so a single
+process can keep hundreds of them in flight. Routing is Flask's own URL
+map; every other request (pages, settings, SSE streams) is handed to the
+Flask app on a worker thread.
+
+Run with an ASGI server, e.g.:
+    uvicorn asgi:app --port 5000
+"""
+import asyncio
+import io
+import json
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qsl
+from werkzeug.exceptions import HTTPException
+from app import app as flask_app
+from routes.analysis import (_parse_analysis_request, _parse_question_request, _parse_history_request,
+                             _report_response, _retry_after)
+from services.analysis_pipeline import run_analysis_async, indicators_for_async
+from services.analysis_sessions import analysis_sessions
+from services.async_market import async_market
+from services.gemini_service import ask_question_async
+from services.metrics import http_request_seconds
+from services.resilience import UpstreamError
+from config import ASGI_WSGI_WORKERS, WARM_UP_CONNECTIONS
+
+_urls = flask_app.url_map.bind('localhost')
+
+
+# Async routes, keyed by the Flask endpoint they replace. Each takes the
+# view arguments, query parameters and JSON body and returns (payload, status).
+
+async def _prices_price(view_args, query, data):
+    # Stock first (includes warrants and Borsa Istanbul stocks), then crypto
+    symbol = view_args['symbol']
+    asset_type, price_data = await async_market.resolve_price(symbol)
+    if 'error' not in price_data and price_data.get('price'):
+        return {'symbol': symbol, 'type': asset_type, **price_data}, 200
+    return {'error': 'Bu sembol için geçerli fiyat verisi bulunamadı'}, 404
+
+
+async def _analysis_price(view_args, query, data):
+    symbol = view_args['symbol']
+    asset_type, price_data = await async_market.resolve_price(symbol)
+    if 'error' not in price_data:
+        return {'symbol': symbol, 'type': asset_type, **price_data}, 200
+    return {'error': 'Symbol not found'}, 404
+
+
+async def _history(view_args, query, data):
+    args, error = _parse_history_request(view_args['symbol'], query)
+    if error:
+        return {'error': error[0]}, error[1]
+    history = await async_market.resolve_history(**args)
+    if 'error' in history:
+        return {'error': history['error']}, 404
+    return {'symbol': args['symbol'], 'period': args['period'], **history}, 200
+
+
+async def _indicators(view_args, query, data):
+    symbol = view_args['symbol'].upper()
+    indicators = await indicators_for_async(symbol, query.get('period', '1y'))
+    if indicators is None:
+        return {'error': f'No historical data available for symbol: {symbol}'}, 404
+    return {'symbol': symbol, **indicators}, 200
+
+
+async def _analyze(view_args, query, data):
+    args, error = _parse_analysis_request(data)
+    if error:
+        return {'error': error[0]}, error[1]
+    report = await run_analysis_async(**args, include_news=bool(data.get('include_news', False)))
+    return await asyncio.to_thread(_report_response, report, args['language'])  # Writes the session
+
+
+async def _ask_question(view_args, query, data):
+    args, error = await asyncio.to_thread(_parse_question_request, data)  # Reads the session
+    if error:
+        return {'error': error[0]}, error[1]
+    session_id = args.pop('session_id')
+    result = await ask_question_async(**args)
+    if session_id:
+        await asyncio.to_thread(analysis_sessions.add_turn, session_id, args['question'], result['answer'])
+    return {
+        'symbol': args['symbol'],
+        'question': args['question'],
+        'answer': result['answer'],
+        'cached': result['cached'],
+        'session_id': session_id,
+        'timestamp': datetime.now().isoformat()
+    }, 200
+
+
+ASYNC_ROUTES = {
+    'prices.get_price': _prices_price,
+    'analysis.get_price': _analysis_price,
+    'analysis.get_history': _history,
+    'analysis.get_indicators': _indicators,
+    'analysis.analyze_stock_route': _analyze,
+    'analysis.ask_question_route': _ask_question
+}
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _send_json(send, payload, status, headers=()):
+    # Same encoding as Flask's jsonify outside debug mode
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode('ascii')),
+                    (b'access-control-allow-origin', b'*'),
+                    *headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _serve_async(handler, view_args, scope, receive, send):
+    """Answer a request with an async route; returns the response status"""
+    body = await _read_body(receive)
+    query = dict(parse_qsl(scope.get('query_string', b'').decode('latin1')))
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        await _send_json(send, {'error': 'Request body must be JSON'}, 400)
+        return 400
+    headers = []
+    try:
+        payload, status = await handler(view_args, query, data)
+        if _retry_after(payload) is not None:
+            headers.append((b'retry-after', _retry_after(payload).encode('ascii')))
+    except UpstreamError as e:
+        # Same response as routes.analysis._error_response
+        payload, status = {'error': str(e)}, 503
+        if e.retry_after is not None:
+            headers.append((b'retry-after', str(math.ceil(e.retry_after)).encode('ascii')))
+    except Exception as e:
+        payload, status = {'error': str(e)}, 500
+    await _send_json(send, payload, status, headers)
+    return status
+
+
+def _wsgi_environ(scope, body):
+    """WSGI environ for an ASGI HTTP request"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        name, value = name.decode('latin1'), value.decode('latin1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class WsgiBridge:
+    """Serve a WSGI app from ASGI with one pool thread per request
+
+    Response chunks are sent as the app yields them, so streamed (SSE)
+    responses keep working, and the app's iterator is closed at the next
+    chunk after the client disconnects.
+    """
+
+    def __init__(self, wsgi_app, max_workers=ASGI_WSGI_WORKERS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        environ = _wsgi_environ(scope, await _read_body(receive))
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue()
+        disconnected = threading.Event()
+
+        def put(*message):
+            loop.call_soon_threadsafe(messages.put_nowait, message)
+
+        def start_response(status, headers, exc_info=None):
+            put('start', int(status.split(' ', 1)[0]),
+                [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers])
+            return lambda chunk: put('body', chunk)
+
+        def run():
+            try:
+                result = self.wsgi_app(environ, start_response)
+                try:
+                    for chunk in result:
+                        if disconnected.is_set():
+                            break
+                        if chunk:
+                            put('body', chunk)
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+            except Exception as e:
+                put('error', e)
+            finally:
+                put('end')
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        loop.run_in_executor(self.executor, run)
+        started = False
+        try:
+            while True:
+                kind, *args = await messages.get()
+                if kind == 'start' and not started:
+                    started = True
+                    await send({'type': 'http.response.start', 'status': args[0], 'headers': args[1]})
+                elif kind == 'body' and not disconnected.is_set():
+                    await send({'type': 'http.response.body', 'body': args[0], 'more_body': True})
+                elif kind == 'error' and not started:
+                    started = True
+                    await _send_json(send, {'error': str(args[0])}, 500)
+                elif kind == 'end':
+                    if not disconnected.is_set():
+                        await send({'type': 'http.response.body', 'body': b''})
+                    return
+        except OSError:
+            disconnected.set()  # Client went away mid-response; the worker stops at its next chunk
+        finally:
+            watcher.cancel()
+
+
+_flask = WsgiBridge(flask_app)
+
+
+async def _lifespan(receive, send):
+    warm_up = None
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Connect and load markets in the background; startup does not wait for upstreams
+            if WARM_UP_CONNECTIONS:
+                warm_up = asyncio.ensure_future(async_market.warm_up())
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if warm_up is not None:
+                warm_up.cancel()
+                await asyncio.gather(warm_up, return_exceptions=True)
+            await async_market.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    try:
+        rule, view_args = _urls.match(scope['path'], scope['method'], return_rule=True)
+    except HTTPException:
+        rule, view_args = None, None
+    handler = ASYNC_ROUTES.get(rule.endpoint) if rule else None
+    if handler is not None:
+        # Flask routes are timed by routes.metrics; these never reach Flask
+        start = time.perf_counter()
+        status = await _serve_async(handler, view_args, scope, receive, send)
+        http_request_seconds.observe(time.perf_counter() - start, scope['method'], rule.rule, str(status))
+    else:
+        await _flask(scope, receive, send)
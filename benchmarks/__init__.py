@@ -0,0 +1,5 @@
+# Benchmarks package
+import os
+
+# Benchmarks run against fakes: no live Binance ticker stream behind the crypto quotes
+os.environ.setdefault('CRYPTO_STREAM', 'false')
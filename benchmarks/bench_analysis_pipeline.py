@@ -0,0 +1,164 @@
+"""Benchmark: concurrent analysis pipeline vs running the stages one by one
+
+Builds a full report (price, indicators, Gemini analysis and news) for a
+known stock and for a symbol that is only listed as a crypto pair, first
+with the stages called in sequence and then through run_analysis, using
+fake Yahoo, Binance and Gemini backends. Also checks that a news stage
+that runs out of time is reported without failing the report, that
+analyses stuck on a hung model give up at their stage timeout without
+holding the workers market data needs, and that
+/api/analyze answers 503 with Retry-After while the market data circuits
+are open but 404 for a symbol that does not exist.
+
+Usage:
+    python -m benchmarks.bench_analysis_pipeline [--latency 0.2] [--llm-latency 1.5]
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from config import ANALYSIS_LLM_WORKERS, ANALYSIS_STAGE_TIMEOUTS
+from services import stock_service, crypto_service, gemini_service, news_service, resilience
+from services.analysis_pipeline import run_analysis, fetch_market_data, indicators_for, INDICATOR_PERIODS
+from services.gemini_service import analyze_stock
+from services.history_store import history_store
+from services.llm_cache import llm_cache
+from services.market_service import resolve_price
+from services.price_poller import price_poller
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.symbol_index import symbol_index
+from benchmarks.fakes import FakeYahoo, FakeExchange, FakeGemini, patched, unlimited_upstreams
+
+MODEL = 'gemini-2.5-flash'
+
+
+def _reset(history_root):
+    """Cold caches, so both runs pay for every upstream call"""
+    stock_quotes.clear()
+    crypto_quotes.clear()
+    llm_cache.clear()
+    symbol_index.clear()
+    history_store.root = tempfile.mkdtemp(dir=history_root)
+
+
+def _sequential(symbol, analysis_type):
+    _, price_data = resolve_price(symbol)
+    indicators = indicators_for(symbol, INDICATOR_PERIODS[analysis_type])
+    analysis = analyze_stock(symbol, price_data, analysis_type, MODEL, 'en', indicators)
+    news = news_service.analyze_news_with_ai(symbol, price_data, 'en', MODEL)
+    return analysis, news
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.2, help='simulated market data latency in seconds')
+    parser.add_argument('--llm-latency', type=float, default=1.5, help='simulated Gemini latency in seconds')
+    args = parser.parse_args()
+
+    yahoo = FakeYahoo(latency=args.latency)
+    exchange = FakeExchange(latency=args.latency, symbols=['BTC/USDT', 'NEAR/USDT'])
+    gemini = FakeGemini(latency=args.llm_latency)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            patched(stock_service.yf, 'Ticker', yahoo.Ticker), \
+            patched(crypto_service, 'exchange', exchange), \
+            patched(gemini_service, 'genai', gemini), \
+            patched(llm_cache, 'root', os.path.join(tmp, 'llm')), \
+            patched(history_store, 'root', history_store.root), \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')):
+        print(f'market data latency {args.latency * 1000:.0f} ms, Gemini latency {args.llm_latency * 1000:.0f} ms')
+        for symbol in ('AAPL', 'NEAR'):
+            _reset(tmp)
+            start = time.perf_counter()
+            _sequential(symbol, 'short_term')
+            sequential_s = time.perf_counter() - start
+
+            _reset(tmp)
+            report = run_analysis(symbol, 'short_term', 'en', MODEL, include_news=True)
+            assert report['analysis'] and report['news_analysis'] and report['indicators']
+            stages = '  '.join(f'{name}={timing["ms"]:.0f}ms' for name, timing in report['stages'].items())
+            print(f'{symbol:<5} ({report["asset_type"]})')
+            print(f'   sequential {sequential_s * 1000:7.0f} ms')
+            print(f'   pipeline   {report["total_ms"]:7.0f} ms   {stages}')
+            assert report['total_ms'] / 1000 < sequential_s * 0.75, 'pipeline should beat the sequential sum'
+
+        # A news stage that runs out of time leaves the rest of the report intact
+        _reset(tmp)
+
+        def slow_news(*_, **__):
+            time.sleep(args.llm_latency * 3)
+            return 'late', False
+
+        news_timeout = args.llm_latency * 1.5
+        original = ANALYSIS_STAGE_TIMEOUTS['news']
+        ANALYSIS_STAGE_TIMEOUTS['news'] = news_timeout
+        try:
+            with patched(news_service, 'generate_cached', slow_news):
+                report = run_analysis('AAPL', 'short_term', 'en', MODEL, include_news=True)
+        finally:
+            ANALYSIS_STAGE_TIMEOUTS['news'] = original
+        news = report['stages']['news']
+        assert report['analysis'] and report['news_analysis'] is None and news['status'] == 'timeout'
+        print(f'news timeout {news_timeout:.2f}s: analysis returned, news stage {news["status"]} '
+              f'after {news["ms"]:.0f} ms, total {report["total_ms"]:.0f} ms')
+
+        # A hung model: twice as many analyses as Gemini stage workers give up at the stage
+        # timeout, which reaches the request, while market data is still served at once
+        # and the workers are free for the next analysis
+        _reset(tmp)
+        hung = FakeGemini(latency=args.llm_latency * 4)
+        analysis_timeout = args.llm_latency
+        original = ANALYSIS_STAGE_TIMEOUTS['analysis']
+        ANALYSIS_STAGE_TIMEOUTS['analysis'] = analysis_timeout
+        try:
+            with unlimited_upstreams(), patched(gemini_service, 'genai', hung), \
+                    ThreadPoolExecutor(max_workers=2 * ANALYSIS_LLM_WORKERS) as pool:
+                stuck = [pool.submit(run_analysis, symbol, 'daily', 'en', MODEL)
+                         for symbol in ('AAPL', 'NEAR') * ANALYSIS_LLM_WORKERS]
+                time.sleep(args.latency * 3)  # Every analysis stage is waiting on the model
+                start = time.perf_counter()
+                market = fetch_market_data('MSFT', 'daily')
+                market_s = time.perf_counter() - start
+                stuck = [future.result() for future in stuck]
+            # The requests gave up too, so the Gemini stage workers are free again
+            with patched(gemini_service, 'genai', FakeGemini(latency=0)):
+                report = run_analysis('NEAR', 'weekly', 'en', MODEL)
+        finally:
+            ANALYSIS_STAGE_TIMEOUTS['analysis'] = original
+            for upstream in resilience.UPSTREAMS:
+                upstream.reset()
+        assert market['price_data'] and market_s < analysis_timeout, market_s
+        assert all(report['stages']['analysis']['status'] in ('timeout', 'error', 'unavailable') for report in stuck)
+        assert report['analysis'] and report['stages']['analysis']['ms'] < analysis_timeout * 1000
+        assert hung.timeouts and set(hung.timeouts) == {analysis_timeout}
+        print(f'hung model: {len(stuck)} analyses gave up after {analysis_timeout:.2f}s (request timeout '
+              f'{hung.timeouts[0]:g}s, {hung.calls} model calls); market data meanwhile in {market_s * 1000:.0f} ms')
+
+        # An outage is a 503 with Retry-After, a symbol that does not exist a 404
+        _reset(tmp)
+        client = app.test_client()
+        with patched(price_poller, 'start', lambda: None), \
+                patched(os, 'environ', {**os.environ, 'GEMINI_API_KEY': 'bench'}):
+            missing = client.post('/api/analyze', json={'symbol': 'ZZZZ', 'language': 'en'})
+            assert missing.status_code == 404, missing.get_json()
+            for upstream in (resilience.yahoo, resilience.binance):
+                for _ in range(upstream.breaker.failure_threshold):
+                    upstream.breaker.record_failure()
+            try:
+                outage = client.post('/api/analyze', json={'symbol': 'MSFT', 'language': 'en'})
+            finally:
+                for upstream in resilience.UPSTREAMS:
+                    upstream.reset()
+        assert outage.status_code == 503 and outage.headers['Retry-After'], outage.get_json()
+        assert outage.get_json()['stages']['price']['status'] == 'unavailable'
+        print(f'outage: /api/analyze answered {outage.status_code} with Retry-After {outage.headers["Retry-After"]}s; '
+              f'an unknown symbol {missing.status_code}')
+        llm_cache.clear()
+        symbol_index.clear()
+
+
+if __name__ == '__main__':
+    main()
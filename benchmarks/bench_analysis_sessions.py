@@ -0,0 +1,150 @@
+"""Benchmark: follow-up questions with and without an analysis session
+
+Analyzes one symbol through the Flask routes with fake Yahoo, Binance
+and Gemini backends, then asks --questions follow-ups three ways:
+
+    legacy    /api/ask-question with the report and price data in every body
+    session   /api/ask-question with only session_id and the question
+    memory    as session, with ANALYSIS_SESSION_TURNS=--turns earlier
+              questions and answers repeated in each prompt
+
+Accounts request body bytes, prompt bytes and approximate prompt tokens
+(4 bytes per token) per follow-up, and the prompt bytes that are new
+beyond the previous prompt's beginning (a shared beginning is what
+Gemini's implicit prefix caching bills at the cached rate). Then checks
+the streamed routes and an expired session.
+
+Usage:
+    python -m benchmarks.bench_analysis_sessions [--questions 5] [--turns 2]
+"""
+import argparse
+import json
+import os
+import tempfile
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from services import stock_service, crypto_service, gemini_service
+from services.analysis_sessions import analysis_sessions
+from services.history_store import history_store
+from services.llm_cache import llm_cache
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.symbol_index import symbol_index
+from benchmarks.fakes import FakeYahoo, FakeExchange, FakeGemini, patched, unlimited_upstreams
+
+QUESTIONS = ['What are the main risks?', 'Where is the nearest support?', 'Is the trend still intact?',
+             'What would invalidate this view?', 'How volatile is it compared to last month?',
+             'Which indicator matters most here?', 'What is a sensible stop level?', 'Summarize in one sentence.']
+
+
+def _shared_prefix(a, b):
+    """Length of the common beginning of two strings"""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _events(response):
+    """(event, data) pairs of a streamed Server-Sent Events response"""
+    for chunk in response.response:
+        text = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        lines = dict(line.split(': ', 1) for line in text.strip().splitlines() if ': ' in line)
+        if 'event' in lines:
+            yield lines['event'], json.loads(lines['data'])
+
+
+def _ask(client, gemini, bodies):
+    """Send each follow-up body and account its request and prompt sizes"""
+    rows, previous = [], ''
+    for body in bodies:
+        raw = json.dumps(body)
+        calls = gemini.calls
+        response = client.post('/api/ask-question', data=raw, content_type='application/json')
+        assert response.status_code == 200, response.get_json()
+        assert gemini.calls == calls + 1
+        prompt = gemini.prompts[-1]
+        rows.append({'request': len(raw.encode('utf-8')), 'prompt': len(prompt.encode('utf-8')),
+                     'new': len(prompt) - _shared_prefix(previous, prompt)})
+        previous = prompt
+    return rows
+
+
+def _report(label, rows):
+    request = sum(r['request'] for r in rows) / len(rows)
+    prompt = sum(r['prompt'] for r in rows) / len(rows)
+    new = sum(r['new'] for r in rows[1:]) / max(len(rows) - 1, 1)
+    print(f'{label:<8} request {request:7.0f} B  prompt {prompt:7.0f} B (~{prompt / 4:5.0f} tokens)  '
+          f'new per follow-up {new:6.0f} B  largest prompt {max(r["prompt"] for r in rows):6d} B')
+    return request, prompt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=5, help='follow-up questions per conversation')
+    parser.add_argument('--turns', type=int, default=2, help='earlier turns repeated in the memory run')
+    args = parser.parse_args()
+
+    questions = QUESTIONS[:args.questions]
+    gemini = FakeGemini(latency=0)
+    client = app.test_client()
+
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, \
+            patched(stock_service.yf, 'Ticker', FakeYahoo(latency=0).Ticker), \
+            patched(crypto_service, 'exchange', FakeExchange(latency=0)), \
+            patched(gemini_service, 'genai', gemini), \
+            patched(llm_cache, 'root', os.path.join(tmp, 'llm')), \
+            patched(history_store, 'root', os.path.join(tmp, 'history')), \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')), \
+            patched(analysis_sessions, 'path', os.path.join(tmp, 'sessions.sqlite3')), \
+            patched(os, 'environ', {**os.environ, 'GEMINI_API_KEY': 'bench'}):
+        report = client.post('/api/analyze', json={'symbol': 'AAPL', 'language': 'en'}).get_json()
+        session_id = report['session_id']
+        print(f'report {len(report["analysis"])} characters, {len(questions)} follow-up questions')
+
+        legacy = _ask(client, gemini, [{
+            'symbol': 'AAPL', 'question': question, 'analysis_text': report['analysis'],
+            'price_data': report['price_data'], 'language': 'en'
+        } for question in questions])
+        legacy_request, legacy_prompt = _report('legacy', legacy)
+
+        llm_cache.clear()
+        bodies = [{'session_id': session_id, 'question': question, 'language': 'en'} for question in questions]
+        session = _ask(client, gemini, bodies)
+        session_request, session_prompt = _report('session', session)
+        assert session_request * 10 < legacy_request and session_prompt < legacy_prompt
+
+        llm_cache.clear()
+        with patched(analysis_sessions, 'max_turns', args.turns):
+            session_id = client.post('/api/analyze', json={'symbol': 'AAPL', 'language': 'en'}).get_json()['session_id']
+            memory = _ask(client, gemini, [{**body, 'session_id': session_id} for body in bodies])
+        _report('memory', memory)
+        # Prompts grow by one turn until the window is full, then stay the same size
+        assert all(r['prompt'] > p['prompt'] for p, r in zip(memory, memory[1:args.turns + 1]))
+        assert max(r['prompt'] for r in memory[args.turns:]) - min(r['prompt'] for r in memory[args.turns:]) < 200
+        if args.turns:
+            assert questions[0] in gemini.prompts[-len(questions) + 1]  # The second prompt repeats the first turn
+
+        # Streamed analysis and questions
+        response = client.post('/api/analyze/stream', json={'symbol': 'MSFT', 'language': 'en'}, buffered=False)
+        done = [data for event, data in _events(response) if event == 'done'][0]
+        response = client.post('/api/ask-question/stream', buffered=False, json={
+            'session_id': done['session_id'], 'question': questions[0], 'language': 'en'})
+        events = list(_events(response))
+        assert events[0][1]['symbol'] == 'MSFT' and events[-1][0] == 'done'
+        print('stream   /api/analyze/stream done event has session_id, follow-up answered from it')
+
+        with patched(analysis_sessions, 'ttl', 0):
+            response = client.post('/api/ask-question', json={'session_id': session_id, 'question': 'Still there?'})
+        assert response.status_code == 404
+        print(f'expired  session answered with {response.status_code}: {response.get_json()["error"]}')
+
+        analysis_sessions.clear()
+        llm_cache.clear()
+        symbol_index.clear()
+    stock_quotes.clear()
+    crypto_quotes.clear()
+
+
+if __name__ == '__main__':
+    main()
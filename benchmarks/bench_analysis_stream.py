@@ -0,0 +1,117 @@
+"""Benchmark: time to first byte of blocking vs streamed analysis
+
+Serves the app on a local port with a fake Gemini model that emits its
+answer in chunks spread over --latency seconds, and measures how long a
+client waits for the first byte of /api/analyze and for the first text
+chunk of /api/analyze/stream and /api/ask-question/stream.
+
+Usage:
+    python -m benchmarks.bench_analysis_stream [--latency 3] [--chunks 20]
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import requests
+from werkzeug.serving import make_server
+
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from services import analysis_pipeline, gemini_service
+from services.analysis_sessions import analysis_sessions
+from services.llm_cache import llm_cache
+from benchmarks.fakes import FakeGemini, patched
+
+PRICE_DATA = {'price': 187.43, 'change': 2.25, 'change_percent': 1.21, 'volume': 51234567}
+
+
+def _events(response):
+    """Yield (event, data) pairs from an SSE response as they arrive"""
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith('event: '):
+            event = line[len('event: '):]
+        elif line.startswith('data: '):
+            yield event, json.loads(line[len('data: '):])
+
+
+def _blocking(base, path, body):
+    start = time.perf_counter()
+    response = requests.post(base + path, json=body, stream=True)
+    first_byte = next(response.iter_content(1))
+    ttfb = time.perf_counter() - start
+    data = json.loads(first_byte + response.content)
+    return ttfb, time.perf_counter() - start, data
+
+
+def _streamed(base, path, body):
+    start = time.perf_counter()
+    response = requests.post(base + path, json=body, stream=True)
+    first_chunk, meta, parts = None, None, []
+    for event, data in _events(response):
+        if event == 'meta':
+            meta = data
+        elif event == 'chunk':
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            parts.append(data['text'])
+        elif event == 'error':
+            raise RuntimeError(data['error'])
+    return first_chunk, time.perf_counter() - start, meta, parts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=3.0, help='seconds the fake model takes for a full answer')
+    parser.add_argument('--chunks', type=int, default=20, help='chunks the answer is streamed in')
+    args = parser.parse_args()
+
+    fake = FakeGemini(latency=args.latency, chunks=args.chunks)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{server.server_port}/api'
+    body = {'symbol': 'AAPL', 'analysis_type': 'daily', 'language': 'en'}
+
+    with tempfile.TemporaryDirectory() as root, \
+            patched(gemini_service, 'genai', fake), patched(llm_cache, 'root', root), \
+            patched(analysis_sessions, 'path', os.path.join(root, 'sessions.sqlite3')), \
+            patched(analysis_pipeline, 'resolve_price_concurrently', lambda symbol: ('stock', dict(PRICE_DATA))), \
+            patched(analysis_pipeline, 'indicators_for', lambda symbol, period: None), \
+            patched(os, 'environ', {**os.environ, 'GEMINI_API_KEY': 'bench'}):
+        try:
+            llm_cache.clear()
+            ttfb, total, blocking = _blocking(base, '/analyze', body)
+            print(f'model latency {args.latency:.1f}s in {args.chunks} chunks')
+            print(f'   /analyze                 first byte {ttfb * 1000:7.0f} ms   complete {total * 1000:7.0f} ms')
+
+            llm_cache.clear()
+            first, total, meta, parts = _streamed(base, '/analyze/stream', body)
+            print(f'   /analyze/stream          first text {first * 1000:7.0f} ms   complete {total * 1000:7.0f} ms'
+                  f'   chunks={len(parts)}')
+            assert not meta['cached'] and meta['price_data']['price'] == PRICE_DATA['price']
+            assert first < 1.0 and first < ttfb / 5, 'streaming should deliver text well before the full answer'
+            assert ''.join(parts).endswith(blocking['analysis'].split('\n\n---\n')[-1]), 'stream must end with the disclaimer'
+
+            # The completed stream is cached and replayed in one chunk
+            first, total, meta, parts = _streamed(base, '/analyze/stream', body)
+            assert meta['cached'] and len(parts) == 2  # cached text + disclaimer
+            print(f'   /analyze/stream (cached) first text {first * 1000:7.0f} ms   complete {total * 1000:7.0f} ms')
+
+            question = {'symbol': 'AAPL', 'question': 'What are the main risks?', 'language': 'en',
+                        'analysis_text': blocking['analysis'], 'price_data': PRICE_DATA}
+            first, total, meta, parts = _streamed(base, '/ask-question/stream', question)
+            assert first < 1.0
+            print(f'   /ask-question/stream     first text {first * 1000:7.0f} ms   complete {total * 1000:7.0f} ms'
+                  f'   chunks={len(parts)}')
+        finally:
+            llm_cache.clear()
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
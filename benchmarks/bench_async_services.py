@@ -0,0 +1,181 @@
+"""Benchmark: sync services on worker threads vs the async service layer
+
+Fires a burst of concurrent requests for distinct symbols at both
+implementations, the sync one through a thread pool the size of a
+typical WSGI worker pool, the async one as tasks on one event loop:
+
+    crypto   ccxt.binance vs ccxt.async_support.binance, both over real HTTP
+             to a local stub of the Binance ticker endpoint
+    stock    stock_service.get_stock_price vs AsyncMarket.get_stock_price; the
+             async side calls a local stub of the Yahoo chart endpoint, the sync
+             side uses the in-process FakeYahoo with the same latency (yfinance
+             0.2.28 cannot parse daily history under pandas 3, and skipping
+             HTTP only flatters the sync side)
+    gemini   analyze_stock vs analyze_stock_async on the fake Gemini model; the
+             async cache lookups must not stall the loop behind a slow disk
+
+Usage:
+    python -m benchmarks.bench_async_services [--requests 400] [--threads 16] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import ccxt
+import ccxt.async_support as ccxt_async
+from services import stock_service, crypto_service, gemini_service
+from services.async_market import AsyncMarket
+from services.gemini_service import analyze_stock, analyze_stock_async
+from services.llm_cache import llm_cache
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.symbol_index import symbol_index
+from benchmarks.fakes import StubServer, FakeYahoo, FakeGemini, patched, stub_markets, unlimited_upstreams
+
+MODEL = 'gemini-2.5-flash'
+
+
+def _reset():
+    stock_quotes.clear()
+    crypto_quotes.clear()
+    llm_cache.clear()
+    symbol_index.clear()
+
+
+def _sync_burst(fn, items, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(fn, items))
+    return time.perf_counter() - start, results
+
+
+def _async_burst(make_client, call, items):
+    async def run():
+        client = make_client()
+        try:
+            start = time.perf_counter()
+            results = await asyncio.gather(*(call(client, item) for item in items))
+            return time.perf_counter() - start, results
+        finally:
+            if client is not None:
+                await client.close()
+    return asyncio.run(run())
+
+
+def _report(name, count, sync_s, async_s, sync_peak='', async_peak=''):
+    print(f'{name:<7} sync  {sync_s:6.2f}s {count / sync_s:8.0f} req/s {sync_peak}')
+    print(f'{"":<7} async {async_s:6.2f}s {count / async_s:8.0f} req/s {async_peak}')
+    assert async_s * 2 < sync_s, f'{name}: async should serve the burst at least twice as fast'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400, help='concurrent requests per burst')
+    parser.add_argument('--threads', type=int, default=16, help='worker threads of the sync side')
+    parser.add_argument('--latency', type=float, default=0.2, help='simulated upstream latency in seconds')
+    parser.add_argument('--llm-latency', type=float, default=1.0, help='simulated Gemini latency in seconds')
+    args = parser.parse_args()
+
+    stocks = [f'S{i:04d}' for i in range(args.requests)]
+    pairs = [f'C{i:04d}/USDT' for i in range(args.requests)]
+    print(f'{args.requests} concurrent requests, {args.threads} sync worker threads, '
+          f'upstream latency {args.latency * 1000:.0f} ms, Gemini latency {args.llm_latency * 1000:.0f} ms')
+
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, StubServer(latency=args.latency) as stub, \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')), \
+            patched(llm_cache, 'root', os.path.join(tmp, 'llm')):
+        # Crypto: the same ccxt code, blocking vs async, against the stub
+        def exchange(module, config=None):
+            client = module.binance({**(config or {}), 'enableRateLimit': False})
+            client.set_markets(stub_markets(pairs))
+            client.urls['api']['public'] = f'{stub.url}/api/v3'
+            return client
+
+        _reset()
+        stub.reset()
+        with patched(crypto_service, 'exchange', exchange(ccxt)):
+            sync_s, results = _sync_burst(crypto_service.get_crypto_price, pairs, args.threads)
+        assert all('price' in r for r in results)
+        sync_peak = stub.peak_in_flight
+
+        _reset()
+        stub.reset()
+        async_s, results = _async_burst(
+            lambda: AsyncMarket(yahoo_base_url=stub.url, exchange_factory=lambda config: exchange(ccxt_async, config)),
+            lambda market, pair: market.get_crypto_price(pair), pairs)
+        assert all('price' in r for r in results)
+        _report('crypto', len(pairs), sync_s, async_s,
+                f'peak in flight {sync_peak}', f'peak in flight {stub.peak_in_flight}')
+
+        # Stocks: share counts are known, so neither side needs the .info scrape
+        for symbol in stocks:
+            stock_service._shares_outstanding[symbol] = (10 ** 9, time.monotonic())
+        yahoo = FakeYahoo(latency=args.latency, symbols=stocks)
+        _reset()
+        with patched(stock_service.yf, 'Ticker', yahoo.Ticker):
+            sync_s, results = _sync_burst(stock_service.get_stock_price, stocks, args.threads)
+        assert all('price' in r and r['market_cap'] for r in results)
+
+        _reset()
+        stub.reset()
+        async_s, results = _async_burst(
+            lambda: AsyncMarket(yahoo_base_url=stub.url),
+            lambda market, symbol: market.get_stock_price(symbol), stocks)
+        assert all('price' in r and r['market_cap'] for r in results)
+        _report('stock', len(stocks), sync_s, async_s, '', f'peak in flight {stub.peak_in_flight}')
+        for symbol in stocks:
+            stock_service._shares_outstanding.pop(symbol, None)
+
+        # Gemini: distinct prompts, so every request reaches the model
+        gemini = FakeGemini(latency=args.llm_latency)
+        price_data = {'price': 187.43, 'change': 2.25, 'change_percent': 1.21, 'volume': 51234567}
+        with patched(gemini_service, 'genai', gemini):
+            _reset()
+            sync_s, results = _sync_burst(
+                lambda symbol: analyze_stock(symbol, price_data, 'daily', MODEL, 'en'), stocks, args.threads)
+            assert gemini.calls == len(stocks)
+
+            _reset()
+            async_s, results = _async_burst(
+                lambda: None,
+                lambda _, symbol: analyze_stock_async(symbol, price_data, 'daily', MODEL, 'en'), stocks)
+            assert gemini.calls == 2 * len(stocks) and not any(r['cached'] for r in results)
+        _report('gemini', len(stocks), sync_s, async_s)
+
+        # Concurrent identical requests on the loop share one generation
+        with patched(gemini_service, 'genai', gemini):
+            _reset()
+            gemini.calls = 0
+            _, results = _async_burst(
+                lambda: None, lambda _, __: analyze_stock_async('AAPL', price_data, 'daily', MODEL, 'en'), range(20))
+            assert gemini.calls == 1 and sum(not r['cached'] for r in results) == 1
+        print('   20 concurrent identical async analyses: 1 gemini call')
+
+        # A slow cache disk (another thread holding the cache lock) does not stall the loop
+        async def stalled_cache():
+            beats = [time.perf_counter()]
+
+            async def heartbeat():
+                while True:
+                    await asyncio.sleep(0.01)
+                    beats.append(time.perf_counter())
+
+            beat = asyncio.ensure_future(heartbeat())
+            await analyze_stock_async('MSFT', price_data, 'daily', MODEL, 'en')
+            beat.cancel()
+            return max(b - a for a, b in zip(beats, beats[1:]))
+
+        with patched(gemini_service, 'genai', gemini):
+            _reset()
+            llm_cache._lock.acquire()
+            threading.Timer(0.5, llm_cache._lock.release).start()
+            gap = asyncio.run(stalled_cache())
+        assert gap < 0.2, f'the event loop stalled for {gap:.2f}s behind the cache lock'
+        print(f'   cache lock held for 0.5s by another thread: longest event loop stall {gap * 1000:.0f} ms')
+        _reset()
+
+
+if __name__ == '__main__':
+    main()
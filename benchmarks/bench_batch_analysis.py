@@ -0,0 +1,133 @@
+"""Benchmark: /api/analyze/batch vs one /api/analyze request per symbol
+
+Analyzes a watchlist of stocks, Borsa Istanbul stocks and crypto
+symbols through the Flask routes with fake Yahoo, Binance and Gemini
+backends:
+
+    single  one /api/analyze per symbol from --clients concurrent clients
+    batch   one /api/analyze/batch request streaming a result per symbol,
+            --clients Gemini calls in flight
+
+Reports throughput in symbols per minute, the number of Gemini calls and
+the time to the first streamed result, then checks that a batched
+analysis is served from the cache by a later /api/analyze.
+
+Usage:
+    python -m benchmarks.bench_batch_analysis [--llm-latency 1.5] [--batch-size 4] [--clients 4]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from config import POPULAR_STOCKS, POPULAR_CRYPTO, BORSA_ISTANBUL
+from services import batch_analysis, stock_service, crypto_service, gemini_service
+from services.history_store import history_store
+from services.analysis_sessions import analysis_sessions
+from services.llm_cache import llm_cache
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.symbol_index import symbol_index
+from benchmarks.fakes import FakeYahoo, FakeExchange, FakeGemini, patched, unlimited_upstreams
+
+
+def _reset(tmp):
+    """Cold caches, so both runs pay for every upstream call"""
+    stock_quotes.clear()
+    crypto_quotes.clear()
+    llm_cache.clear()
+    symbol_index.clear()
+    history_store.root = tempfile.mkdtemp(dir=tmp)
+
+
+def _events(response):
+    """(event, data) pairs of a streamed Server-Sent Events response"""
+    for chunk in response.response:
+        text = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        lines = dict(line.split(': ', 1) for line in text.strip().splitlines() if ': ' in line)
+        if 'event' in lines:
+            yield lines['event'], json.loads(lines['data'])
+
+
+def _report(label, elapsed, count, calls, extra=''):
+    print(f'{label:<7} {elapsed:6.2f}s  {count / elapsed * 60:7.1f} symbols/min  {calls:3d} Gemini calls{extra}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated market data latency in seconds')
+    parser.add_argument('--llm-latency', type=float, default=1.5, help='simulated Gemini latency per analysis')
+    parser.add_argument('--batch-size', type=int, default=4, help='symbols per Gemini call')
+    parser.add_argument('--clients', type=int, default=4, help='concurrent requests / Gemini calls in flight')
+    args = parser.parse_args()
+
+    symbols = list(POPULAR_STOCKS) + list(BORSA_ISTANBUL) + [pair.split('/')[0] for pair in POPULAR_CRYPTO]
+    yahoo = FakeYahoo(latency=args.latency)
+    exchange = FakeExchange(latency=args.latency)
+    gemini = FakeGemini(latency=args.llm_latency)
+    client = app.test_client()
+    print(f'{len(symbols)} symbols, Gemini latency {args.llm_latency * 1000:.0f} ms per analysis '
+          f'(+{gemini.section_cost:.0%} per extra section), batches of {args.batch_size}, {args.clients} in flight')
+
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, \
+            patched(stock_service.yf, 'Ticker', yahoo.Ticker), \
+            patched(crypto_service, 'exchange', exchange), \
+            patched(gemini_service, 'genai', gemini), \
+            patched(llm_cache, 'root', os.path.join(tmp, 'llm')), \
+            patched(analysis_sessions, 'path', os.path.join(tmp, 'sessions.sqlite3')), \
+            patched(history_store, 'root', history_store.root), \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')), \
+            patched(batch_analysis, 'ANALYSIS_BATCH_SIZE', args.batch_size), \
+            patched(os, 'environ', {**os.environ, 'GEMINI_API_KEY': 'bench'}):
+        # One request per symbol
+        _reset(tmp)
+        gemini.calls = 0
+
+        def analyze(symbol):
+            response = client.post('/api/analyze', json={'symbol': symbol, 'language': 'en'})
+            return response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            statuses = list(pool.map(analyze, symbols))
+        single = time.perf_counter() - start
+        assert all(status == 200 for status in statuses), statuses
+        _report('single', single, len(symbols), gemini.calls)
+        single_calls = gemini.calls
+
+        # One batch request
+        _reset(tmp)
+        gemini.calls = 0
+        results = []
+        first = summary = None
+        start = time.perf_counter()
+        with patched(batch_analysis, 'ANALYSIS_BATCH_CONCURRENCY', args.clients):
+            response = client.post('/api/analyze/batch', json={'symbols': symbols, 'language': 'en'}, buffered=False)
+            for event, data in _events(response):
+                if event == 'result':
+                    first = first or time.perf_counter() - start
+                    results.append(data)
+                elif event == 'done':
+                    summary = data
+        batch = time.perf_counter() - start
+        assert len(results) == len(symbols) and all('analysis' in r and r['indicators'] for r in results), \
+            [r.get('error') for r in results if 'error' in r]
+        assert summary['llm_calls'] == gemini.calls == -(-len(symbols) // args.batch_size)
+        _report('batch', batch, len(symbols), gemini.calls, f'  first result after {first * 1000:.0f} ms  '
+                f'(server: {summary["symbols_per_minute"]} symbols/min)')
+        assert gemini.calls < single_calls and batch < single
+
+        # A batched analysis is a cache hit for the single-symbol route
+        response = client.post('/api/analyze', json={'symbol': symbols[0], 'language': 'en'})
+        assert response.status_code == 200 and response.get_json()['cached']
+        print(f'single  /api/analyze {symbols[0]} after the batch: cached, {gemini.calls - summary["llm_calls"]} new calls')
+        llm_cache.clear()
+        symbol_index.clear()
+        stock_quotes.clear()
+        crypto_quotes.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark: sequential vs batched stock quotes against recorded Yahoo responses
+
+Both paths must return the same quotes without errors, and the batched
+one must make at most one upstream call per symbol.
+
+Usage:
+    python -m benchmarks.bench_batch_quotes [--latency 0.1] [--rounds 3]
+"""
+import argparse
+import time
+from config import POPULAR_STOCKS, BORSA_ISTANBUL
+from services import stock_service
+from services.quote_cache import stock_quotes
+from benchmarks.fakes import RecordedYahoo, patched
+
+
+def _time(fn, rounds):
+    """Return the last result and the best wall time of several cold-cache rounds in milliseconds"""
+    best = None
+    for _ in range(rounds):
+        stock_quotes.clear()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.1, help='Injected upstream latency in seconds')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    yahoo = RecordedYahoo(latency=args.latency)
+    with patched(stock_service.yf, 'Ticker', yahoo.Ticker):
+        for name, watchlist in (('popular', POPULAR_STOCKS), ('borsa-istanbul', BORSA_ISTANBUL)):
+            symbols = list(watchlist)
+
+            yahoo.calls = 0
+            quotes, sequential = _time(lambda: [stock_service.get_stock_price(s) for s in symbols], args.rounds)
+            sequential_calls = yahoo.calls // args.rounds
+
+            yahoo.calls = 0
+            batch, batched = _time(lambda: stock_service.get_stock_prices(symbols), args.rounds)
+            batched_calls = yahoo.calls // args.rounds
+
+            assert not any('error' in quote for quote in quotes), quotes
+            assert [batch[s]['price'] for s in symbols] == [quote['price'] for quote in quotes]
+            assert batched_calls <= min(len(symbols), sequential_calls), (batched_calls, sequential_calls)
+
+            print(f"{name:<16} symbols={len(symbols):<3} "
+                  f"sequential={sequential:8.1f} ms ({sequential_calls} calls)  "
+                  f"batched={batched:8.1f} ms ({batched_calls} calls)  "
+                  f"speedup={sequential / batched:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
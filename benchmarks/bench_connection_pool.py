@@ -0,0 +1,157 @@
+"""Benchmark: connection reuse of the pooled upstream sessions
+
+Sends rounds of --threads concurrent quote requests (a dashboard
+refresh, a batch lookup) to a local stub of the Yahoo chart and Binance
+ticker endpoints that charges --handshake seconds for every new
+connection. Between rounds the threads go idle, so a pool smaller than
+the thread count closes the surplus connections and the next round has
+to open them again. Compares:
+
+    yahoo    a plain requests.Session (10 pooled connections per host) vs
+             http_pool.pooled_session(), fetching the chart endpoint directly
+             (yfinance 0.2.28 cannot parse daily history under pandas 3)
+    binance  get_crypto_price on a default ccxt.binance() vs
+             crypto_service.create_exchange()
+    warm-up  latency of the first Yahoo request with and without warm_up()
+    async    two bursts through AsyncMarket; the second opens no connections
+
+Connection counts are read from the clients' own stats and checked
+against the connections the stub accepted.
+
+Usage:
+    python -m benchmarks.bench_connection_pool [--rounds 20] [--threads 16] [--handshake 0.05]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import ccxt
+import ccxt.async_support as ccxt_async
+import requests
+from services import crypto_service, stock_service
+from services.async_market import AsyncMarket
+from services.http_pool import pooled_session, connection_stats
+from services.quote_cache import crypto_quotes
+from services.symbol_index import symbol_index
+from benchmarks.fakes import StubServer, patched, stub_markets, unlimited_upstreams
+
+
+def _rounds(fn, items, threads):
+    """Call fn on items in rounds of `threads` concurrent calls"""
+    results = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for i in range(0, len(items), threads):
+            results.extend(pool.map(fn, items[i:i + threads]))
+    return time.perf_counter() - start, results
+
+
+def _report(name, label, elapsed, count, stats):
+    print(f'{name:<8} {label:<8} {elapsed:6.2f}s {count / elapsed:7.0f} req/s '
+          f'{stats["connections"]:5d} connections  reuse {stats["reuse_ratio"]:6.1%}')
+
+
+def _exchange(client, stub, pairs):
+    client.enableRateLimit = False  # Measures connections, not ccxt's request spacing
+    client.set_markets(stub_markets(pairs))
+    client.urls['api']['public'] = f'{stub.url}/api/v3'
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=20, help='rounds of concurrent requests')
+    parser.add_argument('--threads', type=int, default=16, help='worker threads sharing one client')
+    parser.add_argument('--latency', type=float, default=0.1, help='simulated upstream latency in seconds')
+    parser.add_argument('--handshake', type=float, default=0.05, help='simulated cost of a new connection in seconds')
+    args = parser.parse_args()
+    # The default pool logs every connection it discards; the counts below say the same
+    logging.getLogger('urllib3.connectionpool').setLevel(logging.ERROR)
+
+    count = args.rounds * args.threads
+    stocks = [f'S{i:04d}' for i in range(count)]
+    pairs = [f'C{i:04d}/USDT' for i in range(count)]
+    print(f'{args.rounds} rounds of {args.threads} concurrent requests, upstream latency '
+          f'{args.latency * 1000:.0f} ms, handshake {args.handshake * 1000:.0f} ms')
+
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, \
+            StubServer(latency=args.latency, handshake=args.handshake) as stub, \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')):
+        # Yahoo: the same requests from the same threads, default vs sized pool
+        timings = {}
+        for label, session in (('default', requests.Session()), ('pooled', pooled_session())):
+            stub.reset()
+            elapsed, responses = _rounds(
+                lambda symbol: session.get(f'{stub.url}/v8/finance/chart/{symbol}',
+                                           params={'range': '5d', 'interval': '1d'}).status_code,
+                stocks, args.threads)
+            assert all(status == 200 for status in responses)
+            stats = connection_stats(session)
+            assert stats['requests'] == len(stocks) and stats['connections'] == stub.connections
+            _report('yahoo', label, elapsed, len(stocks), stats)
+            timings[label] = elapsed, stats['connections']
+            session.close()
+        assert timings['pooled'][1] <= args.threads < timings['default'][1], \
+            'the pooled session should keep one connection per thread'
+        assert timings['pooled'][0] < timings['default'][0]
+
+        # Binance: get_crypto_price through a default and the service's exchange client
+        timings = {}
+        for label, client in (('default', ccxt.binance()), ('pooled', crypto_service.create_exchange())):
+            crypto_quotes.clear()
+            stub.reset()
+            with patched(crypto_service, 'exchange', _exchange(client, stub, pairs)):
+                elapsed, results = _rounds(crypto_service.get_crypto_price, pairs, args.threads)
+                stats = crypto_service.connection_stats()
+            assert all('price' in r for r in results)
+            assert stats['connections'] == stub.connections
+            _report('binance', label, elapsed, len(pairs), stats)
+            timings[label] = elapsed, stats['connections']
+            client.session.close()
+        assert timings['pooled'][1] <= args.threads < timings['default'][1]
+        assert timings['pooled'][0] < timings['default'][0]
+        crypto_quotes.clear()
+
+        # Warm-up: the first request of a fresh session, with and without warm_up()
+        first = {}
+        for label in ('cold', 'warm'):
+            session = pooled_session()
+            with patched(stock_service, '_session', session), patched(stock_service, 'YAHOO_BASE_URL', stub.url):
+                if label == 'warm':
+                    stock_service.warm_up()
+                start = time.perf_counter()
+                session.get(f'{stub.url}/v8/finance/chart/AAPL', params={'range': '5d', 'interval': '1d'})
+                first[label] = time.perf_counter() - start
+            session.close()
+        print(f'warm-up  first request {first["cold"] * 1000:6.1f} ms cold, {first["warm"] * 1000:6.1f} ms warm')
+        assert first['warm'] + args.handshake / 2 < first['cold']
+
+        # Async: the second burst runs entirely on pooled connections
+        async def bursts():
+            market = AsyncMarket(yahoo_base_url=stub.url,
+                                 exchange_factory=lambda config: _exchange(ccxt_async.binance(config), stub, pairs))
+            try:
+                stats = []
+                for _ in range(2):
+                    crypto_quotes.clear()
+                    results = await asyncio.gather(*(market.get_crypto_price(pair) for pair in pairs))
+                    assert all('price' in r for r in results)
+                    stats.append(market.connection_stats())
+                return stats
+            finally:
+                await market.close()
+
+        stub.reset()
+        first, second = asyncio.run(bursts())
+        print(f'async    first burst {first["connections"]} connections, second burst '
+              f'{second["connections"] - first["connections"]} new for {second["requests"] - first["requests"]} requests')
+        assert first['connections'] == stub.connections and second['connections'] == first['connections']
+        crypto_quotes.clear()
+        symbol_index.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Benchmark: crypto quotes from the WebSocket ticker stream vs REST
+
+Runs a TickerStream against a local stand-in of Binance's ticker stream
+(StubTickerServer, replaying recorded frames every --interval seconds)
+next to a RecordedExchange answering REST calls after --latency:
+
+    rest      get_crypto_price for the watchlist pairs with quotes that must
+              be fresh (quote cache TTL 0): one fetch_ticker per call
+    stream    the same calls answered from the streamed ticker table
+    tab       /api/prices/crypto through the Flask routes
+
+Then checks that a pair a user asks for is added to the subscription,
+that a dropped connection is reopened, that quotes fall back to REST
+while the stream is silent, that pairs past max_symbols wait for room or
+replace the least recently requested pair, and that reconnect attempts
+back off while the stream is unreachable.
+
+Usage:
+    python -m benchmarks.bench_crypto_stream [--calls 200] [--latency 0.05] [--interval 0.1]
+"""
+import argparse
+import os
+import socket
+import tempfile
+import time
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from config import POPULAR_CRYPTO
+from services import crypto_service
+from services.crypto_stream import TickerStream
+from services.price_poller import price_poller
+from services.quote_cache import crypto_quotes
+from services.symbol_index import symbol_index
+from benchmarks.fakes import RecordedExchange, StubTickerServer, patched, unlimited_upstreams
+
+PAIRS = list(POPULAR_CRYPTO)
+EXTRA = 'LINK/USDT'  # Not on the watchlist; streamed once a user asks for it
+
+
+def _wait(condition, timeout):
+    """Seconds until condition() holds; fails after timeout"""
+    start = time.perf_counter()
+    while not condition():
+        assert time.perf_counter() - start < timeout, 'timed out'
+        time.sleep(0.005)
+    return time.perf_counter() - start
+
+
+def _quotes(calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        price_data = crypto_service.get_crypto_price(PAIRS[i % len(PAIRS)])
+        assert price_data.get('price'), price_data
+    return (time.perf_counter() - start) / calls
+
+
+def _closed_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200, help='quote lookups per run')
+    parser.add_argument('--latency', type=float, default=0.05, help='REST latency in seconds')
+    parser.add_argument('--interval', type=float, default=0.1, help='seconds between streamed frames')
+    args = parser.parse_args()
+
+    max_age = args.interval * 5
+    exchange = RecordedExchange(latency=args.latency, symbols=PAIRS + [EXTRA])
+    client = app.test_client()
+    print(f'REST latency {args.latency * 1000:.0f} ms, a frame per pair every {args.interval * 1000:.0f} ms, '
+          f'streamed tickers stale after {max_age * 1000:.0f} ms')
+
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, \
+            StubTickerServer(interval=args.interval, symbols=PAIRS + [EXTRA]) as stub, \
+            patched(crypto_service, 'exchange', exchange), \
+            patched(price_poller, 'start', lambda: None), \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')), \
+            patched(crypto_quotes, 'ttl', 0):
+        rest = _quotes(args.calls)
+        rest_calls = exchange.total_calls
+        print(f'rest     {rest * 1e6:9.1f} us per quote, {rest_calls} REST calls')
+
+        stream = TickerStream(url=stub.ws_url, symbols=PAIRS, max_age=max_age, backoff=(args.interval, 1.0))
+        with patched(crypto_service, 'ticker_stream', stream):
+            stream.start()
+            connected = _wait(lambda: stream.stats()['fresh'] == len(PAIRS), 5)
+            exchange.calls.clear()
+            streamed = _quotes(args.calls)
+            assert exchange.total_calls == 0
+            age = stream.stats()['last_frame_age']
+            print(f'stream   {streamed * 1e6:9.1f} us per quote, {exchange.total_calls} REST calls '
+                  f'(all pairs streamed {connected * 1000:.0f} ms after start, newest frame {age * 1000:.0f} ms old)')
+            assert streamed * 10 < rest
+
+            response = client.get('/api/prices/crypto')
+            assert response.status_code == 200 and exchange.total_calls == 0
+            print(f'tab      /api/prices/crypto: {len(response.get_json())} quotes, {exchange.total_calls} REST calls')
+
+            # A pair users ask for joins the subscription
+            assert crypto_service.get_crypto_price(EXTRA).get('price') and exchange.total_calls == 1
+            joined = _wait(lambda: stream.get(EXTRA) is not None, 5)
+            crypto_service.get_crypto_price(EXTRA)
+            assert exchange.total_calls == 1
+            print(f'watch    {EXTRA}: first quote over REST, streamed {joined * 1000:.0f} ms later, '
+                  f'{stub.subscriptions} SUBSCRIBE requests')
+
+            # A dropped connection is reopened and resubscribed
+            start = time.perf_counter()
+            stub.drop()
+            _wait(lambda: stream.stats()['connections'] == 2, 5)
+            frames = stream.frames
+            _wait(lambda: stream.frames > frames + len(PAIRS), 5)
+            reconnected = time.perf_counter() - start
+            assert stream.get(EXTRA) is not None
+            print(f'drop     reconnected and streaming again within {reconnected * 1000:.0f} ms, '
+                  f'{stream.stats()["subscribed"]} pairs subscribed')
+
+            # Silent stream: quotes fall back to REST
+            stub.pause()
+            stale = _wait(lambda: stream.get(PAIRS[0]) is None, 5)
+            calls = exchange.total_calls
+            assert crypto_service.get_crypto_price(PAIRS[0]).get('price') and exchange.total_calls == calls + 1
+            stub.pause(False)
+            resumed = _wait(lambda: stream.get(PAIRS[0]) is not None, 5)
+            print(f'stale    REST fallback {stale * 1000:.0f} ms after the frames stopped, '
+                  f'streamed again {resumed * 1000:.0f} ms after they resumed')
+            stream.stop()
+
+        # Full subscription: a requested pair waits for room, then replaces the least recently requested one
+        watchlist, first, second = PAIRS[:-2], PAIRS[-2], PAIRS[-1]
+        stream = TickerStream(url=stub.ws_url, symbols=watchlist, max_age=max_age, max_symbols=len(watchlist))
+        stream.start()
+        _wait(lambda: stream.stats()['fresh'] == len(watchlist), 5)
+        stream.watch(first)
+        time.sleep(args.interval * 3)
+        assert stream.get(first) is None and stream.stats()['pending'] == 1
+        stream.max_symbols += 1
+        _wait(lambda: stream.get(first) is not None, 5)
+        stream.watch(second)
+        _wait(lambda: stream.get(second) is not None, 5)
+        stats = stream.stats()
+        stream.stop()
+        assert stream.get(first) is None and stats['dropped'] == 1 and stats['pending'] == 0
+        assert stats['subscribed'] == stream.max_symbols
+        print(f'full     {first} waited for room, then {second} replaced it: '
+              f'{stats["subscribed"]} subscribed, {stats["dropped"]} dropped, {stats["pending"]} pending')
+
+    # Unreachable stream: attempts spread out instead of hammering the endpoint
+    low, high, window = 0.05, 0.4, 1.5
+    stream = TickerStream(url=f'ws://127.0.0.1:{_closed_port()}/ws', backoff=(low, high))
+    stream.start()
+    time.sleep(window)
+    stream.stop()
+    attempts = stream.stats()['failures']
+    assert 2 <= attempts < window / low
+    print(f'backoff  {attempts} connection attempts in {window:.1f}s with delays from {low * 1000:.0f} '
+          f'to {high * 1000:.0f} ms (next delay {stream.stats()["reconnect_delay"] * 1000:.0f} ms)')
+    crypto_quotes.clear()
+    symbol_index.clear()
+
+
+if __name__ == '__main__':
+    main()
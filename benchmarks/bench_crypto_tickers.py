@@ -0,0 +1,57 @@
+"""Benchmark: per-symbol fetch_ticker vs one fetch_tickers snapshot
+
+Runs the crypto tab against a stubbed ccxt exchange that counts calls, and
+checks that the bulk path costs one exchange call plus one per missing pair,
+also when several requests for the tab arrive at once.
+
+Usage:
+    python -m benchmarks.bench_crypto_tickers [--latency 0.05]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import POPULAR_CRYPTO
+from services import crypto_service
+from services.quote_cache import crypto_quotes
+from benchmarks.fakes import FakeExchange, patched
+
+
+def _run(exchange, fn):
+    exchange.calls = {}
+    crypto_quotes.clear()
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000, dict(exchange.calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05, help='Injected exchange latency in seconds')
+    args = parser.parse_args()
+
+    symbols = list(POPULAR_CRYPTO)
+    # The bulk endpoint "forgets" one pair so the per-symbol fallback is exercised
+    missing = symbols[-1]
+    exchange = FakeExchange(latency=args.latency, bulk_symbols=symbols[:-1])
+
+    with patched(crypto_service, 'exchange', exchange):
+        single, single_ms, single_calls = _run(
+            exchange, lambda: {s: crypto_service.get_crypto_price(s) for s in symbols})
+        bulk, bulk_ms, bulk_calls = _run(exchange, lambda: crypto_service.get_crypto_prices(symbols))
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            concurrent, concurrent_ms, concurrent_calls = _run(
+                exchange, lambda: list(pool.map(lambda _: crypto_service.get_crypto_prices(symbols), range(8))))
+
+    assert single == bulk, 'bulk and per-symbol results differ'
+    assert single_calls == {'fetch_ticker': len(symbols)}, single_calls
+    assert bulk_calls == {'fetch_tickers': 1, 'fetch_ticker': 1}, bulk_calls
+    assert all(result == bulk for result in concurrent) and concurrent_calls == bulk_calls, concurrent_calls
+
+    print(f"per-symbol  {single_ms:8.1f} ms  calls={single_calls}")
+    print(f"bulk        {bulk_ms:8.1f} ms  calls={bulk_calls}  (fallback for {missing})")
+    print(f"8 at once   {concurrent_ms:8.1f} ms  calls={concurrent_calls}  (one shared refresh)")
+    print(f"speedup     {single_ms / bulk_ms:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Benchmark: LTTB chart downsampling of long candle series
+
+Downsamples --points synthetic 1m candles (a random walk with a few
+sharp spikes) to chart widths of 300 to 2000 points with
+downsample.lttb_indices, and with a per-point Python LTTB for
+reference; both must pick the same candles. For each width it reports
+how many of the spikes survive and the mean gap between the full close
+line and the line drawn through the kept points, for LTTB and for
+taking every k-th candle, and checks that the kept candles still hold
+the highest and lowest close, the highest high, the lowest low and the
+whole volume. LTTB trades a larger mean gap (it keeps the extreme
+candle of a bucket, not a typical one) for keeping the spikes a stride
+steps over. The history route is then asked for a stock's max period
+with and without max_points.
+
+Usage:
+    python -m benchmarks.bench_downsample [--points 100000] [--rounds 10] [--spikes 20]
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from services import stock_service
+from services.downsample import lttb_indices, downsample
+from services.history_store import history_store
+from services.price_poller import price_poller
+from services.symbol_index import symbol_index
+from benchmarks.fakes import FakeYahoo, patched, unlimited_upstreams
+
+WIDTHS = (300, 500, 1000, 2000)
+
+
+def _reference_lttb(x, y, max_points):
+    """LTTB one point at a time, as usually written"""
+    count = len(x)
+    x = [value - x[0] for value in x]
+    every = (count - 2) / (max_points - 2)
+    a = 0
+    picked = [0]
+    for i in range(max_points - 2):
+        next_start, next_end = int((i + 1) * every) + 1, min(int((i + 2) * every) + 1, count)
+        next_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        next_y = sum(y[next_start:next_end]) / (next_end - next_start)
+        best, pick = -1.0, None
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((x[a] - next_x) * (y[j] - y[a]) - (x[a] - x[j]) * (next_y - y[a]))
+            if area > best:
+                best, pick = area, j
+        a = pick
+        picked.append(a)
+    picked.append(count - 1)
+    return picked
+
+
+def _synthetic_candles(count, spikes, seed=5):
+    """Candle arrays of a random walk, and the indices of its one-candle spikes (a stride likely misses them)"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, count)))
+    spiked = np.sort(rng.choice(np.arange(1, count - 1), spikes, replace=False))
+    close[spiked] *= rng.choice((0.9, 1.1), spikes)
+    ts = (int(time.time() * 1000) // 60000 - count) * 60000 + np.arange(count, dtype=np.int64) * 60000
+    spread = np.abs(rng.normal(0, 2e-3, count)) * close
+    return {'ts': ts, 'open': np.roll(close, 1), 'high': close + spread, 'low': close - spread, 'close': close,
+            'volume': rng.integers(1, 1000, count).astype(np.float64)}, spiked
+
+
+def _line_error(candles, ts, close):
+    """Mean gap between the full close line and the line through (ts, close), in % of the close range"""
+    drawn = np.interp(candles['ts'], ts, close)
+    return 100 * np.abs(drawn - candles['close']).mean() / np.ptp(candles['close'])
+
+
+def _timed(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return result, (time.perf_counter() - start) * 1000 / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=100000, help='synthetic 1m candles downsampled')
+    parser.add_argument('--rounds', type=int, default=10, help='runs timed per width')
+    parser.add_argument('--spikes', type=int, default=20, help='one-candle spikes of 10%% in the series')
+    args = parser.parse_args()
+
+    candles, spiked = _synthetic_candles(args.points, args.spikes)
+    ts_list, close_list = candles['ts'].tolist(), candles['close'].tolist()
+    print(f'{args.points} candles with {args.spikes} spikes; error = mean gap to the full close line, % of its range')
+    print(f'{"width":>6}  {"lttb":>9}  {"candles":>9}  {"per-point":>10}  '
+          f'{"lttb spikes":>11} {"error":>6}  {"stride spikes":>13} {"error":>6}')
+    for width in WIDTHS:
+        picked, lttb_ms = _timed(lambda: lttb_indices(candles['ts'], candles['close'], width, keep_extremes=False),
+                                 args.rounds)
+        reference, reference_ms = _timed(lambda: _reference_lttb(ts_list, close_list, width), 1)
+        assert picked.tolist() == reference
+        reduced, candles_ms = _timed(lambda: downsample(candles, width), args.rounds)
+        assert len(reduced['ts']) == width and (np.diff(reduced['ts']) > 0).all()
+        assert reduced['close'].max() == candles['close'].max() and reduced['close'].min() == candles['close'].min()
+        assert reduced['high'].max() == candles['high'].max() and reduced['low'].min() == candles['low'].min()
+        assert reduced['volume'].sum() == candles['volume'].sum()
+        stride = np.unique(np.append(np.arange(0, args.points, -(-args.points // width)), args.points - 1))
+        kept = np.isin(candles['ts'][spiked], reduced['ts']).sum()
+        strided = np.isin(spiked, stride).sum()
+        assert kept > strided
+        print(f'{width:>6}  {lttb_ms:7.2f}ms  {candles_ms:7.2f}ms  {reference_ms:8.1f}ms  '
+              f'{kept:>5} of {args.spikes:<3} {_line_error(candles, reduced["ts"], reduced["close"]):5.2f}%  '
+              f'{strided:>7} of {args.spikes:<3} '
+              f'{_line_error(candles, candles["ts"][stride], candles["close"][stride]):5.2f}%')
+    print('lttb = lttb_indices, candles = downsample with the bucket aggregates, per-point = plain Python LTTB '
+          '(same picks); extremes and total volume kept at every width')
+
+    client = app.test_client()
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, \
+            patched(stock_service.yf, 'Ticker', FakeYahoo(latency=0).Ticker), \
+            patched(price_poller, 'start', lambda: None), \
+            patched(history_store, 'root', os.path.join(tmp, 'history')), \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')):
+        full = client.get('/api/history/AAPL?period=max')
+        for query in ('max_points=500', 'max_points=500&format=columnar'):
+            response = client.get(f'/api/history/AAPL?period=max&{query}')
+            assert response.status_code == 200, response.get_json()
+            points = response.get_json().get('count') or len(response.get_json()['dates'])
+            assert points == 500
+            print(f'GET /api/history/AAPL?period=max&{query}: {points} of {len(full.get_json()["dates"])} candles, '
+                  f'{len(response.data) / 1000:.1f} kB instead of {len(full.data) / 1000:.1f} kB')
+        assert max(client.get('/api/history/AAPL?period=max&max_points=500').get_json()['high']) == \
+            max(full.get_json()['high'])
+        for bad in ('2', 'wide'):
+            assert client.get(f'/api/history/AAPL?period=max&max_points={bad}').status_code == 400
+        symbol_index.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark: lightweight chart-based stock quotes vs the full .info scrape
+
+Fetches the popular watchlist through both quote paths against recorded
+Yahoo responses and prints the per-path and per-field latency and payload
+bytes recorded by stock_service.quote_stats. The fast path must make one
+chart call per symbol once share counts are known (the first round also
+scrapes .info once per symbol for them) and move fewer bytes than .info.
+
+Usage:
+    python -m benchmarks.bench_fast_quote [--latency 0.05]
+"""
+import argparse
+import time
+from config import POPULAR_STOCKS
+from services import stock_service
+from services.quote_cache import stock_quotes
+from benchmarks.fakes import RecordedYahoo, patched
+
+
+def _run(yahoo, fast, rounds):
+    """Fetch the watchlist with a cold quote cache several times
+    
+    Returns per-round wall times (ms), per-round upstream calls and quote stats.
+    The first round also learns share counts, later rounds show steady state.
+    """
+    stock_service.quote_stats.clear()
+    stock_service._shares_outstanding.clear()
+    times, calls = [], []
+    with patched(stock_service, 'STOCK_FAST_QUOTE', fast):
+        for _ in range(rounds):
+            stock_quotes.clear()
+            yahoo.calls = 0
+            start = time.perf_counter()
+            for symbol in POPULAR_STOCKS:
+                assert 'error' not in stock_service.get_stock_price(symbol)
+            times.append((time.perf_counter() - start) * 1000)
+            calls.append(yahoo.calls)
+    return times, calls, stock_service.quote_stats.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05, help='Injected chart latency in seconds')
+    parser.add_argument('--rounds', type=int, default=4)
+    args = parser.parse_args()
+
+    yahoo = RecordedYahoo(latency=args.latency)
+    symbols = len(POPULAR_STOCKS)
+    paths = {}
+    with patched(stock_service.yf, 'Ticker', yahoo.Ticker):
+        for label, fast in (('info only', False), ('fast quote', True)):
+            times, calls, stats = _run(yahoo, fast, args.rounds)
+            paths.update(stats['paths'])
+            if fast:
+                assert calls == [2 * symbols] + [symbols] * (args.rounds - 1), calls
+                assert stats['paths']['info']['calls'] == symbols, stats['paths']
+            else:
+                assert calls == [symbols] * args.rounds and list(stats['paths']) == ['info'], (calls, stats['paths'])
+            steady = sum(times[1:]) / max(len(times) - 1, 1)
+            print(f"== {label}: first round {times[0]:.1f} ms ({calls[0]} calls), "
+                  f"steady state {steady:.1f} ms ({calls[-1]} calls) per watchlist")
+            for path, summary in stats['paths'].items():
+                print(f"   path  {path:<6} calls={summary['calls']:<4} "
+                      f"avg={summary['avg_ms']:7.2f} ms  avg_bytes={summary['avg_bytes']}")
+            for field, per_path in stats['fields'].items():
+                cells = '  '.join(f"{path}: {s['calls']} x {s['avg_ms']:.1f} ms / {s['avg_bytes']} B"
+                                  for path, s in per_path.items())
+                print(f"   field {field:<15} {cells}")
+    assert paths['fast']['avg_bytes'] < paths['info']['avg_bytes'], paths
+
+
+if __name__ == '__main__':
+    main()
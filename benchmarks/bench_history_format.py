@@ -0,0 +1,148 @@
+"""Benchmark: JSON vs columnar payloads of /api/history
+
+Loads chart candles from fake upstreams (a stock's max and 10y daily
+series, a crypto pair's 1y daily, 5y daily and 1d hourly series, and a
+30 day series of 1m candles) and encodes each as:
+
+    per-row   the crypto formatter before the columnar format: a Python
+              loop of datetime.fromtimestamp().strftime() per candle
+    json      history_format.json_history, dates converted with NumPy
+    columnar  history_format.columnar_history, delta-encoded typed arrays
+
+reporting the encode time (formatting plus json.dumps, as the routes
+send it) and the payload bytes. The columnar payload is decoded with
+history_format.decode_column and, if node is installed, with the
+decoder in static/js/analyze.js, and both must give back the JSON
+format's values. The routes are then asked for both formats.
+
+Usage:
+    python -m benchmarks.bench_history_format [--rounds 20]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from services import stock_service, crypto_service
+from services.history_format import json_history, columnar_history, decode_column
+from services.history_store import history_store
+from services.price_poller import price_poller
+from services.symbol_index import symbol_index
+from benchmarks.fakes import FakeYahoo, FakeExchange, patched, unlimited_upstreams
+
+ANALYZE_JS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'js', 'analyze.js')
+
+
+def _per_row(candles, tz, period):
+    """The crypto chart formatter before columnar payloads (server-local dates)"""
+    dates = candles['ts'].tolist()
+    if period == '1d':
+        date_strings = [datetime.fromtimestamp(ts / 1000).strftime('%Y-%m-%d %H:%M') for ts in dates]
+    else:
+        date_strings = [datetime.fromtimestamp(ts / 1000).strftime('%Y-%m-%d') for ts in dates]
+    return {
+        'dates': date_strings,
+        'prices': np.round(candles['close'], 2).tolist(),
+        'high': np.round(candles['high'], 2).tolist(),
+        'low': np.round(candles['low'], 2).tolist(),
+        'volume': candles['volume'].astype(np.int64).tolist()
+    }
+
+
+def _encode(formatter, candles, tz, period, rounds):
+    """(compact JSON body, milliseconds per encode)"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        body = json.dumps(formatter(candles, tz, period), separators=(',', ':'))
+    return body, (time.perf_counter() - start) * 1000 / rounds
+
+
+def _node_decode(payload):
+    """The columnar payload decoded by analyze.js's decodeHistory under node"""
+    with open(ANALYZE_JS, encoding='utf-8') as f:
+        source = f.read()
+    decoder = source[source.index('// Typed arrays of the columnar'):source.index('function loadChart')]
+    script = decoder + ('\nconst input = require("fs").readFileSync(0, "utf8");'
+                        '\nprocess.stdout.write(JSON.stringify(decodeHistory(JSON.parse(input))));')
+    result = subprocess.run(['node', '-e', script], input=payload, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def _check(reference, payload, node):
+    """Both decoders give back the JSON format's values"""
+    columnar = json.loads(payload)
+    for column in ('prices', 'high', 'low', 'volume'):
+        assert decode_column(columnar[column]).tolist() == reference[column], column
+    times = decode_column(columnar['times']) * columnar['time_unit']
+    assert len(times) == columnar['count'] == len(reference['dates'])
+    if node:
+        decoded = _node_decode(payload)
+        for column in reference:
+            assert decoded[column] == reference[column], column
+
+
+def _one_minute_candles(days):
+    """Synthetic 1m candles of the last days, for a series longer than any chart period"""
+    rng = np.random.default_rng(11)
+    count = days * 1440
+    ts = (int(time.time() * 1000) // 60000 - count) * 60000 + np.arange(count, dtype=np.int64) * 60000
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 5e-4, count)))
+    return {'ts': ts, 'open': close, 'high': close * 1.001, 'low': close * 0.999, 'close': close,
+            'volume': rng.integers(0, 5000, count).astype(np.float64)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=20, help='encodes timed per series and format')
+    args = parser.parse_args()
+    node = shutil.which('node') is not None
+
+    client = app.test_client()
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, \
+            patched(stock_service.yf, 'Ticker', FakeYahoo(latency=0).Ticker), \
+            patched(crypto_service, 'exchange', FakeExchange(latency=0)), \
+            patched(price_poller, 'start', lambda: None), \
+            patched(history_store, 'root', os.path.join(tmp, 'history')), \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')):
+        series = []
+        for period in ('max', '10y'):
+            candles, tz = stock_service.get_stock_candles('AAPL', period)
+            series.append((f'AAPL {period}', candles, tz, period))
+        for period in ('5y', '1y', '1d'):
+            series.append((f'BTC/USDT {period}', crypto_service.get_crypto_candles('BTC/USDT', period),
+                           crypto_service.CANDLE_TZ, period))
+        series.append(('1m x 30 days', _one_minute_candles(30), 'UTC', '1mo'))
+
+        print(f'{"series":<16}{"candles":>8}  {"per-row":>18}  {"json":>18}  {"columnar":>18}  {"smaller":>7}')
+        for name, candles, tz, period in series:
+            row, row_ms = _encode(_per_row, candles, tz, period, args.rounds)
+            body, json_ms = _encode(json_history, candles, tz, period, args.rounds)
+            packed, packed_ms = _encode(columnar_history, candles, tz, period, args.rounds)
+            _check(json_history(candles, tz, period), packed, node)
+            assert len(packed) < len(body)
+            cells = [f'{len(text) / 1000:8.1f} kB {ms:5.2f} ms'
+                     for text, ms in ((row, row_ms), (body, json_ms), (packed, packed_ms))]
+            print(f'{name:<16}{len(candles["ts"]):>8}  {"  ".join(cells)}  {len(body) / len(packed):6.1f}x')
+        print(f'decoded with decode_column{" and analyze.js under node" if node else " (node not found)"}: '
+              f'identical to the JSON format')
+
+        # The routes, both formats
+        for path in ('/api/history/AAPL?period=max', '/api/history/BTC?period=5y'):
+            plain = client.get(path)
+            packed = client.get(f'{path}&format=columnar')
+            assert plain.status_code == packed.status_code == 200, (plain.get_json(), packed.get_json())
+            assert packed.get_json()['count'] == len(plain.get_json()['dates'])
+            print(f'GET {path}: {len(plain.data) / 1000:.1f} kB as JSON lists, '
+                  f'{len(packed.data) / 1000:.1f} kB with &format=columnar')
+        assert client.get('/api/history/AAPL?period=1y&format=csv').status_code == 400
+        symbol_index.clear()
+
+
+if __name__ == '__main__':
+    main()
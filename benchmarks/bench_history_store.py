@@ -0,0 +1,96 @@
+"""Benchmark: local OHLCV history store vs re-downloading the full window
+
+Serves a 10y daily stock series and a 1y hourly crypto series (8760
+candles) through the history store backed by recorded Yahoo Finance and
+Binance candles, comparing a cold download, a warm read from disk, and
+a warm read with an incremental top-up. Warm reads must not call the
+upstreams, and a top-up must fetch only the missing candles.
+
+Usage:
+    python -m benchmarks.bench_history_store [--latency 0.2] [--rounds 20]
+"""
+import argparse
+import tempfile
+import time
+from services import stock_service, crypto_service
+from services.history_store import history_store
+from benchmarks.fakes import RecordedYahoo, RecordedExchange, patched
+
+HOURS_PER_YEAR = 24 * 365
+
+
+def _timed(fn, rounds=1):
+    """Run fn and return (last result, average milliseconds)"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return result, (time.perf_counter() - start) * 1000 / rounds
+
+
+def _fill_hourly(exchange, symbol):
+    """Download a year of hourly candles page by page into the store"""
+    since = int(time.time() * 1000) - HOURS_PER_YEAR * 3600000
+    first = True
+    while True:
+        ohlcv = exchange.fetch_ohlcv(symbol, '1h', since=since, limit=crypto_service.OHLCV_PAGE_LIMIT)
+        candles = crypto_service._ohlcv_to_candles(ohlcv)
+        if first:
+            history_store.write('binance', symbol, '1h', candles, covered_from=int(candles['ts'][0]))
+            first = False
+        else:
+            history_store.append('binance', symbol, '1h', candles)
+        if len(ohlcv) < crypto_service.OHLCV_PAGE_LIMIT:
+            return
+        since = ohlcv[-1][0] + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.2, help='Injected upstream latency in seconds')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    yahoo = RecordedYahoo(latency=args.latency)
+    exchange = RecordedExchange(latency=args.latency)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            patched(history_store, 'root', tmp), \
+            patched(stock_service.yf, 'Ticker', yahoo.Ticker), \
+            patched(crypto_service, 'exchange', exchange):
+        print("== stock AAPL, period=10y, daily")
+        history, cold_ms = _timed(lambda: stock_service.get_stock_history('AAPL', '10y'))
+        print(f"   cold download      {cold_ms:9.2f} ms  rows={len(history['dates'])}  upstream calls={yahoo.calls}")
+        yahoo.calls = 0
+        warm, warm_ms = _timed(lambda: stock_service.get_stock_history('AAPL', '10y'), args.rounds)
+        print(f"   warm (from disk)   {warm_ms:9.2f} ms")
+        assert yahoo.calls == 0 and warm == history
+        with patched(stock_service, 'HISTORY_REFRESH_SECONDS', 0):
+            yahoo.calls = 0
+            _, topup_ms = _timed(lambda: stock_service.get_stock_history('AAPL', '10y'))
+            print(f"   warm + top-up      {topup_ms:9.2f} ms  upstream calls={yahoo.calls}")
+            assert yahoo.calls == 1
+        yahoo.calls = 0
+        month, slice_ms = _timed(lambda: stock_service.get_stock_history('AAPL', '1mo'), args.rounds)
+        print(f"   1mo sliced locally {slice_ms:9.2f} ms")
+        assert yahoo.calls == 0 and month['dates'] == history['dates'][-len(month['dates']):]
+
+        print(f"== crypto BTC/USDT, 1y hourly ({HOURS_PER_YEAR} candles)")
+        exchange.calls = {}
+        _, cold_ms = _timed(lambda: _fill_hourly(exchange, 'BTC/USDT'))
+        print(f"   cold download      {cold_ms:9.2f} ms  upstream calls={exchange.total_calls}")
+        assert exchange.total_calls == -(-HOURS_PER_YEAR // crypto_service.OHLCV_PAGE_LIMIT)
+        candles, warm_ms = _timed(
+            lambda: history_store.read('binance', 'BTC/USDT', '1h', last=HOURS_PER_YEAR), args.rounds)
+        print(f"   warm (from disk)   {warm_ms:9.2f} ms  rows={len(candles['ts'])}")
+        assert len(candles['ts']) == HOURS_PER_YEAR
+        with patched(crypto_service, 'HISTORY_REFRESH_SECONDS', 0):
+            exchange.calls = {}
+            since = int(time.time() * 1000) - HOURS_PER_YEAR * 3600000
+            candles, topup_ms = _timed(lambda: crypto_service._load_history('BTC/USDT', '1h', since))
+            print(f"   warm + top-up      {topup_ms:9.2f} ms  upstream calls={exchange.total_calls}")
+            # The new candles, and the part of an hour between the window start and the first stored candle
+            assert exchange.total_calls <= 2, exchange.calls
+
+
+if __name__ == '__main__':
+    main()
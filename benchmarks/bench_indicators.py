@@ -0,0 +1,171 @@
+"""Benchmark: vectorized indicators vs naive per-candle loops
+
+Computes every indicator over a synthetic 10k-candle random walk with the
+NumPy implementations in services.indicators and with straightforward
+Python loops, checks that both agree, and reports the time per indicator.
+Both must also agree on the recorded Yahoo Finance and Binance daily
+candles (benchmarks/recorded).
+
+Usage:
+    python -m benchmarks.bench_indicators [--candles 10000] [--rounds 50]
+"""
+import argparse
+import math
+import time
+import numpy as np
+from services import indicators
+from benchmarks.fakes import load_recording
+
+
+def _recorded_candles():
+    """(name, candles) of the recorded daily candles"""
+    yahoo, binance = load_recording('yahoo'), load_recording('binance')
+    ohlcv = np.asarray(binance['ohlcv'], dtype=float)
+    return [
+        (f"{yahoo['symbol']} (Yahoo)", {key: np.asarray(yahoo['history'][key], dtype=float)
+                                        for key in ('high', 'low', 'close')}),
+        (f"{binance['symbol']} (Binance)", {'high': ohlcv[:, 2], 'low': ohlcv[:, 3], 'close': ohlcv[:, 4]})
+    ]
+
+
+def _random_walk(count, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    spread = close * rng.uniform(0.001, 0.02, count)
+    return {'high': close + spread, 'low': close - spread, 'close': close}
+
+
+# Naive references, one candle at a time
+
+def naive_sma(x, window):
+    out = [math.nan] * len(x)
+    for i in range(window - 1, len(x)):
+        out[i] = sum(x[i - window + 1:i + 1]) / window
+    return out
+
+
+def naive_ema(x, alpha):
+    out = [x[0]]
+    for value in x[1:]:
+        out.append((1 - alpha) * out[-1] + alpha * value)
+    return out
+
+
+def naive_rsi(x, period):
+    out = [math.nan] * len(x)
+    gain = loss = None
+    for i in range(1, len(x)):
+        delta = x[i] - x[i - 1]
+        up, down = max(delta, 0.0), max(-delta, 0.0)
+        if gain is None:
+            gain, loss = up, down
+        else:
+            gain = (1 - 1 / period) * gain + up / period
+            loss = (1 - 1 / period) * loss + down / period
+        if i >= period:
+            out[i] = 100.0 if loss == 0 else 100 - 100 / (1 + gain / loss)
+    return out
+
+
+def naive_macd(x):
+    fast, slow = naive_ema(x, 2 / 13), naive_ema(x, 2 / 27)
+    line = [f - s for f, s in zip(fast, slow)]
+    signal = naive_ema(line, 2 / 10)
+    return line, signal, [l - s for l, s in zip(line, signal)]
+
+
+def naive_bollinger(x, window=20, num_std=2.0):
+    upper, middle, lower = [math.nan] * len(x), [math.nan] * len(x), [math.nan] * len(x)
+    for i in range(window - 1, len(x)):
+        chunk = x[i - window + 1:i + 1]
+        mean = sum(chunk) / window
+        std = math.sqrt(sum((v - mean) ** 2 for v in chunk) / window)
+        upper[i], middle[i], lower[i] = mean + num_std * std, mean, mean - num_std * std
+    return upper, middle, lower
+
+
+def naive_atr(high, low, close, period=14):
+    out = [math.nan] * len(close)
+    value = None
+    for i in range(len(close)):
+        tr = high[i] - low[i]
+        if i:
+            tr = max(tr, abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        value = tr if value is None else (1 - 1 / period) * value + tr / period
+        if i >= period - 1:
+            out[i] = value
+    return out
+
+
+def naive_swing_levels(high, low, close, order=5, count=3):
+    highs, lows = set(), set()
+    for i in range(order, len(high) - order):
+        if high[i] == max(high[i - order:i + order + 1]):
+            highs.add(high[i])
+        if low[i] == min(low[i - order:i + order + 1]):
+            lows.add(low[i])
+    last = close[-1]
+    support = sorted((v for v in lows if v < last), reverse=True)[:count]
+    resistance = sorted(v for v in highs if v > last)[:count]
+    return support, resistance
+
+
+def _timed(fn, rounds):
+    """Run fn and return (last result, average milliseconds)"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return result, (time.perf_counter() - start) * 1000 / rounds
+
+
+def _assert_close(name, fast, slow):
+    fast = [np.asarray(v, dtype=float) for v in (fast if isinstance(fast, tuple) else (fast,))]
+    slow = [np.asarray(v, dtype=float) for v in (slow if isinstance(slow, tuple) else (slow,))]
+    for f, s in zip(fast, slow):
+        assert np.allclose(f, s, rtol=1e-9, atol=1e-9, equal_nan=True), f'{name}: vectorized result differs'
+
+
+def _cases(data):
+    """(name, vectorized, loop) of every indicator over candle arrays"""
+    high, low, close = data['high'], data['low'], data['close']
+    h, l, c = high.tolist(), low.tolist(), close.tolist()
+    return [
+        ('SMA(50)', lambda: indicators.sma(close, 50), lambda: naive_sma(c, 50)),
+        ('EMA(26)', lambda: indicators.ema(close, span=26), lambda: naive_ema(c, 2 / 27)),
+        ('RSI(14)', lambda: indicators.rsi(close, 14), lambda: naive_rsi(c, 14)),
+        ('MACD(12,26,9)', lambda: indicators.macd(close), lambda: naive_macd(c)),
+        ('Bollinger(20,2)', lambda: indicators.bollinger(close), lambda: naive_bollinger(c)),
+        ('ATR(14)', lambda: indicators.atr(high, low, close), lambda: naive_atr(h, l, c)),
+        ('Swing levels', lambda: indicators.swing_levels(high, low, close),
+         lambda: naive_swing_levels(h, l, c)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candles', type=int, default=10000, help='series length')
+    parser.add_argument('--rounds', type=int, default=50, help='vectorized runs per indicator')
+    args = parser.parse_args()
+
+    data = _random_walk(args.candles)
+    print(f'{args.candles} candles')
+    print(f'{"indicator":<16} {"vectorized ms":>14} {"loop ms":>10} {"speedup":>9}')
+    for name, fast, slow in _cases(data):
+        fast_result, fast_ms = _timed(fast, args.rounds)
+        slow_result, slow_ms = _timed(slow, 1)
+        _assert_close(name, fast_result, tuple(slow_result) if isinstance(slow_result, tuple) else slow_result)
+        print(f'{name:<16} {fast_ms:>14.3f} {slow_ms:>10.2f} {slow_ms / fast_ms:>8.0f}x')
+
+    _, summary_ms = _timed(lambda: indicators.compute_indicators(data), args.rounds)
+    print(f'compute_indicators (all of the above): {summary_ms:.3f} ms')
+
+    for series, candles in _recorded_candles():
+        for name, fast, slow in _cases(candles):
+            slow_result = slow()
+            _assert_close(f'{series} {name}', fast(),
+                          tuple(slow_result) if isinstance(slow_result, tuple) else slow_result)
+        print(f'recorded {series}, {len(candles["close"])} candles: every indicator matches the loops')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""Benchmark: background analysis jobs vs holding /api/analyze open
+
+Sends --clients analysis requests through the Flask routes with fake
+Yahoo, Binance and Gemini backends, half of them repeating a symbol
+another client asked for:
+
+    sync    POST /api/analyze: each client waits for its analysis
+    jobs    POST /api/jobs: each client gets a job id at once, then polls
+            GET /api/jobs/<id> (one client follows /events instead);
+            identical requests join the same job
+
+Then checks that a job left queued by a previous run resumes, that
+finished results expire and stay within the size bound, and that
+'process' mode runs jobs in worker processes.
+
+Usage:
+    python -m benchmarks.bench_job_queue [--llm-latency 1.5] [--clients 8]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from config import POPULAR_STOCKS
+from services import stock_service, crypto_service, gemini_service
+from services.history_store import history_store
+from services.job_queue import job_queue, JobQueue, _SCHEMA
+from services.analysis_sessions import analysis_sessions
+from services.llm_cache import llm_cache
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.symbol_index import symbol_index
+from benchmarks.fakes import FakeYahoo, FakeExchange, FakeGemini, patched, unlimited_upstreams
+
+
+def _square(n):
+    """Job function for the process mode check; module level so worker processes can import it"""
+    return {'value': n * n, 'pid': os.getpid()}, 200
+
+
+def _reset(tmp):
+    stock_quotes.clear()
+    crypto_quotes.clear()
+    llm_cache.clear()
+    symbol_index.clear()
+    history_store.root = tempfile.mkdtemp(dir=tmp)
+
+
+def _events(response):
+    """(event, data) pairs of a streamed Server-Sent Events response"""
+    for chunk in response.response:
+        text = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        lines = dict(line.split(': ', 1) for line in text.strip().splitlines() if ': ' in line)
+        if 'event' in lines:
+            yield lines['event'], json.loads(lines['data'])
+
+
+def _poll(client, job_id, interval=0.05):
+    while True:
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated market data latency in seconds')
+    parser.add_argument('--llm-latency', type=float, default=1.5, help='simulated Gemini latency per analysis')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients, half repeating a symbol')
+    args = parser.parse_args()
+
+    distinct = list(POPULAR_STOCKS)[:args.clients - args.clients // 2]
+    symbols = [distinct[i % len(distinct)] for i in range(args.clients)]
+    yahoo = FakeYahoo(latency=args.latency)
+    exchange = FakeExchange(latency=args.latency)
+    gemini = FakeGemini(latency=args.llm_latency)
+    client = app.test_client()
+    print(f'{args.clients} clients, {len(distinct)} distinct symbols, '
+          f'Gemini latency {args.llm_latency * 1000:.0f} ms, {job_queue.workers} job workers')
+
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, \
+            patched(stock_service.yf, 'Ticker', yahoo.Ticker), \
+            patched(crypto_service, 'exchange', exchange), \
+            patched(gemini_service, 'genai', gemini), \
+            patched(llm_cache, 'root', os.path.join(tmp, 'llm')), \
+            patched(analysis_sessions, 'path', os.path.join(tmp, 'sessions.sqlite3')), \
+            patched(history_store, 'root', history_store.root), \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')), \
+            patched(job_queue, 'path', os.path.join(tmp, 'jobs.sqlite3')), \
+            patched(os, 'environ', {**os.environ, 'GEMINI_API_KEY': 'bench'}):
+        # Every client holds its request open for the whole analysis
+        _reset(tmp)
+
+        def analyze(symbol):
+            start = time.perf_counter()
+            response = client.post('/api/analyze', json={'symbol': symbol, 'language': 'en'})
+            return response.status_code, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            responses = list(pool.map(analyze, symbols))
+        sync = time.perf_counter() - start
+        assert all(status == 200 for status, _ in responses)
+        held = max(elapsed for _, elapsed in responses)
+        print(f'sync    {sync:6.2f}s  requests held open up to {held * 1000:6.0f} ms')
+
+        # Every client gets a job id at once
+        _reset(tmp)
+        gemini.calls = 0
+
+        def submit(symbol):
+            start = time.perf_counter()
+            response = client.post('/api/jobs', json={'symbol': symbol, 'language': 'en'})
+            assert response.status_code == 202, response.get_json()
+            return response.get_json(), time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            submitted = list(pool.map(submit, symbols))
+        slowest_submit = max(elapsed for _, elapsed in submitted)
+        job_ids = [job['job_id'] for job, _ in submitted]
+        joined = sum(job['deduplicated'] for job, _ in submitted)
+        assert len(set(job_ids)) == len(distinct) and joined == args.clients - len(distinct)
+
+        # One client follows the job's event stream, the others poll
+        response = client.get(submitted[0][0]['events_url'], buffered=False)
+        events = list(_events(response))
+        assert events[-1][0] == 'done' and events[-1][1]['status'] == 'done'
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            jobs = list(pool.map(lambda job_id: _poll(client, job_id), job_ids))
+        total = time.perf_counter() - start
+        assert all(job['status'] == 'done' and job['result']['analysis'] for job in jobs)
+        assert gemini.calls == len(distinct)
+        print(f'jobs    {total:6.2f}s  submit answered within {slowest_submit * 1000:6.1f} ms, '
+              f'{joined} joined an identical job, {gemini.calls} Gemini calls, '
+              f'events: {" > ".join(event if event != "status" else data["status"] for event, data in events)}')
+        assert slowest_submit < held
+
+        # A job queued by a previous run resumes when the store is opened
+        path = os.path.join(tmp, 'previous.sqlite3')
+        db = sqlite3.connect(path)
+        for statement in _SCHEMA:
+            db.execute(statement)
+        params = {'symbol': distinct[0], 'analysis_type': 'daily', 'language': 'en',
+                  'model_name': 'bench', 'include_news': False}
+        db.execute("INSERT INTO jobs (id, kind, key, params, status, created) VALUES ('left', 'analyze', '', ?, "
+                   "'running', ?)", (json.dumps(params), time.time()))
+        db.commit()
+        db.close()
+        with patched(job_queue, 'path', path):
+            resumed = _poll(client, 'left')
+        assert resumed['status'] == 'done', resumed
+        print(f'resume  job left running by a previous run: {resumed["status"]}')
+
+        # Results are bounded in number and time
+        with patched(job_queue, 'max_results', 2):
+            for symbol in distinct[:3]:
+                _poll(client, submit(symbol)[0]['job_id'])
+        kept = sum(client.get(f'/api/jobs/{job_id}').status_code == 200 for job_id in job_ids)
+        with patched(job_queue, 'ttl', 0):
+            expired = client.get(f'/api/jobs/{job_ids[0]}').status_code
+        assert kept <= 2 and expired == 404
+        print(f'bound   {kept} of the first {len(job_ids)} results kept with max_results 2, expired result: {expired}')
+
+    # Worker processes
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(path=os.path.join(tmp, 'jobs.sqlite3'), workers=2, mode='process')
+        queue.register('square', _square)
+        start = time.perf_counter()
+        job_ids = [queue.submit('square', {'n': n})[0] for n in range(4)]
+        results = []
+        for job_id in job_ids:
+            job = queue.get(job_id)
+            while job['status'] not in ('done', 'failed'):
+                job = queue.wait(job_id, timeout=1)
+            results.append(job['result'])
+        assert [r['value'] for r in results] == [0, 1, 4, 9] and os.getpid() not in {r['pid'] for r in results}
+        print(f'process {time.perf_counter() - start:6.2f}s  4 jobs in {len({r["pid"] for r in results})} '
+              f'worker processes (includes spawning them)')
+        queue._process_pool().shutdown()
+    llm_cache.clear()
+    symbol_index.clear()
+    stock_quotes.clear()
+    crypto_quotes.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Benchmark: Gemini response cache on repeated analysis requests
+
+Replays a burst of /api/analyze-style requests (a few symbols, analysis
+types and languages, with prices drifting by a couple of basis points) against
+a fake Gemini model, with and without the on-disk response cache, and
+checks the cache rules: price tolerance, per-type freshness, persistence
+across restarts, the size bound and coalescing of concurrent requests.
+
+Usage:
+    python -m benchmarks.bench_llm_cache [--latency 0.5] [--requests 60]
+"""
+import argparse
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services import gemini_service
+from services.llm_cache import llm_cache, LLMCache
+from benchmarks.fakes import FakeGemini, patched
+
+SYMBOLS = {'AAPL': 187.43, 'THYAO.IS': 291.5, 'BTC': 67250.0}
+TYPES = ['daily', 'short_term']
+LANGUAGES = ['tr', 'en']
+MODEL = 'gemini-2.5-flash'
+
+
+def _price_data(price):
+    return {'price': round(price, 2), 'change': round(price * 0.012, 2),
+            'change_percent': 1.2, 'volume': 51234567}
+
+
+def _requests(count, drift, seed=3):
+    """Random (symbol, type, language, price) tuples with prices drifting by up to drift"""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(count):
+        symbol = rng.choice(list(SYMBOLS))
+        price = SYMBOLS[symbol] * (1 + rng.uniform(-drift, drift))
+        out.append((symbol, rng.choice(TYPES), rng.choice(LANGUAGES), price))
+    return out
+
+
+def _run(requests, use_cache):
+    cached = 0
+    start = time.perf_counter()
+    for symbol, analysis_type, language, price in requests:
+        if not use_cache:
+            llm_cache.clear()
+        result = gemini_service.analyze_stock(symbol, _price_data(price), analysis_type, MODEL, language)
+        cached += result['cached']
+    return time.perf_counter() - start, cached
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.5, help='simulated Gemini latency in seconds')
+    parser.add_argument('--requests', type=int, default=60, help='requests in the burst')
+    args = parser.parse_args()
+
+    fake = FakeGemini(latency=args.latency)
+    with tempfile.TemporaryDirectory() as root, \
+            patched(gemini_service, 'genai', fake), patched(llm_cache, 'root', root):
+        burst = _requests(args.requests, drift=0.0002)
+
+        llm_cache.clear()
+        fake.calls = 0
+        uncached_s, _ = _run(burst, use_cache=False)
+        uncached_calls = fake.calls
+
+        llm_cache.clear()
+        fake.calls = 0
+        cached_s, served = _run(burst, use_cache=True)
+        distinct = len({(s, t, l) for s, t, l, _ in burst})
+        print(f'{args.requests} requests, {distinct} distinct (symbol, type, language), prices within ±0.02%')
+        print(f'   no cache   {uncached_s:7.2f}s  gemini calls={uncached_calls}')
+        print(f'   cache      {cached_s:7.2f}s  gemini calls={fake.calls}  served from cache={served}')
+        print(f'   stats      {llm_cache.stats()}')
+        # Prices are snapped to a grid, so a drifting price can straddle one grid line
+        assert distinct <= fake.calls <= 2 * distinct, 'each distinct request should reach Gemini once or twice'
+
+        # A price move beyond the tolerance is a different prompt
+        base = _price_data(SYMBOLS['AAPL'])
+        moved = _price_data(SYMBOLS['AAPL'] * 1.02)
+        assert gemini_service.analyze_stock('AAPL', base, 'daily', MODEL, 'en')['cached']
+        assert not gemini_service.analyze_stock('AAPL', moved, 'daily', MODEL, 'en')['cached']
+        print('   a 2% price move misses the cache')
+
+        # Other numbers snap on their own grid: a different RSI or a falling market is a different prompt
+        prompt = 'Price {} Change {}% RSI {}'
+        cached = lambda *values: llm_cache.get_or_generate(
+            MODEL, prompt.format(*values), lambda: 'report', ttl=60, price=values[0])[1]
+        cached(67000, 2.1, 55.3)
+        assert cached(67010, 2.1, 55.3), 'a $10 move on 67000 is within the tolerance'
+        assert not cached(67010, 2.1, 71.0), 'a different RSI must miss'
+        assert not cached(67010, -2.1, 55.3), 'a change of the opposite sign must miss'
+        assert not cached(67010, -3.4, 71.0)
+        print('   a changed RSI or sign of the change misses the cache, a $10 move on 67000 does not')
+        symbol = lambda name: llm_cache.fingerprint(MODEL, f'{name} Price 187.43', price=187.43)
+        assert len({symbol(f'S{i:04d}') for i in range(400)} | {symbol('1INCH'), symbol('2INCH')}) == 402
+        print('   digits inside a symbol are kept exactly: S0300 and S0301 are different prompts')
+
+        # The tolerance is relative at every order of magnitude of the price
+        key = lambda value: llm_cache.fingerprint(MODEL, f'Price {value:.2f}', price=value)
+        for level in (10001, 99999):
+            assert key(level) == key(level * 1.0005) or key(level * 1.0005) == key(level * 1.001)
+            assert key(level) != key(level * 1.02)
+        print('   the price grid steps by 0.5% of the price at 10001 and at 99999')
+
+        # Entries survive a restart
+        restarted = LLMCache(root=root)
+        with patched(gemini_service, 'llm_cache', restarted):
+            assert gemini_service.analyze_stock('AAPL', base, 'daily', MODEL, 'en')['cached']
+        print(f'   a fresh process serves {restarted.stats()["entries"]} entries from disk')
+
+        # Daily entries expire before long-term ones
+        now = [time.time()]
+        clocked = LLMCache(root=root, clock=lambda: now[0])
+        with patched(gemini_service, 'llm_cache', clocked):
+            for analysis_type in ('daily', 'long_term'):
+                gemini_service.analyze_stock('AAPL', base, analysis_type, MODEL, 'en')
+            now[0] += 600
+            daily = gemini_service.analyze_stock('AAPL', base, 'daily', MODEL, 'en')['cached']
+            long_term = gemini_service.analyze_stock('AAPL', base, 'long_term', MODEL, 'en')['cached']
+        assert not daily and long_term
+        print('   after 10 minutes: daily expired, long_term still cached')
+
+    # Size bound: keep writing distinct prompts into a small cache
+    with tempfile.TemporaryDirectory() as root:
+        small = LLMCache(root=root, max_bytes=16 * 1024)
+        for i in range(100):
+            small.get_or_generate(MODEL, f'prompt {i * 1000}', lambda: 'x' * 1000, ttl=60)
+        stats = small.stats()
+        assert stats['bytes'] <= small.max_bytes
+        print(f'   100 writes into a 16 KiB cache: {stats["entries"]} entries, {stats["bytes"]} bytes')
+
+    # Concurrent identical requests share one generation
+    fake = FakeGemini(latency=args.latency)
+    with tempfile.TemporaryDirectory() as root, \
+            patched(gemini_service, 'genai', fake), patched(llm_cache, 'root', root):
+        llm_cache.clear()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(
+                lambda _: gemini_service.analyze_stock('AAPL', base, 'weekly', MODEL, 'en'), range(8)))
+        assert fake.calls == 1 and len({r['analysis'] for r in results}) == 1
+        print(f'   8 concurrent identical requests: {fake.calls} gemini call')
+        llm_cache.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Benchmark: cost of the /metrics instrumentation on the hot path
+
+Times --observations histogram observations and counter increments, then
+a cached /api/price request through the Flask routes with and without
+the request timing hooks, to show what the instrumentation adds per
+request. Then drives quotes, an unknown symbol, a crypto quote, an
+analysis and a refused upstream call through fake Yahoo, Binance and
+Gemini backends, and checks /metrics reports each of them.
+
+Usage:
+    python -m benchmarks.bench_metrics [--observations 200000] [--requests 2000]
+"""
+import argparse
+import asyncio
+import os
+import re
+import tempfile
+import time
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+import asgi
+from routes import metrics as metrics_routes
+from services import stock_service, crypto_service, gemini_service
+from services.analysis_sessions import analysis_sessions
+from services.history_store import history_store
+from services.llm_cache import llm_cache
+from services.metrics import Histogram, Counter
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.resilience import yahoo
+from services.symbol_index import symbol_index
+from benchmarks.fakes import FakeYahoo, FakeExchange, FakeGemini, patched, unlimited_upstreams
+
+
+class _Untimed:
+    def observe(self, *args):
+        pass
+
+
+def _sample(text, name, **labels):
+    """Sum of the series of a metric that have the given labels"""
+    total = 0.0
+    for line in text.splitlines():
+        series, _, value = line.rpartition(' ')
+        if series.split('{', 1)[0] == name and all(f'{key}="{v}"' in series for key, v in labels.items()):
+            total += float(value)
+    return total
+
+
+def _request_time(client, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        assert client.get('/api/price/AAPL').status_code == 200
+    return (time.perf_counter() - start) / requests
+
+
+async def _asgi_request(method, path, body=b''):
+    """Status of one request sent straight to the ASGI app"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi.app({'type': 'http', 'method': method, 'path': path, 'query_string': b''}, receive, send)
+    return messages[0]['status']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--observations', type=int, default=200000, help='observations timed per metric type')
+    parser.add_argument('--requests', type=int, default=2000, help='cached quote requests timed per run')
+    args = parser.parse_args()
+
+    histogram = Histogram('bench_seconds', 'Benchmark', ('route',))
+    start = time.perf_counter()
+    for i in range(args.observations):
+        histogram.observe((i % 1000) / 1000, '/api/price/<symbol>')
+    observe = (time.perf_counter() - start) / args.observations
+    counter = Counter('bench_total', 'Benchmark', ('kind', 'result'))
+    start = time.perf_counter()
+    for _ in range(args.observations):
+        counter.inc('quote', 'found')
+    increment = (time.perf_counter() - start) / args.observations
+    assert histogram.count('/api/price/<symbol>') == args.observations
+    assert counter.value('quote', 'found') == args.observations
+    print(f'observe   {observe * 1e6:6.2f} us per histogram observation, '
+          f'{increment * 1e6:6.2f} us per counter increment')
+
+    client = app.test_client()
+    gemini = FakeGemini(latency=0)
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, \
+            patched(stock_service.yf, 'Ticker', FakeYahoo(latency=0).Ticker), \
+            patched(crypto_service, 'exchange', FakeExchange(latency=0)), \
+            patched(gemini_service, 'genai', gemini), \
+            patched(llm_cache, 'root', os.path.join(tmp, 'llm')), \
+            patched(history_store, 'root', os.path.join(tmp, 'history')), \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')), \
+            patched(analysis_sessions, 'path', os.path.join(tmp, 'sessions.sqlite3')), \
+            patched(os, 'environ', {**os.environ, 'GEMINI_API_KEY': 'bench'}):
+        # A cached quote is the cheapest route, so the hooks weigh most on it
+        client.get('/api/price/AAPL')
+        _request_time(client, args.requests // 10)
+        with patched(metrics_routes, 'http_request_seconds', _Untimed()):
+            untimed = _request_time(client, args.requests)
+        timed = _request_time(client, args.requests)
+        print(f'request   {untimed * 1e6:7.1f} us untimed, {timed * 1e6:7.1f} us timed '
+              f'({(timed - untimed) * 1e6:+.1f} us per cached /api/price request)')
+
+        assert client.get('/api/price/NOSUCHSYMBOL').status_code == 404
+        assert client.get('/api/price/BTC').status_code == 200
+        assert client.post('/api/analyze', json={'symbol': 'MSFT', 'language': 'en'}).status_code == 200
+        assert asyncio.run(_asgi_request('POST', '/api/analyze', b'not json')) == 400
+        for _ in range(yahoo.breaker.failure_threshold):
+            yahoo.breaker.record_failure()
+        try:
+            assert client.get('/api/price/NVDA').status_code != 200  # Refused before reaching Yahoo
+        finally:
+            yahoo.breaker.reset()
+
+        response = client.get('/metrics')
+        assert response.status_code == 200 and response.mimetype == 'text/plain'
+        text = response.get_data(as_text=True)
+        checks = {
+            'route latency': _sample(text, 'http_request_duration_seconds_count',
+                                     route='/api/price/<symbol>', status='200'),
+            'async route': _sample(text, 'http_request_duration_seconds_count', route='/api/analyze', status='400'),
+            'yahoo calls': _sample(text, 'upstream_request_duration_seconds_count', upstream='yahoo', outcome='ok'),
+            'binance ticker': _sample(text, 'upstream_request_duration_seconds_count',
+                                      upstream='binance', operation='fetch_ticker', outcome='ok'),
+            'gemini generate': _sample(text, 'upstream_request_duration_seconds_count',
+                                       upstream='gemini', operation='generate_content', outcome='ok'),
+            'quote path': _sample(text, 'stock_quote_path_duration_seconds_count', path='fast'),
+            'missing variant': _sample(text, 'symbol_variant_probes_total', kind='quote', result='missing'),
+            'gemini tokens': _sample(text, 'gemini_tokens_total', kind='output'),
+            'cache hit ratio': _sample(text, 'cache_hit_ratio', cache='stock_quotes'),
+            'circuit refused': _sample(text, 'upstream_refused_total', upstream='yahoo', reason='rejected'),
+            'circuit closed': _sample(text, 'upstream_circuit_state', upstream='yahoo', state='closed')
+        }
+        for name, value in checks.items():
+            assert value, f'{name} missing from /metrics'
+            print(f'{name:<16} {value:g}')
+        families = len(re.findall(r'^# TYPE ', text, re.MULTILINE))
+        print(f'/metrics  {families} metric families, {len(text.encode("utf-8"))} bytes')
+
+        analysis_sessions.clear()
+        llm_cache.clear()
+        symbol_index.clear()
+    stock_quotes.clear()
+    crypto_quotes.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Benchmark: paged, concurrent OHLCV backfill of long crypto ranges
+
+Runs against a FakeExchange serving synthetic candles from a listing
+date 8 years back, at most --page-limit candles per request, with
+--latency per request:
+
+    sequential  a year of hourly candles fetched page after page
+    parallel    the same range through ohlcv_backfill (OHLCV_BACKFILL_WORKERS
+                pages at once, under the Binance rate limiter)
+    1m          30 days of minute candles (tens of pages)
+
+Then checks the chart periods that a single fetch_ohlcv call could not
+serve: 'max' reaches back to the listing, 'ytd' starts on January 1st
+and 5y is served as daily candles. A backfill whose oldest pages fail is
+stored up to the failure and resumed from there, one whose middle page
+times out serves the newer pages, and the tracker's
+progress report is sampled while a backfill runs.
+
+Usage:
+    python -m benchmarks.bench_ohlcv_backfill [--latency 0.05] [--page-limit 1000]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+import ccxt
+import numpy as np
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from config import OHLCV_BACKFILL_WORKERS
+from services import crypto_service
+from services.history_store import history_store
+from services.ohlcv_backfill import backfill, backfills, BackfillTracker
+from services.resilience import binance, UpstreamError
+from benchmarks.fakes import FakeExchange, patched
+
+HOUR_MS = 3600000
+DAY_MS = 86400000
+
+
+def _sequential(exchange, symbol, timeframe, since, page_limit):
+    """Page through a range one request at a time"""
+    rows = []
+    while True:
+        page = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=page_limit)
+        rows += page
+        if len(page) < page_limit:
+            return rows
+        since = page[-1][0] + 1
+
+
+def _check_contiguous(candles, step):
+    steps = np.diff(candles['ts'])
+    assert len(candles['ts']) and (steps == step).all(), 'gaps or duplicates in the merged candles'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.05, help='injected latency per request in seconds')
+    parser.add_argument('--page-limit', type=int, default=1000, help='most candles per request')
+    args = parser.parse_args()
+
+    exchange = FakeExchange(latency=args.latency)
+    exchange.ohlcv_page_limit = args.page_limit
+    now = int(time.time() * 1000)
+    year_ago = now - 365 * DAY_MS
+    print(f'{args.latency * 1000:.0f} ms per request, {args.page_limit} candles per page, '
+          f'{OHLCV_BACKFILL_WORKERS} pages at once')
+
+    start = time.perf_counter()
+    rows = _sequential(exchange, 'BTC/USDT', '1h', year_ago, args.page_limit)
+    sequential = time.perf_counter() - start
+    print(f'sequential {sequential * 1000:7.0f} ms  {len(rows)} hourly candles')
+
+    fetch = lambda timeframe: lambda since, limit: binance.call(
+        exchange.fetch_ohlcv, 'BTC/USDT', timeframe, since=since, limit=limit)
+    tracker = BackfillTracker()
+    start = time.perf_counter()
+    result = backfill(fetch('1h'), year_ago, now + 1, HOUR_MS, args.page_limit, tracker=tracker)
+    parallel = time.perf_counter() - start
+    assert result.error is None and result.covered_from == year_ago
+    _check_contiguous(result.candles, HOUR_MS)
+    assert np.array_equal(result.candles['ts'], np.asarray([row[0] for row in rows], dtype=np.int64))
+    print(f'parallel   {parallel * 1000:7.0f} ms  {len(result.candles["ts"])} hourly candles, '
+          f'{tracker.pages} pages, identical to the sequential download')
+
+    start = time.perf_counter()
+    result = backfill(fetch('1m'), now - 30 * DAY_MS, now + 1, 60000, args.page_limit, tracker=tracker)
+    minutes = time.perf_counter() - start
+    _check_contiguous(result.candles, 60000)
+    print(f'1m         {minutes * 1000:7.0f} ms  {len(result.candles["ts"])} minute candles over 30 days')
+
+    client = app.test_client()
+    with tempfile.TemporaryDirectory() as tmp, \
+            patched(history_store, 'root', tmp), \
+            patched(crypto_service, 'exchange', exchange):
+        listed = exchange.listed_at // (7 * DAY_MS) * 7 * DAY_MS
+        weekly = crypto_service.get_crypto_candles('BTC/USDT', 'max')
+        _check_contiguous(weekly, 7 * DAY_MS)
+        assert weekly['ts'][0] == listed and history_store.meta('binance', 'BTC/USDT', '1w')['complete']
+        daily = crypto_service._load_history('BTC/USDT', '1d', None)
+        _check_contiguous(daily, DAY_MS)
+        print(f'max        {len(weekly["ts"])} weekly and {len(daily["ts"])} daily candles back to the listing '
+              f'({datetime.fromtimestamp(weekly["ts"][0] / 1000, tz=timezone.utc):%Y-%m-%d})')
+
+        ytd = crypto_service.get_crypto_history('BTC/USDT', 'ytd')
+        jan1 = datetime(datetime.now(timezone.utc).year, 1, 1, tzinfo=timezone.utc)
+        assert ytd['dates'][0] == datetime.fromtimestamp(jan1.timestamp()).strftime('%Y-%m-%d'), ytd['dates'][0]
+        five_years = crypto_service.get_crypto_history('BTC/USDT', '5y')
+        assert len(five_years['dates']) >= 1826
+        print(f'ytd        {len(ytd["dates"])} daily candles from {ytd["dates"][0]}; '
+              f'5y {len(five_years["dates"])} daily candles')
+
+        # The oldest page fails: the newer page is stored and served, the next request resumes from it
+        fetch_ohlcv = exchange.fetch_ohlcv
+        cutoff = now - 3 * 365 * DAY_MS
+
+        def failing(symbol, timeframe='1d', since=None, limit=None, params=None):
+            if since is not None and since < cutoff:
+                raise UpstreamError('binance', 'HTTP 503')
+            return fetch_ohlcv(symbol, timeframe, since=since, limit=limit, params=params)
+
+        with patched(exchange, 'fetch_ohlcv', failing):
+            partial = crypto_service.get_crypto_history('ETH/USDT', '5y')
+        meta = history_store.meta('binance', 'ETH/USDT', '1d')
+        assert 'error' not in partial and cutoff <= meta['covered_from'] and not meta['complete']
+        exchange.calls.clear()
+        history = crypto_service.get_crypto_history('ETH/USDT', '5y')
+        assert len(history['dates']) >= 1826 and exchange.calls.get('fetch_ohlcv', 0) == 1
+        print(f'resume     a failed oldest page left {len(partial["dates"])} daily candles from '
+              f'{partial["dates"][0]}; the retry fetched {exchange.calls["fetch_ohlcv"]} page for all '
+              f'{len(history["dates"])}')
+
+        # A middle page times out (binance.call passes ccxt errors on unwrapped): the newer page is served
+        page_ms = args.page_limit * HOUR_MS
+        start_ms = now - 3 * page_ms
+        timeout_from, timeout_to = start_ms + page_ms // 2, start_ms + 3 * page_ms // 2
+
+        def timing_out(symbol, timeframe='1d', since=None, limit=None, params=None):
+            if since is not None and timeout_from <= since < timeout_to:
+                raise ccxt.RequestTimeout('binance GET /api/v3/klines timed out')
+            return fetch_ohlcv(symbol, timeframe, since=since, limit=limit, params=params)
+
+        with patched(exchange, 'fetch_ohlcv', timing_out):
+            served = crypto_service._load_history('ADA/USDT', '1h', start_ms)
+        meta = history_store.meta('binance', 'ADA/USDT', '1h')
+        _check_contiguous(served, HOUR_MS)
+        assert len(served['ts']) and meta['covered_from'] >= timeout_to and not meta['complete']
+        print(f'timeout    a timed out middle page left {len(served["ts"])} hourly candles of '
+              f'{3 * args.page_limit} served')
+
+        # Progress of a backfill in flight, sampled from another thread
+        samples = []
+        done = threading.Event()
+
+        def sample():
+            while not done.is_set():
+                samples.extend(backfills.stats()['active'])
+                time.sleep(args.latency / 2)
+
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        crypto_service._load_history('SOL/USDT', '1h', now - 2 * 365 * DAY_MS)
+        done.set()
+        sampler.join()
+        progress = sorted({(s['pages_done'], s['pages_total']) for s in samples if s['key'].startswith('binance/SOL')})
+        assert progress and progress[-1][0] <= progress[-1][1]
+        stats = client.get('/api/prices/backfill-stats').get_json()
+        assert stats['completed'] >= 4 and not stats['active']
+        print(f'progress   {", ".join(f"{d}/{t}" for d, t in progress)} pages; /api/prices/backfill-stats: '
+              f'{stats["completed"]} completed, {stats["failed"]} failed, {stats["pages"]} pages')
+
+
+if __name__ == '__main__':
+    main()
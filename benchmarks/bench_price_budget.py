@@ -0,0 +1,117 @@
+"""Benchmark: dashboard tab latency with slow upstream symbols
+
+Requests the popular stocks and crypto tabs through the Flask routes
+while a fake Yahoo backend answers --slow-symbols after --slow seconds
+and the rest after --latency. Compares:
+
+    blocking  get_watchlist_prices without a budget: the tab waits for its
+              slowest symbol
+    cold      first request with the response budget: fast symbols fresh,
+              slow ones 'pending' (never fetched before)
+    warm      every quote expired, the slow ones not refreshed in time:
+              served stale with their age, none dropped
+    crypto    first request, then the bulk ticker call slower than the budget
+              ('slow bulk'): every pair stale
+
+Usage:
+    python -m benchmarks.bench_price_budget [--latency 0.05] [--slow 1.0]
+"""
+import argparse
+import os
+import tempfile
+import time
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from config import POPULAR_STOCKS, POPULAR_CRYPTO, PRICE_RESPONSE_BUDGET
+from services import crypto_service, stock_service
+from services.price_poller import price_poller
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.symbol_index import symbol_index
+from services.watchlist_service import get_watchlist_prices
+from benchmarks.fakes import FakeExchange, FakeYahoo, patched, unlimited_upstreams
+
+
+def _request(client, path):
+    start = time.perf_counter()
+    response = client.get(path)
+    assert response.status_code == 200
+    return time.perf_counter() - start, response.get_json()
+
+
+def _report(label, elapsed, cards):
+    states = {'fresh': 0, 'stale': 0, 'pending': 0}
+    for card in cards.values():
+        states['pending' if card.get('pending') else 'stale' if card.get('stale') else 'fresh'] += 1
+    ages = [card['age'] for card in cards.values() if card.get('stale')]
+    age = f'  age {min(ages)}-{max(ages)}s' if ages else ''
+    print(f'{label:<9} {elapsed * 1000:7.1f} ms  {len(cards):2d} cards  '
+          f'fresh {states["fresh"]:2d}  stale {states["stale"]:2d}  pending {states["pending"]:2d}{age}')
+    return states
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.05, help='latency of the fast symbols in seconds')
+    parser.add_argument('--slow', type=float, default=1.0, help='latency of the slow symbols in seconds')
+    parser.add_argument('--slow-symbols', default='NVDA,AMD', help='comma-separated slow stock symbols')
+    args = parser.parse_args()
+
+    slow = args.slow_symbols.split(',')
+    budget = PRICE_RESPONSE_BUDGET
+    margin = 0.1  # Flask and JSON overhead on top of the budget
+    print(f'budget {budget * 1000:.0f} ms, upstream latency {args.latency * 1000:.0f} ms, '
+          f'{len(slow)} symbols at {args.slow * 1000:.0f} ms')
+
+    yahoo = FakeYahoo(latency=args.latency, slow={symbol: args.slow for symbol in slow})
+    exchange = FakeExchange(latency=args.latency)
+    client = app.test_client()
+    stock_quotes.clear()
+    crypto_quotes.clear()
+
+    # The poller would refresh the cache behind the requests being measured
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')), \
+            patched(price_poller, 'start', lambda: None), \
+            patched(stock_service.yf, 'Ticker', yahoo.Ticker), \
+            patched(crypto_service, 'exchange', exchange):
+        start = time.perf_counter()
+        cards = get_watchlist_prices('popular')
+        blocking = time.perf_counter() - start
+        _report('blocking', blocking, cards)
+        assert blocking >= args.slow and len(cards) == len(POPULAR_STOCKS)
+        stock_quotes.clear()
+
+        elapsed, cards = _request(client, '/api/prices/popular')
+        states = _report('cold', elapsed, cards)
+        assert elapsed < budget + margin and len(cards) == len(POPULAR_STOCKS)
+        assert states['pending'] == len(slow) and all(cards[symbol].get('pending') for symbol in slow)
+
+        time.sleep(args.slow)  # The refresh started by the cold request completes
+        elapsed, cards = _request(client, '/api/prices/popular')
+        states = _report('refreshed', elapsed, cards)
+        assert states['fresh'] == len(POPULAR_STOCKS)
+
+        time.sleep(args.slow / 2)  # Let the stored quotes age
+        with patched(stock_quotes, 'ttl', 0):
+            elapsed, cards = _request(client, '/api/prices/popular')
+            states = _report('warm', elapsed, cards)
+            time.sleep(args.slow)
+        assert elapsed < budget + margin and len(cards) == len(POPULAR_STOCKS)
+        assert states['stale'] == len(slow) and all(cards[symbol]['price'] for symbol in slow)
+
+        elapsed, cards = _request(client, '/api/prices/crypto')
+        _report('crypto', elapsed, cards)
+        exchange.latency = args.slow
+        with patched(crypto_quotes, 'ttl', 0):
+            elapsed, cards = _request(client, '/api/prices/crypto')
+            states = _report('slow bulk', elapsed, cards)
+            time.sleep(args.slow)
+        assert elapsed < budget + margin and states['stale'] == len(POPULAR_CRYPTO)
+
+        symbol_index.clear()
+    stock_quotes.clear()
+    crypto_quotes.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Load test: background price poller fanning out to many stream subscribers
+
+Hundreds of simulated subscribers consume pushed updates while a fake data
+source counts upstream fetches. Upstream cost should depend only on the
+number of refresh cycles, never on the number of subscribers, and every
+subscriber must receive every cycle's changed quotes and nothing else;
+stale quotes whose age grows between cycles are not republished.
+
+Usage:
+    python -m benchmarks.bench_price_stream [--subscribers 500] [--cycles 20]
+"""
+import argparse
+import threading
+import time
+from services.price_poller import PricePoller
+from services.watchlist_service import WATCHLISTS
+
+
+class FakeWatchlistSource:
+    """Fake data source where one quote per watchlist changes every cycle"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.cycle = {name: 0 for name in WATCHLISTS}
+        self._lock = threading.Lock()
+
+    def __call__(self, watchlist):
+        with self._lock:
+            self.calls += 1
+            self.cycle[watchlist] += 1
+            cycle = self.cycle[watchlist]
+        if self.latency:
+            time.sleep(self.latency)
+        symbols = list(WATCHLISTS[watchlist])
+        moving = symbols[cycle % len(symbols)]
+        return {
+            symbol: {'name': name, 'symbol': symbol,
+                     'price': 100.0 + (cycle if symbol == moving else 0),
+                     'change': 0.0, 'change_percent': 0.0, 'volume': 0}
+            for symbol, name in WATCHLISTS[watchlist].items()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.01, help='Injected upstream latency in seconds')
+    args = parser.parse_args()
+
+    source = FakeWatchlistSource(latency=args.latency)
+    # Refresh cycles are driven by hand below instead of by the poller thread
+    poller = PricePoller(interval=3600, fetch=source)
+    poller.refresh()
+    source.calls = 0
+
+    subscriptions = [poller.subscribe() for _ in range(args.subscribers)]
+    received = [0] * args.subscribers
+    quotes = [0] * args.subscribers
+    lags = []
+    lags_lock = threading.Lock()
+    published_at = [0.0]
+    stop = threading.Event()
+
+    def subscriber(index):
+        subscription = subscriptions[index]
+        while not stop.is_set():
+            message = subscription.get(timeout=0.05)
+            if message is None:
+                continue
+            _, data = message
+            lag = time.perf_counter() - published_at[0]
+            received[index] += 1
+            quotes[index] += sum(len(changes) for changes in data.values())
+            with lags_lock:
+                lags.append(lag)
+
+    threads = [threading.Thread(target=subscriber, args=(i,), daemon=True) for i in range(args.subscribers)]
+    for t in threads:
+        t.start()
+
+    start = time.perf_counter()
+    for _ in range(args.cycles):
+        published_at[0] = time.perf_counter()
+        poller.refresh()
+        # Let subscribers drain before the next cycle
+        deadline = time.perf_counter() + 5
+        while min(received) < poller.refreshes - 1 and time.perf_counter() < deadline:
+            time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in threads:
+        t.join()
+
+    expected_calls = args.cycles * len(WATCHLISTS)
+    assert source.calls == expected_calls, f'expected {expected_calls} upstream calls, got {source.calls}'
+    assert all(r == args.cycles for r in received), 'some subscribers missed updates'
+    # Each cycle one quote per watchlist moves and the one moved before returns to its old price
+    expected_quotes = 2 * len(WATCHLISTS) * args.cycles
+    assert all(q == expected_quotes for q in quotes), f'expected {expected_quotes} changed quotes per subscriber'
+
+    lags.sort()
+    p50 = lags[len(lags) // 2] * 1000
+    p99 = lags[int(len(lags) * 0.99) - 1] * 1000
+    print(f"subscribers={args.subscribers} cycles={args.cycles} elapsed={elapsed:.2f} s")
+    print(f"upstream calls={source.calls} ({len(WATCHLISTS)} per cycle, independent of subscribers)")
+    print(f"events delivered={sum(received)} quotes per event={quotes[0] / max(received[0], 1):.1f}")
+    print(f"delivery lag p50={p50:.2f} ms p99={p99:.2f} ms")
+
+    # A watchlist served from stale fallbacks during an outage: only the age changes
+    ages = iter(range(1, 1000))
+    stale = PricePoller(interval=3600, fetch=lambda watchlist: {
+        symbol: {'name': name, 'symbol': symbol, 'price': 100.0, 'stale': True, 'age': next(ages) * 15.0}
+        for symbol, name in WATCHLISTS[watchlist].items()})
+    assert stale.refresh()
+    subscription = stale.subscribe()
+    republished = [stale.refresh() for _ in range(5)]
+    assert not any(republished) and subscription.get(timeout=0) is None
+    print(f"stale quotes: {len(republished)} refreshes with growing ages published nothing")
+
+
+if __name__ == '__main__':
+    main()
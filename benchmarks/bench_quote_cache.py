@@ -0,0 +1,62 @@
+"""Benchmark: shared quote cache and single-flight coalescing
+
+Fires many concurrent lookups for the same symbol at recorded Yahoo
+responses and checks that they collapse into a single upstream fetch,
+then measures warm-cache lookup cost, every warm lookup being a hit.
+
+Usage:
+    python -m benchmarks.bench_quote_cache [--clients 50] [--latency 0.2]
+"""
+import argparse
+import threading
+import time
+from services import stock_service
+from services.quote_cache import stock_quotes
+from benchmarks.fakes import RecordedYahoo, patched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.2, help='Injected upstream latency in seconds')
+    parser.add_argument('--warm-lookups', type=int, default=100000)
+    args = parser.parse_args()
+
+    yahoo = RecordedYahoo(latency=args.latency)
+    stock_quotes.clear()
+    barrier = threading.Barrier(args.clients)
+    results = []
+
+    def client():
+        barrier.wait()
+        results.append(stock_service.get_stock_price('AAPL'))
+
+    with patched(stock_service.yf, 'Ticker', yahoo.Ticker):
+        threads = [threading.Thread(target=client) for _ in range(args.clients)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        cold_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.warm_lookups):
+            stock_service.get_stock_price('AAPL')
+        warm_us = (time.perf_counter() - start) * 1e6 / args.warm_lookups
+
+    # One quote fetch, however many HTTP requests that fetch itself needs
+    stats = stock_quotes.stats()
+    assert stats['misses'] == 1 and stats['coalesced'] == args.clients - 1, stats
+    assert all(r == results[0] for r in results) and 'error' not in results[0]
+    assert all(calls == 1 for calls in yahoo.calls_by_endpoint.values()), yahoo.calls_by_endpoint
+    assert stats['hits'] == args.warm_lookups, stats
+
+    print(f"{args.clients} concurrent clients: {cold_ms:.1f} ms, "
+          f"quote fetches={stats['misses']}, upstream calls={yahoo.calls} {yahoo.calls_by_endpoint}")
+    print(f"warm lookup: {warm_us:.2f} us/call")
+    print(f"stats: {stock_quotes.stats()}")
+
+
+if __name__ == '__main__':
+    main()
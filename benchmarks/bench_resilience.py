@@ -0,0 +1,266 @@
+"""Benchmark: rate limiting and circuit breaking of the upstream calls
+
+Drives the real service functions against upstreams that fail on a
+schedule:
+
+    yahoo    get_stock_price (yfinance over HTTP) during a 429 storm, with the
+             circuit breaker disabled and enabled: upstream requests, time
+             spent, and symbols wrongly indexed as missing
+    stale    AsyncMarket.get_stock_price during a 503 outage after the cached
+             quotes expired: every caller gets the last quote marked stale
+    binance  get_crypto_price through open -> half-open -> closed: while the
+             circuit is half-open a single probe reaches Binance
+    gemini   analyze_stock while the fake model raises ResourceExhausted: the
+             quota errors open the circuit, later calls never reach the model;
+             then streamed answers that fail half way open it the same way
+    limiter  an Upstream with a 50 req/s token bucket under 16 threads, and a
+             half-open call cancelled while it waits for a token
+
+Usage:
+    python -m benchmarks.bench_resilience [--symbols 100] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import ccxt
+import yfinance.base
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+from services import crypto_service, gemini_service, resilience, stock_service
+from services.async_market import AsyncMarket
+from services.gemini_service import analyze_stock
+from services.llm_cache import llm_cache
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.resilience import Upstream, UpstreamUnavailable
+from services.symbol_index import symbol_index
+from benchmarks.fakes import FakeGemini, StubServer, patched, stub_markets, unlimited_upstreams
+
+PRICE_DATA = {'price': 187.43, 'change': 2.25, 'change_percent': 1.21, 'volume': 51234567}
+
+
+def _reset():
+    for upstream in resilience.UPSTREAMS:
+        upstream.reset()
+    stock_quotes.clear()
+    crypto_quotes.clear()
+    symbol_index.clear()
+
+
+def _burst(fn, items, threads=16):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(fn, items))
+    return time.perf_counter() - start, results
+
+
+def _yahoo_storm(stub, symbols, threshold):
+    """429 storm: the breaker stops the requests, no symbol is indexed as missing"""
+    runs = {}
+    for label, failure_threshold in (('no breaker', 10 ** 9), ('breaker', threshold)):
+        _reset()
+        stub.reset()
+        stub.outage(429, 60)
+        with patched(resilience.yahoo.breaker, 'failure_threshold', failure_threshold):
+            elapsed, results = _burst(stock_service.get_stock_price, symbols)
+        assert all('error' in r for r in results)
+        missing = sum(symbol_index.is_missing('stock', s) or symbol_index.is_missing('stock', f'{s}.IS')
+                      for s in symbols)
+        runs[label] = stub.calls
+        print(f'yahoo    {label:<10} {elapsed:6.2f}s {stub.calls:5d} upstream requests '
+              f'{resilience.yahoo.stats()["rejected"]:5d} refused  {missing} symbols indexed as missing')
+        assert missing == 0
+    # yfinance makes two requests per quote (timezone, then chart); calls already in
+    # flight when the circuit opens still complete
+    assert runs['breaker'] <= 2 * (threshold + 16) < runs['no breaker']
+
+
+def _stale_quotes(stub, symbols):
+    """Expired quotes are served stale while Yahoo answers 503"""
+    _reset()
+    stub.reset()
+
+    async def run():
+        market = AsyncMarket(yahoo_base_url=stub.url)
+        try:
+            fresh = await asyncio.gather(*(market.get_stock_price(s) for s in symbols))
+            assert all('price' in r and not r.get('stale') for r in fresh)
+            stub.outage(503, 60)
+            with patched(stock_quotes, 'ttl', 0):
+                start = time.perf_counter()
+                stale = await asyncio.gather(*(market.get_stock_price(s) for s in symbols))
+                return time.perf_counter() - start, fresh, stale
+        finally:
+            await market.close()
+
+    for symbol in symbols:
+        stock_service._shares_outstanding[symbol] = (10 ** 9, time.monotonic())
+    elapsed, fresh, stale = asyncio.run(run())
+    for symbol in symbols:
+        stock_service._shares_outstanding.pop(symbol, None)
+    assert all(r.get('stale') and r['price'] == f['price'] for r, f in zip(stale, fresh))
+    print(f'stale    {len(stale)} quotes during the outage in {elapsed:.2f}s, all stale '
+          f'(age {min(r["age"] for r in stale)}-{max(r["age"] for r in stale)}s), '
+          f'{stub.failed} upstream requests failed')
+
+
+def _binance_probe(stub, threshold, reset_timeout):
+    """open -> half-open (one probe) -> closed"""
+    _reset()
+    stub.reset()
+    pairs = [f'C{i:04d}/USDT' for i in range(64)]
+    client = ccxt.binance({'enableRateLimit': False})
+    client.set_markets(stub_markets(pairs))
+    client.urls['api']['public'] = f'{stub.url}/api/v3'
+    breaker = resilience.binance.breaker
+
+    with patched(crypto_service, 'exchange', client), patched(breaker, 'reset_timeout', reset_timeout):
+        stub.fail(503, threshold)
+        for pair in pairs[:threshold]:
+            assert 'error' in crypto_service.get_crypto_price(pair)
+        assert breaker.state == breaker.OPEN
+        calls = stub.calls
+        _, results = _burst(crypto_service.get_crypto_price, pairs[threshold:2 * threshold])
+        assert stub.calls == calls and all('unavailable' in r['error'] for r in results)
+        print(f'binance  open after {threshold} 503s, {len(results)} calls refused without a request')
+
+        time.sleep(reset_timeout)
+        calls = stub.calls
+        _, results = _burst(crypto_service.get_crypto_price, pairs[2 * threshold:2 * threshold + 16])
+        probes = stub.calls - calls
+        assert probes == 1 and sum('price' in r for r in results) == 1 and breaker.state == breaker.CLOSED
+        print(f'         half-open: {probes} probe of {len(results)} concurrent calls reached Binance, circuit closed')
+
+        _, results = _burst(crypto_service.get_crypto_price, pairs[40:])
+        assert all('price' in r for r in results)
+    crypto_quotes.clear()
+
+
+def _gemini_quota(threshold):
+    """Quota errors open the circuit; later analyses fail fast without calling the model"""
+    _reset()
+    gemini = FakeGemini(latency=0.05)
+    gemini.fail(ResourceExhausted('Quota exceeded for requests per minute'), threshold)
+    errors = []
+    with patched(gemini_service, 'genai', gemini):
+        for i in range(2 * threshold):
+            start = time.perf_counter()
+            try:
+                analyze_stock(f'SYM{i}', PRICE_DATA, 'daily', 'gemini-2.5-flash', 'en')
+            except Exception as e:
+                errors.append((e, time.perf_counter() - start))
+    refused = [seconds for e, seconds in errors if isinstance(e, UpstreamUnavailable)]
+    assert gemini.calls == threshold and len(refused) == threshold
+    print(f'gemini   {threshold} quota errors, then {len(refused)} analyses refused in '
+          f'{max(refused) * 1000:.2f} ms at most, {gemini.calls} model calls in total')
+
+
+def _gemini_mid_stream(threshold):
+    """Streams failing after their first chunks open the circuit, though each one opened fine"""
+    _reset()
+    gemini = FakeGemini(latency=0.05)
+    gemini.fail_mid_stream(ServiceUnavailable('The model is overloaded'), threshold)
+    failed = 0
+    with patched(gemini_service, 'genai', gemini):
+        for i in range(threshold):
+            _, chunks = gemini_service.stream_cached('gemini-2.5-flash', f'Stream {i}', 'short_term')
+            try:
+                list(chunks)
+            except Exception:
+                failed += 1
+        assert failed == threshold and resilience.gemini.breaker.state == resilience.gemini.breaker.OPEN
+        _, chunks = gemini_service.stream_cached('gemini-2.5-flash', 'Stream after', 'short_term')
+        try:
+            received = list(chunks)
+        except UpstreamUnavailable:
+            received = None
+    assert received is None and gemini.calls == threshold
+    print(f'         {threshold} streams failing half way opened the circuit, the next stream was refused')
+
+
+def _cancelled_probe():
+    """A half-open call cancelled while it waits for a token gives the probe back"""
+    upstream = Upstream('test', rate=2, burst=1, is_failure=lambda e: False, failure_threshold=1, reset_timeout=0.1)
+
+    def fail():
+        raise resilience.UpstreamError('test', 'HTTP 503')
+
+    async def ok():
+        return 'ok'
+
+    async def run():
+        try:
+            upstream.call(fail)  # Opens the circuit and spends the only token
+        except resilience.UpstreamError:
+            pass
+        await asyncio.sleep(0.1)
+        try:
+            await asyncio.wait_for(upstream.call_async(ok), 0.05)  # Cancelled in the limiter wait
+        except asyncio.TimeoutError:
+            pass
+        return await upstream.call_async(ok)
+
+    assert asyncio.run(run()) == 'ok' and upstream.breaker.state == upstream.breaker.CLOSED
+    print('         a half-open call cancelled in the limiter wait gave the probe back, '
+          'the next one closed the circuit')
+
+
+def _limiter():
+    """Token bucket pacing across threads, and fast refusal past max_wait"""
+    upstream = Upstream('test', rate=50, burst=10, is_failure=lambda e: False)
+    elapsed, _ = _burst(lambda _: upstream.call(lambda: None), range(100))
+    expected = (100 - 10) / 50
+    print(f'limiter  100 calls at 50/s (burst 10) from 16 threads in {elapsed:.2f}s (expected {expected:.2f}s)')
+    assert expected * 0.9 < elapsed < expected * 1.3
+
+    upstream = Upstream('test', rate=5, burst=2, is_failure=lambda e: False, max_wait=0.5)
+    outcomes = []
+    lock = threading.Lock()
+
+    def call(_):
+        try:
+            upstream.call(lambda: None)
+            result = 'ok'
+        except UpstreamUnavailable:
+            result = 'refused'
+        with lock:
+            outcomes.append(result)
+
+    _burst(call, range(20))
+    print(f'         20 calls at 5/s with 0.5s max wait: {outcomes.count("ok")} served, '
+          f'{outcomes.count("refused")} refused')
+    # The burst, plus the tokens refilled within max_wait
+    assert outcomes.count('ok') == int(2 + 5 * 0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=100, help='symbols requested during the outages')
+    parser.add_argument('--latency', type=float, default=0.2, help='simulated upstream latency in seconds')
+    args = parser.parse_args()
+    logging.getLogger('yfinance').setLevel(logging.CRITICAL)  # One "possibly delisted" line per 429
+
+    symbols = [f'S{i:04d}' for i in range(args.symbols)]
+    threshold = resilience.yahoo.breaker.failure_threshold
+    print(f'{args.symbols} symbols, upstream latency {args.latency * 1000:.0f} ms, breaker opens after {threshold} failures')
+
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, StubServer(latency=args.latency) as stub, \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')), \
+            patched(llm_cache, 'root', os.path.join(tmp, 'llm')), \
+            patched(yfinance.base, '_BASE_URL_', stub.url):
+        _yahoo_storm(stub, symbols, threshold)
+        _stale_quotes(stub, symbols)
+        _binance_probe(stub, threshold, reset_timeout=0.5)
+        _gemini_quota(threshold)
+        _gemini_mid_stream(threshold)
+    _limiter()
+    _cancelled_probe()
+    _reset()
+    llm_cache.clear()
+
+
+if __name__ == '__main__':
+    main()
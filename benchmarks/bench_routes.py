@@ -0,0 +1,288 @@
+"""Benchmark: throughput and latency of every route, offline
+
+Replays recorded Yahoo Finance, Binance and Gemini responses
+(benchmarks/recorded, see record_upstreams.py) with injected latency,
+and sends --requests requests from --concurrency clients to each route
+through the Flask app: the pages, the dashboard tabs, quotes, history
+for every chart period of a stock and a crypto pair, indicators,
+analysis (blocking, streamed, batched and as a job), follow-up
+questions, news, settings, stats and /metrics.
+
+Caches start empty for every route and the requests cycle through
+several symbols, so each route's numbers include its cold requests and
+the cached ones that follow. Every request must succeed, and a route
+may call the fake upstreams at most UPSTREAM_CALLS_PER_KEY times per
+symbol or question it cycles through, however many requests it gets.
+Prints a table and, with --output, writes
+the results as JSON; --compare checks them against an earlier results
+file and exits with status 1 if a route got slower, or makes more
+upstream calls, than --tolerance allows.
+
+Usage:
+    python -m benchmarks.bench_routes [--requests 100] [--concurrency 8] [--latency 0.05]
+        [--llm-latency 0.5] [--only history] [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from config import POPULAR_STOCKS, POPULAR_CRYPTO, BORSA_ISTANBUL
+from services import stock_service, crypto_service, gemini_service
+from services.analysis_sessions import analysis_sessions
+from services.history_store import history_store
+from services.job_queue import job_queue
+from services.llm_cache import llm_cache
+from services.price_poller import price_poller
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.symbol_index import symbol_index
+from benchmarks.fakes import RecordedYahoo, RecordedExchange, RecordedGemini, patched, unlimited_upstreams
+
+PERIODS = ('1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max')
+STOCKS = list(POPULAR_STOCKS)
+CRYPTO = [pair.split('/')[0] for pair in POPULAR_CRYPTO]
+QUESTIONS = ['What are the main risks?', 'Where is the nearest support?', 'Is the trend still intact?',
+             'What would invalidate this view?', 'How volatile is it compared to last month?',
+             'Which indicator matters most here?', 'What is a sensible stop level?', 'Summarize in one sentence.']
+
+# Upstream calls a route may make per symbol or question: a quote, history
+# pages, a refresh and the model call, but never one per request
+UPSTREAM_CALLS_PER_KEY = 6
+
+
+def _get(path):
+    return lambda client, i: client.get(path(i) if callable(path) else path)
+
+
+def _post(path, body):
+    return lambda client, i: client.post(path, json=body(i))
+
+
+def _streamed(path, body):
+    """Send a request to a streamed route and read the whole stream"""
+    def send(client, i):
+        response = client.post(path, json=body(i), buffered=False)
+        for _ in response.response:
+            pass
+        return response
+    return send
+
+
+def _job(client, i):
+    """Submit an analysis job and poll it until it finishes"""
+    response = client.post('/api/jobs', json={'symbol': STOCKS[i % len(STOCKS)], 'language': 'en'})
+    status_url = response.get_json()['status_url']
+    while True:
+        response = client.get(status_url)
+        if response.get_json()['status'] in ('done', 'failed'):
+            return response
+        time.sleep(0.01)
+
+
+def _routes(report):
+    """(name, send, keys) of every benchmarked route
+
+    send(client, i) makes the i-th request; keys is the number of distinct
+    symbols or questions the requests cycle through (0 for routes that
+    never call an upstream), which bounds the upstream calls a route may
+    make however many requests it gets.
+    """
+    stock = lambda i: STOCKS[i % len(STOCKS)]
+    question = lambda i: {'symbol': 'AAPL', 'question': QUESTIONS[i % len(QUESTIONS)], 'language': 'en',
+                          'analysis_text': report['analysis'], 'price_data': report['price_data']}
+    routes = [
+        ('GET /', _get('/'), 0),
+        ('GET /analyze', _get('/analyze'), 0),
+        ('GET /settings', _get('/settings'), 0),
+        ('GET /api-key-help', _get('/api-key-help'), 0),
+        ('GET /api/prices/popular', _get('/api/prices/popular'), len(POPULAR_STOCKS)),
+        ('GET /api/prices/crypto', _get('/api/prices/crypto'), 1),  # One bulk ticker call
+        ('GET /api/prices/borsa-istanbul', _get('/api/prices/borsa-istanbul'), len(BORSA_ISTANBUL)),
+        ('GET /api/prices/<stock>', _get(lambda i: f'/api/prices/{stock(i)}'), len(STOCKS)),
+        ('GET /api/price/<stock>', _get(lambda i: f'/api/price/{stock(i)}'), len(STOCKS)),
+        ('GET /api/price/<crypto>', _get(lambda i: f'/api/price/{CRYPTO[i % len(CRYPTO)]}'), len(CRYPTO))
+    ]
+    for period in PERIODS:
+        routes.append((f'GET /api/history/<stock>?period={period}',
+                       _get(lambda i, period=period: f'/api/history/{stock(i)}?period={period}'), len(STOCKS)))
+        routes.append((f'GET /api/history/<crypto>?period={period}',
+                       _get(lambda i, period=period: f'/api/history/{CRYPTO[i % len(CRYPTO)]}?period={period}'),
+                       len(CRYPTO)))
+    routes.append(('GET /api/history/<stock>?period=max&format=columnar',
+                   _get(lambda i: f'/api/history/{stock(i)}?period=max&format=columnar'), len(STOCKS)))
+    routes.append(('GET /api/history/<stock>?period=max&max_points=800',
+                   _get(lambda i: f'/api/history/{stock(i)}?period=max&max_points=800'), len(STOCKS)))
+    analysis = lambda i: {'symbol': stock(i), 'language': 'en'}
+    routes += [
+        ('GET /api/indicators/<stock>', _get(lambda i: f'/api/indicators/{stock(i)}'), len(STOCKS)),
+        ('POST /api/analyze', _post('/api/analyze', analysis), len(STOCKS)),
+        ('POST /api/analyze/stream', _streamed('/api/analyze/stream', analysis), len(STOCKS)),
+        ('POST /api/analyze/batch', _streamed('/api/analyze/batch', lambda i: {
+            'symbols': [stock(i + n) for n in range(4)], 'language': 'en'}), len(STOCKS)),
+        ('POST /api/jobs (until done)', _job, len(STOCKS)),
+        ('POST /api/ask-question', _post('/api/ask-question', question), len(QUESTIONS)),
+        ('POST /api/ask-question/stream', _streamed('/api/ask-question/stream', question), len(QUESTIONS)),
+        ('POST /api/analyze-news', _post('/api/analyze-news', analysis), len(STOCKS)),
+        ('GET /api/settings', _get('/api/settings'), 0),
+        ('GET /api/prices/cache-stats', _get('/api/prices/cache-stats'), 0),
+        ('GET /api/prices/upstream-stats', _get('/api/prices/upstream-stats'), 0),
+        ('GET /metrics', _get('/metrics'), 0)
+    ]
+    return routes
+
+
+def _reset(tmp):
+    stock_quotes.clear()
+    crypto_quotes.clear()
+    llm_cache.clear()
+    symbol_index.clear()
+    history_store.root = tempfile.mkdtemp(dir=tmp)
+
+
+def _upstream_calls(fakes):
+    """Calls made so far to each fake upstream"""
+    yahoo, exchange, gemini = fakes
+    return {'yahoo': yahoo.calls, 'binance': exchange.total_calls, 'gemini': gemini.calls}
+
+
+def _measure(client, send, requests, concurrency, fakes):
+    """Latency percentiles, throughput and upstream calls of `requests` requests from `concurrency` clients"""
+    before = _upstream_calls(fakes)
+    def timed(i):
+        start = time.perf_counter()
+        response = send(client, i)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    after = _upstream_calls(fakes)
+    return {
+        'requests': requests,
+        'errors': sum(status >= 400 for _, status in results),
+        'upstream_calls': {name: after[name] - before[name] for name in after},
+        'throughput_rps': round(requests / elapsed, 2),
+        'first_ms': round(float(latencies[0]), 3),
+        'mean_ms': round(float(latencies.mean()), 3),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+        'max_ms': round(float(latencies.max()), 3)
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _compare(results, baseline, tolerance, floor_ms=1.0):
+    """Print each route against the baseline; returns the routes that got slower"""
+    regressions = []
+    print(f'\ncompared with {baseline.get("commit") or "baseline"} ({baseline.get("created_at", "?")}), '
+          f'tolerance {tolerance:.2f}x')
+    for name, now in results['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if before is None:
+            continue
+        slower = [key for key in ('p50_ms', 'p99_ms')
+                  if now[key] > before[key] * tolerance and now[key] - before[key] > floor_ms]
+        if now['throughput_rps'] * tolerance < before['throughput_rps']:
+            slower.append('throughput_rps')
+        calls, calls_before = (sum(row.get('upstream_calls', {}).values()) for row in (now, before))
+        if 'upstream_calls' in before and calls > calls_before * tolerance:
+            slower.append('upstream_calls')
+        if slower:
+            regressions.append(name)
+        print(f'{name:<56} p50 {before["p50_ms"]:9.2f} -> {now["p50_ms"]:9.2f} ms  '
+              f'p99 {before["p99_ms"]:9.2f} -> {now["p99_ms"]:9.2f} ms  '
+              f'{"SLOWER: " + ", ".join(slower) if slower else ""}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--latency', type=float, default=0.05, help='injected Yahoo and Binance latency in seconds')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='injected Gemini latency in seconds')
+    parser.add_argument('--only', help='benchmark only the routes whose name contains this text')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='results JSON of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='slowdown factor counted as a regression')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'settings': {key: getattr(args, key) for key in ('requests', 'concurrency', 'latency', 'llm_latency')},
+        'routes': {}
+    }
+    print(f'{args.requests} requests per route from {args.concurrency} clients, upstream latency '
+          f'{args.latency * 1000:.0f} ms, Gemini latency {args.llm_latency * 1000:.0f} ms')
+    print(f'{"route":<56} {"req/s":>9} {"first":>9} {"p50":>9} {"p99":>9} {"max":>9} {"calls":>6}  errors')
+
+    fakes = yahoo, exchange, gemini = (RecordedYahoo(latency=args.latency), RecordedExchange(latency=args.latency),
+                                       RecordedGemini(latency=args.llm_latency))
+    # The poller would refresh the quote cache behind the requests being measured
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, \
+            patched(stock_service.yf, 'Ticker', yahoo.Ticker), \
+            patched(crypto_service, 'exchange', exchange), \
+            patched(gemini_service, 'genai', gemini), \
+            patched(price_poller, 'start', lambda: None), \
+            patched(llm_cache, 'root', os.path.join(tmp, 'llm')), \
+            patched(history_store, 'root', history_store.root), \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')), \
+            patched(analysis_sessions, 'path', os.path.join(tmp, 'sessions.sqlite3')), \
+            patched(job_queue, 'path', os.path.join(tmp, 'jobs.sqlite3')), \
+            patched(os, 'environ', {**os.environ, 'GEMINI_API_KEY': 'bench'}):
+        _reset(tmp)
+        response = client.post('/api/analyze', json={'symbol': 'AAPL', 'language': 'en'})
+        assert response.status_code == 200, response.get_json()
+        report = response.get_json()
+        for name, send, keys in _routes(report):
+            if args.only and args.only not in name:
+                continue
+            _reset(tmp)
+            row = results['routes'][name] = _measure(client, send, args.requests, args.concurrency, fakes)
+            calls = sum(row['upstream_calls'].values())
+            print(f'{name:<56} {row["throughput_rps"]:9.1f} {row["first_ms"]:7.1f}ms {row["p50_ms"]:7.1f}ms '
+                  f'{row["p99_ms"]:7.1f}ms {row["max_ms"]:7.1f}ms {calls:>6}  {row["errors"]}')
+            assert row['errors'] == 0, f'{name}: {row["errors"]} failed requests'
+            assert calls <= UPSTREAM_CALLS_PER_KEY * keys, f'{name}: {calls} upstream calls for {keys} keys'
+        time.sleep(args.latency * 2)  # Quote refreshes started behind the last responses finish on the fakes
+        analysis_sessions.clear()
+        llm_cache.clear()
+        symbol_index.clear()
+    stock_quotes.clear()
+    crypto_quotes.clear()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f'\nresults written to {args.output}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = _compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} routes slower than the baseline')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark: cold vs warm symbol resolution through the symbol index
+
+Resolves a stock, a Borsa Istanbul stock, a warrant and a crypto symbol
+that are not in config.py, first with an empty index and then with the
+index warmed by the first pass (quote caches are cleared in between so
+only resolution is measured). Then probes a burst of unknown symbols
+against a small index: its size stays bounded, expired "not found"
+entries are pruned from the file, and the burst is written at once.
+
+Usage:
+    python -m benchmarks.bench_symbol_resolution [--latency 0.05]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from services import stock_service, crypto_service
+from services.market_service import resolve_price
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.symbol_index import symbol_index, SymbolIndex
+from benchmarks.fakes import FakeYahoo, FakeExchange, patched
+
+CASES = [
+    ('stock', 'IBM'),
+    ('bist', 'TCELL'),
+    ('warrant', 'KOZALX.V'),
+    ('crypto', 'AVAX'),
+]
+
+
+def _resolve(yahoo, exchange, symbol):
+    stock_quotes.clear()
+    crypto_quotes.clear()
+    yahoo.calls = 0
+    exchange.calls = {}
+    start = time.perf_counter()
+    asset_type, price_data = resolve_price(symbol)
+    elapsed = (time.perf_counter() - start) * 1000
+    assert 'error' not in price_data, price_data
+    return asset_type, elapsed, yahoo.calls + exchange.total_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05, help='Injected upstream latency in seconds')
+    args = parser.parse_args()
+
+    yahoo = FakeYahoo(latency=args.latency, symbols=['IBM', 'TCELL.IS', 'KOZALX.V.IS'])
+    exchange = FakeExchange(latency=args.latency, symbols=['AVAX/USDT'])
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            patched(stock_service.yf, 'Ticker', yahoo.Ticker), \
+            patched(crypto_service, 'exchange', exchange), \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')):
+        symbol_index.clear()
+        print(f"{'case':<8} {'symbol':<10} {'type':<7} {'cold':>10} {'calls':>5} {'warm':>10} {'calls':>5}")
+        for name, symbol in CASES:
+            asset_type, cold_ms, cold_calls = _resolve(yahoo, exchange, symbol)
+            _, warm_ms, warm_calls = _resolve(yahoo, exchange, symbol)
+            print(f"{name:<8} {symbol:<10} {asset_type:<7} {cold_ms:8.1f}ms {cold_calls:>5} {warm_ms:8.1f}ms {warm_calls:>5}")
+            assert warm_calls == 1, f'{symbol} took {warm_calls} upstream calls when warm'
+
+        # A fresh process picks the learned mappings up from disk
+        symbol_index.flush()
+        reloaded = SymbolIndex(path=symbol_index.path)
+        assert all(reloaded.lookup(symbol) for _, symbol in CASES)
+        print(f"index persisted to disk with {len(CASES)} learned mappings")
+        symbol_index.clear()
+
+        # 5000 unknown symbols against an index of at most 1000 entries per kind
+        now = [time.time()]
+        path = os.path.join(tmp, 'bounded.json')
+        bounded = SymbolIndex(path=path, negative_ttl=60, max_entries=1000, save_delay=60, clock=lambda: now[0])
+        for i in range(5000):
+            bounded.mark_missing('stock', f'X{i:04d}')
+            bounded.remember(f'U{i:04d}', 'stock', f'U{i:04d}')
+        assert bounded.saves == 0, 'changes are batched until flush or save_delay'
+        bounded.flush()
+        with open(path, encoding='utf-8') as f:
+            saved = json.load(f)
+        assert bounded.saves == 1 and len(saved['missing']) == len(saved['entries']) == 1000
+        assert bounded.is_missing('stock', 'X4999') and not bounded.is_missing('stock', 'X0000')
+        now[0] += 61
+        bounded.mark_missing('stock', 'LATE')
+        bounded.flush()
+        with open(path, encoding='utf-8') as f:
+            saved = json.load(f)
+        assert list(saved['missing']) == ['stock:LATE']
+        print(f"5000 unknown symbols: {len(saved['entries'])} mappings kept, expired negatives pruned on save, "
+              f"{bounded.saves} file writes")
+
+
+if __name__ == '__main__':
+    main()
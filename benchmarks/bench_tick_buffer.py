@@ -0,0 +1,171 @@
+"""Benchmark: live tick ring buffers behind the 1d charts
+
+Ingests --ticks synthetic ticks (a random walk with a growing cumulative
+volume) spread over --symbols symbols into a TickBuffer, and into a
+bounded deque of one dict per tick for comparison, reporting the cost
+per tick and the memory each holds. Then aggregates a symbol's ring into
+1m, 5m and 15m candles, checks them against a pandas resample of the
+same ticks, checks that the rings of symbols quoted only over REST stay
+small until their pair is streamed, and serves a 1d chart of a crypto pair and of a stock
+through the Flask routes with the ticked part of the day in 1m candles.
+
+Usage:
+    python -m benchmarks.bench_tick_buffer [--ticks 1000000] [--symbols 8] [--size 86400]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+import numpy as np
+import pandas as pd
+os.environ.setdefault('WARM_UP_CONNECTIONS', 'false')  # Offline: no upstream connections at import
+from app import app
+from services import stock_service, crypto_service
+from services.history_store import history_store
+from services.price_poller import price_poller
+from services.symbol_index import symbol_index
+from services.tick_buffer import TickBuffer, INTERVALS, INITIAL_TICKS, TICK_BYTES, tick_buffer
+from benchmarks.fakes import FakeYahoo, FakeExchange, patched, unlimited_upstreams
+
+
+def _synthetic_ticks(count, symbols, step_ms, seed=7):
+    """(symbol index, epoch ms, price, cumulative volume) columns, time-ordered per symbol"""
+    rng = np.random.default_rng(seed)
+    which = np.arange(count) % symbols
+    start = int(time.time() * 1000) - (count // symbols) * step_ms
+    ts = start + (np.arange(count) // symbols) * step_ms
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 1e-4, count)))
+    volumes = np.cumsum(rng.integers(0, 50, count)).astype(np.float64)
+    return which, ts.tolist(), np.round(prices, 4).tolist(), volumes.tolist()
+
+
+def _ingest(record, names, which, ts, prices, volumes):
+    """Seconds per tick of feeding every tick to record()"""
+    start = time.perf_counter()
+    for i, symbol in enumerate(which.tolist()):
+        record(names[symbol], prices[i], volumes[i], ts[i])
+    return (time.perf_counter() - start) / len(ts)
+
+
+def _held(feed):
+    """Bytes allocated by feed() and still held when it returns"""
+    tracemalloc.start()
+    feed()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held
+
+
+def _resampled(ts, price, volume, interval):
+    """Reference candles of the same ticks from pandas"""
+    frame = pd.DataFrame({'price': price, 'volume': volume}, index=pd.to_datetime(ts, unit='ms'))
+    rule = {'1m': '1min', '5m': '5min', '15m': '15min'}[interval]
+    ohlc = frame['price'].resample(rule).ohlc().dropna()
+    return ohlc, frame['volume'].resample(rule).sum().loc[ohlc.index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ticks', type=int, default=1000000, help='synthetic ticks ingested')
+    parser.add_argument('--symbols', type=int, default=8, help='symbols the ticks are spread over')
+    parser.add_argument('--size', type=int, default=86400, help='ticks kept per symbol')
+    args = parser.parse_args()
+
+    names = [f'SYM{i}/USDT' for i in range(args.symbols)]
+    which, ts, prices, volumes = _synthetic_ticks(args.ticks, args.symbols, step_ms=1000)
+    buffer = TickBuffer(size=args.size, max_symbols=args.symbols)
+    for name in names:
+        buffer.record(name, 1.0, 0.0, 0)  # Allocate the rings up front, outside the measurement
+    buffer.clear()
+    per_tick = _ingest(buffer.record, names, which, ts, prices, volumes)
+    stats = buffer.stats()
+    assert stats['ticks'] + stats['skipped'] == args.ticks
+    assert stats['bytes'] == stats['bytes_per_symbol'] * args.symbols
+    print(f'ring     {per_tick * 1e9:6.0f} ns per tick, {stats["bytes_per_symbol"] / 1e6:.2f} MB per symbol '
+          f'({args.size} ticks), {stats["bytes"] / 1e6:.1f} MB for {args.symbols} symbols')
+
+    # Candles of one symbol's retained ticks, checked against pandas
+    with buffer._lock:
+        ring_ts, ring_price, ring_volume = buffer._rings[names[0]].copy()
+    for interval in INTERVALS:
+        start = time.perf_counter()
+        candles = buffer.candles(names[0], interval)
+        elapsed = time.perf_counter() - start
+        ohlc, volume = _resampled(ring_ts, ring_price, ring_volume, interval)
+        assert len(candles['ts']) == len(ohlc)
+        for column in ('open', 'high', 'low', 'close'):
+            assert np.allclose(candles[column], ohlc[column].to_numpy())
+        assert np.allclose(candles['volume'], volume.to_numpy())
+        print(f'{interval:<8} {elapsed * 1000:6.2f} ms for {len(candles["ts"])} candles from {len(ring_ts)} ticks')
+
+    # Another pass over the full rings allocates nothing that outlives its tick
+    grown = _held(lambda: _ingest(buffer.record, names, which, ts, prices, volumes))
+    assert grown < 64 * 1024, grown
+    print(f'memory   rings {stats["bytes"] / 1e6:.1f} MB, {grown / 1e3:.1f} kB more after another {args.ticks} ticks')
+
+    # Dashboard symbols quoted over REST every 15 s: small rings, capped at a day of quotes until streamed
+    quoted = TickBuffer(size=args.size, quote_size=args.size // 15, max_symbols=32)
+    dashboard = [f'Q{i:02d}' for i in range(26)]
+    for symbol in dashboard:
+        quoted.record_quote(symbol, {'price': 100.0, 'volume': 0.0})
+    small = quoted.stats()['bytes']
+    assert small == len(dashboard) * INITIAL_TICKS * TICK_BYTES
+    for i in range(args.size // 5):
+        quoted.record_quote(dashboard[0], {'price': 100.0 + i % 7, 'volume': float(i)})
+    assert quoted._rings[dashboard[0]].size == args.size // 15
+    for i in range(args.size // 5):
+        quoted.record(dashboard[0], 100.0 + i % 7, float(args.size + i))
+    ring = quoted._rings[dashboard[0]]
+    ring_ts = ring.copy()[0]
+    assert ring.capacity == args.size and len(ring_ts) == args.size // 15 + args.size // 5
+    assert (np.diff(ring_ts) >= 0).all()
+    print(f'quoted   {len(dashboard)} REST-quoted symbols hold {small / 1e3:.0f} kB of rings '
+          f'({len(dashboard) * stats["bytes_per_symbol"] / 1e6:.1f} MB at the streamed size); '
+          f'a day of quotes caps one at {args.size // 15 * TICK_BYTES / 1e3:.0f} kB, streaming lifts it')
+
+    deques = {name: deque(maxlen=args.size) for name in names}
+
+    def record_dict(symbol, price, total_volume, ts_ms):
+        deques[symbol].append({'ts': ts_ms, 'price': price, 'volume': total_volume})
+
+    per_dict = _ingest(record_dict, names, which, ts, prices, volumes)
+    for queue in deques.values():
+        queue.clear()
+    held = _held(lambda: _ingest(record_dict, names, which, ts, prices, volumes))
+    print(f'dicts    {per_dict * 1e9:6.0f} ns per tick, {held / 1e6:.1f} MB held for the same ticks '
+          f'(one dict per tick in a bounded deque)')
+
+    # 1d charts through the routes: hourly (crypto) or daily (stock) candles up to the first tick
+    client = app.test_client()
+    exchange = FakeExchange(latency=0)
+    with unlimited_upstreams(), tempfile.TemporaryDirectory() as tmp, \
+            patched(stock_service.yf, 'Ticker', FakeYahoo(latency=0).Ticker), \
+            patched(crypto_service, 'exchange', exchange), \
+            patched(price_poller, 'start', lambda: None), \
+            patched(history_store, 'root', os.path.join(tmp, 'history')), \
+            patched(symbol_index, 'path', os.path.join(tmp, 'symbol_index.json')):
+        symbol_index.remember('BTC', 'crypto', 'BTC/USDT')
+        now = int(time.time() * 1000)
+        for i in range(7200):  # The last two hours, one tick a second
+            tick_buffer.record('BTC/USDT', 60000 + i % 50, 1e9 + i, now - (7200 - i) * 1000)
+            tick_buffer.record('AAPL', 190 + (i % 30) / 10, 5e7 + i, now - (7200 - i) * 1000)
+        for path, upstream in (('/api/history/BTC', 'hourly'), ('/api/history/AAPL', 'daily')):
+            start = time.perf_counter()
+            response = client.get(f'{path}?period=1d&interval=1m')
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.get_json()
+            dates = pd.to_datetime(response.get_json()['dates'])
+            minutes = int((np.diff(dates.values).astype('timedelta64[m]') == np.timedelta64(1, 'm')).sum())
+            assert minutes >= 118
+            print(f'1d chart {path}: {len(dates) - minutes - 1} {upstream} + {minutes + 1} '
+                  f'1m candles in {elapsed * 1000:.1f} ms')
+        assert client.get('/api/history/BTC?period=1d&interval=2m').status_code == 400
+        assert client.get('/api/prices/tick-stats').get_json()['symbols'] >= 2
+        tick_buffer.clear()
+        symbol_index.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,725 @@
+"""Offline stand-ins for the upstream data providers used by the benchmarks"""
+import asyncio
+import functools
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from contextlib import contextmanager, ExitStack
+import ccxt
+import numpy as np
+import pandas as pd
+from aiohttp import web, WSMsgType
+from google.api_core.exceptions import DeadlineExceeded
+from config import POPULAR_STOCKS, POPULAR_CRYPTO, BORSA_ISTANBUL
+from services import resilience
+
+
+def _seed(symbol):
+    """Deterministic pseudo-random number derived from a symbol"""
+    return zlib.crc32(symbol.encode('utf-8')) % 10000
+
+
+# Calendar days per yfinance period (trading-day periods are counted separately)
+_PERIOD_DAYS = {'1mo': 31, '3mo': 92, '6mo': 183, '1y': 366, '2y': 731, '5y': 1827,
+                '10y': 3653, 'ytd': 366, 'max': 365 * 30}
+_TRADING_DAY_PERIODS = {'1d': 1, '5d': 5}
+
+# Recorded upstream responses replayed by RecordedYahoo, RecordedExchange and RecordedGemini
+RECORDED_DIR = os.path.join(os.path.dirname(__file__), 'recorded')
+# .info fields quoted in the currency, scaled to each symbol's price level on replay
+_YAHOO_PRICE_FIELDS = ('currentPrice', 'regularMarketPrice', 'previousClose', 'regularMarketPreviousClose',
+                       'open', 'regularMarketOpen', 'dayLow', 'dayHigh', 'regularMarketDayLow',
+                       'regularMarketDayHigh', 'fiftyTwoWeekLow', 'fiftyTwoWeekHigh', 'fiftyDayAverage',
+                       'twoHundredDayAverage', 'bid', 'ask', 'targetHighPrice', 'targetLowPrice',
+                       'targetMeanPrice', 'targetMedianPrice', 'regularMarketChange')
+
+
+def _candle_frame(base_price, index, base_volume):
+    """Deterministic candles: the same timestamp always gets the same values"""
+    t = (index.asi8 // 10 ** 9 // 3600).astype(float) if len(index) else []
+    closes = base_price + 5 * np.sin(np.asarray(t) / 500.0)
+    return pd.DataFrame({
+        'Open': closes - 0.25, 'High': closes + 0.5, 'Low': closes - 0.5,
+        'Close': closes, 'Volume': np.full(len(index), float(base_volume))
+    }, index=index)
+
+
+class _FakeResponse:
+    """Just enough of requests.Response for session response hooks"""
+
+    def __init__(self, payload):
+        self.content = json.dumps(payload).encode('utf-8')
+        self.status_code = 200
+
+
+class FakeYahoo:
+    """Fake Yahoo Finance backend that serves canned quotes with injected latency
+    
+    .info costs info_latency (two requests upstream, default twice the chart
+    latency) and returns a payload padded to the size of a real quoteSummary
+    response; the chart endpoint returns a few daily candles. Symbols in
+    `slow` answer the chart endpoint after their own latency instead.
+    """
+
+    def __init__(self, latency=0.05, symbols=None, info_latency=None, slow=None):
+        self.latency = latency
+        self.info_latency = 2 * latency if info_latency is None else info_latency
+        self.slow = dict(slow or {})
+        self.symbols = set(symbols if symbols is not None else list(POPULAR_STOCKS) + list(BORSA_ISTANBUL))
+        self.calls = 0
+        self.calls_by_endpoint = {}
+        self._lock = threading.Lock()
+
+    def record_call(self, endpoint='info', latency=None):
+        with self._lock:
+            self.calls += 1
+            self.calls_by_endpoint[endpoint] = self.calls_by_endpoint.get(endpoint, 0) + 1
+        latency = self.latency if latency is None else latency
+        if latency:
+            time.sleep(latency)
+
+    def quote(self, symbol):
+        """Return the .info dictionary for a symbol, or an empty dict if unknown"""
+        if symbol not in self.symbols:
+            return {}
+        seed = _seed(symbol)
+        price = 10 + seed / 10
+        info = {
+            'symbol': symbol,
+            'currentPrice': price,
+            'regularMarketPrice': price,
+            'previousClose': price - 1,
+            'regularMarketChange': 1.0,
+            'regularMarketChangePercent': 100 / (price - 1),
+            'volume': seed * 1000,
+            'marketCap': seed * 10 ** 8,
+            'sharesOutstanding': seed * 10 ** 8 / price,
+            'longBusinessSummary': 'Lorem ipsum dolor sit amet. ' * 60
+        }
+        # Pad with the long tail of fields a real quoteSummary response carries
+        info.update({f'field{i}': {'raw': seed * i, 'fmt': f'{seed * i:,}'} for i in range(150)})
+        return info
+
+    def history(self, symbol, period='5d', start=None):
+        """Return daily candles (business days) for a symbol, or an empty frame if unknown"""
+        if symbol not in self.symbols:
+            return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+        end = pd.Timestamp.now(tz='America/New_York').normalize()
+        if start is not None:
+            index = pd.bdate_range(start=pd.Timestamp(start, tz='America/New_York'), end=end)
+        elif period in _TRADING_DAY_PERIODS:
+            index = pd.bdate_range(end=end, periods=_TRADING_DAY_PERIODS[period])
+        else:
+            index = pd.bdate_range(start=end - pd.Timedelta(days=_PERIOD_DAYS.get(period, 31)), end=end)
+        index = index.tz_convert('America/New_York') if index.tz is not None else index.tz_localize('America/New_York')
+        return _candle_frame(self.quote(symbol)['currentPrice'], index, _seed(symbol) * 1000)
+
+    def Ticker(self, symbol, session=None):
+        return FakeTicker(self, symbol, session)
+
+
+def load_recording(name):
+    """Upstream responses recorded by benchmarks.record_upstreams ('yahoo', 'binance' or 'gemini')"""
+    with open(os.path.join(RECORDED_DIR, f'{name}.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _replay_rows(stamps, step, count):
+    """Recorded row for each timestamp, walking the recording back and forth
+
+    Reversing at the ends instead of wrapping around keeps consecutive
+    candles continuous however long the requested period is.
+    """
+    cycle = max(2 * count - 2, 1)
+    position = (np.asarray(stamps, dtype=np.int64) // step) % cycle
+    return np.where(position < count, position, cycle - position)
+
+
+class RecordedYahoo(FakeYahoo):
+    """FakeYahoo replaying a recorded .info payload and recorded daily candles
+
+    Each symbol gets the recording scaled to its own price level, so quotes
+    differ per symbol while the payload shape and the day-to-day moves are
+    those of the real response.
+    """
+
+    def __init__(self, latency=0.05, recording=None, **kwargs):
+        super().__init__(latency, **kwargs)
+        self.recording = recording or load_recording('yahoo')
+
+    def _scale(self, symbol):
+        return (10 + _seed(symbol) / 10) / self.recording['info']['regularMarketPrice']
+
+    def quote(self, symbol):
+        if symbol not in self.symbols:
+            return {}
+        scale = self._scale(symbol)
+        info = dict(self.recording['info'], symbol=symbol)
+        for field in _YAHOO_PRICE_FIELDS:
+            if isinstance(info.get(field), (int, float)):
+                info[field] *= scale
+        return info
+
+    def history(self, symbol, period='5d', start=None):
+        hist = super().history(symbol, period=period, start=start)
+        if hist.empty:
+            return hist
+        candles = self.recording['history']
+        rows = _replay_rows(hist.index.as_unit('s').asi8, 86400, len(candles['close']))
+        scale = self._scale(symbol)
+        for column in ('Open', 'High', 'Low', 'Close'):
+            hist[column] = np.asarray(candles[column.lower()], dtype=float)[rows] * scale
+        hist['Volume'] = np.asarray(candles['volume'], dtype=float)[rows]
+        return hist
+
+
+class FakeTicker:
+    """Minimal yfinance.Ticker replacement backed by a FakeYahoo"""
+
+    def __init__(self, backend, symbol, session=None):
+        self._backend = backend
+        self._session = session
+        self._meta = None
+        self.ticker = symbol
+
+    def _respond(self, payload):
+        """Pass a fake response through the session hooks, as requests would"""
+        if self._session is not None:
+            response = _FakeResponse(payload)
+            for hook in self._session.hooks.get('response', []):
+                hook(response)
+
+    @property
+    def info(self):
+        self._backend.record_call('info', self._backend.info_latency)
+        info = self._backend.quote(self.ticker)
+        self._respond(info)
+        return info
+
+    def history(self, period='1mo', interval='1d', start=None, **kwargs):
+        self._backend.record_call('chart', self._backend.slow.get(self.ticker))
+        hist = self._backend.history(self.ticker, period=period, start=start)
+        self._meta = {'symbol': self.ticker}
+        if not hist.empty:
+            self._meta['regularMarketPrice'] = float(hist['Close'].iloc[-1])
+        self._respond({'meta': self._meta, 'rows': hist.reset_index(drop=True).to_dict('list')})
+        return hist
+
+    def get_history_metadata(self):
+        return self._meta or {}
+
+
+@contextmanager
+def patched(target, name, value):
+    """Temporarily replace an attribute on a module or object"""
+    original = getattr(target, name)
+    setattr(target, name, value)
+    try:
+        yield value
+    finally:
+        setattr(target, name, original)
+
+
+@contextmanager
+def unlimited_upstreams():
+    """Lift the per-upstream rate limits, for benchmarks of throughput on our side"""
+    with ExitStack() as stack:
+        for upstream in resilience.UPSTREAMS:
+            stack.enter_context(patched(upstream.limiter, 'rate', 0))
+        yield
+
+
+# Timeframe -> candle length in milliseconds
+TIMEFRAME_MS = {'1m': 60000, '5m': 300000, '15m': 900000, '1h': 3600000,
+                '4h': 14400000, '1d': 86400000, '1w': 604800000}
+
+
+class FakeExchange:
+    """Stubbed ccxt exchange that counts calls and serves canned tickers"""
+
+    def __init__(self, latency=0.05, symbols=None, bulk_symbols=None):
+        self.latency = latency
+        self.symbols = set(symbols if symbols is not None else POPULAR_CRYPTO)
+        # Pairs the bulk endpoint returns; defaults to every known pair
+        self.bulk_symbols = set(bulk_symbols) if bulk_symbols is not None else None
+        # Populated by load_markets(), like a real ccxt exchange
+        self.markets = None
+        # OHLCV history starts here and each request returns at most this many candles
+        self.listed_at = int(time.time() * 1000) - 8 * 365 * 86400000
+        self.ohlcv_page_limit = 1000
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def record_call(self, method):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def ticker(self, symbol):
+        seed = _seed(symbol)
+        last = 1 + seed / 7
+        return {
+            'symbol': symbol,
+            'last': last,
+            'change': last * 0.01,
+            'percentage': 1.0,
+            'quoteVolume': seed * 10000,
+            'high': last * 1.02,
+            'low': last * 0.98
+        }
+
+    def load_markets(self, reload=False):
+        if self.markets is None or reload:
+            self.record_call('load_markets')
+            self.markets = {s: {'symbol': s} for s in self.symbols}
+        return self.markets
+
+    def fetch_ticker(self, symbol):
+        self.record_call('fetch_ticker')
+        if symbol not in self.symbols:
+            raise ccxt.BadSymbol(f'binance does not have market symbol {symbol}')
+        return self.ticker(symbol)
+
+    def fetch_tickers(self, symbols=None):
+        self.record_call('fetch_tickers')
+        available = self.symbols if self.bulk_symbols is None else self.symbols & self.bulk_symbols
+        wanted = symbols if symbols is not None else available
+        return {s: self.ticker(s) for s in wanted if s in available}
+
+    def fetch_ohlcv(self, symbol, timeframe='1d', since=None, limit=None, params=None):
+        """Synthetic candles aligned to the timeframe, ending at the current one"""
+        self.record_call('fetch_ohlcv')
+        if symbol not in self.symbols:
+            raise ccxt.BadSymbol(f'binance does not have market symbol {symbol}')
+        step = TIMEFRAME_MS[timeframe]
+        limit = min(limit or 500, self.ohlcv_page_limit)
+        now = int(time.time() * 1000) // step * step
+        first = self.listed_at // step * step
+        if since is None:
+            start = max(first, now - (limit - 1) * step)
+        else:
+            start = max(first, -(-since // step) * step)
+        ts = np.arange(start, min(now, start + (limit - 1) * step) + 1, step, dtype=np.int64)
+        base = 1 + _seed(symbol) / 7
+        closes = base + base * 0.05 * np.sin(ts / step / 50.0)
+        return [[int(t), c - 0.1, c + 0.2, c - 0.2, c, 1000.0 + (t // step) % 97]
+                for t, c in zip(ts.tolist(), closes.tolist())]
+
+
+class RecordedExchange(FakeExchange):
+    """FakeExchange replaying a recorded ticker and recorded candles, scaled per pair"""
+
+    def __init__(self, latency=0.05, recording=None, **kwargs):
+        super().__init__(latency, **kwargs)
+        self.recording = recording or load_recording('binance')
+
+    def _scale(self, symbol):
+        return (1 + _seed(symbol) / 7) / self.recording['ticker']['last']
+
+    def ticker(self, symbol):
+        scale = self._scale(symbol)
+        ticker = dict(self.recording['ticker'], symbol=symbol)
+        for field in ('last', 'close', 'open', 'high', 'low', 'bid', 'ask', 'vwap', 'previousClose', 'change'):
+            if isinstance(ticker.get(field), (int, float)):
+                ticker[field] *= scale
+        return ticker
+
+    def fetch_ohlcv(self, symbol, timeframe='1d', since=None, limit=None, params=None):
+        candles = super().fetch_ohlcv(symbol, timeframe, since=since, limit=limit, params=params)
+        recorded = self.recording['ohlcv']
+        rows = _replay_rows([c[0] for c in candles], TIMEFRAME_MS[timeframe], len(recorded))
+        scale = self._scale(symbol)
+        return [[c[0], *(value * scale for value in recorded[row][1:5]), recorded[row][5]]
+                for c, row in zip(candles, rows.tolist())]
+
+
+class _FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGemini:
+    """Stand-in for google.generativeai that answers after a fixed delay
+
+    Streamed calls (stream=True) spread the same delay over the chunks,
+    like a model emitting tokens as it goes. A prompt listing several
+    symbols gets one "=== SYMBOL ===" section each, and every section after
+    the first adds section_cost times the delay (output tokens dominate
+    generation time). A request whose timeout (request_options) is shorter
+    than its delay fails with DeadlineExceeded once the timeout has passed,
+    like the real client; the timeouts requests were sent with are kept in
+    timeouts. fail() makes calls fail before they answer, fail_mid_stream()
+    makes streamed calls fail half way through their chunks. Patch it in
+    with patched(gemini_service, 'genai', fake).
+    """
+
+    def __init__(self, latency=2.0, chunks=20, section_cost=0.75):
+        self.latency = latency
+        self.chunks = chunks
+        self.section_cost = section_cost
+        self.calls = 0
+        self.prompts = []
+        self.timeouts = []
+        self._failures = deque()
+        self._stream_failures = deque()
+        self._lock = threading.Lock()
+
+    def fail(self, error, times=1):
+        """Raise error (e.g. google.api_core.exceptions.ResourceExhausted) from the next `times` calls"""
+        with self._lock:
+            self._failures.extend([error] * times)
+
+    def fail_mid_stream(self, error, times=1):
+        """Raise error half way through the chunks of the next `times` streamed calls"""
+        with self._lock:
+            self._stream_failures.extend([error] * times)
+
+    def configure(self, api_key=None, **kwargs):
+        pass
+
+    def GenerativeModel(self, model_name):
+        return _FakeGeminiModel(self, model_name)
+
+    def _record(self, prompt):
+        with self._lock:
+            self.calls += 1
+            self.prompts.append(prompt)
+            if self._failures:
+                raise self._failures.popleft()
+            return self.calls
+
+    @staticmethod
+    def _text(number):
+        return f'Analysis #{number}: ' + 'lorem ipsum ' * 150
+
+    def _reply(self, prompt):
+        """Response text and generation time for a prompt"""
+        number = self._record(prompt)
+        symbols = re.findall(r'^\s*Symbol: (\S+)', prompt, re.MULTILINE)
+        if len(symbols) < 2:
+            return self._text(number), self.latency
+        text = '\n\n'.join(f'=== {symbol} ===\n{self._text(number)}' for symbol in symbols)
+        return text, self.latency * (1 + self.section_cost * (len(symbols) - 1))
+
+    def answer(self, prompt, timeout=None):
+        text, latency = self._reply(prompt)
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise DeadlineExceeded('Deadline Exceeded')
+        if latency:
+            time.sleep(latency)
+        return text
+
+    async def answer_async(self, prompt, timeout=None):
+        text, latency = self._reply(prompt)
+        if timeout is not None and latency > timeout:
+            await asyncio.sleep(timeout)
+            raise DeadlineExceeded('Deadline Exceeded')
+        if latency:
+            await asyncio.sleep(latency)
+        return text
+
+    def stream(self, prompt):
+        # Like the real client, the request (and any error) happens before the first chunk
+        text, latency = self._reply(prompt)
+        size = -(-len(text) // self.chunks)
+        with self._lock:
+            error = self._stream_failures.popleft() if self._stream_failures else None
+
+        def chunks():
+            for start in range(0, len(text), size):
+                if error is not None and start >= len(text) // 2:
+                    raise error
+                if latency:
+                    time.sleep(latency / self.chunks)
+                yield _FakeGeminiResponse(text[start:start + size])
+        return chunks()
+
+
+class _FakeGeminiModel:
+    def __init__(self, backend, model_name):
+        self.backend = backend
+        self.model_name = model_name
+
+    def _timeout(self, request_options):
+        timeout = (request_options or {}).get('timeout')
+        self.backend.timeouts.append(timeout)
+        return timeout
+
+    def generate_content(self, prompt, stream=False, request_options=None, **kwargs):
+        timeout = self._timeout(request_options)
+        if stream:
+            return self.backend.stream(prompt)
+        return _FakeGeminiResponse(self.backend.answer(prompt, timeout))
+
+    async def generate_content_async(self, prompt, request_options=None, **kwargs):
+        return _FakeGeminiResponse(await self.backend.answer_async(prompt, self._timeout(request_options)))
+
+
+class RecordedGemini(FakeGemini):
+    """FakeGemini answering with recorded responses
+
+    Analysis, follow-up answer and news prompts each get the recorded
+    response of their kind, with the recorded symbol swapped for the one
+    asked about.
+    """
+
+    def __init__(self, latency=2.0, recording=None, **kwargs):
+        super().__init__(latency, **kwargs)
+        self.recording = recording or load_recording('gemini')
+
+    def _recorded(self, prompt, symbol):
+        if 'USER QUESTION:' in prompt:
+            kind = 'answer'
+        elif 'news' in prompt.lower() or 'haber' in prompt.lower():
+            kind = 'news'
+        else:
+            kind = 'analysis'
+        return self.recording[kind].replace(self.recording['symbol'], symbol)
+
+    def _reply(self, prompt):
+        self._record(prompt)
+        symbols = re.findall(r'^\s*Symbol: (\S+)', prompt, re.MULTILINE)
+        if len(symbols) < 2:
+            return self._recorded(prompt, symbols[0] if symbols else self.recording['symbol']), self.latency
+        text = '\n\n'.join(f'=== {symbol} ===\n{self._recorded(prompt, symbol)}' for symbol in symbols)
+        return text, self.latency * (1 + self.section_cost * (len(symbols) - 1))
+
+
+class StubServer:
+    """Local HTTP server speaking the Yahoo chart and Binance ticker APIs
+
+    Runs an aiohttp server on its own event loop thread and answers every
+    symbol after `latency` seconds, so real HTTP clients (yfinance, ccxt,
+    aiohttp) can be benchmarked offline. Tracks how many requests were
+    in flight at once and how many connections were opened; the first
+    request on each new connection waits `handshake` more seconds, the
+    cost of the TCP/TLS setup a real upstream would charge. fail() and
+    outage() make it answer with an error status (429, 5xx) on a schedule.
+
+        with StubServer(latency=0.2) as stub:
+            patched(yfinance.base, '_BASE_URL_', stub.url)
+    """
+
+    def __init__(self, latency=0.2, handshake=0.0):
+        self.latency = latency
+        self.handshake = handshake
+        self.calls = 0
+        self.connections = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._transports = set()
+        self._failures = deque()
+        self._outage = (None, 0.0)  # (status, until monotonic time)
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._runner = None
+
+    def __enter__(self):
+        @web.middleware
+        async def track(request, handler):
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                if request.transport not in self._transports:
+                    self._transports.add(request.transport)
+                    self.connections += 1
+                    if self.handshake:
+                        await asyncio.sleep(self.handshake)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                status = self._failure_status()
+                if status:
+                    self.failed += 1
+                    return web.json_response({'error': 'scheduled failure'}, status=status)
+                return await handler(request)
+            finally:
+                self.in_flight -= 1
+
+        app = web.Application(middlewares=[track])
+        self._add_routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        self._thread.start()
+        self._call(self._runner.setup())
+        site = web.TCPSite(self._runner, '127.0.0.1', 0, backlog=4096)
+        self._call(site.start())
+        port = self._runner.addresses[0][1]
+        self.url = f'http://127.0.0.1:{port}'
+        return self
+
+    def _add_routes(self, app):
+        app.router.add_get('/v8/finance/chart/{symbol}', self._chart)
+        app.router.add_get('/api/v3/ticker/24hr', self._ticker)
+
+    def __exit__(self, *exc):
+        self._call(self._runner.cleanup())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def reset(self):
+        self.calls = self.connections = self.failed = self.peak_in_flight = 0
+        self._failures.clear()
+        self._outage = (None, 0.0)
+
+    def fail(self, status, times=1):
+        """Answer the next `times` requests with an error status"""
+        self._failures.extend([status] * times)
+
+    def outage(self, status, seconds):
+        """Answer every request with an error status for the next `seconds`"""
+        self._outage = (status, time.monotonic() + seconds)
+
+    def _failure_status(self):
+        if self._failures:
+            return self._failures.popleft()
+        status, until = self._outage
+        return status if time.monotonic() < until else None
+
+    @functools.lru_cache(maxsize=None)
+    def _stamps(self, days):
+        """Market-open timestamps of the last `days` days in New York"""
+        today = pd.Timestamp.now(tz='America/New_York').normalize()
+        return [int((today - pd.Timedelta(days=days - 1 - i) + pd.Timedelta(hours=9.5)).timestamp())
+                for i in range(days)]
+
+    async def _chart(self, request):
+        symbol = request.match_info['symbol']
+        days = {'1d': 1, '5d': 5}.get(request.query.get('range'), 22)
+        price = 10 + _seed(symbol) / 10
+        stamps = self._stamps(days)
+        closes = [round(price + 0.1 * i, 2) for i in range(days)]
+        return web.json_response({'chart': {'result': [{
+            'meta': {'symbol': symbol, 'currency': 'USD', 'instrumentType': 'EQUITY', 'exchangeName': 'NMS',
+                     'timezone': 'EDT', 'exchangeTimezoneName': 'America/New_York', 'gmtoffset': -14400,
+                     'regularMarketPrice': closes[-1], 'chartPreviousClose': closes[0], 'priceHint': 2,
+                     'dataGranularity': '1d', 'range': request.query.get('range', '')},
+            'timestamp': stamps,
+            'indicators': {
+                'quote': [{'open': closes, 'high': [c + 0.5 for c in closes], 'low': [c - 0.5 for c in closes],
+                           'close': closes, 'volume': [_seed(symbol) * 1000] * days}],
+                'adjclose': [{'adjclose': closes}]
+            }
+        }], 'error': None}})
+
+    async def _ticker(self, request):
+        market_id = request.query['symbol']
+        price = 100 + _seed(market_id)
+        return web.json_response({
+            'symbol': market_id, 'lastPrice': str(price), 'priceChange': '1.5', 'priceChangePercent': '1.2',
+            'highPrice': str(price + 2), 'lowPrice': str(price - 2), 'volume': '1000',
+            'quoteVolume': str(price * 1000), 'openTime': 0, 'closeTime': int(time.time() * 1000)
+        })
+
+
+class StubTickerServer(StubServer):
+    """StubServer that also speaks Binance's WebSocket ticker stream at /ws
+
+    Answers SUBSCRIBE and UNSUBSCRIBE requests like Binance and sends a
+    24hrTicker frame per subscribed pair every `interval` seconds,
+    replaying the recorded frames scaled to each pair's price level (the
+    same levels RecordedExchange serves over REST). Pairs not in `symbols`
+    get no frames, as on Binance. pause() stops the frames without
+    closing connections and drop() closes every connection.
+
+        with StubTickerServer(interval=0.1) as stub:
+            stream = TickerStream(url=stub.ws_url)
+    """
+
+    def __init__(self, interval=0.1, symbols=None, recording=None, **kwargs):
+        super().__init__(latency=0, **kwargs)
+        self.interval = interval
+        self.symbols = {pair.replace('/', ''): pair for pair in (symbols if symbols is not None else POPULAR_CRYPTO)}
+        self.recording = recording or load_recording('binance')
+        self.paused = False
+        self.frames_sent = 0
+        self.subscriptions = 0
+        self._sockets = set()
+
+    @property
+    def ws_url(self):
+        return self.url.replace('http://', 'ws://') + '/ws'
+
+    def _add_routes(self, app):
+        super()._add_routes(app)
+        app.router.add_get('/ws', self._ws)
+
+    def pause(self, paused=True):
+        """Stop (or resume) sending frames, keeping the connections open"""
+        self.paused = paused
+
+    def drop(self):
+        """Close every open stream connection"""
+        async def close_all():
+            for ws in list(self._sockets):
+                await ws.close()
+        self._call(close_all())
+
+    def _frame(self, market_id, number):
+        pair = self.symbols[market_id]
+        frames = self.recording['frames']
+        frame = dict(frames[number % len(frames)], s=market_id, E=int(time.time() * 1000))
+        scale = (1 + _seed(pair) / 7) / self.recording['ticker']['last']
+        for field in ('c', 'o', 'h', 'l', 'p', 'w', 'b', 'a'):
+            frame[field] = f'{float(frame[field]) * scale:.8f}'
+        return frame
+
+    async def _replay(self, ws, streams):
+        number = 0
+        while not ws.closed:
+            await asyncio.sleep(self.interval)
+            if self.paused:
+                continue
+            for stream in list(streams):
+                market_id = stream.split('@')[0].upper()
+                if market_id in self.symbols:
+                    await ws.send_str(json.dumps(self._frame(market_id, number)))
+                    self.frames_sent += 1
+            number += 1
+
+    async def _ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.add(ws)
+        streams = set()
+        replay = asyncio.ensure_future(self._replay(ws, streams))
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                command = json.loads(message.data)
+                if command.get('method') == 'SUBSCRIBE':
+                    streams.update(command['params'])
+                    self.subscriptions += 1
+                elif command.get('method') == 'UNSUBSCRIBE':
+                    streams.difference_update(command['params'])
+                await ws.send_str(json.dumps({'result': None, 'id': command.get('id')}))
+        finally:
+            replay.cancel()
+            self._sockets.discard(ws)
+        return ws
+
+
+def stub_markets(pairs):
+    """ccxt market dictionaries for USDT pairs served by StubServer"""
+    return [{
+        'id': pair.replace('/', ''), 'symbol': pair, 'base': pair.split('/')[0], 'quote': 'USDT',
+        'baseId': pair.split('/')[0], 'quoteId': 'USDT', 'settle': None, 'settleId': None,
+        'type': 'spot', 'spot': True, 'margin': False, 'swap': False, 'future': False, 'option': False,
+        'contract': False, 'linear': None, 'inverse': None, 'active': True, 'precision': {}, 'limits': {}
+    } for pair in pairs]
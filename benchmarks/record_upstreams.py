@@ -0,0 +1,111 @@
+"""Record live Yahoo Finance, Binance and Gemini responses for the offline benchmarks
+
+Writes benchmarks/recorded/yahoo.json (a stock's .info payload and a year
+of daily candles), binance.json (a pair's ticker, a year of daily candles
+and frames of its WebSocket ticker stream) and gemini.json (an analysis,
+a follow-up answer and a news summary for the stock, made from the app's
+own prompts). RecordedYahoo, RecordedExchange, StubTickerServer and
+RecordedGemini in benchmarks.fakes replay them.
+
+Needs network access, and GEMINI_API_KEY for the Gemini responses.
+
+Usage:
+    python -m benchmarks.record_upstreams [--stock AAPL] [--crypto BTC/USDT] [--frames 60] [--skip-gemini]
+"""
+import argparse
+import json
+import math
+import os
+from datetime import datetime, timezone
+import ccxt
+import google.generativeai as genai
+import websocket
+import yfinance as yf
+from config import GEMINI_MODEL, CRYPTO_STREAM_URL
+from services import gemini_service
+from services.news_service import _news_prompt
+from services.stock_service import get_stock_price
+from services.analysis_pipeline import indicators_for
+from benchmarks.fakes import RECORDED_DIR
+
+QUESTION = 'What are the main risks?'
+
+
+def _jsonable(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    return str(value)
+
+
+def _write(name, payload):
+    payload = {'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'), **payload}
+    path = os.path.join(RECORDED_DIR, f'{name}.json')
+    os.makedirs(RECORDED_DIR, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=1, ensure_ascii=False)
+        f.write('\n')
+    print(f'{path}: {os.path.getsize(path)} bytes')
+
+
+def record_yahoo(symbol):
+    ticker = yf.Ticker(symbol)
+    hist = ticker.history(period='1y', interval='1d')
+    _write('yahoo', {
+        'symbol': symbol,
+        'info': _jsonable(ticker.info),
+        'history': {column.lower(): [round(float(v), 4) for v in hist[column]]
+                    for column in ('Open', 'High', 'Low', 'Close', 'Volume')}
+    })
+
+
+def record_binance(pair, frames):
+    exchange = ccxt.binance({'enableRateLimit': True})
+    ticker = exchange.fetch_ticker(pair)
+    # The ticker stream sends one frame per second
+    socket = websocket.create_connection(f"{CRYPTO_STREAM_URL}/{pair.replace('/', '').lower()}@ticker", timeout=10)
+    try:
+        stream = [json.loads(socket.recv()) for _ in range(frames)]
+    finally:
+        socket.close()
+    _write('binance', {
+        'symbol': pair,
+        'ticker': _jsonable(ticker),
+        'ohlcv': exchange.fetch_ohlcv(pair, '1d', limit=365),
+        'frames': stream
+    })
+
+
+def record_gemini(symbol):
+    genai.configure(api_key=os.environ['GEMINI_API_KEY'])
+    model = genai.GenerativeModel(os.getenv('GEMINI_MODEL', GEMINI_MODEL))
+    price_data = get_stock_price(symbol)
+    analysis = model.generate_content(gemini_service._analysis_prompt(
+        symbol, price_data, 'short_term', 'en', indicators_for(symbol, '1y'))).text
+    answer = model.generate_content(gemini_service._question_prompt(
+        symbol, price_data, analysis, QUESTION, 'en')).text
+    news = model.generate_content(_news_prompt(symbol, price_data, 'en')).text
+    _write('gemini', {'symbol': symbol, 'analysis': analysis, 'answer': answer, 'news': news})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stock', default='AAPL', help='Yahoo symbol recorded')
+    parser.add_argument('--crypto', default='BTC/USDT', help='Binance pair recorded')
+    parser.add_argument('--frames', type=int, default=60, help='ticker stream frames recorded (one per second)')
+    parser.add_argument('--skip-gemini', action='store_true', help='keep the recorded Gemini responses')
+    args = parser.parse_args()
+
+    record_yahoo(args.stock)
+    record_binance(args.crypto, args.frames)
+    if not args.skip_gemini:
+        record_gemini(args.stock)
+
+
+if __name__ == '__main__':
+    main()
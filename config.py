@@ -6,6 +6,149 @@ load_dotenv()
 # Gemini Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+# Seconds a Gemini request may take before the client gives up on it (the analysis
+# pipeline passes its stage timeouts instead)
+GEMINI_REQUEST_TIMEOUT = float(os.getenv('GEMINI_REQUEST_TIMEOUT', '120'))
+
+# Quote fetching
+# Maximum number of concurrent Yahoo requests used by batch quote lookups
+QUOTE_BATCH_WORKERS = int(os.getenv('QUOTE_BATCH_WORKERS', '8'))
+# Use the lightweight chart endpoint for stock quotes and only fall back to the full .info scrape
+STOCK_FAST_QUOTE = os.getenv('STOCK_FAST_QUOTE', 'true').lower() in ('1', 'true', 'yes')
+# Seconds a share count learned from .info is reused to derive market cap
+STOCK_SHARES_TTL = float(os.getenv('STOCK_SHARES_TTL', '86400'))
+
+# Shared keep-alive HTTP sessions of the Yahoo and Binance clients: idle connections
+# kept per host (size it to the busiest thread pool) and number of hosts kept
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '32'))
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', '8'))
+# Binance client: request timeout in seconds and minimum milliseconds between requests
+# of unit weight (ccxt's throttle; heavier endpoints wait proportionally longer)
+EXCHANGE_TIMEOUT = float(os.getenv('EXCHANGE_TIMEOUT', '10'))
+EXCHANGE_RATE_LIMIT_MS = float(os.getenv('EXCHANGE_RATE_LIMIT_MS', '50'))
+# Upstream protection (services/resilience.py): sustained requests per second and burst
+# size of each upstream's token bucket (a rate of 0 disables limiting), seconds a call may
+# wait for a token, consecutive failures (429, 5xx, timeouts) that open the upstream's
+# circuit, and seconds it stays open before a single probe call is let through
+UPSTREAM_LIMITS = {
+    'yahoo': {'rate': float(os.getenv('YAHOO_RATE_LIMIT', '10')), 'burst': int(os.getenv('YAHOO_BURST', '20'))},
+    'binance': {'rate': float(os.getenv('BINANCE_RATE_LIMIT', '20')), 'burst': int(os.getenv('BINANCE_BURST', '40'))},
+    'gemini': {'rate': float(os.getenv('GEMINI_RATE_LIMIT', '2')), 'burst': int(os.getenv('GEMINI_BURST', '10'))}
+}
+UPSTREAM_MAX_WAIT = float(os.getenv('UPSTREAM_MAX_WAIT', '5'))
+UPSTREAM_FAILURE_THRESHOLD = int(os.getenv('UPSTREAM_FAILURE_THRESHOLD', '5'))
+UPSTREAM_RESET_TIMEOUT = float(os.getenv('UPSTREAM_RESET_TIMEOUT', '30'))
+# Binance WebSocket ticker stream (services/crypto_stream.py): whether to run it, its
+# endpoint, seconds after which a streamed ticker is stale and quotes fall back to REST,
+# seconds a pair users asked for stays subscribed, most pairs subscribed, and the first
+# and longest delay in seconds before reconnecting
+CRYPTO_STREAM = os.getenv('CRYPTO_STREAM', 'true').lower() in ('1', 'true', 'yes')
+CRYPTO_STREAM_URL = os.getenv('CRYPTO_STREAM_URL', 'wss://stream.binance.com:9443/ws')
+CRYPTO_STREAM_MAX_AGE = float(os.getenv('CRYPTO_STREAM_MAX_AGE', '10'))
+CRYPTO_STREAM_RECENT_TTL = float(os.getenv('CRYPTO_STREAM_RECENT_TTL', '900'))
+CRYPTO_STREAM_MAX_SYMBOLS = int(os.getenv('CRYPTO_STREAM_MAX_SYMBOLS', '200'))
+CRYPTO_STREAM_BACKOFF_MIN = float(os.getenv('CRYPTO_STREAM_BACKOFF_MIN', '1'))
+CRYPTO_STREAM_BACKOFF_MAX = float(os.getenv('CRYPTO_STREAM_BACKOFF_MAX', '60'))
+# Open the upstream connections and load exchange markets in the background at startup
+WARM_UP_CONNECTIONS = os.getenv('WARM_UP_CONNECTIONS', 'true').lower() in ('1', 'true', 'yes')
+
+# Quote cache: seconds a quote stays fresh per asset class, and maximum entries per cache
+QUOTE_CACHE_TTL_STOCK = float(os.getenv('QUOTE_CACHE_TTL_STOCK', '15'))
+QUOTE_CACHE_TTL_CRYPTO = float(os.getenv('QUOTE_CACHE_TTL_CRYPTO', '5'))
+QUOTE_CACHE_MAX_SIZE = int(os.getenv('QUOTE_CACHE_MAX_SIZE', '1024'))
+
+# Background watchlist refresh interval and stream keep-alive, in seconds
+PRICE_POLL_INTERVAL = float(os.getenv('PRICE_POLL_INTERVAL', '15'))
+PRICE_STREAM_KEEPALIVE = float(os.getenv('PRICE_STREAM_KEEPALIVE', '15'))
+# Seconds a dashboard tab request waits for quote refreshes; slower quotes are served
+# stale (last known value and its age) while the refresh finishes in the background
+PRICE_RESPONSE_BUDGET = float(os.getenv('PRICE_RESPONSE_BUDGET', '0.2'))
+
+# Symbol resolution index file, how long "symbol not found" results are remembered (seconds),
+# most mappings and most "not found" results kept (least recently used dropped first), and
+# seconds changes are collected before the file is rewritten once
+SYMBOL_INDEX_PATH = os.getenv('SYMBOL_INDEX_PATH', os.path.join('.cache', 'symbol_index.json'))
+SYMBOL_INDEX_NEGATIVE_TTL = float(os.getenv('SYMBOL_INDEX_NEGATIVE_TTL', '86400'))
+SYMBOL_INDEX_MAX_ENTRIES = int(os.getenv('SYMBOL_INDEX_MAX_ENTRIES', '10000'))
+SYMBOL_INDEX_SAVE_DELAY = float(os.getenv('SYMBOL_INDEX_SAVE_DELAY', '2'))
+
+# Local OHLCV history store: directory, seconds between incremental top-ups,
+# and seconds between full re-downloads (picks up split/dividend adjustments)
+HISTORY_STORE_DIR = os.getenv('HISTORY_STORE_DIR', os.path.join('.cache', 'history'))
+HISTORY_REFRESH_SECONDS = float(os.getenv('HISTORY_REFRESH_SECONDS', '60'))
+HISTORY_FULL_REFRESH_SECONDS = float(os.getenv('HISTORY_FULL_REFRESH_SECONDS', '86400'))
+# Pages of a crypto history backfill fetched at once (each still waits for the Binance rate limiter)
+OHLCV_BACKFILL_WORKERS = int(os.getenv('OHLCV_BACKFILL_WORKERS', '4'))
+# Live tick buffers behind the 1d charts (services/tick_buffer.py): ticks kept per streamed
+# pair (24 bytes each; 86400 holds a day of one-second stream frames) and per symbol only
+# quoted over REST (5760 holds a day of quotes refreshed every 15 seconds), rings growing
+# to that as ticks arrive; most symbols kept (the one ticked least recently is dropped
+# first), and the candle interval of 1d charts when the request does not pick one (1m, 5m or 15m)
+TICK_BUFFER_SIZE = int(os.getenv('TICK_BUFFER_SIZE', '86400'))
+TICK_BUFFER_QUOTE_SIZE = int(os.getenv('TICK_BUFFER_QUOTE_SIZE', '5760'))
+TICK_BUFFER_MAX_SYMBOLS = int(os.getenv('TICK_BUFFER_MAX_SYMBOLS', '64'))
+TICK_CANDLE_INTERVAL = os.getenv('TICK_CANDLE_INTERVAL', '5m')
+
+# Gemini response cache: directory, size bound in bytes, and relative move of the
+# price and of each other number in a prompt (e.g. 0.005 = 0.5%) within which
+# prompts are treated as identical
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', os.path.join('.cache', 'llm'))
+LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+LLM_CACHE_PRICE_TOLERANCE = float(os.getenv('LLM_CACHE_PRICE_TOLERANCE', '0.005'))
+# Seconds a cached response stays fresh, per analysis type and for questions and news
+LLM_CACHE_TTL = {
+    'daily': float(os.getenv('LLM_CACHE_TTL_DAILY', '300')),
+    'weekly': float(os.getenv('LLM_CACHE_TTL_WEEKLY', '1800')),
+    'short_term': float(os.getenv('LLM_CACHE_TTL_SHORT_TERM', '3600')),
+    'long_term': float(os.getenv('LLM_CACHE_TTL_LONG_TERM', '21600')),
+    'question': float(os.getenv('LLM_CACHE_TTL_QUESTION', '600')),
+    'news': float(os.getenv('LLM_CACHE_TTL_NEWS', '1800'))
+}
+
+# Analysis pipeline: concurrent price and indicator stage workers, workers of the
+# Gemini analysis and news stages (a pool of their own, so slow model calls cannot
+# hold the workers of the fast stages), and seconds each stage may take before the
+# report is returned without it; the Gemini stages pass theirs on as the request timeout
+ANALYSIS_PIPELINE_WORKERS = int(os.getenv('ANALYSIS_PIPELINE_WORKERS', '16'))
+ANALYSIS_LLM_WORKERS = int(os.getenv('ANALYSIS_LLM_WORKERS', '8'))
+ANALYSIS_STAGE_TIMEOUTS = {
+    'price': float(os.getenv('ANALYSIS_TIMEOUT_PRICE', '10')),
+    'indicators': float(os.getenv('ANALYSIS_TIMEOUT_INDICATORS', '8')),
+    'analysis': float(os.getenv('ANALYSIS_TIMEOUT_ANALYSIS', '90')),
+    'news': float(os.getenv('ANALYSIS_TIMEOUT_NEWS', '90'))
+}
+
+# Batch analysis (/api/analyze/batch): symbols packed into one Gemini prompt, Gemini
+# calls in flight at once, threads computing indicators, and most symbols per request
+ANALYSIS_BATCH_SIZE = int(os.getenv('ANALYSIS_BATCH_SIZE', '4'))
+ANALYSIS_BATCH_CONCURRENCY = int(os.getenv('ANALYSIS_BATCH_CONCURRENCY', '4'))
+ANALYSIS_BATCH_WORKERS = int(os.getenv('ANALYSIS_BATCH_WORKERS', '8'))
+ANALYSIS_BATCH_MAX_SYMBOLS = int(os.getenv('ANALYSIS_BATCH_MAX_SYMBOLS', '50'))
+
+# Background analysis jobs (/api/jobs): SQLite job store, jobs run at once, whether they
+# run on threads or in worker processes ('thread' or 'process'), seconds a finished job's
+# result is kept, and most finished jobs kept
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', os.path.join('.cache', 'jobs.sqlite3'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_WORKER_MODE = os.getenv('JOB_WORKER_MODE', 'thread').lower()
+JOB_RESULT_TTL = float(os.getenv('JOB_RESULT_TTL', '3600'))
+JOB_MAX_RESULTS = int(os.getenv('JOB_MAX_RESULTS', '500'))
+
+# Analysis sessions for follow-up questions: SQLite store, seconds an unused session is
+# kept, most sessions kept, and earlier questions and answers repeated in each prompt
+# (conversation memory for the model, at the cost of a longer prompt per follow-up)
+ANALYSIS_SESSION_PATH = os.getenv('ANALYSIS_SESSION_PATH', os.path.join('.cache', 'sessions.sqlite3'))
+ANALYSIS_SESSION_TTL = float(os.getenv('ANALYSIS_SESSION_TTL', '3600'))
+ANALYSIS_SESSION_MAX = int(os.getenv('ANALYSIS_SESSION_MAX', '1000'))
+ANALYSIS_SESSION_TURNS = int(os.getenv('ANALYSIS_SESSION_TURNS', '0'))
+
+# Async service layer (asgi.py): Yahoo Finance host, maximum open connections
+# per pooled HTTP session, and per-request timeout in seconds
+YAHOO_BASE_URL = os.getenv('YAHOO_BASE_URL', 'https://query2.finance.yahoo.com')
+ASYNC_HTTP_POOL_SIZE = int(os.getenv('ASYNC_HTTP_POOL_SIZE', '100'))
+ASYNC_HTTP_TIMEOUT = float(os.getenv('ASYNC_HTTP_TIMEOUT', '30'))
+# Threads serving the Flask routes behind asgi.py (each open SSE stream holds one)
+ASGI_WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', '32'))
 
 # Popular stocks and crypto symbols
 POPULAR_STOCKS = {
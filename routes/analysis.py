@@ -1,213 +1,538 @@
 """Analysis API routes"""
 from flask import Blueprint, jsonify, request
 from datetime import datetime
+import math
 import os
-from services.stock_service import get_stock_price, get_stock_history
-from services.crypto_service import get_crypto_price, get_crypto_history
-from services.gemini_service import analyze_stock, ask_question
-from services.news_service import analyze_news_with_ai
-from config import GEMINI_API_KEY, GEMINI_MODEL
+from services.market_service import resolve_price, resolve_history
+from services.analysis_pipeline import run_analysis, fetch_market_data, indicators_for
+from services.batch_analysis import analyze_batch
+from services.gemini_service import ask_question, analyze_stock_stream, ask_question_stream
+from services.analysis_sessions import analysis_sessions
+from services.resilience import UpstreamError
+from services.history_format import FORMATS, MIN_POINTS
+from services.tick_buffer import INTERVALS
+from routes.sse import sse_event, sse_response
+from config import GEMINI_API_KEY, GEMINI_MODEL, ANALYSIS_BATCH_MAX_SYMBOLS, TICK_CANDLE_INTERVAL
 
 analysis_bp = Blueprint('analysis', __name__, url_prefix='/api')
 
+ANALYSIS_TYPES = ('daily', 'weekly', 'short_term', 'long_term')
+
+
+def _error_response(e):
+    """Error response for a failed request: 503 with Retry-After when an upstream is unavailable"""
+    if isinstance(e, UpstreamError):
+        response = jsonify({'error': str(e)})
+        if e.retry_after is not None:
+            response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+        return response, 503
+    return jsonify({'error': str(e)}), 500
+
+
+def _retry_after(payload):
+    """Retry-After header value of a response payload, or None if it has no retry_after"""
+    if payload.get('retry_after') is None:
+        return None
+    return str(math.ceil(payload['retry_after']))
+
+
+def _payload_response(payload, status):
+    """Flask response of a (payload, status) pair, with Retry-After when the payload has retry_after"""
+    response = jsonify(payload)
+    if _retry_after(payload) is not None:
+        response.headers['Retry-After'] = _retry_after(payload)
+    return response, status
+
+
+def _unavailable_payload(stage, stages):
+    """503 payload of a pipeline stage an unavailable upstream refused or failed"""
+    payload = {'error': stage['error'], 'stages': stages}
+    if stage.get('retry_after') is not None:
+        payload['retry_after'] = stage['retry_after']
+    return payload
+
 
 @analysis_bp.route('/price/<symbol>', methods=['GET'])
 def get_price(symbol):
     """Get price for a specific symbol (used by analysis)"""
-    # Try as stock first
-    price_data = get_stock_price(symbol)
+    asset_type, price_data = resolve_price(symbol)
     if 'error' not in price_data:
         return jsonify({
             'symbol': symbol,
-            'type': 'stock',
-            **price_data
-        })
-    
-    # Try as crypto
-    crypto_symbol = f"{symbol}/USDT"
-    price_data = get_crypto_price(crypto_symbol)
-    if 'error' not in price_data:
-        return jsonify({
-            'symbol': symbol,
-            'type': 'crypto',
+            'type': asset_type,
             **price_data
         })
     
     return jsonify({'error': 'Symbol not found'}), 404
 
 
-@analysis_bp.route('/analyze', methods=['POST'])
-def analyze_stock_route():
-    """Analyze a stock using Gemini AI"""
-    data = request.json
+def _parse_analysis_request(data):
+    """Validate an analysis request body (shared with the async routes in asgi.py)
+    
+    Returns:
+        Tuple of (analysis arguments, None), or (None, (error message, status))
+    """
     symbol = data.get('symbol', '').upper()
     analysis_type = data.get('analysis_type', 'short_term')
     language = data.get('language', 'tr')  # Default to Turkish
     
     # Validate analysis type
-    valid_types = ['daily', 'weekly', 'short_term', 'long_term']
-    if analysis_type not in valid_types:
+    if analysis_type not in ANALYSIS_TYPES:
         analysis_type = 'short_term'
     
     if not symbol:
-        return jsonify({'error': 'Symbol is required'}), 400
+        return None, ('Symbol is required', 400)
     
     # Get current API key and model from env
     api_key = os.getenv('GEMINI_API_KEY', '')
     model_name = os.getenv('GEMINI_MODEL', GEMINI_MODEL)
     
     if not api_key:
-        return jsonify({'error': 'Gemini API key not configured'}), 400
+        return None, ('Gemini API key not configured', 400)
+    
+    return {
+        'symbol': symbol,
+        'analysis_type': analysis_type,
+        'language': language,
+        'model_name': model_name
+    }, None
+
+
+def _prepare_analysis(data):
+    """Validate a streamed analysis request and gather its price data and indicators
+    
+    Returns:
+        Tuple of (analysis arguments, None), or (None, error response)
+    """
+    args, error = _parse_analysis_request(data)
+    if error:
+        return None, (jsonify({'error': error[0]}), error[1])
+    
+    # Price (stock or crypto, incl. warrants and Borsa Istanbul) and indicators, concurrently
+    market = fetch_market_data(args['symbol'], args['analysis_type'])
+    if market['error']:
+        stage = market['stages'].get('price', {})
+        if stage.get('status') == 'unavailable':
+            return None, _payload_response(_unavailable_payload(stage, market['stages']), 503)
+        return None, (jsonify({'error': market['error']}), 404)
+    
+    return {
+        **args,
+        'price_data': market['price_data'],
+        'indicators': market['indicators']
+    }, None
+
+
+@analysis_bp.route('/analyze', methods=['POST'])
+def analyze_stock_route():
+    """Analyze a stock using Gemini AI
+    
+    Price, indicators, the analysis and (with include_news) the news
+    analysis run as a concurrent pipeline; 'stages' reports the wall time
+    of each. A failed or timed-out news stage leaves news_analysis empty
+    instead of failing the request.
+    """
+    data = request.json
+    args, error = _parse_analysis_request(data)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+    include_news = bool(data.get('include_news', False))
     
     try:
-        # Get stock data (includes warrants and Borsa Istanbul stocks)
-        price_data = get_stock_price(symbol)
+        return _payload_response(*_run_report(**args, include_news=include_news))
         
-        # Only try crypto if stock lookup failed and symbol doesn't look like a warrant/stock
-        if 'error' in price_data and not ('.' in symbol or symbol.endswith('.V')):
-            # Try crypto
-            crypto_symbol = f"{symbol}/USDT"
-            crypto_data = get_crypto_price(crypto_symbol)
-            if 'error' not in crypto_data:
-                price_data = crypto_data
-        
-        # Validate price data before analysis
-        if 'error' in price_data:
-            return jsonify({'error': price_data['error']}), 404
+    except Exception as e:
+        return _error_response(e)
+
+
+def _report_response(report, language):
+    """Response payload and status for an /analyze report (shared with asgi.py)
+    
+    A price or analysis stage refused by an unavailable upstream answers
+    503 with the stage's retry_after (sent as Retry-After); a price that
+    does not exist answers 404.
+    """
+    # Validate price data before analysis
+    if report['error']:
+        stage = report['stages'].get('price', {})
+        if stage.get('status') == 'unavailable':
+            return _unavailable_payload(stage, report['stages']), 503
+        return {'error': report['error'], 'stages': report['stages']}, 404
+    
+    if report['analysis'] is None and not report.get('news_analysis'):
+        stage = report['stages'].get('analysis', {})
+        if stage.get('status') == 'unavailable':
+            return _unavailable_payload(stage, report['stages']), 503
+        return {'error': stage.get('error', 'Analysis failed'), 'stages': report['stages']}, 500
+    
+    del report['error']
+    if report['analysis'] is not None:
+        # Follow-up questions send this id instead of the report
+        report['session_id'] = analysis_sessions.create(report['symbol'], report['price_data'], report['analysis'],
+                                                        language, report['analysis_type'])
+    report['timestamp'] = datetime.now().isoformat()
+    return report, 200
+
+
+def _run_report(include_news=False, **args):
+    """Run an /analyze request (also run as a background job, see routes/jobs.py)"""
+    return _report_response(run_analysis(**args, include_news=include_news), args['language'])
+
+
+def _stream_text(meta, chunks, on_done=None):
+    """Server-Sent Events for a streamed Gemini response
+    
+    Sends a 'meta' event, one 'chunk' event per piece of text as it
+    arrives, then 'done', or 'error' if generation fails midway. on_done
+    gets the full text and returns extra fields for the 'done' event.
+    """
+    yield sse_event('meta', meta)
+    parts = []
+    try:
+        for text in chunks:
+            parts.append(text)
+            yield sse_event('chunk', {'text': text})
+    except Exception as e:
+        yield sse_event('error', {'error': str(e)})
+        return
+    extra = on_done(''.join(parts)) if on_done else {}
+    yield sse_event('done', {**extra, 'timestamp': datetime.now().isoformat()})
+
+
+@analysis_bp.route('/analyze/stream', methods=['POST'])
+def analyze_stock_stream_route():
+    """Analyze a stock using Gemini AI, streaming the text as it is generated"""
+    try:
+        args, error = _prepare_analysis(request.json)
+        if error:
+            return error
         
-        # Check if price is valid (not 0 or None)
-        if not price_data.get('price') or price_data.get('price') == 0:
-            return jsonify({'error': 'Bu sembol için geçerli fiyat verisi bulunamadı. Lütfen farklı bir sembol deneyin.'}), 404
+        cached, chunks = analyze_stock_stream(**args)
         
-        # Analyze with Gemini
-        analysis = analyze_stock(symbol, price_data, analysis_type, model_name, language)
+        def start_session(analysis):
+            return {'session_id': analysis_sessions.create(args['symbol'], args['price_data'], analysis,
+                                                           args['language'], args['analysis_type'])}
         
-        return jsonify({
-            'symbol': symbol,
-            'price_data': price_data,
-            'analysis': analysis,
-            'analysis_type': analysis_type,
-            'timestamp': datetime.now().isoformat()
-        })
+        return sse_response(_stream_text({
+            'symbol': args['symbol'],
+            'price_data': args['price_data'],
+            'analysis_type': args['analysis_type'],
+            'indicators': args['indicators'],
+            'cached': cached
+        }, chunks, start_session))
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _error_response(e)
 
 
-@analysis_bp.route('/ask-question', methods=['POST'])
-def ask_question_route():
-    """Ask a follow-up question about the analysis"""
-    data = request.json
-    symbol = data.get('symbol', '').upper()
+def _parse_batch_request(data):
+    """Validate a batch analysis request
+    
+    Returns:
+        Tuple of (batch arguments, None), or (None, (error message, status))
+    """
+    symbols = data.get('symbols') or []
+    if isinstance(symbols, str):
+        symbols = symbols.split(',')
+    symbols = list(dict.fromkeys(str(s).strip().upper() for s in symbols if str(s).strip()))
+    
+    analysis_types = data.get('analysis_types') or [data.get('analysis_type', 'short_term')]
+    analysis_types = [t for t in dict.fromkeys(analysis_types) if t in ANALYSIS_TYPES] or ['short_term']
+    
+    if not symbols:
+        return None, ('Symbols are required', 400)
+    if len(symbols) > ANALYSIS_BATCH_MAX_SYMBOLS:
+        return None, (f'At most {ANALYSIS_BATCH_MAX_SYMBOLS} symbols per batch', 400)
+    
+    # Get current API key and model from env
+    api_key = os.getenv('GEMINI_API_KEY', '')
+    model_name = os.getenv('GEMINI_MODEL', GEMINI_MODEL)
+    
+    if not api_key:
+        return None, ('Gemini API key not configured', 400)
+    
+    return {
+        'symbols': symbols,
+        'analysis_types': analysis_types,
+        'language': data.get('language', 'tr'),
+        'model_name': model_name
+    }, None
+
+
+@analysis_bp.route('/analyze/batch', methods=['POST'])
+def analyze_batch_route():
+    """Analyze many symbols at once, streaming each result as it finishes
+    
+    Takes symbols (a list or comma-separated string) and analysis_types
+    (or a single analysis_type). Prices are resolved in bulk and several
+    symbols share each Gemini call. Sends a 'meta' event, one 'result'
+    event per symbol and analysis type, then 'done' with the symbol
+    throughput and the number of Gemini calls used.
+    """
+    args, error = _parse_batch_request(request.json or {})
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+    
+    def generate():
+        yield sse_event('meta', {'symbols': args['symbols'], 'analysis_types': args['analysis_types']})
+        try:
+            for event, data in analyze_batch(**args):
+                if event == 'summary':
+                    yield sse_event('done', {**data, 'timestamp': datetime.now().isoformat()})
+                    continue
+                if 'analysis' in data:
+                    data['session_id'] = analysis_sessions.create(data['symbol'], data['price_data'],
+                                                                  data['analysis'], args['language'],
+                                                                  data['analysis_type'])
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+    
+    return sse_response(generate())
+
+
+def _parse_question_request(data):
+    """Validate a follow-up question request (shared with the async routes in asgi.py)
+    
+    A request with a session_id takes the symbol, price data, report and
+    earlier questions from the session; otherwise the client sends the
+    symbol, analysis_text and price_data itself.
+    
+    Returns:
+        Tuple of (question arguments, None), or (None, (error message, status))
+    """
+    session_id = data.get('session_id')
+    session = {}
+    if session_id:
+        session = analysis_sessions.get(session_id)
+        if session is None:
+            return None, ('Analysis session not found or expired', 404)
+    
+    symbol = data.get('symbol', session.get('symbol', '')).upper()
     question = data.get('question', '').strip()
-    analysis_text = data.get('analysis_text', '')
-    price_data = data.get('price_data', {})
-    language = data.get('language', 'tr')  # Default to Turkish
+    analysis_text = session.get('analysis') or data.get('analysis_text', '')
+    price_data = session.get('price_data') or data.get('price_data', {})
+    language = data.get('language', session.get('language', 'tr'))  # Default to Turkish
     
     if not symbol or not question:
-        return jsonify({'error': 'Symbol and question are required'}), 400
+        return None, ('Symbol and question are required', 400)
     
     if not analysis_text:
-        return jsonify({'error': 'Analysis text is required'}), 400
+        return None, ('Analysis text is required', 400)
     
     # Get current API key and model from env
     api_key = os.getenv('GEMINI_API_KEY', '')
     model_name = os.getenv('GEMINI_MODEL', GEMINI_MODEL)
     
     if not api_key:
-        return jsonify({'error': 'Gemini API key not configured'}), 400
+        return None, ('Gemini API key not configured', 400)
+    
+    return {
+        'symbol': symbol,
+        'price_data': price_data,
+        'analysis_text': analysis_text,
+        'question': question,
+        'model_name': model_name,
+        'language': language,
+        'history': session.get('turns', []),
+        'session_id': session_id
+    }, None
+
+
+def _prepare_question(data):
+    """Validate a follow-up question request
+    
+    Returns:
+        Tuple of (question arguments, None), or (None, error response)
+    """
+    args, error = _parse_question_request(data)
+    if error:
+        return None, (jsonify({'error': error[0]}), error[1])
+    return args, None
+
+
+@analysis_bp.route('/ask-question', methods=['POST'])
+def ask_question_route():
+    """Ask a follow-up question about the analysis"""
+    args, error = _prepare_question(request.json)
+    if error:
+        return error
     
     try:
         # Ask question using Gemini
-        answer = ask_question(symbol, price_data, analysis_text, question, model_name, language)
+        session_id = args.pop('session_id')
+        result = ask_question(**args)
+        if session_id:
+            analysis_sessions.add_turn(session_id, args['question'], result['answer'])
         
         return jsonify({
-            'symbol': symbol,
-            'question': question,
-            'answer': answer,
+            'symbol': args['symbol'],
+            'question': args['question'],
+            'answer': result['answer'],
+            'cached': result['cached'],
+            'session_id': session_id,
             'timestamp': datetime.now().isoformat()
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _error_response(e)
 
 
-@analysis_bp.route('/analyze-news', methods=['POST'])
-def analyze_news_route():
-    """Use Gemini AI to research and analyze news for a stock symbol"""
-    data = request.json
+@analysis_bp.route('/ask-question/stream', methods=['POST'])
+def ask_question_stream_route():
+    """Ask a follow-up question, streaming the answer as it is generated"""
+    args, error = _prepare_question(request.json)
+    if error:
+        return error
+    
+    try:
+        session_id = args.pop('session_id')
+        cached, chunks = ask_question_stream(**args)
+        
+        def record_turn(answer):
+            if session_id:
+                analysis_sessions.add_turn(session_id, args['question'], answer)
+            return {'session_id': session_id}
+        
+        return sse_response(_stream_text({
+            'symbol': args['symbol'],
+            'question': args['question'],
+            'cached': cached
+        }, chunks, record_turn))
+        
+    except Exception as e:
+        return _error_response(e)
+
+
+def _parse_news_request(data):
+    """Validate a news analysis request
+    
+    Returns:
+        Tuple of (news arguments, None), or (None, (error message, status))
+    """
     symbol = data.get('symbol', '').upper()
     language = data.get('language', 'tr')  # Default to Turkish
     
     if not symbol:
-        return jsonify({'error': 'Symbol is required'}), 400
+        return None, ('Symbol is required', 400)
     
     # Get current API key and model from env
     api_key = os.getenv('GEMINI_API_KEY', '')
     model_name = os.getenv('GEMINI_MODEL', GEMINI_MODEL)
     
     if not api_key:
-        return jsonify({'error': 'Gemini API key not configured'}), 400
+        return None, ('Gemini API key not configured', 400)
+    
+    return {
+        'symbol': symbol,
+        'language': language,
+        'model_name': model_name
+    }, None
+
+
+def _run_news_analysis(symbol, language, model_name):
+    """Run an /analyze-news request (also run as a background job, see routes/jobs.py)"""
+    # Price data is optional context, so a slow or failed lookup only drops it
+    report = run_analysis(symbol, language=language, model_name=model_name,
+                          include_analysis=False, include_news=True)
+    
+    if report['news_analysis'] is None:
+        return {'error': report['stages']['news'].get('error', 'News analysis failed')}, 500
+    
+    return {
+        'symbol': symbol,
+        'news_analysis': report['news_analysis'],
+        'cached': report['news_cached'],
+        'stages': report['stages'],
+        'timestamp': datetime.now().isoformat()
+    }, 200
+
+
+@analysis_bp.route('/analyze-news', methods=['POST'])
+def analyze_news_route():
+    """Use Gemini AI to research and analyze news for a stock symbol"""
+    args, error = _parse_news_request(request.json)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
     
     try:
-        # Get price data for context (optional but helpful)
-        price_data = None
-        try:
-            stock_data = get_stock_price(symbol)
-            if 'error' not in stock_data:
-                price_data = stock_data
-            else:
-                # Try as crypto
-                crypto_symbol = f"{symbol}/USDT"
-                crypto_data = get_crypto_price(crypto_symbol)
-                if 'error' not in crypto_data:
-                    price_data = crypto_data
-        except:
-            pass  # Price data is optional
-        
-        # Use Gemini AI to research and analyze news
-        analysis = analyze_news_with_ai(symbol, price_data, language, model_name)
-        
-        if 'error' in analysis:
-            return jsonify({'error': analysis['error']}), 500
-        
-        return jsonify({
-            'symbol': symbol,
-            'news_analysis': analysis['analysis'],
-            'timestamp': datetime.now().isoformat()
-        })
+        payload, status = _run_news_analysis(**args)
+        return jsonify(payload), status
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _error_response(e)
+
+
+def _parse_history_request(symbol, args):
+    """Validate a history request's query parameters (shared with the async routes in asgi.py)
+    
+    Returns:
+        Tuple of (resolve_history arguments, None), or (None, (error message, status))
+    """
+    interval = args.get('interval', TICK_CANDLE_INTERVAL)  # Candles built from live ticks (1d only)
+    fmt = args.get('format', 'json')  # 'columnar' packs the candles as typed arrays
+    max_points = args.get('max_points')  # Chart width in points; longer periods are downsampled
+    if interval not in INTERVALS:
+        return None, (f'Unknown interval: {interval}', 400)
+    if fmt not in FORMATS:
+        return None, (f'Unknown format: {fmt}', 400)
+    if max_points is not None:
+        try:
+            max_points = int(max_points)
+        except ValueError:
+            max_points = 0
+        if max_points < MIN_POINTS:
+            return None, (f'max_points must be an integer of at least {MIN_POINTS}', 400)
+    
+    return {
+        'symbol': symbol.upper(),
+        'period': args.get('period', '1mo'),  # Default to 1 month
+        'interval': interval,
+        'fmt': fmt,
+        'max_points': max_points
+    }, None
 
 
 @analysis_bp.route('/history/<symbol>', methods=['GET'])
 def get_history(symbol):
     """Get historical price data for charting"""
-    symbol = symbol.upper()
-    period = request.args.get('period', '1mo')  # Default to 1 month
+    args, error = _parse_history_request(symbol, request.args)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
     
     try:
-        # Try as stock first
-        history = get_stock_history(symbol, period)
-        
-        # Only try crypto if stock lookup failed and symbol doesn't look like a warrant/stock
-        if 'error' in history and not ('.' in symbol or symbol.endswith('.V')):
-            # Try crypto
-            crypto_symbol = f"{symbol}/USDT"
-            crypto_history = get_crypto_history(crypto_symbol, period)
-            if 'error' not in crypto_history:
-                history = crypto_history
+        # Stock or crypto, whichever serves this symbol
+        history = resolve_history(**args)
         
         if 'error' in history:
             return jsonify({'error': history['error']}), 404
         
         return jsonify({
-            'symbol': symbol,
-            'period': period,
+            'symbol': args['symbol'],
+            'period': args['period'],
             **history
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _error_response(e)
+
 
+@analysis_bp.route('/indicators/<symbol>', methods=['GET'])
+def get_indicators(symbol):
+    """Get technical indicators computed from historical data"""
+    symbol = symbol.upper()
+    period = request.args.get('period', '1y')  # Default to 1 year
+    
+    try:
+        indicators = indicators_for(symbol, period)
+        
+        if indicators is None:
+            return jsonify({'error': f'No historical data available for symbol: {symbol}'}), 404
+        
+        return jsonify({
+            'symbol': symbol,
+            **indicators
+        })
+        
+    except Exception as e:
+        return _error_response(e)
@@ -0,0 +1,89 @@
+"""Background analysis job routes"""
+from flask import Blueprint, jsonify, request, url_for
+from services.job_queue import job_queue, FINISHED
+from routes.analysis import _parse_analysis_request, _parse_news_request, _run_report, _run_news_analysis
+from routes.sse import sse_event, sse_response
+from config import PRICE_STREAM_KEEPALIVE
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+# Job type -> (request validator, job function); the functions are module level so
+# worker processes can import them
+JOB_TYPES = {
+    'analyze': (_parse_analysis_request, _run_report),
+    'analyze_news': (_parse_news_request, _run_news_analysis)
+}
+
+for _kind, (_, _handler) in JOB_TYPES.items():
+    job_queue.register(_kind, _handler)
+
+
+@jobs_bp.route('', methods=['POST'])
+def submit_job():
+    """Queue an /analyze or /analyze-news request and answer with its job id at once
+
+    Takes the body of the matching route plus 'type' ('analyze', the
+    default, or 'analyze_news'). An identical job that is still queued or
+    running is returned instead of starting another one.
+    """
+    data = request.json or {}
+    kind = data.get('type', 'analyze')
+    if kind not in JOB_TYPES:
+        return jsonify({'error': f'Unknown job type: {kind}'}), 400
+
+    parse, _ = JOB_TYPES[kind]
+    params, error = parse(data)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+    if kind == 'analyze':
+        params['include_news'] = bool(data.get('include_news', False))
+
+    job_id, deduplicated = job_queue.submit(kind, params)
+    status_url = url_for('jobs.get_job', job_id=job_id)
+    response = jsonify({
+        'job_id': job_id,
+        'deduplicated': deduplicated,
+        'status_url': status_url,
+        'events_url': url_for('jobs.stream_job', job_id=job_id)
+    })
+    response.headers['Location'] = status_url
+    return response, 202
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a job's status, with 'result' (the route's response) once done or 'error' once failed"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@jobs_bp.route('/<job_id>/events', methods=['GET'])
+def stream_job(job_id):
+    """Stream a job's progress as Server-Sent Events
+
+    Sends a 'status' event whenever the job changes status, then 'done'
+    with the finished job (its status tells whether it failed).
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        current, status = job, None
+        while current is not None and current['status'] not in FINISHED:
+            if current['status'] != status:
+                status = current['status']
+                yield sse_event('status', current)
+            else:
+                # Comment line keeps proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+            current = job_queue.wait(job_id, timeout=PRICE_STREAM_KEEPALIVE)
+
+        if current is None:
+            yield sse_event('error', {'error': 'Job not found'})
+        else:
+            yield sse_event('done', current)
+
+    return sse_response(generate())
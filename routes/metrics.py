@@ -0,0 +1,66 @@
+"""Prometheus metrics endpoint and per-route request timing"""
+import time
+from flask import Blueprint, Response, g, request
+from services.metrics import registry, http_request_seconds
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.llm_cache import llm_cache
+from services.resilience import upstream_stats, CircuitBreaker
+from services.tick_buffer import tick_buffer
+
+metrics_bp = Blueprint('metrics', __name__)
+
+_CIRCUIT_STATES = (CircuitBreaker.CLOSED, CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN)
+
+
+@metrics_bp.before_app_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+@metrics_bp.after_app_request
+def _observe_request(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # The route pattern, not the path, so /api/price/AAPL and /api/price/MSFT share a series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_seconds.observe(time.perf_counter() - start, request.method, route, str(response.status_code))
+    return response
+
+
+@registry.collector
+def _cache_metrics():
+    caches = {'stock_quotes': stock_quotes.stats(), 'crypto_quotes': crypto_quotes.stats(), 'llm': llm_cache.stats()}
+    for kind, help_text in (('hits', 'Lookups answered from the cache'),
+                            ('misses', 'Lookups that went to the upstream'),
+                            ('coalesced', 'Lookups that joined an identical lookup in flight')):
+        yield (f'cache_{kind}_total', 'counter', help_text,
+               [({'cache': name}, stats[kind]) for name, stats in caches.items()])
+    yield ('cache_hit_ratio', 'gauge', 'Share of lookups answered from the cache since startup',
+           [({'cache': name}, stats['hit_ratio']) for name, stats in caches.items()])
+
+
+@registry.collector
+def _upstream_metrics():
+    upstreams = upstream_stats()
+    yield ('upstream_circuit_state', 'gauge', 'Circuit breaker state of an upstream (1 for the current state)',
+           [({'upstream': name, 'state': state}, int(stats['state'] == state))
+            for name, stats in upstreams.items() for state in _CIRCUIT_STATES])
+    yield ('upstream_circuit_opened_total', 'counter', 'Times the circuit breaker of an upstream opened',
+           [({'upstream': name}, stats['opened']) for name, stats in upstreams.items()])
+    yield ('upstream_refused_total', 'counter', 'Calls refused before reaching an upstream, by reason',
+           [({'upstream': name, 'reason': reason}, stats[reason])
+            for name, stats in upstreams.items() for reason in ('rejected', 'rate_limited')])
+
+
+@registry.collector
+def _tick_metrics():
+    stats = tick_buffer.stats()
+    yield ('tick_buffer_symbols', 'gauge', 'Symbols with a live tick ring', [({}, stats['symbols'])])
+    yield ('tick_buffer_bytes', 'gauge', 'Memory held by the live tick rings', [({}, stats['bytes'])])
+    yield ('tick_buffer_ticks_total', 'counter', 'Live quote ticks recorded', [({}, stats['ticks'])])
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """All metrics in the Prometheus text format"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
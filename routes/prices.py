@@ -1,82 +1,134 @@
 """Price API routes"""
 from flask import Blueprint, jsonify
-from services.stock_service import get_stock_price
-from services.crypto_service import get_crypto_price
-from config import POPULAR_STOCKS, POPULAR_CRYPTO, BORSA_ISTANBUL
+from routes.sse import sse_event, sse_response
+from services.market_service import resolve_price
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.llm_cache import llm_cache
+from services.resilience import upstream_stats
+from services import stock_service, crypto_service
+from services.async_market import async_market
+from services.crypto_stream import ticker_stream
+from services.stock_service import quote_stats
+from services.tick_buffer import tick_buffer
+from services.ohlcv_backfill import backfills
+from services.watchlist_service import get_watchlist_prices
+from services.price_poller import price_poller
+from config import PRICE_STREAM_KEEPALIVE, PRICE_RESPONSE_BUDGET
 
 prices_bp = Blueprint('prices', __name__, url_prefix='/api/prices')
 
 
+def _watchlist_response(watchlist):
+    """Serve a watchlist within the response budget
+    
+    The background poller keeps the quote cache warm; quotes it has not
+    refreshed are revalidated behind the response and served stale meanwhile.
+    """
+    price_poller.start()
+    return jsonify(get_watchlist_prices(watchlist, timeout=PRICE_RESPONSE_BUDGET))
+
+
 @prices_bp.route('/popular', methods=['GET'])
 def get_popular_prices():
     """Get prices for popular stocks"""
-    results = {}
-    for symbol, name in POPULAR_STOCKS.items():
-        price_data = get_stock_price(symbol)
-        # Only include if no error and price is valid
-        if 'error' not in price_data and price_data.get('price') and price_data.get('price') != 0:
-            results[symbol] = {
-                'name': name,
-                'symbol': symbol,
-                **price_data
-            }
-    return jsonify(results)
+    return _watchlist_response('popular')
 
 
 @prices_bp.route('/crypto', methods=['GET'])
 def get_crypto_prices():
     """Get prices for popular cryptocurrencies"""
-    results = {}
-    for symbol, name in POPULAR_CRYPTO.items():
-        price_data = get_crypto_price(symbol)
-        # Only include if no error and price is valid
-        if 'error' not in price_data and price_data.get('price') and price_data.get('price') != 0:
-            results[symbol] = {
-                'name': name,
-                'symbol': symbol.replace('/USDT', ''),
-                **price_data
-            }
-    return jsonify(results)
+    return _watchlist_response('crypto')
 
 
 @prices_bp.route('/borsa-istanbul', methods=['GET'])
 def get_borsa_istanbul():
     """Get prices for Borsa Istanbul stocks"""
-    results = {}
-    for symbol, name in BORSA_ISTANBUL.items():
-        price_data = get_stock_price(symbol)
-        # Only include if no error and price is valid
-        if 'error' not in price_data and price_data.get('price') and price_data.get('price') != 0:
-            results[symbol] = {
-                'name': name,
-                'symbol': symbol,
-                **price_data
-            }
-    return jsonify(results)
+    return _watchlist_response('borsa')
+
+
+@prices_bp.route('/stream', methods=['GET'])
+def stream_prices():
+    """Stream watchlist prices as Server-Sent Events
+    
+    Sends a 'snapshot' event with every known price on connect, then
+    'update' events containing only the quotes that changed.
+    """
+    price_poller.start()
+    subscription = price_poller.subscribe()
+    
+    def generate():
+        try:
+            yield sse_event('snapshot', price_poller.snapshot())
+            while True:
+                message = subscription.get(timeout=PRICE_STREAM_KEEPALIVE)
+                if message is None:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ': keep-alive\n\n'
+                    continue
+                event, data = message
+                yield sse_event(event, data)
+        finally:
+            price_poller.unsubscribe(subscription)
+    
+    return sse_response(generate())
+
+
+@prices_bp.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Get hit, miss and coalesced counters of the quote and Gemini response caches"""
+    return jsonify({
+        'stock': stock_quotes.stats(),
+        'crypto': crypto_quotes.stats(),
+        'llm': llm_cache.stats()
+    })
+
+
+@prices_bp.route('/quote-stats', methods=['GET'])
+def get_quote_stats():
+    """Get latency and payload size of each stock quote path, per field"""
+    return jsonify(quote_stats.snapshot())
+
+
+@prices_bp.route('/tick-stats', methods=['GET'])
+def get_tick_stats():
+    """Get the ticks buffered for the 1d charts and the memory they hold, per symbol and in total"""
+    return jsonify(tick_buffer.stats())
+
+
+@prices_bp.route('/backfill-stats', methods=['GET'])
+def get_backfill_stats():
+    """Get the progress of crypto history backfills in flight and totals of finished ones"""
+    return jsonify(backfills.stats())
+
+
+@prices_bp.route('/connection-stats', methods=['GET'])
+def get_connection_stats():
+    """Get requests sent and connections opened per upstream session (reuse avoids handshakes)"""
+    return jsonify({
+        'yahoo': stock_service.connection_stats(),
+        'binance': crypto_service.connection_stats(),
+        'async': async_market.connection_stats(),
+        'binance_stream': ticker_stream.stats()
+    })
+
+
+@prices_bp.route('/upstream-stats', methods=['GET'])
+def get_upstream_stats():
+    """Get circuit breaker state and call, failure and rejection counters per upstream"""
+    return jsonify(upstream_stats())
 
 
 @prices_bp.route('/<symbol>', methods=['GET'])
 def get_price(symbol):
     """Get price for a specific symbol"""
-    # Try as stock first (includes warrants and Borsa Istanbul stocks)
-    price_data = get_stock_price(symbol)
+    # Stock first (includes warrants and Borsa Istanbul stocks), then crypto
+    asset_type, price_data = resolve_price(symbol)
     if 'error' not in price_data and price_data.get('price') and price_data.get('price') != 0:
         return jsonify({
             'symbol': symbol,
-            'type': 'stock',
+            'type': asset_type,
             **price_data
         })
     
-    # Only try crypto if stock lookup failed and symbol doesn't look like a warrant/stock
-    if not ('.' in symbol or symbol.endswith('.V')):
-        crypto_symbol = f"{symbol}/USDT"
-        crypto_data = get_crypto_price(crypto_symbol)
-        if 'error' not in crypto_data and crypto_data.get('price') and crypto_data.get('price') != 0:
-            return jsonify({
-                'symbol': symbol,
-                'type': 'crypto',
-                **crypto_data
-            })
-    
     return jsonify({'error': 'Bu sembol için geçerli fiyat verisi bulunamadı'}), 404
 
@@ -1,10 +1,15 @@
 """Settings API routes"""
 from flask import Blueprint, jsonify, request
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from services.settings_service import get_settings, update_settings
 
 settings_bp = Blueprint('settings', __name__, url_prefix='/api/settings')
 
+# Gemini rejects a bad key as invalid argument ("API key not valid"), unauthenticated or permission denied
+_INVALID_KEY_ERRORS = (google_exceptions.InvalidArgument, google_exceptions.Unauthenticated,
+                       google_exceptions.PermissionDenied)
+
 
 @settings_bp.route('', methods=['GET'])
 def get_settings_route():
@@ -70,21 +75,18 @@ def test_api_key_route():
             'test_response': response.text.strip() if hasattr(response, 'text') else 'OK'
         })
         
+    except google_exceptions.TooManyRequests:
+        return jsonify({
+            'error': 'API key quota exceeded. Please check your usage limits.'
+        }), 429
+    except _INVALID_KEY_ERRORS:
+        return jsonify({
+            'error': 'Invalid API key. Please check your API key.'
+        }), 401
     except Exception as e:
-        error_msg = str(e)
-        # Check for specific error types
-        if 'api key' in error_msg.lower() or 'authentication' in error_msg.lower() or 'invalid' in error_msg.lower():
-            return jsonify({
-                'error': 'Invalid API key. Please check your API key.'
-            }), 401
-        elif 'quota' in error_msg.lower() or 'limit' in error_msg.lower():
-            return jsonify({
-                'error': 'API key quota exceeded. Please check your usage limits.'
-            }), 429
-        else:
-            return jsonify({
-                'error': f'Error testing API key: {error_msg}'
-            }), 500
+        return jsonify({
+            'error': f'Error testing API key: {str(e)}'
+        }), 500
 
 
 @settings_bp.route('/test-model', methods=['POST'])
@@ -121,19 +123,20 @@ def test_model_route():
             'test_response': response.text.strip() if hasattr(response, 'text') else 'OK'
         })
         
+    except google_exceptions.NotFound:
+        return jsonify({
+            'error': f'Model "{model}" not found. Please check the model name.'
+        }), 404
+    except google_exceptions.TooManyRequests:
+        return jsonify({
+            'error': 'API key quota exceeded. Please check your usage limits.'
+        }), 429
+    except _INVALID_KEY_ERRORS:
+        return jsonify({
+            'error': 'Invalid API key. Please check your API key.'
+        }), 401
     except Exception as e:
-        error_msg = str(e)
-        # Check for specific error types
-        if 'not found' in error_msg.lower() or 'does not exist' in error_msg.lower():
-            return jsonify({
-                'error': f'Model "{model}" not found. Please check the model name.'
-            }), 404
-        elif 'api key' in error_msg.lower() or 'authentication' in error_msg.lower():
-            return jsonify({
-                'error': 'Invalid API key. Please check your API key.'
-            }), 401
-        else:
-            return jsonify({
-                'error': f'Error testing model: {error_msg}'
-            }), 500
+        return jsonify({
+            'error': f'Error testing model: {str(e)}'
+        }), 500
 
@@ -0,0 +1,16 @@
+"""Server-Sent Events helpers shared by the streaming routes"""
+import json
+from flask import Response
+
+
+def sse_event(event, data):
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    """Stream an iterable of formatted events without proxy buffering"""
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,315 @@
+"""Concurrent analysis pipeline: price, indicators, Gemini analysis and news
+
+Independent stages run at the same time, so a report takes about as long
+as its slowest chain of stages instead of the sum of all of them:
+
+    price ──┬── news
+            └──────────┬── analysis
+    indicators ────────┘
+
+Every stage has a timeout. A stage that fails or runs out of time is
+reported in the stage timings and left out of the report instead of
+failing the whole request. The Gemini stages run on a pool of their own
+and pass their timeout on as the request timeout, so a model call that
+hangs neither outlives its stage for long nor holds a price or
+indicator worker.
+
+run_analysis_async is the same pipeline as asyncio tasks on the async
+service layer, used by the ASGI entry point (asgi.py).
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from services.async_market import async_market
+from services.market_service import resolve_price_concurrently, resolve_candles
+from services.indicators import compute_indicators
+from services.gemini_service import analyze_stock, analyze_stock_async
+from services.news_service import analyze_news_with_ai, analyze_news_with_ai_async
+from services.resilience import UpstreamError
+from config import ANALYSIS_PIPELINE_WORKERS, ANALYSIS_LLM_WORKERS, ANALYSIS_STAGE_TIMEOUTS
+
+# History window the indicators of each analysis type are computed over
+INDICATOR_PERIODS = {
+    'daily': '3mo',
+    'weekly': '6mo',
+    'short_term': '1y',
+    'long_term': '5y'
+}
+
+# Stages run here; they call into services that use their own pools, never these ones
+_executor = ThreadPoolExecutor(max_workers=ANALYSIS_PIPELINE_WORKERS, thread_name_prefix='analysis')
+_llm_executor = ThreadPoolExecutor(max_workers=ANALYSIS_LLM_WORKERS, thread_name_prefix='analysis-llm')
+
+# Stages that wait on Gemini, run on _llm_executor
+_LLM_STAGES = ('analysis', 'news')
+
+
+def indicators_for(symbol, period):
+    """Indicators of a symbol over a period, or None if it has no history"""
+    candles = resolve_candles(symbol, period)
+    if candles is None:
+        return None
+    return _with_period(compute_indicators(candles), period)
+
+
+async def indicators_for_async(symbol, period):
+    """indicators_for on the async service layer"""
+    candles = await async_market.resolve_candles(symbol, period)
+    if candles is None:
+        return None
+    return _with_period(compute_indicators(candles), period)
+
+
+def _with_period(indicators, period):
+    if indicators:
+        indicators['period'] = period
+    return indicators
+
+
+class _Stage:
+    """One pipeline step running on the shared executor of its kind"""
+
+    def __init__(self, name, timings, fn, *args):
+        self.name = name
+        self.timings = timings
+        self.started = time.perf_counter()
+        self.finished = None
+        executor = _llm_executor if name in _LLM_STAGES else _executor
+        self.future = executor.submit(self._run, fn, *args)
+
+    def _run(self, fn, *args):
+        try:
+            return fn(*args)
+        finally:
+            self.finished = time.perf_counter()
+
+    def result(self, timeout=None):
+        """Wait for the stage and record its timing
+
+        Returns:
+            The stage result, or None if it failed or timed out
+        """
+        timeout = ANALYSIS_STAGE_TIMEOUTS[self.name] if timeout is None else timeout
+        remaining = max(0.0, self.started + timeout - time.perf_counter())
+        timing = {'status': 'ok'}
+        try:
+            result = self.future.result(timeout=remaining)
+        except TimeoutError:
+            timing = {'status': 'timeout', 'error': f'{self.name} did not finish within {timeout:g}s'}
+            result = None
+        except UpstreamError as e:
+            timing = _unavailable(e)
+            result = None
+        except Exception as e:
+            timing = {'status': 'error', 'error': str(e)}
+            result = None
+        end = self.finished if self.finished is not None else time.perf_counter()
+        timing['ms'] = round((end - self.started) * 1000, 1)
+        self.timings[self.name] = timing
+        return result
+
+
+def _unavailable(error):
+    """Stage timing of a stage refused or failed by an upstream"""
+    timing = {'status': 'unavailable', 'error': str(error)}
+    if error.retry_after is not None:
+        timing['retry_after'] = round(error.retry_after, 1)
+    return timing
+
+
+def _price_error(resolved, stage=None):
+    """Why a resolved price cannot be analyzed, or None if it can
+
+    A price an unavailable upstream could not serve (nothing stored to fall
+    back on) marks the price stage timing 'unavailable', like a refused
+    stage, so the report answers 503 instead of a missing symbol's 404.
+    """
+    if resolved is None:
+        return stage['error'] if stage and stage['status'] == 'unavailable' else 'Price data unavailable'
+    _, price_data = resolved
+    if 'error' in price_data:
+        if stage is not None and price_data.get('unavailable'):
+            stage.update(status='unavailable', error=price_data['error'])
+            if price_data.get('retry_after') is not None:
+                stage['retry_after'] = round(price_data['retry_after'], 1)
+        return price_data['error']
+    # Check if price is valid (not 0 or None)
+    if not price_data.get('price'):
+        return 'Bu sembol için geçerli fiyat verisi bulunamadı. Lütfen farklı bir sembol deneyin.'
+    return None
+
+
+def fetch_market_data(symbol, analysis_type):
+    """Resolve the price and compute indicators concurrently
+
+    Returns:
+        Dictionary with price_data, asset_type, indicators, error (set when
+        the price is unusable) and per-stage timings
+    """
+    timings = {}
+    price_stage = _Stage('price', timings, resolve_price_concurrently, symbol)
+    indicator_stage = _Stage('indicators', timings, indicators_for, symbol, INDICATOR_PERIODS[analysis_type])
+
+    resolved = price_stage.result()
+    error = _price_error(resolved, timings['price'])
+    # Indicators are optional context; the analysis still runs without them
+    indicators = indicator_stage.result()
+
+    return {
+        'asset_type': resolved[0] if resolved else None,
+        'price_data': None if error else resolved[1],
+        'indicators': indicators,
+        'error': error,
+        'stages': timings
+    }
+
+
+def run_analysis(symbol, analysis_type='short_term', language='tr', model_name=None,
+                 include_analysis=True, include_news=False):
+    """Build a combined report for a symbol
+
+    Args:
+        symbol: Stock/crypto symbol
+        analysis_type: Type of analysis - 'daily', 'weekly', 'short_term', 'long_term'
+        language: Report language
+        model_name: Gemini model name
+        include_analysis: Run the Gemini analysis (needs a valid price)
+        include_news: Run the Gemini news analysis (price is optional context)
+
+    Returns:
+        Dictionary with price_data, indicators, analysis, cached,
+        news_analysis, error, stage timings and total_ms. Fields of
+        stages that failed or timed out are None.
+    """
+    start = time.perf_counter()
+    timings = {}
+    price_stage = _Stage('price', timings, resolve_price_concurrently, symbol)
+    indicator_stage = None
+    if include_analysis:
+        indicator_stage = _Stage('indicators', timings, indicators_for, symbol, INDICATOR_PERIODS[analysis_type])
+
+    resolved = price_stage.result()
+    error = _price_error(resolved, timings['price'])
+    price_data = None if error else resolved[1]
+
+    # News only uses the price as context, so it starts as soon as the price is known
+    news_stage = None
+    if include_news:
+        news_stage = _Stage('news', timings, analyze_news_with_ai, symbol, price_data, language, model_name,
+                            ANALYSIS_STAGE_TIMEOUTS['news'])
+
+    indicators = indicator_stage.result() if indicator_stage else None
+
+    analysis_stage = None
+    if include_analysis and price_data:
+        analysis_stage = _Stage('analysis', timings, analyze_stock, symbol, price_data, analysis_type,
+                                model_name, language, indicators, ANALYSIS_STAGE_TIMEOUTS['analysis'])
+
+    report = {
+        'symbol': symbol,
+        'asset_type': resolved[0] if resolved else None,
+        'price_data': price_data,
+        'analysis_type': analysis_type,
+        'indicators': indicators,
+        'analysis': None,
+        'cached': None,
+        'error': error
+    }
+
+    if analysis_stage:
+        result = analysis_stage.result()
+        if result:
+            report['analysis'] = result['analysis']
+            report['cached'] = result['cached']
+
+    if news_stage:
+        news = news_stage.result()
+        if news and 'error' in news:
+            timings['news'].update(status='error', error=news['error'])
+            news = None
+        report['news_analysis'] = news['analysis'] if news else None
+        report['news_cached'] = news['cached'] if news else None
+
+    report['stages'] = timings
+    report['total_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return report
+
+
+async def _async_stage(name, timings, coro):
+    """Await one pipeline step within its timeout and record its timing like _Stage
+
+    Returns:
+        The stage result, or None if it failed or timed out
+    """
+    timeout = ANALYSIS_STAGE_TIMEOUTS[name]
+    start = time.perf_counter()
+    timing = {'status': 'ok'}
+    try:
+        result = await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        timing = {'status': 'timeout', 'error': f'{name} did not finish within {timeout:g}s'}
+        result = None
+    except UpstreamError as e:
+        timing = _unavailable(e)
+        result = None
+    except Exception as e:
+        timing = {'status': 'error', 'error': str(e)}
+        result = None
+    timing['ms'] = round((time.perf_counter() - start) * 1000, 1)
+    timings[name] = timing
+    return result
+
+
+async def run_analysis_async(symbol, analysis_type='short_term', language='tr', model_name=None,
+                             include_analysis=True, include_news=False):
+    """run_analysis without blocking a thread; arguments and report are the same"""
+    start = time.perf_counter()
+    timings = {}
+    price_task = asyncio.ensure_future(_async_stage('price', timings, async_market.resolve_price(symbol)))
+    indicator_task = None
+    if include_analysis:
+        indicator_task = asyncio.ensure_future(_async_stage(
+            'indicators', timings, indicators_for_async(symbol, INDICATOR_PERIODS[analysis_type])))
+
+    resolved = await price_task
+    error = _price_error(resolved, timings['price'])
+    price_data = None if error else resolved[1]
+
+    # News only uses the price as context, so it starts as soon as the price is known
+    news_task = None
+    if include_news:
+        news_task = asyncio.ensure_future(_async_stage(
+            'news', timings, analyze_news_with_ai_async(symbol, price_data, language, model_name,
+                                                        ANALYSIS_STAGE_TIMEOUTS['news'])))
+
+    indicators = await indicator_task if indicator_task else None
+
+    report = {
+        'symbol': symbol,
+        'asset_type': resolved[0] if resolved else None,
+        'price_data': price_data,
+        'analysis_type': analysis_type,
+        'indicators': indicators,
+        'analysis': None,
+        'cached': None,
+        'error': error
+    }
+
+    if include_analysis and price_data:
+        result = await _async_stage('analysis', timings, analyze_stock_async(
+            symbol, price_data, analysis_type, model_name, language, indicators, ANALYSIS_STAGE_TIMEOUTS['analysis']))
+        if result:
+            report['analysis'] = result['analysis']
+            report['cached'] = result['cached']
+
+    if news_task:
+        news = await news_task
+        if news and 'error' in news:
+            timings['news'].update(status='error', error=news['error'])
+            news = None
+        report['news_analysis'] = news['analysis'] if news else None
+        report['news_cached'] = news['cached'] if news else None
+
+    report['stages'] = timings
+    report['total_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return report
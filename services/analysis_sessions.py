@@ -0,0 +1,128 @@
+"""Server-side analysis sessions, so follow-up questions reference a report by id
+
+A session keeps what a follow-up prompt needs: the symbol, the price the
+analysis saw, the report without its disclaimer, and the latest
+questions and answers. The client sends only the session id and the new
+question instead of the whole report and price data.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from services.gemini_service import _disclaimer
+from config import ANALYSIS_SESSION_PATH, ANALYSIS_SESSION_TTL, ANALYSIS_SESSION_MAX, ANALYSIS_SESSION_TURNS
+
+_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        symbol TEXT NOT NULL,
+        analysis_type TEXT,
+        language TEXT NOT NULL,
+        price_data TEXT NOT NULL,
+        analysis TEXT NOT NULL,
+        turns TEXT NOT NULL,
+        created REAL NOT NULL,
+        used REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS sessions_used ON sessions (used)'
+)
+
+
+class AnalysisSessions:
+    """SQLite store of analysis sessions with an idle timeout and a size bound
+
+    SQLite lets job worker processes (see job_queue) create sessions the
+    server answers questions from. A session expires ttl seconds after
+    its last use; beyond max_sessions the least recently used go first.
+    Only the latest max_turns questions and answers are kept.
+    """
+
+    def __init__(self, path=ANALYSIS_SESSION_PATH, ttl=ANALYSIS_SESSION_TTL,
+                 max_sessions=ANALYSIS_SESSION_MAX, max_turns=ANALYSIS_SESSION_TURNS, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self._clock = clock
+        self._conn = None  # Opened on first use, reopened if path changes
+        self._conn_path = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        """Open the store; caller must hold the lock"""
+        if self._conn is not None and self._conn_path == self.path:
+            return self._conn
+        if self._conn is not None:
+            self._conn.close()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        conn.row_factory = sqlite3.Row
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        self._conn, self._conn_path = conn, self.path
+        return conn
+
+    def create(self, symbol, price_data, analysis, language='tr', analysis_type=None):
+        """Start a session for an analysis report
+
+        Returns:
+            Session id
+        """
+        session_id = uuid.uuid4().hex
+        # The disclaimer is for the reader; the model does not need it on every follow-up
+        analysis = analysis.removesuffix(_disclaimer(language))
+        now = self._clock()
+        with self._lock:
+            db = self._db()
+            db.execute('INSERT INTO sessions (id, symbol, analysis_type, language, price_data, analysis, turns, '
+                       'created, used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       (session_id, symbol, analysis_type, language, json.dumps(price_data or {}),
+                        analysis, '[]', now, now))
+            db.execute('DELETE FROM sessions WHERE used < ?', (now - self.ttl,))
+            db.execute('DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY used DESC '
+                       'LIMIT -1 OFFSET ?)', (self.max_sessions,))
+        return session_id
+
+    def get(self, session_id):
+        """Get a session
+
+        Returns:
+            Dictionary with symbol, analysis_type, language, price_data,
+            analysis and turns (list of [question, answer]), or None if
+            the session is unknown or expired
+        """
+        with self._lock:
+            row = self._db().execute('SELECT * FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        if row is None or row['used'] < self._clock() - self.ttl:
+            return None
+        return {
+            'symbol': row['symbol'],
+            'analysis_type': row['analysis_type'],
+            'language': row['language'],
+            'price_data': json.loads(row['price_data']),
+            'analysis': row['analysis'],
+            'turns': json.loads(row['turns'])
+        }
+
+    def add_turn(self, session_id, question, answer):
+        """Record a question and its answer, keeping the latest max_turns"""
+        with self._lock:
+            db = self._db()
+            row = db.execute('SELECT turns FROM sessions WHERE id = ?', (session_id,)).fetchone()
+            if row is None:
+                return
+            turns = json.loads(row['turns']) + [[question, answer]]
+            turns = turns[-self.max_turns:] if self.max_turns > 0 else []
+            db.execute('UPDATE sessions SET turns = ?, used = ? WHERE id = ?',
+                       (json.dumps(turns), self._clock(), session_id))
+
+    def clear(self):
+        """Delete every session"""
+        with self._lock:
+            self._db().execute('DELETE FROM sessions')
+
+
+# Shared session store for the analysis routes
+analysis_sessions = AnalysisSessions()
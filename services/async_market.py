@@ -0,0 +1,484 @@
+"""Async market data client used by the ASGI entry point (asgi.py)
+
+Non-blocking counterparts of stock_service, crypto_service and
+market_service. Yahoo Finance is read straight from its chart endpoint
+and Binance through ccxt.async_support, both over one pooled aiohttp
+session, so a single event loop can keep hundreds of upstream calls in
+flight instead of parking a worker thread on each. The quote caches,
+symbol index and history store are shared with the sync services (their
+file reads and writes run on worker threads via asyncio.to_thread), and
+every result has the same shape as its sync counterpart.
+"""
+import asyncio
+import json
+import time
+import aiohttp
+import ccxt
+import ccxt.async_support as ccxt_async
+import numpy as np
+import pandas as pd
+from config import (YAHOO_BASE_URL, ASYNC_HTTP_POOL_SIZE, ASYNC_HTTP_TIMEOUT, STOCK_FAST_QUOTE,
+                    HISTORY_REFRESH_SECONDS, TICK_CANDLE_INTERVAL)
+from services import stock_service, crypto_service, market_service
+from services.crypto_stream import ticker_stream
+from services.http_pool import connection_summary
+from services.ohlcv_backfill import backfill_async
+from services.history_format import format_history
+from services.history_store import history_store, empty_candles, COLUMNS
+from services.market_service import _is_valid_price, _looks_like_stock
+from services.metrics import stock_quote_seconds, symbol_probes
+from services.quote_cache import stock_quotes, crypto_quotes
+from services.resilience import yahoo, binance, UpstreamError
+from services.symbol_index import symbol_index
+from services.tick_buffer import tick_buffer, DAY_MS
+
+# Yahoo rejects chart requests without a browser user agent (same header as yfinance)
+_YAHOO_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36'
+}
+
+_DAY_MS = 86400000
+
+
+def _chart_candles(result):
+    """Daily candle arrays and exchange timezone from a chart result
+
+    Prices are dividend/split adjusted and days are keyed on midnight in
+    the exchange timezone, like yfinance history(), so candles written by
+    either client are interchangeable in the history store.
+
+    Returns:
+        Tuple of (column arrays, timezone name), or (None, None) without candles
+    """
+    if not result or not result.get('timestamp'):
+        return None, None
+    tz = (result.get('meta') or {}).get('exchangeTimezoneName') or 'UTC'
+    quote = result['indicators']['quote'][0]
+    candles = {name: np.asarray(quote.get(name) or [], dtype=np.float64)
+               for name in ('open', 'high', 'low', 'close', 'volume')}
+
+    adjclose = (result['indicators'].get('adjclose') or [{}])[0].get('adjclose')
+    if adjclose:
+        ratio = np.asarray(adjclose, dtype=np.float64) / candles['close']
+        for name in ('open', 'high', 'low', 'close'):
+            candles[name] = candles[name] * ratio
+    candles['volume'] = np.nan_to_num(candles['volume'])
+
+    # Move each timestamp back to midnight of its exchange-local day
+    ts = np.asarray(result['timestamp'], dtype=np.int64) * 1000
+    wall = pd.to_datetime(ts, unit='ms', utc=True).tz_convert(tz).tz_localize(None).asi8 // 10 ** 6
+    candles['ts'] = ts - wall % _DAY_MS
+
+    # Drop empty rows and keep the last candle of each day (Yahoo may send the live one separately)
+    prices = np.vstack([candles[name] for name in ('open', 'high', 'low', 'close')])
+    order = np.argsort(candles['ts'], kind='stable')
+    keep = order[~np.isnan(prices[:, order]).all(axis=0)]
+    keep = keep[np.r_[candles['ts'][keep][1:] != candles['ts'][keep][:-1], True]]
+    if not len(keep):
+        return None, None
+    return {name: candles[name][keep] for name in COLUMNS}, tz
+
+
+def _info_quote(sym, fields):
+    """stock_service's .info quote path, measured like the blocking client measures it"""
+    return stock_service._measured('info', stock_service._info_quote, sym, fields)
+
+
+class AsyncMarket:
+    """Market data client bound to one event loop
+
+    The HTTP session and exchange are created on first use and must be
+    released with close() before the loop stops. Concurrent calls for the
+    same quote or history share one upstream request, which keeps running
+    (and fills the caches) even if every caller is cancelled.
+    """
+
+    def __init__(self, yahoo_base_url=YAHOO_BASE_URL, pool_size=ASYNC_HTTP_POOL_SIZE,
+                 timeout=ASYNC_HTTP_TIMEOUT, exchange_factory=ccxt_async.binance):
+        self.yahoo_base_url = yahoo_base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._exchange_factory = exchange_factory
+        self._session = None
+        self._exchange = None
+        self._inflight = {}  # key -> asyncio.Task
+        self._connections = {'created': 0, 'reused': 0}
+
+    def _trace_config(self):
+        """Count connections opened vs taken from the pool"""
+        async def created(session, context, params):
+            self._connections['created'] += 1
+
+        async def reused(session, context, params):
+            self._connections['reused'] += 1
+
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(created)
+        trace.on_connection_reuseconn.append(reused)
+        return trace
+
+    @property
+    def session(self):
+        """Pooled HTTP session shared by Yahoo and exchange requests"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[self._trace_config()])
+        return self._session
+
+    def connection_stats(self):
+        """Requests and connections of the pooled session"""
+        created, reused = self._connections['created'], self._connections['reused']
+        return connection_summary(created + reused, created)
+
+    async def warm_up(self):
+        """Async market_service.warm_up_connections: connect and load the exchange markets"""
+        async def connect_yahoo():
+            async with self.session.head(self.yahoo_base_url, headers=_YAHOO_HEADERS):
+                pass
+
+        # Failures are left for the first real request to surface
+        await asyncio.gather(connect_yahoo(), binance.call_async(self.exchange.load_markets), return_exceptions=True)
+        if self._exchange.markets:
+            await asyncio.to_thread(symbol_index.seed_markets, self._exchange.markets)
+
+    @property
+    def exchange(self):
+        """Async Binance client; markets load lazily on its first request"""
+        if self._exchange is None:
+            self._exchange = self._exchange_factory({'session': self.session, 'timeout': int(self.timeout * 1000)})
+        return self._exchange
+
+    async def close(self):
+        """Close the exchange and the HTTP session"""
+        if self._exchange is not None:
+            await self._exchange.close()
+            self._exchange = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _single_flight(self, key, fetch):
+        """Await fetch() once across concurrent callers of the same key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(fetch())
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    # Stocks
+
+    async def _chart(self, sym, **params):
+        """Chart result of one Yahoo symbol and the payload size
+
+        Returns:
+            Tuple of (chart result or None if Yahoo has no data, bytes read)
+        """
+        url = f'{self.yahoo_base_url}/v8/finance/chart/{sym}'
+        params = {'interval': '1d', 'includePrePost': 'false', 'events': 'div,splits,capitalGains', **params}
+
+        async def chart():
+            async with self.session.get(url, params=params, headers=_YAHOO_HEADERS) as response:
+                body = await response.read()
+                if response.status == 404:
+                    return None, len(body)
+                yahoo.check_status(response.status)
+                response.raise_for_status()
+            results = (json.loads(body).get('chart') or {}).get('result')
+            return (results[0] if results else None), len(body)
+
+        return await yahoo.call_async(chart)
+
+    async def _fast_quote(self, sym):
+        """stock_service._fast_quote over the pooled session, recorded in quote_stats"""
+        start = time.perf_counter()
+        result, nbytes = await self._chart(sym, range='5d')
+        candles, _ = _chart_candles(result)
+        quote = None
+        if candles is not None:
+            closes = candles['close'][~np.isnan(candles['close'])]
+            price = result['meta'].get('regularMarketPrice') or (float(closes[-1]) if len(closes) else None)
+            if price:
+                quote = stock_service._chart_quote(sym, price, closes.tolist(), candles['volume'][-1])
+        fields = [field for field, value in (quote or {}).items() if value is not None]
+        elapsed = time.perf_counter() - start
+        stock_service.quote_stats.record('fast', fields, elapsed, nbytes)
+        stock_quote_seconds.observe(elapsed, 'fast')
+        return quote
+
+    async def _fetch_quote(self, sym):
+        """stock_service._fetch_quote without blocking the loop"""
+        if not STOCK_FAST_QUOTE:
+            return await asyncio.to_thread(stock_service._fetch_quote, sym)
+
+        quote = await self._fast_quote(sym)
+        if quote is None:
+            return None
+
+        missing = [field for field in stock_service.QUOTE_FIELDS if quote.get(field) is None]
+        if missing:
+            # .info is a multi-request scrape with no async client; run it on a worker thread
+            info_quote = await asyncio.to_thread(yahoo.call, _info_quote, sym, missing) or {}
+            for field in missing:
+                quote[field] = info_quote.get(field)
+        return quote
+
+    async def _fetch_stock_price(self, symbol):
+        for sym in stock_service._symbol_variants(symbol):
+            try:
+                quote = await self._fetch_quote(sym)
+            except UpstreamError as e:
+                return stock_quotes.fallback(symbol, e)
+            except Exception:
+                symbol_probes.inc('quote', 'error')
+                continue
+
+            # No price for this variant, try the next one
+            if quote is None:
+                symbol_probes.inc('quote', 'missing')
+                await asyncio.to_thread(stock_service._mark_missing, symbol, sym)
+                continue
+
+            symbol_probes.inc('quote', 'found')
+            await asyncio.to_thread(symbol_index.remember, symbol, 'stock', sym)
+            return stock_service._format_quote(quote)
+
+        return {'error': f'No data available for symbol: {symbol}'}
+
+    async def get_stock_price(self, symbol):
+        """Async stock_service.get_stock_price (served from the shared quote cache)"""
+        cached = stock_quotes.get(symbol)
+        if cached is not None:
+            return cached
+
+        async def fetch():
+            price_data = await self._fetch_stock_price(symbol)
+            stock_quotes.set(symbol, price_data)
+            return price_data
+
+        return dict(await self._single_flight(('stock', symbol), fetch))
+
+    async def _load_stock_history(self, sym, period):
+        """stock_service._load_history over the pooled session"""
+        key = ('yahoo', sym, '1d')
+        meta = await asyncio.to_thread(history_store.meta, *key)
+        start_ms = stock_service._period_start_ms(period)
+        last = stock_service._TRADING_DAY_PERIODS.get(period)
+
+        try:
+            if stock_service._needs_full_download(meta, period, start_ms, last):
+                result, _ = await self._chart(sym, range=period)
+                candles, tz = _chart_candles(result)
+                if candles is None:
+                    return None, None
+                meta = await asyncio.to_thread(stock_service._store_full_history, key, candles, period, start_ms, tz)
+            elif stock_service._needs_top_up(meta):
+                start = pd.Timestamp(stock_service._top_up_start(meta), tz=meta['tz'])
+                result, _ = await self._chart(sym, period1=int(start.timestamp()), period2=int(time.time()))
+                candles, _ = _chart_candles(result)
+                await asyncio.to_thread(history_store.append, *key,
+                                        candles if candles is not None else empty_candles())
+        except UpstreamError:
+            if meta is None:
+                raise
+
+        return await asyncio.to_thread(history_store.read, *key, start_ms=start_ms, last=last), meta['tz']
+
+    async def get_stock_candles(self, symbol, period='1mo', interval=TICK_CANDLE_INTERVAL):
+        """Async stock_service.get_stock_candles"""
+        for sym in stock_service._symbol_variants(symbol):
+            try:
+                candles, tz = await self._single_flight(
+                    ('stock_history', sym, period), lambda: self._load_stock_history(sym, period))
+
+                if candles is None or len(candles['ts']) == 0:
+                    symbol_probes.inc('history', 'missing')
+                    continue
+
+                symbol_probes.inc('history', 'found')
+                await asyncio.to_thread(symbol_index.remember, symbol, 'stock', sym)
+                if period == '1d':
+                    candles = tick_buffer.overlay(symbol, candles, DAY_MS, interval)
+                return candles, tz
+            except UpstreamError:
+                break
+            except Exception:
+                symbol_probes.inc('history', 'error')
+                continue
+
+        return None, None
+
+    async def get_stock_history(self, symbol, period='1mo', interval=TICK_CANDLE_INTERVAL, fmt='json', max_points=None):
+        """Async stock_service.get_stock_history"""
+        candles, tz = await self.get_stock_candles(symbol, period, interval)
+        if candles is None:
+            return {'error': f'No historical data available for symbol: {symbol}'}
+        return format_history(candles, tz, period, fmt, max_points)
+
+    # Crypto
+
+    async def _fetch_crypto_price(self, symbol):
+        try:
+            ticker = await binance.call_async(self.exchange.fetch_ticker, symbol)
+            ticker_stream.watch(symbol)
+            return crypto_service._format_ticker(ticker)
+        except UpstreamError as e:
+            return crypto_quotes.fallback(symbol, e)
+        except ccxt.BadSymbol as e:
+            await asyncio.to_thread(symbol_index.mark_missing, 'crypto', symbol)
+            return {'error': f'Error fetching data: {str(e)}'}
+        except Exception as e:
+            return {'error': f'Error fetching data: {str(e)}'}
+
+    async def get_crypto_price(self, symbol):
+        """Async crypto_service.get_crypto_price (streamed ticker, else the shared quote cache)"""
+        streamed = ticker_stream.get(symbol)
+        if streamed is not None:
+            return crypto_service._format_ticker(streamed)
+        cached = crypto_quotes.get(symbol)
+        if cached is not None:
+            return cached
+
+        async def fetch():
+            price_data = await self._fetch_crypto_price(symbol)
+            crypto_quotes.set(symbol, price_data)
+            return price_data
+
+        return dict(await self._single_flight(('crypto', symbol), fetch))
+
+    async def _load_crypto_history(self, symbol, timeframe, start_ms):
+        """crypto_service._load_history on the async exchange"""
+        key = ('binance', symbol, timeframe)
+        meta = await asyncio.to_thread(history_store.meta, *key)
+
+        try:
+            if meta is not None and meta['rows'] and time.time() - meta['updated_at'] > HISTORY_REFRESH_SECONDS:
+                since = meta['last_ts']
+                while True:
+                    ohlcv = await binance.call_async(self.exchange.fetch_ohlcv, symbol, timeframe, since=since,
+                                                     limit=crypto_service.OHLCV_PAGE_LIMIT)
+                    await asyncio.to_thread(history_store.append, *key, crypto_service._ohlcv_to_candles(ohlcv))
+                    if len(ohlcv) < crypto_service.OHLCV_PAGE_LIMIT:
+                        break
+                    since = ohlcv[-1][0] + 1
+                meta = await asyncio.to_thread(history_store.meta, *key)
+            if crypto_service._needs_backfill(meta, start_ms):
+                result = await backfill_async(
+                    lambda since, limit: binance.call_async(self.exchange.fetch_ohlcv, symbol, timeframe,
+                                                            since=since, limit=limit),
+                    start_ms, crypto_service._backfill_end(meta, int(time.time() * 1000)),
+                    crypto_service._timeframe_ms(timeframe), crypto_service.OHLCV_PAGE_LIMIT, key=key)
+                await asyncio.to_thread(crypto_service._store_backfill, key, meta, result)
+                if result.error is not None and await asyncio.to_thread(history_store.meta, *key) is None:
+                    raise result.error
+        except UpstreamError:
+            if await asyncio.to_thread(history_store.meta, *key) is None:
+                raise
+
+        return await asyncio.to_thread(history_store.read, *key, start_ms=start_ms)
+
+    async def get_crypto_candles(self, symbol, period='1mo', interval=TICK_CANDLE_INTERVAL):
+        """Async crypto_service.get_crypto_candles"""
+        timeframe, start_ms = crypto_service._history_window(period)
+        candles = await self._single_flight(
+            ('crypto_history', symbol, period), lambda: self._load_crypto_history(symbol, timeframe, start_ms))
+
+        if candles is None or len(candles['ts']) == 0:
+            return None
+        if period == '1d':
+            candles = tick_buffer.overlay(symbol, candles, crypto_service._timeframe_ms(timeframe), interval)
+        return candles
+
+    async def get_crypto_history(self, symbol, period='1mo', interval=TICK_CANDLE_INTERVAL, fmt='json', max_points=None):
+        """Async crypto_service.get_crypto_history"""
+        try:
+            candles = await self.get_crypto_candles(symbol, period, interval)
+
+            if candles is None:
+                return {'error': 'No historical data available'}
+
+            return format_history(candles, crypto_service.CANDLE_TZ, period, fmt, max_points)
+        except Exception as e:
+            return {'error': f'Error fetching historical data: {str(e)}'}
+
+    # Symbol resolution
+
+    async def _crypto_pair(self, symbol):
+        """market_service._crypto_pair, also indexing markets loaded by the async exchange"""
+        if not symbol_index.has_markets and self._exchange is not None and self._exchange.markets:
+            await asyncio.to_thread(symbol_index.seed_markets, self._exchange.markets)
+        return market_service._crypto_pair(symbol)
+
+    async def _crypto_candles(self, pair, period):
+        try:
+            return await self.get_crypto_candles(pair, period)
+        except Exception:
+            return None
+
+    async def resolve_price(self, symbol):
+        """Async market_service.resolve_price_concurrently
+
+        Both venues of an unknown symbol are queried at once and a stock
+        quote wins over the crypto pair.
+
+        Returns:
+            Tuple of (asset type 'stock' or 'crypto', price dictionary)
+        """
+        entry = symbol_index.lookup(symbol)
+        if entry and entry['type'] == 'crypto':
+            return 'crypto', await self.get_crypto_price(entry['symbol'])
+
+        pair = None if entry or _looks_like_stock(symbol) else await self._crypto_pair(symbol)
+        # Left running if the stock wins; its answer still lands in the quote cache
+        crypto_task = asyncio.ensure_future(self.get_crypto_price(pair)) if pair else None
+        price_data = await self.get_stock_price(symbol)
+        if _is_valid_price(price_data) or crypto_task is None:
+            return 'stock', price_data
+
+        crypto_data = await crypto_task
+        if _is_valid_price(crypto_data):
+            await asyncio.to_thread(symbol_index.remember, symbol, 'crypto', pair)
+            return 'crypto', crypto_data
+        return 'stock', price_data
+
+    async def resolve_history(self, symbol, period='1mo', interval=TICK_CANDLE_INTERVAL, fmt='json', max_points=None):
+        """Async market_service.resolve_history"""
+        entry = symbol_index.lookup(symbol)
+        if entry and entry['type'] == 'crypto':
+            return await self.get_crypto_history(entry['symbol'], period, interval, fmt, max_points)
+
+        history = await self.get_stock_history(symbol, period, interval, fmt, max_points)
+        if 'error' not in history or _looks_like_stock(symbol):
+            return history
+
+        pair = await self._crypto_pair(symbol)
+        if pair:
+            crypto_history = await self.get_crypto_history(pair, period, interval, fmt, max_points)
+            if 'error' not in crypto_history:
+                await asyncio.to_thread(symbol_index.remember, symbol, 'crypto', pair)
+                return crypto_history
+
+        return history
+
+    async def resolve_candles(self, symbol, period='1mo'):
+        """Async market_service.resolve_candles"""
+        entry = symbol_index.lookup(symbol)
+        if entry and entry['type'] == 'crypto':
+            return await self._crypto_candles(entry['symbol'], period)
+
+        candles, _ = await self.get_stock_candles(symbol, period)
+        if candles is not None or _looks_like_stock(symbol):
+            return candles
+
+        pair = await self._crypto_pair(symbol)
+        if pair:
+            candles = await self._crypto_candles(pair, period)
+            if candles is not None:
+                await asyncio.to_thread(symbol_index.remember, symbol, 'crypto', pair)
+        return candles
+
+
+# Client for the ASGI app's event loop (opened lazily, closed on shutdown)
+async_market = AsyncMarket()
@@ -0,0 +1,109 @@
+"""Batch analysis of many symbols: bulk prices, packed Gemini prompts, streamed results
+
+A portfolio review is one request instead of one /api/analyze per symbol:
+
+    prices      one resolve_prices call (bulk stock batch and fetch_tickers)
+    indicators  computed concurrently on a bounded pool
+    analysis    up to ANALYSIS_BATCH_SIZE symbols of the same analysis type per
+                Gemini call (see gemini_service.analyze_stocks), with at most
+                ANALYSIS_BATCH_CONCURRENCY calls in flight
+
+Results are yielded per symbol as their Gemini call finishes.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from services.analysis_pipeline import INDICATOR_PERIODS, indicators_for, _price_error
+from services.gemini_service import analyze_stocks
+from services.market_service import resolve_prices
+from config import (ANALYSIS_BATCH_SIZE, ANALYSIS_BATCH_CONCURRENCY, ANALYSIS_BATCH_WORKERS,
+                    ANALYSIS_STAGE_TIMEOUTS)
+
+
+def _indicators(future):
+    """Indicators of a finished or running indicator task, or None; they are optional context"""
+    try:
+        return future.result(timeout=ANALYSIS_STAGE_TIMEOUTS['indicators'])
+    except Exception:
+        return None
+
+
+def analyze_batch(symbols, analysis_types=('short_term',), language='tr', model_name=None,
+                  batch_size=None, concurrency=None):
+    """Analyze every symbol for every analysis type
+
+    Args:
+        symbols: Stock/crypto symbols
+        analysis_types: Analysis types to run for each symbol
+        language: Report language
+        model_name: Gemini model name
+        batch_size: Symbols packed into one Gemini prompt (default ANALYSIS_BATCH_SIZE)
+        concurrency: Gemini calls in flight at once (default ANALYSIS_BATCH_CONCURRENCY)
+
+    Yields:
+        ('result', dictionary) per symbol and analysis type as it finishes, with
+        symbol, analysis_type, asset_type, price_data, indicators, and analysis
+        and cached, or error; then ('summary', dictionary) with symbols,
+        analyses, errors, llm_calls, cached, total_ms and symbols_per_minute
+    """
+    start = time.perf_counter()
+    batch_size = batch_size or ANALYSIS_BATCH_SIZE
+    concurrency = concurrency or ANALYSIS_BATCH_CONCURRENCY
+    symbols = list(dict.fromkeys(symbols))
+    summary = {'symbols': len(symbols), 'analyses': 0, 'errors': 0, 'llm_calls': 0, 'cached': 0}
+
+    def result(entry):
+        summary['analyses'] += 1
+        if 'error' in entry:
+            summary['errors'] += 1
+        elif entry['cached']:
+            summary['cached'] += 1
+        return 'result', entry
+
+    resolved = resolve_prices(symbols)
+    valid = []
+    for symbol in symbols:
+        error = _price_error(resolved[symbol])
+        if error:
+            for analysis_type in analysis_types:
+                yield result({'symbol': symbol, 'analysis_type': analysis_type, 'asset_type': resolved[symbol][0],
+                              'price_data': None, 'error': error})
+        else:
+            valid.append(symbol)
+
+    with ThreadPoolExecutor(max_workers=ANALYSIS_BATCH_WORKERS, thread_name_prefix='batch-data') as data_pool, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-llm') as llm_pool:
+        periods = {INDICATOR_PERIODS[analysis_type] for analysis_type in analysis_types}
+        indicator_tasks = {(symbol, period): data_pool.submit(indicators_for, symbol, period)
+                           for symbol in valid for period in periods}
+
+        def analyze_group(group, analysis_type):
+            period = INDICATOR_PERIODS[analysis_type]
+            items = [(symbol, resolved[symbol][1], _indicators(indicator_tasks[symbol, period]))
+                     for symbol in group]
+            try:
+                analyses, calls = analyze_stocks(items, analysis_type, model_name, language)
+            except Exception as e:
+                analyses, calls = {symbol: {'error': str(e)} for symbol in group}, 0
+            return items, analysis_type, analyses, calls
+
+        groups = [llm_pool.submit(analyze_group, valid[i:i + batch_size], analysis_type)
+                  for analysis_type in analysis_types
+                  for i in range(0, len(valid), batch_size)]
+
+        for future in as_completed(groups):
+            items, analysis_type, analyses, calls = future.result()
+            summary['llm_calls'] += calls
+            for symbol, price_data, indicators in items:
+                yield result({
+                    'symbol': symbol,
+                    'analysis_type': analysis_type,
+                    'asset_type': resolved[symbol][0],
+                    'price_data': price_data,
+                    'indicators': indicators,
+                    **analyses[symbol]
+                })
+
+    elapsed = time.perf_counter() - start
+    summary['total_ms'] = round(elapsed * 1000, 1)
+    summary['symbols_per_minute'] = round(len(symbols) / elapsed * 60, 1) if elapsed else 0.0
+    yield 'summary', summary
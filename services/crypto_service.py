@@ -1,112 +1,352 @@
 """Cryptocurrency price service using Binance API"""
+import time
+from datetime import datetime, timezone
 import ccxt
+import numpy as np
+from config import HISTORY_REFRESH_SECONDS, EXCHANGE_TIMEOUT, EXCHANGE_RATE_LIMIT_MS, TICK_CANDLE_INTERVAL
+from services.crypto_stream import ticker_stream
+from services.history_format import format_history
+from services.history_store import history_store, empty_candles, COLUMNS
+from services.http_pool import pooled_session, connection_stats as _connection_stats
+from services.ohlcv_backfill import backfill
+from services.quote_cache import crypto_quotes
+from services.resilience import binance, UpstreamError
+from services.symbol_index import symbol_index
+from services.tick_buffer import tick_buffer
 
-# Initialize crypto exchange
-exchange = ccxt.binance()
+
+def create_exchange():
+    """Binance client on a pooled keep-alive session, with ccxt's request throttling"""
+    return ccxt.binance({
+        'session': pooled_session(),
+        'enableRateLimit': True,
+        'rateLimit': EXCHANGE_RATE_LIMIT_MS,
+        'timeout': int(EXCHANGE_TIMEOUT * 1000)
+    })
+
+
+# Long-lived exchange client shared by the whole process
+exchange = create_exchange()
+
+# Binance opens its daily and weekly candles at midnight UTC
+CANDLE_TZ = 'UTC'
+
+
+def warm_up():
+    """Load the exchange markets (opening its connection) and index the listed pairs"""
+    symbol_index.seed_markets(binance.call(exchange.load_markets))
+
+
+def connection_stats():
+    """Requests and connections of the exchange client's session"""
+    return _connection_stats(exchange.session)
+
+
+def _format_ticker(ticker):
+    """Convert a ccxt ticker into a price dictionary"""
+    # Check if we have valid price data
+    if not ticker or 'last' not in ticker or not ticker['last'] or ticker['last'] == 0:
+        return {'error': 'Price data not available for this symbol'}
+    
+    return {
+        'price': round(ticker['last'], 2),
+        'change': round(ticker['change'], 2),
+        'change_percent': round(ticker['percentage'], 2),
+        'volume': ticker.get('quoteVolume', 0),
+        'high_24h': ticker.get('high', 0),
+        'low_24h': ticker.get('low', 0)
+    }
 
 
 def get_crypto_price(symbol):
-    """Get real-time crypto price from Binance"""
+    """Get real-time crypto price from Binance
+    
+    Served from the WebSocket ticker table (see crypto_stream) while it is
+    fresh, else from the shared quote cache or REST. While Binance is rate
+    limiting or down, the last known quote is returned marked 'stale'
+    (see QuoteCache.fallback).
+    """
+    streamed = ticker_stream.get(symbol)
+    if streamed is not None:
+        return _format_ticker(streamed)
+    return crypto_quotes.get_or_fetch(symbol, lambda: _fetch_crypto_price(symbol))
+
+
+def _fetch_crypto_price(symbol):
+    """Fetch a crypto price from Binance, bypassing the cache"""
     try:
-        ticker = exchange.fetch_ticker(symbol)
-        
-        # Check if we have valid price data
-        if not ticker or 'last' not in ticker or not ticker['last'] or ticker['last'] == 0:
-            return {'error': 'Price data not available for this symbol'}
-        
-        return {
-            'price': round(ticker['last'], 2),
-            'change': round(ticker['change'], 2),
-            'change_percent': round(ticker['percentage'], 2),
-            'volume': ticker.get('quoteVolume', 0),
-            'high_24h': ticker.get('high', 0),
-            'low_24h': ticker.get('low', 0)
-        }
+        ticker = binance.call(exchange.fetch_ticker, symbol)
+        # The pair exists; stream it from now on
+        ticker_stream.watch(symbol)
+        return _format_ticker(ticker)
+    except UpstreamError as e:
+        return crypto_quotes.fallback(symbol, e)
+    except ccxt.BadSymbol as e:
+        symbol_index.mark_missing('crypto', symbol)
+        return {'error': f'Error fetching data: {str(e)}'}
     except Exception as e:
         return {'error': f'Error fetching data: {str(e)}'}
 
 
-def get_crypto_history(symbol, period='1mo'):
+def get_crypto_prices(symbols, timeout=None):
+    """Get real-time prices for several crypto pairs with one exchange call
+    
+    Streamed pairs are served from the WebSocket ticker table and cached
+    ones from the shared quote cache; the rest are requested through a
+    single fetch_tickers call, shared with concurrent requests for the same
+    pairs (see QuoteCache.get_many). Pairs missing from the bulk response
+    are fetched one by one.
+    
+    Args:
+        symbols: Iterable of crypto symbols (e.g., BTC/USDT)
+        timeout: Latency budget in seconds; quotes that are not refreshed in
+            time are served stale while the refresh continues in the background
+            (see QuoteCache.get_many). None waits for every quote.
+    
+    Returns:
+        Dictionary mapping each symbol to the same dictionary get_crypto_price
+        returns, or to None if it missed the budget and was never fetched before
+    """
+    # Preserve order and drop duplicates
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    
+    # Streamed pairs first; only the rest go to the cache and REST
+    results = {}
+    for symbol in symbols:
+        streamed = ticker_stream.get(symbol)
+        if streamed is not None:
+            results[symbol] = _format_ticker(streamed)
+    rest = [symbol for symbol in symbols if symbol not in results]
+    
+    if rest:
+        results.update(crypto_quotes.get_many(rest, lambda missing: _fetch_crypto_prices(missing).items(), timeout))
+    
+    # Keep the caller's symbol order
+    return {symbol: results[symbol] for symbol in symbols}
+
+
+def _fetch_crypto_prices(symbols):
+    """Fetch several crypto prices with one fetch_tickers call, bypassing the cache"""
+    try:
+        tickers = binance.call(exchange.fetch_tickers, symbols) or {}
+    except UpstreamError as e:
+        # Asking pair by pair would only add load; serve what is known
+        return {symbol: crypto_quotes.fallback(symbol, e) for symbol in symbols}
+    except Exception:
+        tickers = {}
+    
+    results = {}
+    for symbol in symbols:
+        ticker = tickers.get(symbol)
+        if not ticker:
+            results[symbol] = _fetch_crypto_price(symbol)
+            continue
+        try:
+            results[symbol] = _format_ticker(ticker)
+        except Exception as e:
+            results[symbol] = {'error': f'Error fetching data: {str(e)}'}
+    return results
+
+
+# Candle timeframe for each chart period
+_PERIOD_TIMEFRAMES = {
+    '1d': '1h',
+    '5d': '4h',
+    '1mo': '1d',
+    '3mo': '1d',
+    '6mo': '1d',
+    '1y': '1d',
+    '2y': '1d',
+    '5y': '1d',
+    '10y': '1w',
+    'ytd': '1d',
+    'max': '1w'
+}
+
+# Days covered by each chart period; 'ytd' starts on January 1st and 'max' at the listing
+_PERIOD_DAYS = {
+    '1d': 1,
+    '5d': 5,
+    '1mo': 30,
+    '3mo': 90,
+    '6mo': 180,
+    '1y': 365,
+    '2y': 730,
+    '5y': 1826,
+    '10y': 3652
+}
+
+_DAY_MS = 86400000
+
+
+def _history_window(period, now_ms=None):
+    """Timeframe and earliest candle open time of a chart period
+    
+    Returns:
+        Tuple of (timeframe, epoch milliseconds or None for the whole
+        history since the pair was listed)
+    """
+    timeframe = _PERIOD_TIMEFRAMES.get(period, '1d')
+    if period == 'max':
+        return timeframe, None
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    if period == 'ytd':
+        now = datetime.fromtimestamp(now_ms / 1000, tz=timezone.utc)
+        return timeframe, int(datetime(now.year, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    return timeframe, now_ms - _PERIOD_DAYS.get(period, 30) * _DAY_MS
+
+
+def _timeframe_ms(timeframe):
+    return ccxt.Exchange.parse_timeframe(timeframe) * 1000
+
+
+def get_crypto_candles(symbol, period='1mo', interval=TICK_CANDLE_INTERVAL):
+    """Get raw candle arrays for a period
+    
+    Candles come from the local history store, which is topped up from the
+    exchange with only the candles newer than the last stored one. For the
+    1d period, the part of the day covered by live ticks is served as
+    interval candles built from them (see tick_buffer).
+    
+    Args:
+        symbol: Crypto symbol (e.g., BTC/USDT)
+        period: Period to fetch (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)
+        interval: Candle interval of the ticked part of a 1d period (1m, 5m or 15m)
+    
+    Returns:
+        Dictionary of column arrays (see history_store.COLUMNS), or None
+        if the exchange has no candles for the symbol
+    """
+    timeframe, start_ms = _history_window(period)
+    
+    # Candles from the local store, backfilled and topped up from the exchange
+    candles = _load_history(symbol, timeframe, start_ms)
+    
+    if candles is None or len(candles['ts']) == 0:
+        return None
+    if period == '1d':
+        candles = tick_buffer.overlay(symbol, candles, _timeframe_ms(timeframe), interval)
+    return candles
+
+
+def get_crypto_history(symbol, period='1mo', interval=TICK_CANDLE_INTERVAL, fmt='json', max_points=None):
     """Get historical price data for charting
     
     Args:
         symbol: Crypto symbol (e.g., BTC/USDT)
         period: Period to fetch (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)
+        interval: Candle interval of the ticked part of a 1d period (see get_crypto_candles)
+        fmt: Payload format, 'json' or 'columnar' (see history_format)
+        max_points: Most candles to return, downsampled with LTTB (see downsample); None for all
     
     Returns:
-        Dictionary with dates and prices, or error
+        Dictionary with dates (in UTC, like Binance's candles) and prices, or error
     """
     try:
-        # Convert period to timeframe
-        timeframe_map = {
-            '1d': '1h',
-            '5d': '4h',
-            '1mo': '1d',
-            '3mo': '1d',
-            '6mo': '1d',
-            '1y': '1d',
-            '2y': '1d',
-            '5y': '1w',
-            '10y': '1w',
-            'ytd': '1d',
-            'max': '1w'
-        }
-        
-        timeframe = timeframe_map.get(period, '1d')
+        candles = get_crypto_candles(symbol, period, interval)
         
-        # Calculate limit based on period
-        limit_map = {
-            '1d': 24,
-            '5d': 30,
-            '1mo': 30,
-            '3mo': 90,
-            '6mo': 180,
-            '1y': 365,
-            '2y': 730,
-            '5y': 260,
-            '10y': 520,
-            'ytd': 365,
-            'max': 1000
-        }
-        
-        limit = limit_map.get(period, 30)
-        
-        # Fetch OHLCV data
-        ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
-        
-        if not ohlcv or len(ohlcv) == 0:
+        if candles is None:
             return {'error': 'No historical data available'}
         
-        # Extract data
-        dates = []
-        prices = []
-        high = []
-        low = []
-        volume = []
-        
-        for candle in ohlcv:
-            timestamp = candle[0]
-            dates.append(timestamp)
-            high.append(round(candle[2], 2))
-            low.append(round(candle[3], 2))
-            prices.append(round(candle[4], 2))  # Close price
-            volume.append(int(candle[5]))
-        
-        # Convert timestamps to dates
-        from datetime import datetime
-        # For 1d period, show hour info, otherwise just date
-        if period == '1d':
-            date_strings = [datetime.fromtimestamp(ts / 1000).strftime('%Y-%m-%d %H:%M') for ts in dates]
-        else:
-            date_strings = [datetime.fromtimestamp(ts / 1000).strftime('%Y-%m-%d') for ts in dates]
-        
-        return {
-            'dates': date_strings,
-            'prices': prices,
-            'high': high,
-            'low': low,
-            'volume': volume
-        }
+        return format_history(candles, CANDLE_TZ, period, fmt, max_points)
     except Exception as e:
         return {'error': f'Error fetching historical data: {str(e)}'}
 
+
+# Maximum candles per fetch_ohlcv request on Binance
+OHLCV_PAGE_LIMIT = 1000
+
+
+def _ohlcv_to_candles(ohlcv):
+    """Convert ccxt OHLCV rows to candle arrays"""
+    if not ohlcv:
+        return empty_candles()
+    rows = np.asarray(ohlcv, dtype=np.float64)
+    return {
+        'ts': rows[:, 0].astype(np.int64),
+        'open': rows[:, 1],
+        'high': rows[:, 2],
+        'low': rows[:, 3],
+        'close': rows[:, 4],
+        'volume': rows[:, 5]
+    }
+
+
+def _needs_backfill(meta, start_ms):
+    """Check whether the stored candles do not reach back to start_ms (None: the listing)"""
+    if meta is None or meta['rows'] == 0:
+        return True
+    if meta['complete']:
+        return False
+    return start_ms is None or meta['covered_from'] is None or start_ms < meta['covered_from']
+
+
+def _backfill_end(meta, now_ms):
+    """End of the range to backfill: the stored candles' coverage, or now"""
+    if meta is None or meta['rows'] == 0:
+        return now_ms + 1
+    return meta['covered_from'] if meta['covered_from'] is not None else meta['first_ts']
+
+
+def _store_backfill(key, meta, result):
+    """Put backfilled candles in front of the stored ones
+    
+    covered_from moves back to the oldest page of the unbroken run the
+    backfill delivered, so a failed backfill resumes from there next time.
+    """
+    if result.covered_from is None:
+        return
+    candles = result.candles
+    if meta is not None and meta['rows']:
+        stored = history_store.read(*key)
+        candles = {column: np.concatenate((candles[column], stored[column])) for column in COLUMNS}
+    if len(candles['ts']) == 0:
+        return
+    history_store.write(*key, candles, covered_from=min(result.covered_from, int(candles['ts'][0])),
+                        complete=result.listed_from is not None)
+
+
+def _load_history(symbol, timeframe, start_ms):
+    """Candles of a pair from start_ms on, served from the history store
+    
+    Candles older than the stored ones are backfilled as concurrent pages
+    (see ohlcv_backfill); start_ms None asks for everything since the pair
+    was listed. Later requests only fetch candles from the last stored one
+    onwards (at most every HISTORY_REFRESH_SECONDS). While Binance is
+    unavailable, or a backfill page fails, whatever is stored is served as
+    it is.
+    
+    Raises:
+        UpstreamError: If Binance is unavailable and nothing is stored
+        ccxt.BaseError: If a backfill page failed and nothing is stored
+    """
+    key = ('binance', symbol, timeframe)
+    meta = history_store.meta(*key)
+    
+    try:
+        if meta is not None and meta['rows'] and time.time() - meta['updated_at'] > HISTORY_REFRESH_SECONDS:
+            since = meta['last_ts']
+            while True:
+                ohlcv = binance.call(exchange.fetch_ohlcv, symbol, timeframe, since=since, limit=OHLCV_PAGE_LIMIT)
+                history_store.append(*key, _ohlcv_to_candles(ohlcv))
+                # Keep paging only if the store was behind by more than one page
+                if len(ohlcv) < OHLCV_PAGE_LIMIT:
+                    break
+                since = ohlcv[-1][0] + 1
+            meta = history_store.meta(*key)
+        if _needs_backfill(meta, start_ms):
+            result = backfill(
+                lambda since, limit: binance.call(exchange.fetch_ohlcv, symbol, timeframe, since=since, limit=limit),
+                start_ms, _backfill_end(meta, int(time.time() * 1000)), _timeframe_ms(timeframe),
+                OHLCV_PAGE_LIMIT, key=key)
+            _store_backfill(key, meta, result)
+            # Whatever pages arrived are served; a page's error only matters if nothing is stored
+            if result.error is not None and history_store.meta(*key) is None:
+                raise result.error
+    except UpstreamError:
+        if history_store.meta(*key) is None:
+            raise
+    
+    return history_store.read(*key, start_ms=start_ms)
@@ -0,0 +1,273 @@
+"""Live Binance ticker table fed by a WebSocket stream
+
+One long-lived connection to Binance's 24h ticker streams keeps the
+latest ticker of the watchlist pairs and of every pair a user asked for
+recently. crypto_service reads the table before going to REST, so a
+streamed quote costs a dictionary lookup and no network I/O. A pair
+whose ticker is older than max_age is left to REST until frames arrive
+again. Every frame is also a tick of the 1d charts (see tick_buffer).
+"""
+import json
+import random
+import threading
+import time
+import websocket
+from config import (POPULAR_CRYPTO, CRYPTO_STREAM_URL, CRYPTO_STREAM_MAX_AGE, CRYPTO_STREAM_RECENT_TTL,
+                    CRYPTO_STREAM_MAX_SYMBOLS, CRYPTO_STREAM_BACKOFF_MIN, CRYPTO_STREAM_BACKOFF_MAX)
+from services.tick_buffer import tick_buffer
+
+
+def _market_id(pair):
+    """Binance market id of a pair, e.g. BTC/USDT -> BTCUSDT"""
+    return pair.replace('/', '').upper()
+
+
+def _stream_name(pair):
+    """Binance stream of a pair's 24h ticker, e.g. BTC/USDT -> btcusdt@ticker"""
+    return _market_id(pair).lower() + '@ticker'
+
+
+def _ticker(pair, frame):
+    """ccxt-shaped ticker of a 24hrTicker frame"""
+    return {
+        'symbol': pair,
+        'last': float(frame['c']),
+        'change': float(frame['p']),
+        'percentage': float(frame['P']),
+        'quoteVolume': float(frame['q']),
+        'high': float(frame['h']),
+        'low': float(frame['l']),
+        'timestamp': frame.get('E')
+    }
+
+
+class TickerStream:
+    """Latest Binance tickers, kept current by one WebSocket connection
+
+    Runs on a background thread: connects, subscribes to the watchlist
+    pairs plus the recently requested ones, and stores every ticker frame.
+    Pairs requested through watch() are added to the live subscription and
+    dropped again when nobody has asked for them for recent_ttl seconds.
+    Past max_symbols, a newly requested pair takes the place of the least
+    recently requested one outside the watchlist (counted in 'dropped');
+    a pair that finds no such place waits in 'pending' until one frees up.
+    A lost connection, or one that delivers no frames for max_age seconds,
+    is reopened after an exponential backoff with jitter.
+    """
+
+    def __init__(self, url=CRYPTO_STREAM_URL, symbols=POPULAR_CRYPTO, max_age=CRYPTO_STREAM_MAX_AGE,
+                 recent_ttl=CRYPTO_STREAM_RECENT_TTL, max_symbols=CRYPTO_STREAM_MAX_SYMBOLS,
+                 backoff=(CRYPTO_STREAM_BACKOFF_MIN, CRYPTO_STREAM_BACKOFF_MAX), clock=time.monotonic,
+                 connect=websocket.create_connection):
+        self.url = url
+        self.symbols = list(symbols)
+        self.max_age = max_age
+        self.recent_ttl = recent_ttl
+        self.max_symbols = max_symbols
+        self.backoff = backoff
+        self._clock = clock
+        self._connect = connect
+        self._tickers = {}  # pair -> (ticker, monotonic receive time)
+        self._recent = {}  # requested pair -> last request time
+        self._pending = set()  # Pairs to subscribe on the open connection
+        self._subscribed = {}  # market id -> pair
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._socket = None
+        self._message_id = 0
+        self._delay = 0.0
+        self.connections = 0
+        self.failures = 0
+        self.frames = 0
+        self.dropped = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the background thread if it is not running yet"""
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='crypto-stream', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Close the connection and stop the background thread"""
+        self._stop.set()
+        socket = self._socket
+        if socket is not None:
+            try:
+                socket.close()
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get(self, pair):
+        """Latest streamed ticker of a pair, or None if it is not streamed or stale
+
+        Never touches the network; a None answer is the caller's cue to use REST.
+        """
+        now = self._clock()
+        with self._lock:
+            if pair in self._recent:
+                self._recent[pair] = now
+            entry = self._tickers.get(pair)
+        if entry is None or now - entry[1] > self.max_age:
+            return None
+        return dict(entry[0])
+
+    def watch(self, pair):
+        """Keep a pair that users ask for streamed; it is subscribed on the open connection"""
+        if not self.running:
+            return
+        with self._lock:
+            self._recent[pair] = self._clock()
+            if _market_id(pair) not in self._subscribed and pair not in self.symbols:
+                self._pending.add(pair)
+
+    def stats(self):
+        now = self._clock()
+        with self._lock:
+            fresh = sum(now - received <= self.max_age for _, received in self._tickers.values())
+            newest = max((received for _, received in self._tickers.values()), default=None)
+            return {
+                'running': self.running,
+                'connected': self._socket is not None,
+                'connections': self.connections,
+                'failures': self.failures,
+                'frames': self.frames,
+                'subscribed': len(self._subscribed),
+                'pending': len(self._pending),
+                'dropped': self.dropped,
+                'fresh': fresh,
+                'last_frame_age': round(now - newest, 3) if newest is not None else None,
+                'reconnect_delay': round(self._delay, 3)
+            }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._stream()
+            except Exception:
+                self.failures += 1
+            finally:
+                self._close()
+            if self._stop.is_set():
+                break
+            # Doubles with every attempt that delivered nothing; reset once frames arrive
+            low, high = self.backoff
+            self._delay = min(high, max(low, self._delay * 2))
+            self._stop.wait(self._delay * random.uniform(0.5, 1.0))
+
+    def _stream(self):
+        """Connect, subscribe and store frames until the connection fails or goes quiet"""
+        socket = self._connect(self.url, timeout=max(self.max_age, 1))
+        socket.settimeout(0.25)  # Pending subscriptions go out between reads
+        with self._lock:
+            self._socket = socket
+            self._subscribed = {}
+            self._pending = set(self.symbols) | set(self._recent)
+        self.connections += 1
+        last_frame = self._clock()
+        last_prune = last_frame
+        while not self._stop.is_set():
+            self._send_subscriptions(socket)
+            now = self._clock()
+            if now - last_prune >= min(self.recent_ttl, 60):
+                self._prune(socket, now)
+                last_prune = now
+            try:
+                message = socket.recv()
+            except websocket.WebSocketTimeoutException:
+                if self._subscribed and self._clock() - last_frame > self.max_age:
+                    raise TimeoutError('No ticker frames within max_age')
+                continue
+            if not message:
+                raise ConnectionError('Stream closed')
+            if self._store(json.loads(message)):
+                last_frame = self._clock()
+                self._delay = 0.0
+
+    def _send(self, socket, method, pairs):
+        self._message_id += 1
+        socket.send(json.dumps({'method': method, 'params': [_stream_name(p) for p in pairs], 'id': self._message_id}))
+
+    def _send_subscriptions(self, socket):
+        """Subscribe the pending pairs that fit, evicting less recently requested ones to make room"""
+        with self._lock:
+            if not self._pending:
+                return
+            requested = lambda pair: self._recent.get(pair, 0.0)
+            # Watchlist pairs first, then the most recently requested
+            pending = sorted(self._pending, key=lambda pair: (pair not in self.symbols, -requested(pair)))
+            # Least recently requested first; watchlist pairs are never evicted
+            evictable = sorted((pair for pair in self._subscribed.values() if pair not in self.symbols), key=requested)
+            room = self.max_symbols - len(self._subscribed)
+            pairs, evicted = [], []
+            for pair in pending:
+                if room <= 0:
+                    if not evictable or requested(evictable[0]) >= requested(pair):
+                        break  # The rest stay pending until a subscription is pruned
+                    evicted.append(evictable.pop(0))
+                    room += 1
+                pairs.append(pair)
+                room -= 1
+            for pair in evicted:
+                del self._subscribed[_market_id(pair)]
+                self._tickers.pop(pair, None)
+            self._pending.difference_update(pairs)
+            self._subscribed.update((_market_id(pair), pair) for pair in pairs)
+            self.dropped += len(evicted)
+        if evicted:
+            self._send(socket, 'UNSUBSCRIBE', evicted)
+        if pairs:
+            self._send(socket, 'SUBSCRIBE', pairs)
+
+    def _prune(self, socket, now):
+        """Unsubscribe pairs nobody asked for within recent_ttl"""
+        with self._lock:
+            idle = [pair for pair, used in self._recent.items() if now - used > self.recent_ttl]
+            for pair in idle:
+                del self._recent[pair]
+            self._pending.difference_update(pair for pair in idle if pair not in self.symbols)
+            dropped = [pair for pair in idle if _market_id(pair) in self._subscribed and pair not in self.symbols]
+            for pair in dropped:
+                del self._subscribed[_market_id(pair)]
+                self._tickers.pop(pair, None)
+        if dropped:
+            self._send(socket, 'UNSUBSCRIBE', dropped)
+
+    def _store(self, message):
+        """Store a ticker frame; returns False for other messages (e.g. subscription replies)"""
+        frame = message.get('data', message)  # Combined streams wrap each frame
+        if not isinstance(frame, dict) or frame.get('e') != '24hrTicker':
+            return False
+        received = self._clock()
+        with self._lock:
+            pair = self._subscribed.get(frame['s'])
+            if pair is None:
+                return False
+            ticker = _ticker(pair, frame)
+            self._tickers[pair] = (ticker, received)
+        self.frames += 1
+        tick_buffer.record(pair, ticker['last'], ticker['quoteVolume'], ticker['timestamp'])
+        return True
+
+    def _close(self):
+        with self._lock:
+            socket, self._socket = self._socket, None
+        if socket is not None:
+            try:
+                socket.close()
+            except Exception:
+                pass
+
+
+# Shared stream for the crypto quotes; started by app.py when CRYPTO_STREAM is enabled
+ticker_stream = TickerStream()
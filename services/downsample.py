@@ -0,0 +1,93 @@
+"""Chart downsampling: Largest-Triangle-Three-Buckets over candle arrays
+
+A chart cannot show more points than it has pixels, so long periods are
+reduced to max_points candles before they are sent. The closes keep the
+points LTTB picks: the first and last candle, then one candle per bucket
+of the rest, the one spanning the largest triangle with the previous
+pick and the next bucket's average, so peaks and troughs survive where a
+plain stride would step over them. The bucket holding the highest or
+lowest close always keeps that candle. High, low and volume are
+aggregated over each point's whole bucket, so no candle's extremes or
+volume are lost.
+"""
+import numpy as np
+
+
+def bucket_starts(count, max_points):
+    """Index of the first candle of each of max_points buckets
+
+    The first and last candle are buckets of their own; the candles in
+    between are split into max_points - 2 buckets of (almost) equal size.
+    """
+    every = (count - 2) / (max_points - 2)
+    middle = (np.arange(max_points - 2) * every).astype(np.int64) + 1
+    return np.concatenate(([0], middle, [count - 1]))
+
+
+def lttb_indices(x, y, max_points, keep_extremes=True):
+    """Indices of the max_points points LTTB picks from (x, y), in order
+
+    NumPy computes the bucket averages and each bucket's triangle areas at
+    once; only the walk from bucket to bucket, where each pick depends on
+    the one before, is a Python loop (max_points iterations, not one per
+    point).
+
+    Args:
+        x: Increasing x values (e.g. candle times)
+        y: Values to plot
+        max_points: Points to keep, at least 3
+        keep_extremes: Pick the highest and lowest y within their buckets
+    """
+    count = len(x)
+    if count <= max_points:
+        return np.arange(count)
+    x = np.asarray(x, dtype=np.float64) - float(x[0])  # Smaller magnitudes keep the areas exact
+    y = np.asarray(y, dtype=np.float64)
+    starts = bucket_starts(count, max_points)
+    ends = np.append(starts[1:], count)
+    # Average point of the bucket after each middle bucket (the last point for the last one)
+    sizes = ends - starts
+    next_x = (np.add.reduceat(x, starts) / sizes)[2:]
+    next_y = (np.add.reduceat(y, starts) / sizes)[2:]
+
+    forced = {}
+    if keep_extremes:
+        for extreme in (int(np.argmin(y)), int(np.argmax(y))):  # The highest wins a shared bucket
+            forced[int(np.searchsorted(starts, extreme, side='right')) - 1] = extreme
+
+    picked = np.empty(max_points, dtype=np.int64)
+    picked[0], picked[-1] = 0, count - 1
+    a = 0
+    for bucket in range(1, max_points - 1):
+        if bucket in forced:
+            a = forced[bucket]
+        else:
+            lo, hi = starts[bucket], ends[bucket]
+            area = np.abs((x[a] - next_x[bucket - 1]) * (y[lo:hi] - y[a])
+                          - (x[a] - x[lo:hi]) * (next_y[bucket - 1] - y[a]))
+            a = lo + int(np.argmax(area))
+        picked[bucket] = a
+    return picked
+
+
+def downsample(candles, max_points):
+    """At most max_points candles of candle arrays (see history_store.COLUMNS)
+
+    Each kept candle has the time and close of the candle LTTB picked in
+    its bucket, the open of the bucket's first candle, the bucket's
+    highest high and lowest low, and its total volume. Candles with no
+    more than max_points rows are returned unchanged.
+    """
+    count = len(candles['ts'])
+    if max_points is None or count <= max_points:
+        return candles
+    picked = lttb_indices(candles['ts'], candles['close'], max_points)
+    starts = bucket_starts(count, max_points)
+    return {
+        'ts': candles['ts'][picked],
+        'open': candles['open'][starts],
+        'high': np.fmax.reduceat(candles['high'], starts),
+        'low': np.fmin.reduceat(candles['low'], starts),
+        'close': candles['close'][picked],
+        'volume': np.add.reduceat(np.nan_to_num(candles['volume']), starts)
+    }
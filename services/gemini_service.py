@@ -1,6 +1,15 @@
 """Gemini AI service for stock analysis"""
+import re
 import google.generativeai as genai
-from config import GEMINI_API_KEY, GEMINI_MODEL
+from config import GEMINI_API_KEY, GEMINI_MODEL, GEMINI_REQUEST_TIMEOUT, LLM_CACHE_TTL
+from services.indicators import format_indicators
+from services.llm_cache import llm_cache
+from services.metrics import gemini_tokens
+from services.resilience import gemini, UpstreamError
+
+# Line opening each symbol's section of a batched analysis response, e.g. "=== AAPL ==="
+# (models sometimes wrap it in markdown bold or a heading)
+_SECTION = re.compile(r'^[ \t*#]*=+[ \t]*([^\s=*]+)[ \t]*=+[ \t*]*$', re.MULTILINE)
 
 
 def configure_gemini(api_key=None):
@@ -10,14 +19,119 @@ def configure_gemini(api_key=None):
         genai.configure(api_key=key)
 
 
-def ask_question(symbol, price_data, analysis_text, question, model_name=None, language='tr'):
-    """Ask a follow-up question about the analysis"""
-    model_name = model_name or GEMINI_MODEL
+def _record_usage(model_name, prompt, text, response=None):
+    """Count the tokens of a generated response in the gemini_tokens_total metric
+
+    Uses the usage the API reports where the SDK exposes it, otherwise
+    estimates about 4 characters per token.
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', None)
+    output_tokens = getattr(usage, 'candidates_token_count', None)
+    gemini_tokens.inc(model_name, 'prompt', amount=prompt_tokens if prompt_tokens is not None else len(prompt) // 4)
+    gemini_tokens.inc(model_name, 'output', amount=output_tokens if output_tokens is not None else len(text) // 4)
+
+
+def generate_cached(model_name, prompt, ttl_key, price=None, timeout=None):
+    """Generate a response, reusing a cached one for an equivalent prompt
     
-    # Configure Gemini
-    configure_gemini()
+    Args:
+        model_name: Gemini model name
+        prompt: Full prompt text
+        ttl_key: Freshness window in LLM_CACHE_TTL (analysis type, 'question' or 'news')
+        price: Current price, sets how far quoted numbers may move
+        timeout: Request timeout in seconds (default GEMINI_REQUEST_TIMEOUT)
+    
+    Returns:
+        Tuple of (response text, whether it came from the cache)
+    """
+    def generate():
+        model = genai.GenerativeModel(model_name)
+        response = gemini.call(model.generate_content, prompt, request_options=_request_options(timeout))
+        _record_usage(model_name, prompt, response.text, response)
+        return response.text
+    
+    return llm_cache.get_or_generate(model_name, prompt, generate, _ttl(ttl_key), price)
+
+
+async def generate_cached_async(model_name, prompt, ttl_key, price=None, timeout=None):
+    """generate_cached for the event loop (see asgi.py); arguments and result are the same"""
+    async def generate():
+        model = genai.GenerativeModel(model_name)
+        response = await gemini.call_async(model.generate_content_async, prompt,
+                                           request_options=_request_options(timeout))
+        _record_usage(model_name, prompt, response.text, response)
+        return response.text
+    
+    return await llm_cache.get_or_generate_async(model_name, prompt, generate, _ttl(ttl_key), price)
+
+
+def stream_cached(model_name, prompt, ttl_key, price=None):
+    """Stream a response as it is generated, or replay a cached one
     
+    The full text is cached once the stream completes, so later blocking
+    or streaming calls for an equivalent prompt are served from the cache.
+    
+    Returns:
+        Tuple of (whether it came from the cache, iterator of text chunks)
+    """
+    ttl = _ttl(ttl_key)
+    cached_text = llm_cache.lookup(model_name, prompt, ttl, price)
+    if cached_text is not None:
+        return True, iter([cached_text])
+    
+    def generate():
+        parts, chunk = [], None
+        try:
+            model = genai.GenerativeModel(model_name)
+            for chunk in gemini.stream(model.generate_content, prompt, request_options=_request_options(None)):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue  # Chunks without text parts (e.g. the final safety ratings)
+                if text:
+                    parts.append(text)
+                    yield text
+        except UpstreamError:
+            raise
+        except Exception as e:
+            raise Exception(f"Gemini API error: {str(e)}")
+        text = ''.join(parts)
+        _record_usage(model_name, prompt, text, chunk)  # The last chunk carries the usage of the whole stream
+        llm_cache.store(model_name, prompt, text, price)
+    
+    return False, generate()
+
+
+def _request_options(timeout):
+    return {'timeout': GEMINI_REQUEST_TIMEOUT if timeout is None else timeout}
+
+
+def _ttl(ttl_key):
+    return LLM_CACHE_TTL.get(ttl_key, LLM_CACHE_TTL['short_term'])
+
+
+def _disclaimer(language):
+    """Investment disclaimer appended to every analysis"""
+    if language == 'tr':
+        return "\n\n---\n**UYARI:** Bu analiz yatırım tavsiyesi niteliği taşımamaktadır. Yatırım kararları kendi risk ve sorumluluğunuzdadır."
+    return "\n\n---\n**DISCLAIMER:** This analysis does not constitute investment advice. Investment decisions are at your own risk and responsibility."
+
+
+def _question_prompt(symbol, price_data, analysis_text, question, language, history=()):
+    """Prompt for a follow-up question about an analysis
+    
+    Earlier questions and answers of the session (history) come after the
+    report, so successive prompts of a conversation share their beginning.
+    """
     lang_instruction = "Türkçe olarak" if language == 'tr' else "In English"
+    earlier = ''.join(f"""
+    Q: {asked}
+    A: {answer}
+    """ for asked, answer in history)
+    if earlier:
+        earlier = f"""
+    EARLIER QUESTIONS IN THIS CONVERSATION:{earlier}"""
     
     prompt = f"""
     You are a financial analysis expert. Answer the user's question about the following analysis report:
@@ -28,22 +142,69 @@ def ask_question(symbol, price_data, analysis_text, question, model_name=None, l
     
     PREVIOUS ANALYSIS REPORT:
     {analysis_text}
-    
+    {earlier}
     USER QUESTION: {question}
     
     Please answer the user's question based on the previous analysis report in a concise and clear manner (maximum 150 words).
     {lang_instruction}, answer in a professional but understandable way.
     """
+    return prompt
+
+
+def ask_question(symbol, price_data, analysis_text, question, model_name=None, language='tr',
+                 history=()):
+    """Ask a follow-up question about the analysis
+    
+    Returns:
+        Dictionary with the answer and whether it came from the cache
+    """
+    model_name = model_name or GEMINI_MODEL
+    
+    # Configure Gemini
+    configure_gemini()
+    
+    prompt = _question_prompt(symbol, price_data, analysis_text, question, language, history)
     
     try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
-        return response.text
+        answer, cached = generate_cached(model_name, prompt, 'question', price_data.get('price'))
+        return {'answer': answer, 'cached': cached}
+    except UpstreamError:
+        raise
     except Exception as e:
         raise Exception(f"Gemini API error: {str(e)}")
 
 
-def analyze_stock(symbol, price_data, analysis_type='short_term', model_name=None, language='tr'):
+async def ask_question_async(symbol, price_data, analysis_text, question, model_name=None, language='tr',
+                             history=()):
+    """ask_question without blocking the event loop"""
+    model_name = model_name or GEMINI_MODEL
+    configure_gemini()
+    prompt = _question_prompt(symbol, price_data, analysis_text, question, language, history)
+    
+    try:
+        answer, cached = await generate_cached_async(model_name, prompt, 'question', price_data.get('price'))
+        return {'answer': answer, 'cached': cached}
+    except UpstreamError:
+        raise
+    except Exception as e:
+        raise Exception(f"Gemini API error: {str(e)}")
+
+
+def ask_question_stream(symbol, price_data, analysis_text, question, model_name=None, language='tr',
+                        history=()):
+    """Stream the answer to a follow-up question as it is generated
+    
+    Returns:
+        Tuple of (whether it came from the cache, iterator of text chunks)
+    """
+    model_name = model_name or GEMINI_MODEL
+    configure_gemini()
+    prompt = _question_prompt(symbol, price_data, analysis_text, question, language, history)
+    return stream_cached(model_name, prompt, 'question', price_data.get('price'))
+
+
+def analyze_stock(symbol, price_data, analysis_type='short_term', model_name=None, language='tr', indicators=None,
+                  timeout=None):
     """Analyze a stock using Gemini AI
     
     Args:
@@ -51,12 +212,161 @@ def analyze_stock(symbol, price_data, analysis_type='short_term', model_name=Non
         price_data: Price data dictionary
         analysis_type: Type of analysis - 'daily', 'weekly', 'short_term', 'long_term'
         model_name: Gemini model name
+        indicators: Computed indicators (see indicators.compute_indicators)
+        timeout: Gemini request timeout in seconds (default GEMINI_REQUEST_TIMEOUT)
+    
+    Returns:
+        Dictionary with the analysis text and whether it came from the cache
     """
     model_name = model_name or GEMINI_MODEL
     
     # Configure Gemini
     configure_gemini()
     
+    prompt = _analysis_prompt(symbol, price_data, analysis_type, language, indicators)
+    
+    try:
+        analysis_text, cached = generate_cached(model_name, prompt, analysis_type, price_data.get('price'), timeout)
+        
+        # Add disclaimer at the end
+        return {'analysis': analysis_text + _disclaimer(language), 'cached': cached}
+    except UpstreamError:
+        raise
+    except Exception as e:
+        raise Exception(f"Gemini API error: {str(e)}")
+
+
+async def analyze_stock_async(symbol, price_data, analysis_type='short_term', model_name=None, language='tr', indicators=None,
+                              timeout=None):
+    """analyze_stock without blocking the event loop (arguments and result as analyze_stock)"""
+    model_name = model_name or GEMINI_MODEL
+    configure_gemini()
+    prompt = _analysis_prompt(symbol, price_data, analysis_type, language, indicators)
+    
+    try:
+        analysis_text, cached = await generate_cached_async(model_name, prompt, analysis_type, price_data.get('price'),
+                                                            timeout)
+        return {'analysis': analysis_text + _disclaimer(language), 'cached': cached}
+    except UpstreamError:
+        raise
+    except Exception as e:
+        raise Exception(f"Gemini API error: {str(e)}")
+
+
+def analyze_stock_stream(symbol, price_data, analysis_type='short_term', model_name=None, language='tr', indicators=None):
+    """Stream an analysis as it is generated (arguments as analyze_stock)
+    
+    Returns:
+        Tuple of (whether it came from the cache, iterator of text chunks
+        ending with the disclaimer)
+    """
+    model_name = model_name or GEMINI_MODEL
+    configure_gemini()
+    prompt = _analysis_prompt(symbol, price_data, analysis_type, language, indicators)
+    cached, chunks = stream_cached(model_name, prompt, analysis_type, price_data.get('price'))
+    
+    def with_disclaimer():
+        yield from chunks
+        yield _disclaimer(language)
+    
+    return cached, with_disclaimer()
+
+
+def analyze_stocks(items, analysis_type='short_term', model_name=None, language='tr'):
+    """Analyze several symbols with one Gemini call
+    
+    Symbols with a cached analysis are served from the cache. The rest
+    share one prompt asking for a section per symbol, and each section is
+    cached under that symbol's analyze_stock prompt, so a later single
+    analysis of the same data is a cache hit. Symbols whose section is
+    missing from the response are analyzed one by one.
+    
+    Args:
+        items: List of (symbol, price data, indicators) tuples
+        analysis_type: Type of analysis - 'daily', 'weekly', 'short_term', 'long_term'
+        model_name: Gemini model name
+        language: Report language
+    
+    Returns:
+        Tuple of (dictionary of symbol -> analyze_stock result or error
+        dictionary, number of Gemini calls made)
+    """
+    model_name = model_name or GEMINI_MODEL
+    configure_gemini()
+    ttl = _ttl(analysis_type)
+    
+    results = {}
+    pending = []
+    for symbol, price_data, indicators in items:
+        prompt = _analysis_prompt(symbol, price_data, analysis_type, language, indicators)
+        cached_text = llm_cache.lookup(model_name, prompt, ttl, price_data.get('price'))
+        if cached_text is not None:
+            results[symbol] = {'analysis': cached_text + _disclaimer(language), 'cached': True}
+        else:
+            pending.append((symbol, price_data, indicators, prompt))
+    
+    calls = 0
+    if len(pending) > 1:
+        calls += 1
+        try:
+            model = genai.GenerativeModel(model_name)
+            batch_prompt = _batch_prompt(pending, analysis_type, language)
+            response = gemini.call(model.generate_content, batch_prompt, request_options=_request_options(None))
+            text = response.text
+            _record_usage(model_name, batch_prompt, text, response)
+        except UpstreamError as e:
+            # The other symbols would be refused the same way
+            for symbol, *_ in pending:
+                results[symbol] = _batch_error(e)
+            return results, calls
+        except Exception:
+            text = ''
+        
+        sections = _split_sections(text, [symbol for symbol, *_ in pending])
+        for symbol, price_data, _, prompt in pending:
+            section = sections.get(symbol)
+            if section:
+                llm_cache.store(model_name, prompt, section, price_data.get('price'))
+                results[symbol] = {'analysis': section + _disclaimer(language), 'cached': False}
+    
+    for symbol, price_data, indicators, _ in pending:
+        if symbol in results:
+            continue
+        calls += 1
+        try:
+            results[symbol] = analyze_stock(symbol, price_data, analysis_type, model_name, language, indicators)
+        except Exception as e:
+            results[symbol] = _batch_error(e)
+    return results, calls
+
+
+def _batch_error(error):
+    """Error entry of a symbol whose batched analysis failed"""
+    result = {'error': str(error)}
+    if isinstance(error, UpstreamError) and error.retry_after is not None:
+        result['retry_after'] = round(error.retry_after, 1)
+    return result
+
+
+def _split_sections(text, symbols):
+    """Map each requested symbol to its section of a batched response"""
+    wanted = {symbol.upper(): symbol for symbol in symbols}
+    sections = {}
+    markers = list(_SECTION.finditer(text))
+    for marker, following in zip(markers, markers[1:] + [None]):
+        symbol = wanted.get(marker.group(1).upper())
+        body = text[marker.end():following.start() if following else len(text)].strip()
+        if symbol and body and symbol not in sections:
+            sections[symbol] = body
+    return sections
+
+
+def _analysis_context(analysis_type, language):
+    """Title, focus and language instruction of an analysis type
+    
+    Returns:
+        Tuple of (analysis type label, focus areas, language instruction)
+    """
     # Define analysis type prompts
     analysis_prompts = {
         'daily': {
@@ -83,15 +393,6 @@ def analyze_stock(symbol, price_data, analysis_type='short_term', model_name=Non
     
     analysis_info = analysis_prompts.get(analysis_type, analysis_prompts['short_term'])
     
-    # Check if this is a warrant
-    is_warrant = symbol.endswith('.V')
-    warrant_note = ""
-    if is_warrant:
-        if language == 'tr':
-            warrant_note = "\n\nNOT: Bu bir varant (warrant) sembolüdür. Varantlar, dayanak varlığa (örneğin KOZAL) dayalı türev enstrümanlardır. Varant analizinde dayanak varlığın performansı, vade tarihi, kullanım fiyatı ve varantın kaldıracı gibi faktörleri değerlendir."
-        else:
-            warrant_note = "\n\nNOTE: This is a warrant symbol. Warrants are derivative instruments based on underlying assets (e.g., KOZAL). In warrant analysis, consider factors such as the underlying asset's performance, expiry date, strike price, and the warrant's leverage."
-    
     # Create analysis prompt based on language
     if language == 'tr':
         lang_instruction = "Türkçe olarak, profesyonel ama kısa ve öz bir şekilde sun."
@@ -107,6 +408,36 @@ def analyze_stock(symbol, price_data, analysis_type='short_term', model_name=Non
         }
         analysis_type_label = analysis_type_labels_en.get(analysis_type, analysis_info['title'])
     
+    return analysis_type_label, analysis_info['focus'], lang_instruction
+
+
+def _symbol_notes(symbol, language, indicators):
+    """Warrant note and computed indicator lines of a symbol's prompt section"""
+    # Check if this is a warrant
+    is_warrant = symbol.endswith('.V')
+    warrant_note = ""
+    if is_warrant:
+        if language == 'tr':
+            warrant_note = "\n\nNOT: Bu bir varant (warrant) sembolüdür. Varantlar, dayanak varlığa (örneğin KOZAL) dayalı türev enstrümanlardır. Varant analizinde dayanak varlığın performansı, vade tarihi, kullanım fiyatı ve varantın kaldıracı gibi faktörleri değerlendir."
+        else:
+            warrant_note = "\n\nNOTE: This is a warrant symbol. Warrants are derivative instruments based on underlying assets (e.g., KOZAL). In warrant analysis, consider factors such as the underlying asset's performance, expiry date, strike price, and the warrant's leverage."
+    
+    # Give the model real indicator values instead of letting it guess them
+    indicator_note = ""
+    if indicators:
+        indicator_note = f"""
+    Technical Indicators (computed from {indicators['candles']} candles of {indicators.get('period', 'recent')} history):
+    {format_indicators(indicators)}
+    Use these computed values when discussing indicators and do not invent other indicator values.
+    """
+    return warrant_note, indicator_note
+
+
+def _analysis_prompt(symbol, price_data, analysis_type, language, indicators):
+    """Prompt for an analysis of the given type"""
+    analysis_type_label, focus, lang_instruction = _analysis_context(analysis_type, language)
+    warrant_note, indicator_note = _symbol_notes(symbol, language, indicators)
+    
     # Create analysis prompt - Kısa ve öz
     prompt = f"""
     You are a financial analysis expert. Perform {analysis_type_label} on the following stock/cryptocurrency:
@@ -116,32 +447,60 @@ def analyze_stock(symbol, price_data, analysis_type='short_term', model_name=Non
     Change: {price_data.get('change', 'N/A')} ({price_data.get('change_percent', 'N/A')}%)
     Volume: {price_data.get('volume', 'N/A')}
     {warrant_note}
-    
+    {indicator_note}
     Analysis Type: {analysis_type_label}
     
     Please perform a BRIEF AND CONCISE analysis (maximum 300 words). Briefly summarize the following headings:
     
     1. CURRENT SITUATION (2-3 sentences)
-    2. TECHNICAL ANALYSIS (2-3 sentences - {analysis_info['focus']})
+    2. TECHNICAL ANALYSIS (2-3 sentences - {focus})
     3. PRICE TARGETS (1-2 sentences)
     4. RISKS AND OPPORTUNITIES (2-3 sentences)
     5. RECOMMENDATION (1 sentence)
     
     {lang_instruction} Avoid unnecessary details, only mention important points.
     """
-    
-    try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
-        analysis_text = response.text
-        
-        # Add disclaimer at the end
-        if language == 'tr':
-            disclaimer = "\n\n---\n**UYARI:** Bu analiz yatırım tavsiyesi niteliği taşımamaktadır. Yatırım kararları kendi risk ve sorumluluğunuzdadır."
-        else:
-            disclaimer = "\n\n---\n**DISCLAIMER:** This analysis does not constitute investment advice. Investment decisions are at your own risk and responsibility."
-        
-        return analysis_text + disclaimer
-    except Exception as e:
-        raise Exception(f"Gemini API error: {str(e)}")
+    return prompt
+
 
+def _batch_prompt(items, analysis_type, language):
+    """Prompt asking for the analysis of several symbols, one marked section each
+    
+    Args:
+        items: List of (symbol, price data, indicators, ...) tuples
+    """
+    analysis_type_label, focus, lang_instruction = _analysis_context(analysis_type, language)
+    
+    blocks = []
+    for symbol, price_data, indicators, *_ in items:
+        warrant_note, indicator_note = _symbol_notes(symbol, language, indicators)
+        blocks.append(f"""
+    Symbol: {symbol}
+    Current Price: ${price_data.get('price', 'N/A')}
+    Change: {price_data.get('change', 'N/A')} ({price_data.get('change_percent', 'N/A')}%)
+    Volume: {price_data.get('volume', 'N/A')}
+    {warrant_note}
+    {indicator_note}""")
+    
+    first = items[0][0]
+    prompt = f"""
+    You are a financial analysis expert. Perform {analysis_type_label} on each of the following {len(items)} stocks/cryptocurrencies:
+    {''.join(blocks)}
+    
+    Analysis Type: {analysis_type_label}
+    
+    For EACH symbol, perform a BRIEF AND CONCISE analysis (maximum 300 words per symbol). Briefly summarize the following headings:
+    
+    1. CURRENT SITUATION (2-3 sentences)
+    2. TECHNICAL ANALYSIS (2-3 sentences - {focus})
+    3. PRICE TARGETS (1-2 sentences)
+    4. RISKS AND OPPORTUNITIES (2-3 sentences)
+    5. RECOMMENDATION (1 sentence)
+    
+    Analyze each symbol on its own, without comparing it to the others. Start each symbol's analysis with a line
+    containing only the symbol between three equals signs (for example "=== {first} ==="), in the order given,
+    and write nothing before the first one.
+    
+    {lang_instruction} Avoid unnecessary details, only mention important points.
+    """
+    return prompt
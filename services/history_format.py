@@ -0,0 +1,123 @@
+"""Chart payloads of candle arrays
+
+The history endpoint answers in one of two formats, both built with
+NumPy column operations rather than a loop per candle:
+
+    json      parallel lists of date strings and prices rounded to cents
+    columnar  the same values packed for the browser: each column is the
+              first value plus little-endian typed-array deltas in base64,
+              at the narrowest width that holds them (see encode_column).
+              Times are epoch milliseconds counted in whole minutes (or
+              seconds), prices are counted in cents, and the client formats
+              the dates itself in the venue's timezone.
+"""
+import base64
+import numpy as np
+import pandas as pd
+from services.downsample import downsample
+
+# Values of the history endpoint's format parameter
+FORMATS = ('json', 'columnar')
+
+# Fewest points a chart can be downsampled to: the first, the last and one in between
+MIN_POINTS = 3
+
+# Prices are rounded to cents in both formats
+PRICE_SCALE = 100
+
+# Integer dtypes tried for a column, narrowest first, and the JS typed array of each
+_INT_TYPES = (
+    (np.dtype('<i1'), 'Int8Array'),
+    (np.dtype('<i2'), 'Int16Array'),
+    (np.dtype('<i4'), 'Int32Array')
+)
+
+# Time units tried for the candle times, coarsest first
+_TIME_UNITS = (60000, 1000, 1)
+
+
+def chart_dates(ts, tz, period):
+    """Date strings of epoch milliseconds in timezone tz, with the time for the 1d period"""
+    local = pd.to_datetime(ts, unit='ms', utc=True).tz_convert(tz).tz_localize(None)
+    if period == '1d':
+        return np.char.replace(np.datetime_as_string(local.values.astype('datetime64[m]')), 'T', ' ')
+    return np.datetime_as_string(local.values.astype('datetime64[D]'))
+
+
+def json_history(candles, tz, period):
+    """Chart dictionary of JSON lists (dates in timezone tz)"""
+    return {
+        'dates': chart_dates(candles['ts'], tz, period).tolist(),
+        'prices': np.round(candles['close'], 2).tolist(),
+        'high': np.round(candles['high'], 2).tolist(),
+        'low': np.round(candles['low'], 2).tolist(),
+        'volume': np.nan_to_num(candles['volume']).astype(np.int64).tolist()
+    }
+
+
+def encode_column(values, scale=1):
+    """Column dictionary of a numeric array for the columnar format
+
+    Finite values are stored as round(values * scale) integers: 'first'
+    holds the first one and 'data' the differences between neighbours in
+    the narrowest of Int8/Int16/Int32Array (Float64Array, exact up to
+    2**53, if they are wider). A column with NaN or infinite values is
+    stored whole as Float64Array without 'first'.
+
+    Returns:
+        Dictionary of 'type' (JS typed array name), 'data' (base64 of
+        the little-endian array), 'scale' and, if delta-encoded, 'first'
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not np.isfinite(values).all():
+        return {'type': 'Float64Array', 'scale': 1, 'data': _base64(np.round(values * scale) / scale, '<f8')}
+    ints = np.round(values * scale).astype(np.int64)
+    deltas = np.diff(ints)
+    low, high = (int(deltas.min()), int(deltas.max())) if len(deltas) else (0, 0)
+    for dtype, name in _INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            break
+    else:
+        dtype, name = np.dtype('<f8'), 'Float64Array'
+    return {'type': name, 'scale': scale, 'first': int(ints[0]) if len(ints) else 0, 'data': _base64(deltas, dtype)}
+
+
+def _base64(values, dtype):
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+
+def decode_column(column):
+    """Values of an encode_column dictionary (what analyze.js does in the browser)"""
+    raw = np.frombuffer(base64.b64decode(column['data']), dtype={
+        'Int8Array': '<i1', 'Int16Array': '<i2', 'Int32Array': '<i4', 'Float64Array': '<f8'}[column['type']])
+    if 'first' not in column:
+        return raw.astype(np.float64)
+    values = np.concatenate(([column['first']], column['first'] + np.cumsum(raw.astype(np.int64))))
+    return values / column['scale'] if column['scale'] != 1 else values
+
+
+def columnar_history(candles, tz, period):
+    """Chart dictionary of delta-encoded typed-array columns (see encode_column)"""
+    ts = candles['ts'].astype(np.int64)
+    unit = next(unit for unit in _TIME_UNITS if not (ts % unit).any())
+    return {
+        'format': 'columnar',
+        'count': len(ts),
+        'tz': tz,
+        'daily': period != '1d',  # Dates without the time of day
+        'time_unit': unit,  # Milliseconds per unit of the times column
+        'times': encode_column(ts // unit),
+        'prices': encode_column(candles['close'], PRICE_SCALE),
+        'high': encode_column(candles['high'], PRICE_SCALE),
+        'low': encode_column(candles['low'], PRICE_SCALE),
+        'volume': encode_column(np.trunc(np.nan_to_num(candles['volume'])))
+    }
+
+
+def format_history(candles, tz, period, fmt='json', max_points=None):
+    """Chart dictionary of candle arrays in one of FORMATS, downsampled to max_points (see downsample)"""
+    candles = downsample(candles, max_points)
+    if fmt == 'columnar':
+        return columnar_history(candles, tz, period)
+    return json_history(candles, tz, period)
@@ -0,0 +1,158 @@
+"""On-disk OHLCV history store with incremental top-up
+
+Every (source, symbol, interval) series lives in its own directory as one
+raw little-endian binary file per column plus a small meta.json. Reads
+memory-map the columns and copy out only the requested slice; updates
+append the candles newer than the last stored one.
+"""
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+from config import HISTORY_STORE_DIR
+
+# Column name -> on-disk dtype; 'ts' is the candle open time in epoch milliseconds
+COLUMNS = {
+    'ts': np.dtype('<i8'),
+    'open': np.dtype('<f8'),
+    'high': np.dtype('<f8'),
+    'low': np.dtype('<f8'),
+    'close': np.dtype('<f8'),
+    'volume': np.dtype('<f8')
+}
+
+
+def empty_candles():
+    """Candle arrays with no rows"""
+    return {column: np.empty(0, dtype=dtype) for column, dtype in COLUMNS.items()}
+
+
+class HistoryStore:
+    """Append-only columnar OHLCV files keyed by (source, symbol, interval)
+    
+    Meta fields kept per series:
+        rows: number of valid rows in the column files
+        first_ts, last_ts: open time of the first and last stored candle
+        covered_from: earliest time the series is known to be complete from
+        complete: True once the full listing history is stored
+        updated_at, full_at: wall time of the last top-up and last full download
+    """
+
+    def __init__(self, root=HISTORY_STORE_DIR):
+        self.root = root
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _dir(self, source, symbol, interval):
+        safe_symbol = re.sub(r'[^A-Za-z0-9._-]', '_', symbol)
+        return os.path.join(self.root, source, safe_symbol, interval)
+
+    def _lock(self, path):
+        with self._locks_lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    @staticmethod
+    def _read_meta(path):
+        try:
+            with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_meta(path, meta):
+        tmp_path = os.path.join(path, 'meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(path, 'meta.json'))
+
+    @staticmethod
+    def _column(path, column, rows):
+        """Read-only memory map of a column's valid rows"""
+        return np.memmap(os.path.join(path, f'{column}.bin'), dtype=COLUMNS[column], mode='r', shape=(rows,))
+
+    def meta(self, source, symbol, interval):
+        """Get a series' meta dictionary, or None if nothing is stored"""
+        return self._read_meta(self._dir(source, symbol, interval))
+
+    def read(self, source, symbol, interval, start_ms=None, last=None):
+        """Read stored candles
+        
+        Args:
+            start_ms: Only candles opening at or after this time
+            last: Only the last N candles
+        
+        Returns:
+            Dictionary of column -> array (copies, safe to keep), or None if nothing is stored
+        """
+        path = self._dir(source, symbol, interval)
+        with self._lock(path):
+            meta = self._read_meta(path)
+            if meta is None:
+                return None
+            rows = meta['rows']
+            if rows == 0:
+                return empty_candles()
+            
+            lo = 0
+            if start_ms is not None:
+                lo = int(np.searchsorted(self._column(path, 'ts', rows), start_ms, side='left'))
+            if last is not None:
+                lo = max(lo, rows - last)
+            # Copy the slice so no memory map outlives the lock (appends may truncate the files)
+            return {column: np.array(self._column(path, column, rows)[lo:]) for column in COLUMNS}
+
+    def write(self, source, symbol, interval, candles, **meta_fields):
+        """Replace a series with new candles (sorted by ts, no duplicates)"""
+        path = self._dir(source, symbol, interval)
+        with self._lock(path):
+            os.makedirs(path, exist_ok=True)
+            for column, dtype in COLUMNS.items():
+                with open(os.path.join(path, f'{column}.bin'), 'wb') as f:
+                    f.write(np.ascontiguousarray(candles[column], dtype=dtype).tobytes())
+            now = time.time()
+            meta = {'updated_at': now, 'full_at': now, 'complete': False, 'covered_from': None}
+            meta.update(meta_fields)
+            self._write_meta(path, self._with_bounds(meta, candles['ts']))
+
+    def append(self, source, symbol, interval, candles, **meta_fields):
+        """Add candles newer than the stored ones, replacing any stored candle they overlap"""
+        path = self._dir(source, symbol, interval)
+        with self._lock(path):
+            meta = self._read_meta(path)
+            if meta is None:
+                raise ValueError(f'No stored history for {source}/{symbol}/{interval}')
+            if len(candles['ts']) == 0:
+                meta.update(meta_fields, updated_at=time.time())
+                self._write_meta(path, meta)
+                return
+            
+            rows = meta['rows']
+            keep = rows
+            if rows:
+                keep = int(np.searchsorted(self._column(path, 'ts', rows), candles['ts'][0], side='left'))
+            for column, dtype in COLUMNS.items():
+                with open(os.path.join(path, f'{column}.bin'), 'r+b') as f:
+                    f.truncate(keep * dtype.itemsize)
+                    f.seek(0, os.SEEK_END)
+                    f.write(np.ascontiguousarray(candles[column], dtype=dtype).tobytes())
+            
+            meta['rows'] = keep + len(candles['ts'])
+            meta.update(meta_fields, updated_at=time.time())
+            if keep == 0:
+                meta['first_ts'] = int(candles['ts'][0])
+            meta['last_ts'] = int(candles['ts'][-1])
+            self._write_meta(path, meta)
+
+    @staticmethod
+    def _with_bounds(meta, ts):
+        meta['rows'] = int(len(ts))
+        meta['first_ts'] = int(ts[0]) if len(ts) else None
+        meta['last_ts'] = int(ts[-1]) if len(ts) else None
+        return meta
+
+
+# Shared store for the whole process
+history_store = HistoryStore()
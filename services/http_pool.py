@@ -0,0 +1,57 @@
+"""Shared keep-alive HTTP sessions for the sync upstream clients"""
+import requests
+from requests.adapters import HTTPAdapter
+from config import HTTP_POOL_SIZE, HTTP_POOL_HOSTS
+
+
+def pooled_session(pool_size=HTTP_POOL_SIZE, hosts=HTTP_POOL_HOSTS):
+    """requests.Session keeping up to pool_size idle connections per host
+
+    requests keeps 10 connections per host by default; when more threads
+    than that share a session, every surplus response closes its
+    connection and the next request pays a new TCP/TLS handshake.
+
+    Args:
+        pool_size: Idle connections kept per host (size it to the busiest thread pool)
+        hosts: Number of hosts whose connection pools are kept
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def connection_summary(request_count, connection_count):
+    """Requests sent, connections opened and the share of requests on a reused connection"""
+    return {
+        'requests': request_count,
+        'connections': connection_count,
+        'reused': max(request_count - connection_count, 0),
+        'reuse_ratio': round(1 - connection_count / request_count, 4) if request_count else 0.0
+    }
+
+
+def connection_stats(session):
+    """Connection reuse of a requests.Session, in total and per host
+
+    Counts come from the urllib3 pools of the session's adapters, so they
+    cover every request made through the session (yfinance, ccxt, or direct).
+    """
+    hosts = {}
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        pools = getattr(adapter, 'poolmanager', None)
+        if pools is None:
+            continue
+        for key in pools.pools.keys():
+            pool = pools.pools.get(key)
+            if pool is None:
+                continue
+            totals = hosts.setdefault(f"{pool.scheme}://{pool.host}:{pool.port}", [0, 0])
+            totals[0] += pool.num_requests
+            totals[1] += pool.num_connections
+    return {
+        **connection_summary(sum(t[0] for t in hosts.values()), sum(t[1] for t in hosts.values())),
+        'hosts': {host: connection_summary(*totals) for host, totals in sorted(hosts.items())}
+    }
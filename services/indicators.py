@@ -0,0 +1,248 @@
+"""Vectorized technical indicators over OHLCV arrays
+
+Every indicator takes NumPy arrays (or lists) and returns arrays of the same
+length, with NaN where the look-back window is not yet filled.
+"""
+import numpy as np
+
+# Largest weight ratio inside one EMA block. Mixed-sign inputs lose about
+# log10 of this many digits, so 1e3 keeps results within ~1e-13.
+_EMA_MAX_GROWTH = 1e3
+
+
+def _as_array(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def sma(values, window):
+    """Simple moving average over a rolling window"""
+    x = _as_array(values)
+    out = np.full(len(x), np.nan)
+    if window <= 0 or len(x) < window:
+        return out
+    sums = np.cumsum(np.concatenate(([0.0], x)))
+    out[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return out
+
+
+def ema(values, span=None, alpha=None):
+    """Exponential moving average seeded with the first value
+
+    Same recursion as pandas ``ewm(adjust=False)``:
+    y[t] = (1 - alpha) * y[t-1] + alpha * x[t].
+
+    The recursion is solved in blocks: within a block it is a weighted
+    cumulative sum, and only the carry between blocks is sequential.
+
+    Args:
+        values: Input series
+        span: EMA span, giving alpha = 2 / (span + 1)
+        alpha: Smoothing factor, e.g. 1 / period for Wilder smoothing
+    """
+    x = _as_array(values)
+    n = len(x)
+    a = alpha if alpha is not None else 2.0 / (span + 1)
+    decay = 1.0 - a
+    if n == 0 or decay <= 0:
+        return x.copy()
+
+    block = int(np.log(_EMA_MAX_GROWTH) / -np.log(decay)) if decay < 1 else n
+    block = max(1, min(n, block))
+    blocks = -(-n // block)
+
+    padded = np.zeros(blocks * block)
+    padded[:n] = x
+    offsets = np.arange(block)
+    # EMA of every block as if it started from zero
+    local = padded.reshape(blocks, block) * decay ** -offsets
+    np.cumsum(local, axis=1, out=local)
+    local *= a * decay ** offsets
+
+    # Value carried into each block from the end of the previous one
+    carry_in = np.empty(blocks)
+    carry = x[0]
+    block_decay = decay ** block
+    for i, end in enumerate(local[:, -1].tolist()):
+        carry_in[i] = carry
+        carry = end + block_decay * carry
+
+    local += decay ** (offsets + 1) * carry_in[:, None]
+    return local.ravel()[:n]
+
+
+def rsi(close, period=14):
+    """Relative strength index with Wilder smoothing"""
+    x = _as_array(close)
+    out = np.full(len(x), np.nan)
+    if len(x) <= period:
+        return out
+    delta = np.diff(x)
+    avg_gain = ema(np.clip(delta, 0, None), alpha=1.0 / period)
+    avg_loss = ema(np.clip(-delta, 0, None), alpha=1.0 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    values[avg_loss == 0] = 100.0
+    values[(avg_loss == 0) & (avg_gain == 0)] = 50.0
+    out[period:] = values[period - 1:]
+    return out
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """MACD line, signal line and histogram"""
+    x = _as_array(close)
+    line = ema(x, span=fast) - ema(x, span=slow)
+    signal_line = ema(line, span=signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close, window=20, num_std=2.0):
+    """Bollinger bands (upper, middle, lower) with population deviation"""
+    x = _as_array(close)
+    middle = sma(x, window)
+    if len(x) < window:
+        return middle.copy(), middle, middle.copy()
+    # Centre the series first so the running sum of squares keeps precision
+    centred = x - x.mean()
+    sums = np.cumsum(np.concatenate(([0.0], centred)))
+    squares = np.cumsum(np.concatenate(([0.0], centred * centred)))
+    mean = (sums[window:] - sums[:-window]) / window
+    var = (squares[window:] - squares[:-window]) / window - mean * mean
+    std = np.full(len(x), np.nan)
+    std[window - 1:] = np.sqrt(np.clip(var, 0, None))
+    return middle + num_std * std, middle, middle - num_std * std
+
+
+def true_range(high, low, close):
+    """True range; the first candle falls back to high - low"""
+    high, low, close = _as_array(high), _as_array(low), _as_array(close)
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    ranges = np.stack((high - low, np.abs(high - prev_close), np.abs(low - prev_close)))
+    return np.fmax.reduce(ranges, axis=0)
+
+
+def atr(high, low, close, period=14):
+    """Average true range with Wilder smoothing"""
+    tr = true_range(high, low, close)
+    out = np.full(len(tr), np.nan)
+    if len(tr) < period:
+        return out
+    out[period - 1:] = ema(tr, alpha=1.0 / period)[period - 1:]
+    return out
+
+
+def pivot_points(high, low, close):
+    """Classic floor pivots from the last candle"""
+    h, l, c = float(high[-1]), float(low[-1]), float(close[-1])
+    pivot = (h + l + c) / 3
+    return {
+        'pivot': pivot,
+        'r1': 2 * pivot - l,
+        's1': 2 * pivot - h,
+        'r2': pivot + (h - l),
+        's2': pivot - (h - l)
+    }
+
+
+def _rolling_extreme(values, order, reduce):
+    """Extreme of each centred window of 2 * order + 1 values"""
+    size = len(values) - 2 * order
+    out = values[:size].copy()
+    for shift in range(1, 2 * order + 1):
+        reduce(out, values[shift:shift + size], out=out)
+    return out
+
+
+def swing_levels(high, low, close, order=5, count=3):
+    """Nearest swing highs above and swing lows below the last close
+
+    A swing high is a candle whose high is the maximum of the ``order``
+    candles on either side of it (and likewise for lows).
+
+    Returns:
+        Tuple of (support levels descending, resistance levels ascending)
+    """
+    high, low = _as_array(high), _as_array(low)
+    if len(high) < 2 * order + 1:
+        return [], []
+    centre = slice(order, len(high) - order)
+    highs = high[centre][high[centre] == _rolling_extreme(high, order, np.maximum)]
+    lows = low[centre][low[centre] == _rolling_extreme(low, order, np.minimum)]
+    last = float(close[-1])
+    support = np.unique(lows[lows < last])[::-1][:count]
+    resistance = np.unique(highs[highs > last])[:count]
+    return support.tolist(), resistance.tolist()
+
+
+def _last(values):
+    value = float(values[-1])
+    return None if np.isnan(value) else round(value, 4)
+
+
+def _levels(values):
+    return [round(v, 4) for v in values]
+
+
+def compute_indicators(candles):
+    """Latest value of every indicator for a candle series
+
+    Args:
+        candles: Dictionary with 'high', 'low' and 'close' arrays
+
+    Returns:
+        Dictionary of indicator values (None where the series is too short),
+        or None for an empty series
+    """
+    close = _as_array(candles['close'])
+    if len(close) == 0:
+        return None
+    high = _as_array(candles['high'])
+    low = _as_array(candles['low'])
+
+    macd_line, signal_line, histogram = macd(close)
+    upper, middle, lower = bollinger(close)
+    support, resistance = swing_levels(high, low, close)
+
+    return {
+        'candles': len(close),
+        'close': _last(close),
+        'sma_20': _last(sma(close, 20)),
+        'sma_50': _last(sma(close, 50)),
+        'sma_200': _last(sma(close, 200)),
+        'ema_12': _last(ema(close, span=12)),
+        'ema_26': _last(ema(close, span=26)),
+        'rsi_14': _last(rsi(close, 14)),
+        'macd': {
+            'macd': _last(macd_line),
+            'signal': _last(signal_line),
+            'histogram': _last(histogram)
+        },
+        'bollinger': {
+            'upper': _last(upper),
+            'middle': _last(middle),
+            'lower': _last(lower)
+        },
+        'atr_14': _last(atr(high, low, close, 14)),
+        'pivots': {k: round(v, 4) for k, v in pivot_points(high, low, close).items()},
+        'support': _levels(support),
+        'resistance': _levels(resistance)
+    }
+
+
+def format_indicators(indicators):
+    """Render computed indicators as prompt lines"""
+    def show(value):
+        return 'N/A' if value is None else f'{value:g}'
+
+    m, b, p = indicators['macd'], indicators['bollinger'], indicators['pivots']
+    lines = [
+        f"RSI(14): {show(indicators['rsi_14'])}",
+        f"MACD(12,26,9): {show(m['macd'])}, signal {show(m['signal'])}, histogram {show(m['histogram'])}",
+        f"SMA 20/50/200: {show(indicators['sma_20'])} / {show(indicators['sma_50'])} / {show(indicators['sma_200'])}",
+        f"EMA 12/26: {show(indicators['ema_12'])} / {show(indicators['ema_26'])}",
+        f"Bollinger(20,2): upper {show(b['upper'])}, middle {show(b['middle'])}, lower {show(b['lower'])}",
+        f"ATR(14): {show(indicators['atr_14'])}",
+        f"Pivots: P {show(p['pivot'])}, R1 {show(p['r1'])}, R2 {show(p['r2'])}, S1 {show(p['s1'])}, S2 {show(p['s2'])}",
+        f"Swing support: {', '.join(map(show, indicators['support'])) or 'N/A'}",
+        f"Swing resistance: {', '.join(map(show, indicators['resistance'])) or 'N/A'}"
+    ]
+    return '\n    '.join(lines)
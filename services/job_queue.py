@@ -0,0 +1,253 @@
+"""Background jobs for long-running analyses, kept in a local SQLite store
+
+A submitted job gets an id at once and runs on a bounded worker pool,
+either on threads or in worker processes. Its status and result live in
+a SQLite file, so clients poll (or stream) them later and jobs that were
+queued or running when the server stopped start over on the next run.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+from services.gemini_service import configure_gemini
+from services.resilience import UpstreamError
+from config import JOB_STORE_PATH, JOB_WORKERS, JOB_WORKER_MODE, JOB_RESULT_TTL, JOB_MAX_RESULTS
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+FINISHED = (DONE, FAILED)
+
+_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        params TEXT NOT NULL,
+        status TEXT NOT NULL,
+        http_status INTEGER,
+        result TEXT,
+        created REAL NOT NULL,
+        started REAL,
+        finished REAL
+    )''',
+    'CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)',
+    'CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (status, finished)'
+)
+
+
+def _run_handler(handler, params):
+    """Run a job function, turning an exception into an error payload
+
+    Also runs in worker processes, where an exception such as
+    UpstreamError would not survive the trip back to the server.
+
+    Returns:
+        Tuple of (response payload, HTTP status)
+    """
+    try:
+        return handler(**params)
+    except Exception as e:
+        return {'error': str(e)}, 503 if isinstance(e, UpstreamError) else 500
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value).isoformat() if value else None
+
+
+class JobQueue:
+    """SQLite-backed job store with a worker pool and result polling
+
+    Job functions are registered per job type; they take the job
+    parameters as keyword arguments and return (payload, HTTP status),
+    like the synchronous routes they stand in for. A job with a status
+    of 400 or more is failed, otherwise done. Submitting a job identical
+    to one still queued or running returns that job instead.
+
+    Finished jobs are kept for ttl seconds, and at most max_results of
+    them. In 'process' mode the job functions must be importable module
+    level functions; worker processes are spawned, not forked, so they
+    never inherit the server's threads.
+    """
+
+    def __init__(self, path=JOB_STORE_PATH, workers=JOB_WORKERS, mode=JOB_WORKER_MODE,
+                 ttl=JOB_RESULT_TTL, max_results=JOB_MAX_RESULTS, clock=time.time):
+        self.path = path
+        self.workers = workers
+        self.mode = mode
+        self.ttl = ttl
+        self.max_results = max_results
+        self._clock = clock
+        self._handlers = {}
+        self._conn = None  # Opened on first use, reopened if path changes
+        self._conn_path = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._pool_lock = threading.Lock()
+        self._pool = None  # Runs jobs (thread mode) or waits on the worker processes
+        self._processes = None
+        self.submitted = 0
+        self.deduplicated = 0
+
+    def register(self, kind, handler):
+        """Register the function that runs jobs of a type"""
+        self._handlers[kind] = handler
+
+    def _db(self):
+        """Open the store, resuming unfinished jobs; caller must hold the lock"""
+        if self._conn is not None and self._conn_path == self.path:
+            return self._conn
+        if self._conn is not None:
+            self._conn.close()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        self._conn, self._conn_path = conn, self.path
+
+        # Jobs of a previous run that never finished start over
+        conn.execute('UPDATE jobs SET status = ?, started = NULL WHERE status = ?', (QUEUED, RUNNING))
+        for row in conn.execute('SELECT id, kind, params FROM jobs WHERE status = ? ORDER BY created', (QUEUED,)):
+            self._dispatch(row['id'], row['kind'], json.loads(row['params']))
+        return conn
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+            return self._pool
+
+    def _process_pool(self):
+        with self._pool_lock:
+            if self._processes is None:
+                # Each worker configures Gemini from the environment and .env it starts with
+                self._processes = ProcessPoolExecutor(max_workers=self.workers, initializer=configure_gemini,
+                                                      mp_context=multiprocessing.get_context('spawn'))
+            return self._processes
+
+    def _dispatch(self, job_id, kind, params):
+        self._executor().submit(self._execute, job_id, kind, params)
+
+    def _execute(self, job_id, kind, params):
+        self._update(job_id, status=RUNNING, started=self._clock())
+        handler = self._handlers.get(kind)
+        try:
+            if handler is None:
+                payload, status = {'error': f'Unknown job type: {kind}'}, 500
+            elif self.mode == 'process':
+                payload, status = self._process_pool().submit(_run_handler, handler, params).result()
+            else:
+                payload, status = _run_handler(handler, params)
+        except Exception as e:
+            # A worker process died or the pool was shut down
+            payload, status = {'error': str(e)}, 500
+        self._update(job_id, status=DONE if status < 400 else FAILED, http_status=status,
+                     result=json.dumps(payload), finished=self._clock())
+
+    def _update(self, job_id, **fields):
+        with self._changed:
+            db = self._db()
+            columns = ', '.join(f'{name} = ?' for name in fields)
+            db.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+            if fields.get('status') in FINISHED:
+                self._prune(db)
+            self._changed.notify_all()
+
+    def _prune(self, db):
+        """Drop expired results, then the oldest beyond max_results; caller must hold the lock"""
+        db.execute('DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?', (*FINISHED, self._clock() - self.ttl))
+        db.execute('DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN (?, ?) '
+                   'ORDER BY finished DESC LIMIT -1 OFFSET ?)', (*FINISHED, self.max_results))
+
+    def submit(self, kind, params):
+        """Queue a job, or join the identical one that is queued or running
+
+        Args:
+            kind: Registered job type
+            params: JSON-serializable keyword arguments of the job function
+
+        Returns:
+            Tuple of (job id, whether an identical job was joined)
+        """
+        if kind not in self._handlers:
+            raise ValueError(f'Unknown job type: {kind}')
+        encoded = json.dumps(params, sort_keys=True)
+        key = hashlib.sha256(f'{kind}\n{encoded}'.encode('utf-8')).hexdigest()
+
+        with self._lock:
+            db = self._db()
+            row = db.execute('SELECT id FROM jobs WHERE key = ? AND status IN (?, ?)',
+                             (key, QUEUED, RUNNING)).fetchone()
+            if row is not None:
+                self.deduplicated += 1
+                return row['id'], True
+            job_id = uuid.uuid4().hex
+            db.execute('INSERT INTO jobs (id, kind, key, params, status, created) VALUES (?, ?, ?, ?, ?, ?)',
+                       (job_id, kind, key, encoded, QUEUED, self._clock()))
+            self.submitted += 1
+
+        self._dispatch(job_id, kind, params)
+        return job_id, False
+
+    def get(self, job_id):
+        """Get a job's status, with its result once done or its error once failed
+
+        Returns:
+            Dictionary with id, type, status, params and timestamps, or None
+            if the job is unknown or its result expired
+        """
+        with self._lock:
+            row = self._db().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or (row['finished'] and row['finished'] < self._clock() - self.ttl):
+            return None
+
+        job = {
+            'id': row['id'],
+            'type': row['kind'],
+            'status': row['status'],
+            'params': json.loads(row['params']),
+            'created_at': _timestamp(row['created']),
+            'started_at': _timestamp(row['started']),
+            'finished_at': _timestamp(row['finished'])
+        }
+        if row['status'] == DONE:
+            job['result'] = json.loads(row['result'])
+        elif row['status'] == FAILED:
+            job['error'] = json.loads(row['result']).get('error', 'Job failed')
+            job['status_code'] = row['http_status']
+        return job
+
+    def wait(self, job_id, timeout=None):
+        """Block until an unfinished job changes status, or timeout seconds pass
+
+        Returns:
+            The job as returned by get
+        """
+        with self._changed:
+            def status():
+                row = self._db().execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+                return row and row['status']
+
+            initial = status()
+            if initial is not None and initial not in FINISHED:
+                self._changed.wait_for(lambda: status() != initial, timeout)
+        return self.get(job_id)
+
+    def restart_workers(self):
+        """Replace the worker processes so new jobs see changed settings
+
+        Jobs already running in the old processes finish there.
+        """
+        with self._pool_lock:
+            processes, self._processes = self._processes, None
+        if processes is not None:
+            processes.shutdown(wait=False)
+
+
+# Shared job queue for the analysis routes
+job_queue = JobQueue()
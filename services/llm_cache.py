@@ -0,0 +1,276 @@
+"""On-disk cache of Gemini responses keyed on a normalized prompt fingerprint"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from services.quote_cache import _Flight
+from config import LLM_CACHE_DIR, LLM_CACHE_MAX_BYTES, LLM_CACHE_PRICE_TOLERANCE
+
+# Numbers standing alone; digits inside a word (a symbol like S0301 or 1INCH) stay exact
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?!\.?\w)')
+
+
+class LLMCache:
+    """Content-addressed response cache with per-call freshness and a size bound
+
+    The key is a hash of the model name and the prompt with whitespace
+    collapsed and numbers snapped to a grid. Every number snaps to a
+    logarithmic grid of its own with relative steps of tolerance, keeping
+    its sign; the price and numbers within the tolerance of it snap to the
+    price's step. A prompt built a few cents later maps to the same entry,
+    while a different RSI or a change of the opposite sign does not.
+
+    Each entry is a small JSON file under root. When the total size
+    exceeds max_bytes the least recently used entries are deleted.
+    Concurrent calls for the same missing key share one generation.
+    """
+
+    def __init__(self, root=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES,
+                 tolerance=LLM_CACHE_PRICE_TOLERANCE, clock=time.time):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.tolerance = tolerance
+        self._clock = clock
+        self._index = None  # key -> [last used, size in bytes], loaded from root on first use
+        self._index_root = None
+        self._bytes = 0
+        self._inflight = {}  # key -> _Flight
+        self._async_inflight = {}  # key -> asyncio.Task, for get_or_generate_async
+        self._lock = threading.Lock()  # Held during disk I/O; never taken on an event loop
+        self._stats_lock = threading.Lock()  # Counters only
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def fingerprint(self, model_name, prompt, price=None):
+        """Cache key of a prompt, tolerant to small price moves"""
+        try:
+            price = float(price) if price else None
+        except (TypeError, ValueError):
+            price = None
+
+        def snap(match):
+            value = float(match.group())
+            if value == 0:
+                return '0'
+            # The price and levels within the tolerance of it share the price's step
+            if price and abs(value - price) <= self.tolerance * abs(price):
+                return f'{self._step(price)}p'
+            return f'{self._step(value)}r'
+
+        text = _NUMBER.sub(snap, ' '.join(prompt.split()))
+        return hashlib.sha256(f'{model_name}\n{text}'.encode('utf-8')).hexdigest()
+
+    def _step(self, value):
+        """Signed index of value on a logarithmic grid of relative steps of tolerance"""
+        step = round(math.log(abs(value)) / math.log1p(self.tolerance))
+        return f'-{step}' if value < 0 else str(step)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f'{key}.json')
+
+    def _ensure_index(self):
+        """Scan root into the in-memory index; caller must hold the lock"""
+        if self._index is not None and self._index_root == self.root:
+            return
+        self._index, self._index_root, self._bytes = {}, self.root, 0
+        if not os.path.isdir(self.root):
+            return
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                self._index[name[:-5]] = [stat.st_mtime, stat.st_size]
+                self._bytes += stat.st_size
+
+    def _read(self, key, ttl):
+        """Return a fresh cached text or None; caller must hold the lock"""
+        self._ensure_index()
+        if key not in self._index:
+            return None
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._drop(key)
+            return None
+        now = self._clock()
+        if now - entry['created_at'] > ttl:
+            return None
+        self._index[key][0] = now
+        return entry['text']
+
+    def _drop(self, key):
+        """Delete one entry; caller must hold the lock"""
+        _, size = self._index.pop(key, (0, 0))
+        self._bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _write(self, key, text):
+        """Store an entry and evict least recently used ones; caller must hold the lock"""
+        self._ensure_index()
+        path = self._path(key)
+        data = json.dumps({'created_at': self._clock(), 'text': text})
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return  # The cache is an optimisation; generation still works without it
+        size = os.path.getsize(path)
+        if key in self._index:
+            self._bytes -= self._index[key][1]
+        self._index[key] = [self._clock(), size]
+        self._bytes += size
+        if self._bytes > self.max_bytes:
+            for old_key, _ in sorted(self._index.items(), key=lambda item: item[1][0]):
+                if self._bytes <= self.max_bytes or old_key == key:
+                    break
+                self._drop(old_key)
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _lookup_key(self, key, ttl):
+        with self._lock:
+            text = self._read(key, ttl)
+        self._count('misses' if text is None else 'hits')
+        return text
+
+    def _store_key(self, key, text):
+        with self._lock:
+            self._write(key, text)
+
+    def lookup(self, model_name, prompt, ttl, price=None):
+        """Get a fresh cached response, or None on a miss"""
+        return self._lookup_key(self.fingerprint(model_name, prompt, price), ttl)
+
+    def store(self, model_name, prompt, text, price=None):
+        """Cache a response generated outside get_or_generate (e.g. streamed)"""
+        if text:
+            self._store_key(self.fingerprint(model_name, prompt, price), text)
+
+    def get_or_generate(self, model_name, prompt, generate, ttl, price=None):
+        """Get a cached response or call generate() once across concurrent callers
+
+        Args:
+            model_name: Model the prompt is sent to
+            prompt: Full prompt text
+            generate: Callable returning the response text
+            ttl: Seconds a cached response stays fresh
+            price: Current price, sets the tolerance of numbers in the prompt
+
+        Returns:
+            Tuple of (response text, whether it came from the cache)
+        """
+        key = self.fingerprint(model_name, prompt, price)
+        with self._lock:
+            text = self._read(key, ttl)
+            if text is not None:
+                self._count('hits')
+                return text, True
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self._count('coalesced')
+                leader = False
+            else:
+                self._count('misses')
+                flight = self._inflight[key] = _Flight()
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = generate()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and flight.result:
+                    self._write(key, flight.result)
+                del self._inflight[key]
+            flight.done.set()
+        return flight.result, False
+
+    async def get_or_generate_async(self, model_name, prompt, generate, ttl, price=None):
+        """get_or_generate for coroutines: generate is an async callable
+        
+        Concurrent callers on the event loop share one lookup and
+        generation. It runs as its own task, so a caller that is cancelled
+        (e.g. by a stage timeout) does not cancel it and the response is
+        still cached. The cache files are read and written on worker
+        threads, and the in-flight tasks are only touched on the loop
+        between awaits, so the loop never waits on disk I/O or on _lock.
+        """
+        key = self.fingerprint(model_name, prompt, price)
+        task = self._async_inflight.get(key)
+        if task is None:
+            task = self._async_inflight[key] = asyncio.ensure_future(
+                self._lookup_or_generate_async(key, generate, ttl))
+            return await asyncio.shield(task)
+        
+        text, cached = await asyncio.shield(task)
+        self._count('hits' if cached else 'coalesced')
+        return text, True
+
+    async def _lookup_or_generate_async(self, key, generate, ttl):
+        try:
+            text = await asyncio.to_thread(self._lookup_key, key, ttl)
+            if text is not None:
+                return text, True
+            text = await generate()
+            if text:
+                await asyncio.to_thread(self._store_key, key, text)
+            return text, False
+        finally:
+            self._async_inflight.pop(key, None)
+
+    def clear(self):
+        """Delete all entries and reset counters"""
+        with self._lock:
+            self._ensure_index()
+            for key in list(self._index):
+                self._drop(key)
+        with self._stats_lock:
+            self.hits = self.misses = self.coalesced = 0
+
+    def stats(self):
+        """Get entry count, size and hit counters"""
+        with self._lock:
+            self._ensure_index()
+            entries, size = len(self._index), self._bytes
+        with self._stats_lock:
+            hits, misses, coalesced = self.hits, self.misses, self.coalesced
+        lookups = hits + misses + coalesced
+        return {
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'coalesced': coalesced,
+            'hit_ratio': round((hits + coalesced) / lookups, 4) if lookups else 0.0
+        }
+
+
+# Shared cache for all Gemini calls
+llm_cache = LLMCache()
@@ -0,0 +1,194 @@
+"""Resolve user-entered symbols to stock or crypto data"""
+from concurrent.futures import ThreadPoolExecutor
+from config import TICK_CANDLE_INTERVAL
+from services import crypto_service, stock_service
+from services.stock_service import get_stock_price, get_stock_prices, get_stock_history, get_stock_candles
+from services.crypto_service import get_crypto_price, get_crypto_prices, get_crypto_history, get_crypto_candles
+from services.symbol_index import symbol_index
+
+# Runs the crypto side of concurrent lookups; these tasks never submit more work
+_lookup_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='lookup')
+
+
+def _is_valid_price(price_data):
+    return 'error' not in price_data and bool(price_data.get('price'))
+
+
+def _looks_like_stock(symbol):
+    """Warrants and exchange-suffixed symbols (e.g. .V, .IS) are never crypto"""
+    return '.' in symbol
+
+
+def _crypto_pair(symbol):
+    """USDT pair for a symbol, or None if the exchange does not list it"""
+    # Markets are loaded lazily by ccxt; index them as soon as they exist
+    if not symbol_index.has_markets and crypto_service.exchange.markets:
+        symbol_index.seed_markets(crypto_service.exchange.markets)
+    
+    pair = f"{symbol}/USDT"
+    if symbol_index.is_missing('crypto', pair):
+        return None
+    return pair
+
+
+def warm_up_connections():
+    """Open the Yahoo and Binance connections and load the exchange markets
+    
+    Failures are ignored: the first real request opens its connection and
+    ccxt loads markets lazily, so warming up is only an optimisation.
+    """
+    for warm_up in (stock_service.warm_up, crypto_service.warm_up):
+        try:
+            warm_up()
+        except Exception:
+            pass
+
+
+def _crypto_candles(pair, period):
+    try:
+        return get_crypto_candles(pair, period)
+    except Exception:
+        return None
+
+
+def resolve_price(symbol):
+    """Get the price of a user symbol from whichever venue serves it
+    
+    Known symbols go straight to their venue. Unknown ones try Yahoo
+    Finance first and then the Binance USDT pair, and the result is
+    recorded in the symbol index.
+    
+    Returns:
+        Tuple of (asset type 'stock' or 'crypto', price dictionary)
+    """
+    entry = symbol_index.lookup(symbol)
+    if entry and entry['type'] == 'crypto':
+        return 'crypto', get_crypto_price(entry['symbol'])
+    
+    # Try as stock first (includes warrants and Borsa Istanbul stocks)
+    price_data = get_stock_price(symbol)
+    if _is_valid_price(price_data) or _looks_like_stock(symbol):
+        return 'stock', price_data
+    
+    pair = _crypto_pair(symbol)
+    if pair:
+        crypto_data = get_crypto_price(pair)
+        if _is_valid_price(crypto_data):
+            symbol_index.remember(symbol, 'crypto', pair)
+            return 'crypto', crypto_data
+    
+    return 'stock', price_data
+
+
+def resolve_price_concurrently(symbol):
+    """resolve_price, with both venues of an unknown symbol queried at once
+    
+    Gives the same answer as resolve_price (a stock quote wins over the
+    crypto pair) in the time of the slower lookup instead of their sum.
+    """
+    entry = symbol_index.lookup(symbol)
+    if entry or _looks_like_stock(symbol):
+        return resolve_price(symbol)
+    
+    pair = _crypto_pair(symbol)
+    if not pair:
+        return resolve_price(symbol)
+    
+    crypto_future = _lookup_pool.submit(get_crypto_price, pair)
+    price_data = get_stock_price(symbol)
+    if _is_valid_price(price_data):
+        return 'stock', price_data
+    
+    crypto_data = crypto_future.result()
+    if _is_valid_price(crypto_data):
+        symbol_index.remember(symbol, 'crypto', pair)
+        return 'crypto', crypto_data
+    return 'stock', price_data
+
+
+def resolve_prices(symbols):
+    """resolve_price for many symbols with bulk quote calls
+    
+    Symbols indexed as crypto are quoted with one fetch_tickers call while
+    the rest go through the concurrent stock batch. Unknown symbols without
+    a stock quote then try their USDT pairs in a second bulk crypto call.
+    
+    Returns:
+        Dictionary of symbol -> (asset type, price dictionary), in the order of symbols
+    """
+    symbols = list(dict.fromkeys(symbols))
+    pairs = {}
+    for symbol in symbols:
+        entry = symbol_index.lookup(symbol)
+        if entry and entry['type'] == 'crypto':
+            pairs[symbol] = entry['symbol']
+    stocks = [symbol for symbol in symbols if symbol not in pairs]
+    
+    crypto_future = _lookup_pool.submit(get_crypto_prices, list(pairs.values())) if pairs else None
+    stock_quotes = get_stock_prices(stocks)
+    results = {symbol: ('stock', stock_quotes[symbol]) for symbol in stocks}
+    if crypto_future:
+        crypto_quotes = crypto_future.result()
+        for symbol, pair in pairs.items():
+            results[symbol] = ('crypto', crypto_quotes[pair])
+    
+    fallback = {}
+    for symbol in stocks:
+        if not _is_valid_price(stock_quotes[symbol]) and not _looks_like_stock(symbol):
+            pair = _crypto_pair(symbol)
+            if pair:
+                fallback[symbol] = pair
+    if fallback:
+        crypto_quotes = get_crypto_prices(fallback.values())
+        for symbol, pair in fallback.items():
+            if _is_valid_price(crypto_quotes[pair]):
+                symbol_index.remember(symbol, 'crypto', pair)
+                results[symbol] = ('crypto', crypto_quotes[pair])
+    
+    return {symbol: results[symbol] for symbol in symbols}
+
+
+def resolve_history(symbol, period='1mo', interval=TICK_CANDLE_INTERVAL, fmt='json', max_points=None):
+    """Get historical data of a user symbol from whichever venue serves it
+    
+    Returns:
+        Dictionary with dates and prices in format fmt (at most max_points), or error (see get_stock_history)
+    """
+    entry = symbol_index.lookup(symbol)
+    if entry and entry['type'] == 'crypto':
+        return get_crypto_history(entry['symbol'], period, interval, fmt, max_points)
+    
+    history = get_stock_history(symbol, period, interval, fmt, max_points)
+    if 'error' not in history or _looks_like_stock(symbol):
+        return history
+    
+    pair = _crypto_pair(symbol)
+    if pair:
+        crypto_history = get_crypto_history(pair, period, interval, fmt, max_points)
+        if 'error' not in crypto_history:
+            symbol_index.remember(symbol, 'crypto', pair)
+            return crypto_history
+    
+    return history
+
+
+def resolve_candles(symbol, period='1mo'):
+    """Get raw candle arrays of a user symbol from whichever venue serves it
+    
+    Returns:
+        Dictionary of column arrays (see history_store.COLUMNS), or None
+    """
+    entry = symbol_index.lookup(symbol)
+    if entry and entry['type'] == 'crypto':
+        return _crypto_candles(entry['symbol'], period)
+    
+    candles, _ = get_stock_candles(symbol, period)
+    if candles is not None or _looks_like_stock(symbol):
+        return candles
+    
+    pair = _crypto_pair(symbol)
+    if pair:
+        candles = _crypto_candles(pair, period)
+        if candles is not None:
+            symbol_index.remember(symbol, 'crypto', pair)
+    return candles
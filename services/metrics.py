@@ -0,0 +1,168 @@
+"""In-process metrics, exposed in the Prometheus text format on /metrics
+
+Counters and histograms are updated on the hot path with a dictionary
+lookup under a lock, a microsecond or two per update. Values another
+module already keeps (cache counters, circuit breaker state) are not
+duplicated: collectors read them only when /metrics is scraped.
+"""
+import bisect
+import math
+import threading
+
+# Upper bounds in seconds; Gemini calls take tens of seconds, cached quotes microseconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def _family(name, kind, help_text, samples):
+    """Text lines of one metric family; samples are (name suffix, labels, value)"""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    for suffix, labels, value in samples:
+        lines.append(f'{name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+    return lines
+
+
+class Counter:
+    """Monotonic counter per label combination"""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount=1):
+        """Add amount to the series of the given label values"""
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def value(self, *values):
+        with self._lock:
+            return self._values.get(values, 0)
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return _family(self.name, 'counter', self.help, [
+            ('', dict(zip(self.labels, key)), value) for key, value in sorted(values.items())
+        ])
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, per label combination"""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *values):
+        """Record a value for the given label values"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *values):
+        with self._lock:
+            series = self._series.get(values)
+            return sum(series[0]) if series else 0
+
+    def render(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        samples = []
+        for key, (counts, total) in sorted(series.items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(('_bucket', {**labels, 'le': _format_value(float(bound))}, cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, cumulative))
+        return _family(self.name, 'histogram', self.help, samples)
+
+
+class Registry:
+    """Metrics and scrape-time collectors rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        """Register a function read at scrape time
+
+        It returns or yields (name, type, help, samples) families, where
+        samples is a list of (labels dictionary, value) pairs.
+        """
+        with self._lock:
+            self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect in collectors:
+            for name, kind, help_text, samples in collect():
+                lines.extend(_family(name, kind, help_text, [('', labels, value) for labels, value in samples]))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    'http_request_duration_seconds', 'Time to the response headers of an HTTP request, per route',
+    ('method', 'route', 'status'))
+upstream_request_seconds = registry.histogram(
+    'upstream_request_duration_seconds', 'Latency of calls to Yahoo Finance, Binance and Gemini, per operation',
+    ('upstream', 'operation', 'outcome'))
+stock_quote_seconds = registry.histogram(
+    'stock_quote_path_duration_seconds',
+    'Latency of a Yahoo quote path: fast (the chart endpoint) or info (the .info scrape)', ('path',))
+symbol_probes = registry.counter(
+    'symbol_variant_probes_total', 'Yahoo symbol variants tried for a user symbol, by what the probe found',
+    ('kind', 'result'))
+gemini_tokens = registry.counter(
+    'gemini_tokens_total', 'Gemini tokens of generated responses (estimated when the SDK does not report usage)',
+    ('model', 'kind'))
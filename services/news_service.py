@@ -1,16 +1,49 @@
 """News service for analyzing stock-related news using Gemini AI"""
-from services.gemini_service import configure_gemini
-import google.generativeai as genai
+from services.gemini_service import configure_gemini, generate_cached, generate_cached_async
 from config import GEMINI_API_KEY, GEMINI_MODEL
 
 
-def analyze_news_with_ai(symbol, price_data=None, language='tr', model_name=None):
-    """Use Gemini AI to research and analyze news for a stock symbol"""
+def analyze_news_with_ai(symbol, price_data=None, language='tr', model_name=None, timeout=None):
+    """Use Gemini AI to research and analyze news for a stock symbol (timeout: Gemini request timeout in seconds)"""
     model_name = model_name or GEMINI_MODEL
     
     # Configure Gemini
     configure_gemini()
     
+    prompt = _news_prompt(symbol, price_data, language)
+    try:
+        analysis, cached = generate_cached(model_name, prompt, 'news', price_data.get('price') if price_data else None,
+                                           timeout)
+        return _news_result(symbol, analysis, cached)
+    except Exception as e:
+        return {'error': f'Gemini API error: {str(e)}'}
+
+
+async def analyze_news_with_ai_async(symbol, price_data=None, language='tr', model_name=None, timeout=None):
+    """analyze_news_with_ai without blocking the event loop"""
+    model_name = model_name or GEMINI_MODEL
+    configure_gemini()
+    
+    prompt = _news_prompt(symbol, price_data, language)
+    try:
+        analysis, cached = await generate_cached_async(
+            model_name, prompt, 'news', price_data.get('price') if price_data else None, timeout)
+        return _news_result(symbol, analysis, cached)
+    except Exception as e:
+        return {'error': f'Gemini API error: {str(e)}'}
+
+
+def _news_result(symbol, analysis, cached):
+    return {
+        'symbol': symbol,
+        'analysis': analysis,
+        'cached': cached,
+        'articles_count': 0  # We don't fetch articles directly anymore
+    }
+
+
+def _news_prompt(symbol, price_data, language):
+    """Prompt asking Gemini to research recent news for a symbol"""
     # Clean symbol for search (remove .IS, .V, etc.)
     clean_symbol = symbol.replace('.IS', '').replace('.V', '').split('.')[0]
     
@@ -71,14 +104,4 @@ def analyze_news_with_ai(symbol, price_data=None, language='tr', model_name=None
         {lang_instruction} Maximum 250 words. Only select important news and keep it brief.
         """
     
-    try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
-        return {
-            'symbol': symbol,
-            'analysis': response.text,
-            'articles_count': 0  # We don't fetch articles directly anymore
-        }
-    except Exception as e:
-        return {'error': f'Gemini API error: {str(e)}'}
-
+    return prompt
@@ -0,0 +1,220 @@
+"""Paged OHLCV downloads of arbitrary time ranges
+
+Exchanges return at most a page of candles per request, so a range is
+split into since-based pages of page_limit candles that are fetched
+several at once (each through the caller's fetch, which goes through
+the upstream's rate limiter) and merged in time order without
+duplicates. If a page fails, the pages adjacent to the range end are
+still returned, so the caller can store them and resume from where the
+unbroken run stops.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import OHLCV_BACKFILL_WORKERS
+from services.history_store import empty_candles
+
+# Runs the pages of the sync backfills; a page task never submits more work
+_page_pool = ThreadPoolExecutor(max_workers=OHLCV_BACKFILL_WORKERS, thread_name_prefix='ohlcv-backfill')
+
+
+def plan_pages(start_ms, end_ms, timeframe_ms, page_limit):
+    """since of each page covering [start_ms, end_ms), oldest first"""
+    return list(range(start_ms, end_ms, timeframe_ms * page_limit))
+
+
+def merge_pages(pages, end_ms=None):
+    """Candle arrays of ccxt OHLCV pages, in time order, one candle per open time
+
+    Candles opening at or after end_ms are dropped; where pages overlap
+    the candle from the later page wins.
+    """
+    rows = [row for page in pages for row in page]
+    if not rows:
+        return empty_candles()
+    rows = np.asarray(rows, dtype=np.float64)
+    ts = rows[:, 0].astype(np.int64)
+    # Last occurrence of each open time
+    order = np.argsort(ts, kind='stable')
+    keep = order[np.append(ts[order][1:] != ts[order][:-1], True)]
+    if end_ms is not None:
+        keep = keep[ts[keep] < end_ms]
+    return {
+        'ts': ts[keep],
+        'open': rows[keep, 1],
+        'high': rows[keep, 2],
+        'low': rows[keep, 3],
+        'close': rows[keep, 4],
+        'volume': rows[keep, 5]
+    }
+
+
+class BackfillResult:
+    """Outcome of a backfill
+
+    candles: merged candles of the pages that form an unbroken run up to
+        the range end (all of them if every page succeeded)
+    covered_from: since of the oldest page in that run, or None if the
+        run is empty (the range end page failed)
+    listed_from: open time of the pair's first candle, if the range
+        reached back to it
+    error: the first page failure, or None
+    """
+
+    def __init__(self, candles, covered_from, listed_from, error):
+        self.candles = candles
+        self.covered_from = covered_from
+        self.listed_from = listed_from
+        self.error = error
+
+
+def _result(starts, results, end_ms, timeframe_ms):
+    """BackfillResult of pages fetched for starts; results[i] is a row list or an exception"""
+    error = next((r for r in results if isinstance(r, BaseException)), None)
+    run = len(starts)
+    while run > 0 and not isinstance(results[run - 1], BaseException):
+        run -= 1
+    pages = results[run:]
+    candles = merge_pages(pages, end_ms)
+    covered_from = starts[run] if run < len(starts) else None
+    listed_from = None
+    # Nothing opens within a candle of the oldest page's since: the pair was listed later
+    if run == 0 and len(candles['ts']) and candles['ts'][0] >= starts[0] + timeframe_ms:
+        listed_from = int(candles['ts'][0])
+    return BackfillResult(candles, covered_from, listed_from, error)
+
+
+class BackfillTracker:
+    """Progress of the backfills in flight and totals of finished ones"""
+
+    def __init__(self):
+        self._active = {}  # key -> progress dictionary
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.pages = 0
+        self.candles = 0
+
+    def begin(self, key, pages_total):
+        with self._lock:
+            self._active[key] = {'pages_total': pages_total, 'pages_done': 0, 'started': time.time()}
+
+    def page_done(self, key):
+        with self._lock:
+            progress = self._active.get(key)
+            if progress is not None:
+                progress['pages_done'] += 1
+            self.pages += 1
+
+    def end(self, key, result):
+        with self._lock:
+            self._active.pop(key, None)
+            if result.error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.candles += len(result.candles['ts'])
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                'active': [{'key': '/'.join(key), 'pages_done': p['pages_done'], 'pages_total': p['pages_total'],
+                            'seconds': round(now - p['started'], 3)} for key, p in self._active.items()],
+                'completed': self.completed,
+                'failed': self.failed,
+                'pages': self.pages,
+                'candles': self.candles
+            }
+
+
+# Shared tracker of the crypto history backfills
+backfills = BackfillTracker()
+
+
+def backfill(fetch, start_ms, end_ms, timeframe_ms, page_limit, key=('backfill',), tracker=backfills):
+    """Download [start_ms, end_ms) as concurrent since-based pages
+
+    Args:
+        fetch: fetch(since, limit) returning ccxt OHLCV rows from since on
+        start_ms: Range start, or None for everything since the pair was listed
+            (found from a first page fetched from the epoch)
+        end_ms: Range end (exclusive)
+        timeframe_ms: Candle width in milliseconds
+        page_limit: Most candles the exchange returns per request
+        key: Name of the backfill in the tracker's progress report
+
+    Returns:
+        BackfillResult
+    """
+    first = None
+    if start_ms is None:
+        # Binance answers a since before the listing with the first candles
+        try:
+            first = fetch(0, page_limit)
+        except Exception as e:
+            return BackfillResult(empty_candles(), None, None, e)
+        if not first:
+            return BackfillResult(empty_candles(), end_ms, None, None)
+        start_ms = int(first[0][0])
+    starts = plan_pages(start_ms, end_ms, timeframe_ms, page_limit)
+    if not starts:
+        return BackfillResult(empty_candles(), end_ms, start_ms if first is not None else None, None)
+    tracker.begin(key, len(starts))
+
+    def fetch_page(since):
+        if since == start_ms and first is not None:
+            rows = first
+        else:
+            rows = fetch(since, page_limit)
+        tracker.page_done(key)
+        return rows
+
+    futures = [_page_pool.submit(fetch_page, since) for since in starts]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    result = _result(starts, results, end_ms, timeframe_ms)
+    if first is not None and result.covered_from == start_ms:
+        result.listed_from = start_ms
+    tracker.end(key, result)
+    return result
+
+
+async def backfill_async(fetch, start_ms, end_ms, timeframe_ms, page_limit, key=('backfill',), tracker=backfills):
+    """backfill with an async fetch, at most OHLCV_BACKFILL_WORKERS pages in flight"""
+    first = None
+    if start_ms is None:
+        try:
+            first = await fetch(0, page_limit)
+        except Exception as e:
+            return BackfillResult(empty_candles(), None, None, e)
+        if not first:
+            return BackfillResult(empty_candles(), end_ms, None, None)
+        start_ms = int(first[0][0])
+    starts = plan_pages(start_ms, end_ms, timeframe_ms, page_limit)
+    if not starts:
+        return BackfillResult(empty_candles(), end_ms, start_ms if first is not None else None, None)
+    tracker.begin(key, len(starts))
+    slots = asyncio.Semaphore(OHLCV_BACKFILL_WORKERS)
+
+    async def fetch_page(since):
+        if since == start_ms and first is not None:
+            rows = first
+        else:
+            async with slots:
+                rows = await fetch(since, page_limit)
+        tracker.page_done(key)
+        return rows
+
+    results = await asyncio.gather(*(fetch_page(since) for since in starts), return_exceptions=True)
+    result = _result(starts, list(results), end_ms, timeframe_ms)
+    if first is not None and result.covered_from == start_ms:
+        result.listed_from = start_ms
+    tracker.end(key, result)
+    return result
@@ -0,0 +1,143 @@
+"""Background poller that keeps the dashboard watchlists warm and pushes changes"""
+import queue
+import threading
+from services.watchlist_service import WATCHLISTS, get_watchlist_prices
+from config import PRICE_POLL_INTERVAL
+
+# Quote fields that change every cycle without the quote changing (a stale quote's age)
+_UNCOMPARED_FIELDS = ('age',)
+
+
+def _changed(previous, data):
+    """Whether a quote differs from the previous one in anything but _UNCOMPARED_FIELDS"""
+    if previous is None:
+        return True
+    return ({k: v for k, v in previous.items() if k not in _UNCOMPARED_FIELDS}
+            != {k: v for k, v in data.items() if k not in _UNCOMPARED_FIELDS})
+
+
+class Subscription:
+    """Event queue of a single stream client
+    
+    A client that falls too far behind is resynchronised with one full
+    snapshot instead of an ever-growing backlog of diffs.
+    """
+
+    def __init__(self, poller, max_pending=32):
+        self._poller = poller
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._drain()
+            self._queue.put_nowait(('snapshot', self._poller.snapshot()))
+
+    def _drain(self):
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def get(self, timeout=None):
+        """Get the next (event, data) pair, or None if nothing arrived in time"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class PricePoller:
+    """Refreshes every watchlist on one background thread
+    
+    Upstream cost depends only on the number of symbols; any number of
+    stream subscribers share the same refresh and receive only the quotes
+    that changed since the previous one (a stale quote whose age grew has
+    not changed).
+    """
+
+    def __init__(self, interval=PRICE_POLL_INTERVAL, fetch=get_watchlist_prices, watchlists=None):
+        self.interval = interval
+        self._fetch = fetch
+        self._watchlists = list(watchlists or WATCHLISTS)
+        self._snapshot = {name: {} for name in self._watchlists}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.refreshes = 0
+
+    def start(self):
+        """Start the background thread if it is not running yet"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='price-poller', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def refresh(self):
+        """Refresh every watchlist once and publish the quotes that changed"""
+        changes = {}
+        for name in self._watchlists:
+            try:
+                prices = self._fetch(name)
+            except Exception:
+                continue
+            with self._lock:
+                previous = self._snapshot[name]
+                changed = {symbol: data for symbol, data in prices.items() if _changed(previous.get(symbol), data)}
+                # Keep showing the last good quote of symbols that failed this round
+                self._snapshot[name] = {**previous, **prices}
+            if changed:
+                changes[name] = changed
+        self.refreshes += 1
+        
+        if changes:
+            self._publish(('update', changes))
+        return changes
+
+    def _publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def snapshot(self):
+        """Get the latest known prices of every watchlist"""
+        with self._lock:
+            return {name: dict(prices) for name, prices in self._snapshot.items()}
+
+    def subscribe(self):
+        """Register a stream client"""
+        subscription = Subscription(self)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+# Shared poller for the dashboard
+price_poller = PricePoller()
@@ -0,0 +1,246 @@
+"""Process-wide TTL cache for price quotes with request coalescing"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import QUOTE_CACHE_TTL_STOCK, QUOTE_CACHE_TTL_CRYPTO, QUOTE_CACHE_MAX_SIZE
+from services.tick_buffer import tick_buffer
+
+# Runs the background refreshes started by get_many; each task fetches one batch of keys
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='quote-refresh')
+
+
+class _Flight:
+    """An upstream fetch that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class QuoteCache:
+    """Bounded LRU cache with a time-to-live and single-flight loading
+    
+    Concurrent get_or_fetch calls for the same missing key share one
+    upstream call. Error results are handed to every waiting caller but
+    never stored. Expired entries stay until evicted, so fallback() can
+    serve the last known value while the upstream is unavailable, and
+    get_many() can answer within a latency budget while it revalidates.
+    on_store(key, value) is called with every value stored.
+    """
+
+    def __init__(self, ttl, max_size=1024, clock=time.monotonic, on_store=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._on_store = on_store
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._inflight = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def _cacheable(value):
+        return isinstance(value, dict) and 'error' not in value and not value.get('stale')
+
+    def _lookup(self, key):
+        """Return a fresh cached value or None; caller must hold the lock"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self._clock() - stored_at > self.ttl:
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        """Insert a value and evict least recently used entries; caller must hold the lock"""
+        self._entries[key] = (self._clock(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        if self._on_store is not None:
+            self._on_store(key, value)
+
+    def get(self, key):
+        """Get a fresh cached value, or None on a miss"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(value)
+
+    def set(self, key, value):
+        """Store a value if it is cacheable"""
+        if not self._cacheable(value):
+            return
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_fetch(self, key, fetch):
+        """Get a cached value, calling fetch() at most once across concurrent callers"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return dict(value)
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                flight = self._inflight[key] = _Flight()
+                leader = True
+        
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return dict(flight.result)
+        
+        result = error = None
+        try:
+            result = fetch()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._complete(key, flight, result, error)
+        return dict(result)
+
+    def _complete(self, key, flight, result, error):
+        """Store a flight's result if cacheable and release its waiters"""
+        flight.result = result
+        flight.error = error
+        with self._lock:
+            if error is None and self._cacheable(result):
+                self._store(key, result)
+            del self._inflight[key]
+        flight.done.set()
+
+    def get_many(self, keys, fetch_many, timeout):
+        """Stale-while-revalidate lookup of several keys within a latency budget
+        
+        Fresh values come from the cache. The other keys are loaded by one
+        fetch_many call on a background thread (joining flights already in
+        progress), and whatever it delivers within timeout seconds is
+        returned. Keys that miss the budget get their last stored value
+        marked stale (see stale()); the refresh keeps running and updates
+        the cache for the next caller. Without a timeout the refresh runs
+        on the calling thread and every key waits for its value.
+        
+        Args:
+            keys: Keys to look up
+            fetch_many: Callable taking a list of keys and returning an iterable
+                of (key, value) pairs, yielded as each value becomes available
+            timeout: Seconds to wait for the refresh, or None to wait for all of it
+        
+        Returns:
+            Dictionary of key -> value in the order of keys; None for keys that
+            missed the budget and were never stored
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results = {}
+        flights = {}
+        started = {}
+        with self._lock:
+            for key in keys:
+                value = self._lookup(key)
+                if value is not None:
+                    self.hits += 1
+                    results[key] = dict(value)
+                    continue
+                flight = self._inflight.get(key)
+                if flight is not None:
+                    self.coalesced += 1
+                else:
+                    self.misses += 1
+                    flight = self._inflight[key] = started[key] = _Flight()
+                flights[key] = flight
+        
+        if started and deadline is None:
+            self._refresh(dict(started), fetch_many)
+        elif started:
+            _refresh_pool.submit(self._refresh, started, fetch_many)
+        
+        for key, flight in flights.items():
+            if not flight.done.wait(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                results[key] = self.stale(key)
+            elif flight.error is not None:
+                results[key] = self.fallback(key, flight.error)
+            else:
+                results[key] = dict(flight.result)
+        return {key: results[key] for key in keys}
+
+    def _refresh(self, flights, fetch_many):
+        """Complete each flight as fetch_many delivers its key"""
+        error = LookupError('no value returned')
+        try:
+            for key, value in fetch_many(list(flights)):
+                flight = flights.pop(key, None)
+                if flight is not None:
+                    self._complete(key, flight, value, None)
+        except Exception as e:
+            error = e
+        for key, flight in flights.items():
+            self._complete(key, flight, None, error)
+
+    def stale(self, key):
+        """Last stored value of key however old, or None if nothing was ever stored
+        
+        A value older than the TTL is marked 'stale' with its 'age' in seconds.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            age = self._clock() - stored_at
+            if age <= self.ttl:
+                return dict(value)
+            return {**value, 'stale': True, 'age': round(age, 1)}
+
+    def fallback(self, key, error):
+        """Last stored value of key, for when the upstream is unavailable
+        
+        Returns:
+            The value from stale(), or an error dictionary with the upstream
+            error, 'unavailable' and the error's retry_after if nothing was
+            ever stored
+        """
+        value = self.stale(key)
+        if value is None:
+            return {'error': str(error), 'unavailable': True, 'retry_after': getattr(error, 'retry_after', None)}
+        return value
+
+    def clear(self):
+        """Drop all entries and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.coalesced = 0
+
+    def stats(self):
+        """Get hit, miss and coalesced counters"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_ratio': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+            }
+
+
+# Shared caches for each asset class; every fresh quote is also a tick of the 1d charts
+stock_quotes = QuoteCache(QUOTE_CACHE_TTL_STOCK, QUOTE_CACHE_MAX_SIZE, on_store=tick_buffer.record_quote)
+crypto_quotes = QuoteCache(QUOTE_CACHE_TTL_CRYPTO, QUOTE_CACHE_MAX_SIZE, on_store=tick_buffer.record_quote)
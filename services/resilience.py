@@ -0,0 +1,362 @@
+"""Per-upstream rate limiting and circuit breaking for Yahoo Finance, Binance and Gemini"""
+import asyncio
+import threading
+import time
+import aiohttp
+import ccxt
+import requests
+from google.api_core import exceptions as google_exceptions
+from services.metrics import upstream_request_seconds
+from config import UPSTREAM_LIMITS, UPSTREAM_MAX_WAIT, UPSTREAM_FAILURE_THRESHOLD, UPSTREAM_RESET_TIMEOUT
+
+
+class UpstreamError(Exception):
+    """An upstream was rate limited, failed with a server error or could not be reached"""
+
+    def __init__(self, upstream, reason, retry_after=None):
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f'{upstream} request failed: {reason}')
+
+
+class UpstreamUnavailable(UpstreamError):
+    """A call was refused without reaching the upstream (circuit open or rate limited)"""
+
+    def __init__(self, upstream, reason, retry_after):
+        super().__init__(upstream, reason, retry_after)
+        self.args = (f'{upstream} is unavailable ({reason}), retry in {retry_after:.0f}s',)
+
+
+def is_failure_status(status):
+    """Whether an HTTP status means the upstream is overloaded or failing (429, 5xx)"""
+    return status == 429 or status >= 500
+
+
+class TokenBucket:
+    """Token bucket shared by threads and coroutines
+
+    Holds up to `burst` tokens, refilled at `rate` per second. reserve()
+    takes a token ahead of time and returns how long the caller must wait
+    before using it, so the caller sleeps (or awaits) outside the lock.
+    A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """Take a token if one is available within max_wait seconds
+
+        Returns:
+            Seconds to wait before the request may start; more than max_wait
+            (and no token taken) if the bucket cannot serve it in time
+        """
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait <= max_wait:
+                self._tokens -= 1
+            return wait
+
+    def reset(self):
+        with self._lock:
+            self._tokens = float(self.burst)
+            self._updated = self._clock()
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open probing
+
+    After failure_threshold consecutive failures the circuit opens and
+    every call is refused for reset_timeout seconds. Then it is half-open:
+    one probe call goes through while the others are still refused, and
+    the probe's outcome closes the circuit or opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=UPSTREAM_FAILURE_THRESHOLD, reset_timeout=UPSTREAM_RESET_TIMEOUT,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def acquire(self):
+        """Ask to make a call
+
+        Returns:
+            None if the call may go ahead, else seconds until the circuit may let calls through
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return None
+            if self._state == self.OPEN:
+                remaining = self._opened_at + self.reset_timeout - self._clock()
+                if remaining > 0:
+                    return remaining
+                self._state = self.HALF_OPEN
+            if self._probing:
+                return 1.0  # A probe is in flight; its outcome decides
+            self._probing = True
+            return None
+
+    def release(self):
+        """Give back an acquired call that never reached the upstream"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+            self._probing = False
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+            self.opened = 0
+
+    def snapshot(self):
+        state = self.state
+        with self._lock:
+            retry_after = 0.0
+            if state == self.OPEN:
+                retry_after = max(0.0, self._opened_at + self.reset_timeout - self._clock())
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'opened': self.opened,
+                'retry_after': round(retry_after, 1)
+            }
+
+
+class Upstream:
+    """Rate limiter and circuit breaker in front of one upstream service
+
+    call() and call_async() wait for a token, refuse fast with
+    UpstreamUnavailable while the circuit is open, and feed the outcome
+    back to the breaker. Only failures that mean the upstream is in
+    trouble (429, 5xx, timeouts, connection errors, as decided by
+    is_failure) count against it; a 404 or an unknown symbol is a healthy
+    answer.
+    """
+
+    def __init__(self, name, rate, burst, is_failure, max_wait=UPSTREAM_MAX_WAIT,
+                 failure_threshold=UPSTREAM_FAILURE_THRESHOLD, reset_timeout=UPSTREAM_RESET_TIMEOUT,
+                 clock=time.monotonic):
+        self.name = name
+        self.max_wait = max_wait
+        self.limiter = TokenBucket(rate, burst, clock)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, clock)
+        self._is_failure = is_failure
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counts = {'calls': 0, 'failures': 0, 'rejected': 0, 'rate_limited': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _admit(self):
+        """Seconds to wait before calling, or UpstreamUnavailable if the call is refused"""
+        retry_after = self.breaker.acquire()
+        if retry_after is not None:
+            self._count('rejected')
+            raise UpstreamUnavailable(self.name, 'circuit open', retry_after)
+        wait = self.limiter.reserve(self.max_wait)
+        if wait > self.max_wait:
+            self.breaker.release()
+            self._count('rate_limited')
+            raise UpstreamUnavailable(self.name, 'rate limited', wait)
+        self._count('calls')
+        return wait
+
+    def _record(self, error):
+        if error is not None and (isinstance(error, UpstreamError) or self._is_failure(error)):
+            self._count('failures')
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def check_status(self, status):
+        """Raise UpstreamError for an HTTP status that means the upstream is in trouble"""
+        if is_failure_status(status):
+            raise UpstreamError(self.name, f'HTTP {status}')
+
+    def watch(self, session):
+        """Report the HTTP failures of a requests session to call()
+
+        For clients that swallow request errors (yfinance returns empty
+        data on a 429): call() raises UpstreamError when a request it made
+        through the session was answered with 429 or 5xx or failed to connect.
+        """
+        def check(response, *args, **kwargs):
+            if is_failure_status(response.status_code):
+                self._local.failure = f'HTTP {response.status_code}'
+
+        send = session.send
+
+        def send_watched(request, **kwargs):
+            try:
+                return send(request, **kwargs)
+            except requests.RequestException as e:
+                self._local.failure = type(e).__name__
+                raise
+
+        session.hooks['response'].append(check)
+        session.send = send_watched
+
+    def _observe(self, fn, start, error, stream=False):
+        """Record a call's latency, labelled with the called function's name"""
+        operation = getattr(fn, '__name__', 'call').strip('_').removesuffix('_async')
+        if stream:
+            operation += '_stream'  # Latency to the first response, not the whole stream
+        upstream_request_seconds.observe(time.perf_counter() - start, self.name, operation,
+                                         'ok' if error is None else 'error')
+
+    def call(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) under the limiter and breaker"""
+        time.sleep(self._admit())
+        self._local.failure = None
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+            if self._local.failure:
+                raise UpstreamError(self.name, self._local.failure)
+        except Exception as e:
+            self._observe(fn, start, e)
+            self._record(e)
+            raise
+        self._observe(fn, start, None)
+        self._record(None)
+        return result
+
+    def stream(self, fn, *args, **kwargs):
+        """Iterate fn(*args, stream=True, **kwargs) under the limiter and breaker
+
+        The call counts as a success only once the whole stream has been
+        read: an error raised while iterating is recorded as its failure,
+        and a stream abandoned part way gives back a half-open probe.
+        """
+        time.sleep(self._admit())
+        self._local.failure = None
+        start = time.perf_counter()
+        opened = False
+        try:
+            chunks = fn(*args, stream=True, **kwargs)
+            if self._local.failure:
+                raise UpstreamError(self.name, self._local.failure)
+            opened = True
+            self._observe(fn, start, None, stream=True)
+            yield from chunks
+        except GeneratorExit:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if not opened:
+                self._observe(fn, start, e, stream=True)
+            self._record(e)
+            raise
+        self._record(None)
+
+    async def call_async(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) under the limiter and breaker"""
+        wait = self._admit()
+        try:
+            await asyncio.sleep(wait)  # Cancelled here too, the call gives back a half-open probe
+            start = time.perf_counter()
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            self._observe(fn, start, e)
+            self._record(e)
+            raise
+        self._observe(fn, start, None)
+        self._record(None)
+        return result
+
+    def reset(self):
+        """Close the circuit, refill the bucket and reset counters"""
+        self.breaker.reset()
+        self.limiter.reset()
+        with self._lock:
+            for name in self._counts:
+                self._counts[name] = 0
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            **self.breaker.snapshot(),
+            **counts,
+            'rate': self.limiter.rate,
+            'burst': self.limiter.burst
+        }
+
+
+def _yahoo_failure(e):
+    return isinstance(e, (requests.ConnectionError, requests.Timeout,
+                          aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+def _binance_failure(e):
+    # Rate limits (418/429), 5xx, maintenance and timeouts; BadSymbol and friends are ExchangeErrors
+    return isinstance(e, ccxt.NetworkError)
+
+
+def _gemini_failure(e):
+    # Quota (429), 5xx and deadline errors; invalid keys and prompts are the caller's problem
+    return isinstance(e, (google_exceptions.TooManyRequests, google_exceptions.ServerError,
+                          google_exceptions.DeadlineExceeded, asyncio.TimeoutError))
+
+
+# One limiter and breaker per upstream, shared by every service function and the async layer
+yahoo = Upstream('yahoo', is_failure=_yahoo_failure, **UPSTREAM_LIMITS['yahoo'])
+binance = Upstream('binance', is_failure=_binance_failure, **UPSTREAM_LIMITS['binance'])
+gemini = Upstream('gemini', is_failure=_gemini_failure, **UPSTREAM_LIMITS['gemini'])
+
+UPSTREAMS = (yahoo, binance, gemini)
+
+
+def upstream_stats():
+    """Breaker state and call counters of every upstream"""
+    return {upstream.name: upstream.stats() for upstream in UPSTREAMS}
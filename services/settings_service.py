@@ -2,6 +2,8 @@
 import os
 from dotenv import load_dotenv
 from services.gemini_service import configure_gemini
+from services.resilience import gemini
+from services.job_queue import job_queue
 
 
 def get_settings():
@@ -51,9 +53,13 @@ def update_settings(api_key=None, model=None):
     # Reload environment
     load_dotenv(override=True)
     
-    # Reconfigure Gemini if API key is set
+    # Reconfigure Gemini if API key is set; quota and failure state belonged to the old key
     if api_key:
         configure_gemini(api_key)
+        gemini.reset()
+    
+    # Job worker processes read the settings when they start
+    job_queue.restart_workers()
     
     return True
 
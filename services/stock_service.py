@@ -1,9 +1,39 @@
 """Stock price service using Yahoo Finance"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
 import yfinance as yf
+from config import (QUOTE_BATCH_WORKERS, STOCK_FAST_QUOTE, STOCK_SHARES_TTL,
+                    HISTORY_REFRESH_SECONDS, HISTORY_FULL_REFRESH_SECONDS,
+                    YAHOO_BASE_URL, TICK_CANDLE_INTERVAL)
+from services.history_format import format_history
+from services.history_store import history_store, empty_candles
+from services.http_pool import pooled_session, connection_stats as _connection_stats
+from services.metrics import stock_quote_seconds, symbol_probes
+from services.quote_cache import stock_quotes
+from services.resilience import yahoo, UpstreamError
+from services.symbol_index import symbol_index
+from services.tick_buffer import tick_buffer, DAY_MS
 
+# Fields of a stock quote
+QUOTE_FIELDS = ('price', 'change', 'change_percent', 'volume', 'market_cap')
 
-def get_stock_price(symbol):
-    """Get real-time stock price from Yahoo Finance"""
+# Keep-alive HTTP session shared by all Yahoo requests; the hook measures payload sizes
+_session = pooled_session()
+_local = threading.local()
+
+# Yahoo symbol -> (shares outstanding, learned at) for deriving market cap
+_shares_outstanding = {}
+
+
+def _symbol_variants(symbol):
+    """Yahoo symbols to try for a user symbol, skipping ones known not to exist"""
+    entry = symbol_index.lookup(symbol)
+    if entry and entry['type'] == 'stock':
+        return [entry['symbol']]
+    
     # Try different symbol formats for Borsa Istanbul warrants
     symbol_variants = [symbol]
     
@@ -15,84 +45,439 @@ def get_stock_price(symbol):
     if not symbol.endswith('.IS') and not symbol.endswith('.V'):
         symbol_variants.append(f"{symbol}.IS")
     
-    for sym in symbol_variants:
+    return [sym for sym in symbol_variants if not symbol_index.is_missing('stock', sym)]
+
+
+def get_stock_price(symbol):
+    """Get real-time stock price from Yahoo Finance (served from the shared quote cache)
+    
+    While Yahoo is rate limiting or down, the last known quote is returned
+    marked 'stale' (see QuoteCache.fallback).
+    """
+    return stock_quotes.get_or_fetch(symbol, lambda: _fetch_stock_price(symbol))
+
+
+def _fetch_stock_price(symbol):
+    """Fetch a stock price from Yahoo Finance, bypassing the cache"""
+    for sym in _symbol_variants(symbol):
         try:
-            ticker = yf.Ticker(sym)
-            info = ticker.info
-            
-            # Check if we have valid data
-            if not info or len(info) == 0:
-                continue
-            
-            current_price = info.get('currentPrice') or info.get('regularMarketPrice') or info.get('previousClose')
-            
-            # If price is 0 or None, try next variant
-            if not current_price or current_price == 0:
-                continue
-            
-            change = info.get('regularMarketChange', 0)
-            change_percent = info.get('regularMarketChangePercent', 0)
-            volume = info.get('volume', 0)
-            market_cap = info.get('marketCap', 0)
-            
-            return {
-                'price': round(current_price, 2),
-                'change': round(change, 2),
-                'change_percent': round(change_percent, 2),
-                'volume': volume,
-                'market_cap': market_cap
-            }
+            quote = yahoo.call(_fetch_quote, sym)
+        except UpstreamError as e:
+            # Rate limited or down: every other variant would fail the same way
+            return stock_quotes.fallback(symbol, e)
         except Exception:
+            symbol_probes.inc('quote', 'error')
             continue
+        
+        # No price for this variant, try the next one
+        if quote is None:
+            symbol_probes.inc('quote', 'missing')
+            _mark_missing(symbol, sym)
+            continue
+        
+        symbol_probes.inc('quote', 'found')
+        symbol_index.remember(symbol, 'stock', sym)
+        return _format_quote(quote)
     
     # If all variants failed, return error
     return {'error': f'No data available for symbol: {symbol}'}
 
 
-def get_stock_history(symbol, period='1mo'):
-    """Get historical price data for charting
+def _format_quote(quote):
+    """Round quote fields into the price dictionary returned to callers"""
+    return {
+        'price': round(quote['price'], 2),
+        'change': round(quote.get('change') or 0, 2),
+        'change_percent': round(quote.get('change_percent') or 0, 2),
+        'volume': quote.get('volume') or 0,
+        'market_cap': quote.get('market_cap') or 0
+    }
+
+
+def _fetch_quote(sym):
+    """Get the quote fields of one Yahoo symbol, or None if Yahoo has no price for it
+    
+    The fast path reads a few days of daily candles from the chart endpoint
+    and only falls back to the much heavier .info scrape for fields it could
+    not provide.
+    """
+    if not STOCK_FAST_QUOTE:
+        return _measured('info', _info_quote, sym)
+    
+    quote = _measured('fast', _fast_quote, sym)
+    if quote is None:
+        return None
+    
+    missing = [field for field in QUOTE_FIELDS if quote.get(field) is None]
+    if missing:
+        info_quote = _measured('info', _info_quote, sym, fields=missing) or {}
+        for field in missing:
+            quote[field] = info_quote.get(field)
+    return quote
+
+
+def _fast_quote(sym):
+    """Quote fields from the chart endpoint (one small request)"""
+    ticker = yf.Ticker(sym, session=_session)
+    hist = ticker.history(period='5d', interval='1d')
+    if hist.empty:
+        return None
+    closes = hist['Close'].dropna()
+    if closes.empty:
+        return None
+    
+    # Metadata comes with the same chart response, no extra request
+    meta = ticker.get_history_metadata() or {}
+    price = meta.get('regularMarketPrice') or float(closes.iloc[-1])
+    if not price:
+        return None
+    return _chart_quote(sym, price, closes.tolist(), hist['Volume'].iloc[-1])
+
+
+def _chart_quote(sym, price, closes, volume):
+    """Quote fields from a chart response's price, daily closes and last volume"""
+    quote = {'price': price, 'change': None, 'change_percent': None, 'volume': None, 'market_cap': None}
+    if len(closes) >= 2:
+        previous_close = float(closes[-2])
+        quote['change'] = price - previous_close
+        quote['change_percent'] = (price - previous_close) / previous_close * 100
+    if volume is not None and volume == volume:  # skip missing and NaN
+        quote['volume'] = int(volume)
+    
+    # Market cap moves with the price; derive it from the share count learned from .info
+    shares = _shares_outstanding.get(sym)
+    if shares and time.monotonic() - shares[1] < STOCK_SHARES_TTL:
+        quote['market_cap'] = int(shares[0] * price)
+    return quote
+
+
+def _info_quote(sym):
+    """Quote fields from the full .info scrape"""
+    info = yf.Ticker(sym, session=_session).info
+    
+    # Check if we have valid data
+    if not info or len(info) == 0:
+        return None
+    
+    current_price = info.get('currentPrice') or info.get('regularMarketPrice') or info.get('previousClose')
+    
+    # If price is 0 or None, there is no usable quote
+    if not current_price or current_price == 0:
+        return None
+    
+    market_cap = info.get('marketCap', 0)
+    shares = info.get('sharesOutstanding') or (market_cap / current_price if market_cap else None)
+    if shares:
+        _shares_outstanding[sym] = (shares, time.monotonic())
+    
+    return {
+        'price': current_price,
+        'change': info.get('regularMarketChange', 0),
+        'change_percent': info.get('regularMarketChangePercent', 0),
+        'volume': info.get('volume', 0),
+        'market_cap': market_cap
+    }
+
+
+def _count_bytes(response, *args, **kwargs):
+    """Response hook adding the payload size to the current thread's byte counter"""
+    _local.bytes = getattr(_local, 'bytes', 0) + len(response.content)
+
+
+def _measured(path, fetch, sym, fields=None):
+    """Run a quote path and record its latency and payload size
     
     Args:
-        symbol: Stock symbol
-        period: Period to fetch (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)
+        path: Quote path name ('fast' or 'info')
+        fetch: Function taking a Yahoo symbol and returning quote fields or None
+        sym: Yahoo symbol
+        fields: Fields this call is used for (default: every field it returns)
+    """
+    _local.bytes = 0
+    start = time.perf_counter()
+    quote = fetch(sym)
+    elapsed = time.perf_counter() - start
+    if fields is None:
+        fields = [field for field, value in (quote or {}).items() if value is not None]
+    quote_stats.record(path, fields, elapsed, _local.bytes)
+    stock_quote_seconds.observe(elapsed, path)
+    return quote
+
+
+class QuoteStats:
+    """Latency and payload bytes of each quote path, attributed to the fields it supplied"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = {}
+        self._fields = {}
+
+    @staticmethod
+    def _add(totals, seconds, nbytes):
+        totals['calls'] += 1
+        totals['seconds'] += seconds
+        totals['bytes'] += nbytes
+
+    def record(self, path, fields, seconds, nbytes):
+        with self._lock:
+            self._add(self._paths.setdefault(path, {'calls': 0, 'seconds': 0.0, 'bytes': 0}), seconds, nbytes)
+            for field in fields:
+                per_field = self._fields.setdefault(field, {})
+                self._add(per_field.setdefault(path, {'calls': 0, 'seconds': 0.0, 'bytes': 0}), seconds, nbytes)
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+            self._fields.clear()
+
+    @staticmethod
+    def _summary(totals):
+        calls = totals['calls']
+        return {
+            'calls': calls,
+            'avg_ms': round(totals['seconds'] * 1000 / calls, 2) if calls else 0.0,
+            'avg_bytes': round(totals['bytes'] / calls) if calls else 0
+        }
+
+    def snapshot(self):
+        """Get per-path and per-field averages"""
+        with self._lock:
+            return {
+                'paths': {path: self._summary(t) for path, t in self._paths.items()},
+                'fields': {
+                    field: {path: self._summary(t) for path, t in per_path.items()}
+                    for field, per_path in self._fields.items()
+                }
+            }
+
+
+# Per-path quote latency and payload measurements
+quote_stats = QuoteStats()
+_session.hooks['response'].append(_count_bytes)
+yahoo.watch(_session)
+
+
+def warm_up():
+    """Open a keep-alive connection to Yahoo so the first quote skips the TCP/TLS handshake"""
+    _session.head(YAHOO_BASE_URL, timeout=10)
+
+
+def connection_stats():
+    """Requests and connections of the shared Yahoo session"""
+    return _connection_stats(_session)
+
+
+def _mark_missing(symbol, sym):
+    """Record a Yahoo symbol without data and drop an index entry that pointed to it"""
+    symbol_index.mark_missing('stock', sym)
+    entry = symbol_index.lookup(symbol)
+    if entry and entry['symbol'] == sym:
+        symbol_index.forget(symbol)
+
+
+def get_stock_prices(symbols, timeout=None):
+    """Get real-time prices for several stocks at once
+    
+    Quotes are fetched concurrently on a bounded worker pool, so a whole
+    watchlist costs about one round trip instead of one per symbol.
+    
+    Args:
+        symbols: Iterable of stock symbols
+        timeout: Latency budget in seconds; quotes that are not refreshed in
+            time are served stale while the refresh continues in the background
+            (see QuoteCache.get_many). None waits for every quote.
     
     Returns:
-        Dictionary with dates and prices, or error
+        Dictionary mapping each symbol to the same dictionary get_stock_price
+        returns, or to None if it missed the budget and was never fetched before
     """
-    # Try different symbol formats for Borsa Istanbul warrants
-    symbol_variants = [symbol]
+    # Preserve order and drop duplicates
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
     
-    if symbol.endswith('.V') and not symbol.endswith('.IS'):
-        symbol_variants.append(f"{symbol}.IS")
+    if timeout is not None:
+        return stock_quotes.get_many(symbols, _fetch_stock_prices, timeout)
     
-    if not symbol.endswith('.IS') and not symbol.endswith('.V'):
-        symbol_variants.append(f"{symbol}.IS")
+    workers = max(1, min(QUOTE_BATCH_WORKERS, len(symbols)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(symbols, pool.map(get_stock_price, symbols)))
+
+
+def _fetch_stock_prices(symbols):
+    """Fetch stock prices concurrently, bypassing the cache
+    
+    Yields:
+        (symbol, price dictionary) pairs in the order the quotes arrive
+    """
+    workers = max(1, min(QUOTE_BATCH_WORKERS, len(symbols)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_fetch_stock_price, symbol): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def get_stock_candles(symbol, period='1mo', interval=TICK_CANDLE_INTERVAL):
+    """Get raw candle arrays for a period
+    
+    Candles come from the local history store, which is topped up from
+    Yahoo Finance with only the candles newer than the last stored one.
+    For the 1d period, the part of the day covered by live ticks is served
+    as interval candles built from them (see tick_buffer).
+    
+    Args:
+        symbol: Stock symbol
+        period: Period to fetch (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)
+        interval: Candle interval of the ticked part of a 1d period (1m, 5m or 15m)
     
-    for sym in symbol_variants:
+    Returns:
+        Tuple of (column arrays, exchange timezone name), or (None, None)
+        if no symbol variant has data
+    """
+    for sym in _symbol_variants(symbol):
         try:
-            ticker = yf.Ticker(sym)
-            hist = ticker.history(period=period)
+            candles, tz = _load_history(sym, period)
             
-            if hist.empty:
+            if candles is None or len(candles['ts']) == 0:
+                symbol_probes.inc('history', 'missing')
                 continue
             
-            # Convert to list format for JSON
-            # For 1d period, show hour info, otherwise just date
+            symbol_probes.inc('history', 'found')
+            symbol_index.remember(symbol, 'stock', sym)
             if period == '1d':
-                dates = hist.index.strftime('%Y-%m-%d %H:%M').tolist()
-            else:
-                dates = hist.index.strftime('%Y-%m-%d').tolist()
-            prices = hist['Close'].tolist()
-            
-            return {
-                'dates': dates,
-                'prices': [round(float(p), 2) for p in prices],
-                'high': [round(float(p), 2) for p in hist['High'].tolist()],
-                'low': [round(float(p), 2) for p in hist['Low'].tolist()],
-                'volume': [int(v) for v in hist['Volume'].tolist()]
-            }
+                candles = tick_buffer.overlay(symbol, candles, DAY_MS, interval)
+            return candles, tz
+        except UpstreamError:
+            break  # Yahoo is unavailable and nothing is stored; other variants would fail the same way
         except Exception:
+            symbol_probes.inc('history', 'error')
             continue
     
-    return {'error': f'No historical data available for symbol: {symbol}'}
+    return None, None
+
+
+def get_stock_history(symbol, period='1mo', interval=TICK_CANDLE_INTERVAL, fmt='json', max_points=None):
+    """Get historical price data for charting
+    
+    Args:
+        symbol: Stock symbol
+        period: Period to fetch (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)
+        interval: Candle interval of the ticked part of a 1d period (see get_stock_candles)
+        fmt: Payload format, 'json' or 'columnar' (see history_format)
+        max_points: Most candles to return, downsampled with LTTB (see downsample); None for all
+    
+    Returns:
+        Dictionary with dates (in the exchange timezone) and prices, or error
+    """
+    candles, tz = get_stock_candles(symbol, period, interval)
+    if candles is None:
+        return {'error': f'No historical data available for symbol: {symbol}'}
+    return format_history(candles, tz, period, fmt, max_points)
+
+
+# Periods counted in trading days rather than calendar time
+_TRADING_DAY_PERIODS = {'1d': 1, '5d': 5}
+
+_CALENDAR_PERIODS = {
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10)
+}
+
+
+def _period_start_ms(period):
+    """Earliest candle time of a calendar period, or None for max and trading-day periods"""
+    now = pd.Timestamp.now(tz='UTC')
+    if period == 'ytd':
+        start = now.normalize().replace(month=1, day=1)
+    elif period in _CALENDAR_PERIODS:
+        start = (now - _CALENDAR_PERIODS[period]).normalize()
+    else:
+        return None
+    return int(start.timestamp() * 1000)
+
+
+def _needs_full_download(meta, period, start_ms, last):
+    """Check whether the stored series cannot serve a period by topping up alone"""
+    if meta is None or meta['rows'] == 0:
+        return True
+    if time.time() - meta['full_at'] > HISTORY_FULL_REFRESH_SECONDS:
+        return True
+    if meta['complete']:
+        return False
+    if period == 'max':
+        return True
+    if last is not None:
+        return meta['rows'] < last
+    if start_ms is not None:
+        return meta['covered_from'] is None or start_ms < meta['covered_from']
+    return True
+
+
+def _frame_to_candles(hist):
+    """Convert a yfinance history frame to candle arrays"""
+    hist = hist[~hist.index.duplicated(keep='last')].sort_index()
+    index = hist.index if hist.index.tz is not None else hist.index.tz_localize('UTC')
+    ts = (index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1)
+    return {
+        'ts': np.asarray(ts, dtype=np.int64),
+        'open': hist['Open'].to_numpy(dtype=np.float64),
+        'high': hist['High'].to_numpy(dtype=np.float64),
+        'low': hist['Low'].to_numpy(dtype=np.float64),
+        'close': hist['Close'].to_numpy(dtype=np.float64),
+        'volume': hist['Volume'].to_numpy(dtype=np.float64)
+    }
+
+
+def _load_history(sym, period):
+    """Daily candles covering a period for one Yahoo symbol
+    
+    While Yahoo is unavailable, whatever is stored is served as it is.
+    
+    Returns:
+        Tuple of (candle arrays or None, exchange timezone name)
+    
+    Raises:
+        UpstreamError: If Yahoo is unavailable and nothing is stored
+    """
+    key = ('yahoo', sym, '1d')
+    meta = history_store.meta(*key)
+    start_ms = _period_start_ms(period)
+    last = _TRADING_DAY_PERIODS.get(period)
+    
+    try:
+        if _needs_full_download(meta, period, start_ms, last):
+            hist = yahoo.call(yf.Ticker(sym, session=_session).history, period=period)
+            if hist.empty:
+                return None, None
+            meta = _store_full_history(key, _frame_to_candles(hist), period, start_ms, str(hist.index.tz or 'UTC'))
+        elif _needs_top_up(meta):
+            hist = yahoo.call(yf.Ticker(sym, session=_session).history, start=_top_up_start(meta), interval='1d')
+            history_store.append(*key, _frame_to_candles(hist) if not hist.empty else empty_candles())
+    except UpstreamError:
+        if meta is None:
+            raise
+    
+    return history_store.read(*key, start_ms=start_ms, last=last), meta['tz']
+
+
+def _needs_top_up(meta):
+    """Check whether the stored series is due for an incremental refresh"""
+    return time.time() - meta['updated_at'] > HISTORY_REFRESH_SECONDS
+
+
+def _top_up_start(meta):
+    """First day to re-fetch; the still-forming last stored candle is replaced"""
+    start = pd.to_datetime(meta['last_ts'], unit='ms', utc=True).tz_convert(meta['tz'])
+    return start.strftime('%Y-%m-%d')
+
 
+def _store_full_history(key, candles, period, start_ms, tz):
+    """Replace the stored series with a full download and return its metadata"""
+    covered_from = start_ms if start_ms is not None else int(candles['ts'][0])
+    history_store.write(*key, candles, covered_from=covered_from, complete=(period == 'max'), tz=tz)
+    return history_store.meta(*key)
@@ -0,0 +1,188 @@
+"""Persistent index mapping user symbols to the venue symbol that serves them"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from config import (POPULAR_STOCKS, POPULAR_CRYPTO, BORSA_ISTANBUL, SYMBOL_INDEX_PATH, SYMBOL_INDEX_NEGATIVE_TTL,
+                    SYMBOL_INDEX_MAX_ENTRIES, SYMBOL_INDEX_SAVE_DELAY)
+
+
+class SymbolIndex:
+    """Remembers which concrete symbol answers a user symbol
+    
+    Positive entries map a user symbol (e.g. 'SOL', 'THYAO') to an asset
+    type and concrete symbol ('crypto', 'SOL/USDT'). Negative entries record
+    concrete symbols that returned no data and expire after negative_ttl
+    seconds. Each kind keeps at most max_entries, dropping the least
+    recently used first, so probing endless unknown symbols cannot grow it.
+    
+    Both survive restarts through a JSON file. Changes are collected for
+    save_delay seconds and then written at once (expired negative entries
+    are pruned on the way), so a burst of new symbols rewrites the file
+    once instead of once per symbol; flush() writes pending changes now and
+    runs at interpreter exit.
+    """
+
+    def __init__(self, path=SYMBOL_INDEX_PATH, negative_ttl=SYMBOL_INDEX_NEGATIVE_TTL,
+                 max_entries=SYMBOL_INDEX_MAX_ENTRIES, save_delay=SYMBOL_INDEX_SAVE_DELAY, clock=time.time):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.save_delay = save_delay
+        self._clock = clock
+        self._entries = OrderedDict()  # user symbol -> {'type': ..., 'symbol': ...}, least recently used first
+        self._missing = OrderedDict()  # 'type:symbol' -> expiry timestamp, oldest first
+        self._crypto_pairs = None  # pairs listed on the exchange, once markets are loaded
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # Keeps snapshots landing on disk in order
+        self._dirty = False
+        self._timer = None
+        self.saves = 0
+        self._load()
+        self.seed_from_config()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = self._clock()
+        self._entries = OrderedDict(data.get('entries', {}))
+        self._missing = OrderedDict(sorted(((k, v) for k, v in data.get('missing', {}).items() if v > now),
+                                           key=lambda item: item[1]))
+        self._trim()
+
+    def _trim(self):
+        """Drop the least recently used entries beyond max_entries; caller must hold the lock"""
+        for entries in (self._entries, self._missing):
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def _changed(self):
+        """Bound the index and schedule a write; caller must hold the lock"""
+        self._trim()
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.save_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write pending changes to disk now"""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty or not self.path:
+                    return
+                self._dirty = False
+                now = self._clock()
+                for key in [key for key, expiry in self._missing.items() if expiry <= now]:
+                    del self._missing[key]
+                # dumps() uses the C encoder; dump() streams through the much slower Python one
+                data = json.dumps({'entries': self._entries, 'missing': self._missing})
+                path = self.path
+            try:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self.saves += 1
+            except OSError:
+                pass  # The index is an optimisation; lookups still work without it
+
+    def seed_from_config(self):
+        """Add the watchlist symbols from config.py"""
+        with self._lock:
+            for symbol in POPULAR_STOCKS:
+                self._entries[symbol] = {'type': 'stock', 'symbol': symbol}
+            for symbol in BORSA_ISTANBUL:
+                entry = {'type': 'stock', 'symbol': symbol}
+                self._entries[symbol] = entry
+                self._entries[symbol[:-len('.IS')]] = entry
+            for pair in POPULAR_CRYPTO:
+                self._entries[pair.split('/')[0]] = {'type': 'crypto', 'symbol': pair}
+
+    def seed_markets(self, pairs):
+        """Record the pairs listed on the exchange so unlisted pairs are never requested"""
+        with self._lock:
+            self._crypto_pairs = set(pairs)
+
+    @property
+    def has_markets(self):
+        return self._crypto_pairs is not None
+
+    def lookup(self, symbol):
+        """Get the {'type', 'symbol'} entry for a user symbol, or None if unknown"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if not entry:
+                return None
+            self._entries.move_to_end(symbol)
+            return dict(entry)
+
+    def remember(self, symbol, asset_type, concrete):
+        """Record that a user symbol resolves to a concrete symbol"""
+        entry = {'type': asset_type, 'symbol': concrete}
+        with self._lock:
+            self._missing.pop(f"{asset_type}:{concrete}", None)
+            if self._entries.get(symbol) == entry:
+                self._entries.move_to_end(symbol)
+                return
+            self._entries[symbol] = entry
+            self._entries.move_to_end(symbol)
+            self._changed()
+
+    def forget(self, symbol):
+        """Drop a positive entry that stopped working"""
+        with self._lock:
+            if self._entries.pop(symbol, None) is not None:
+                self._changed()
+
+    def mark_missing(self, asset_type, concrete):
+        """Record that a concrete symbol returned no data"""
+        key = f"{asset_type}:{concrete}"
+        with self._lock:
+            self._missing.pop(key, None)  # Re-inserted last, keeping the oldest expiry first
+            self._missing[key] = self._clock() + self.negative_ttl
+            self._changed()
+
+    def is_missing(self, asset_type, concrete):
+        """Check whether a concrete symbol is known not to exist"""
+        with self._lock:
+            if asset_type == 'crypto' and self._crypto_pairs is not None:
+                return concrete not in self._crypto_pairs
+            key = f"{asset_type}:{concrete}"
+            expiry = self._missing.get(key)
+            if expiry is None:
+                return False
+            if expiry <= self._clock():
+                del self._missing[key]
+                return False
+            return True
+
+    def clear(self):
+        """Drop everything except the config.py seeds, and any write still pending"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._dirty = False
+            self._entries = OrderedDict()
+            self._missing = OrderedDict()
+            self._crypto_pairs = None
+        self.seed_from_config()
+
+
+# Shared index for the whole process
+symbol_index = SymbolIndex()
+atexit.register(symbol_index.flush)
@@ -0,0 +1,235 @@
+"""Per-symbol ring buffers of live quote ticks, aggregated into intraday candles
+
+Every live quote, whether a REST quote stored in a quote cache or a
+frame of the Binance ticker stream, is appended to its symbol's ring:
+three typed arrays that start small and double as ticks arrive, up to
+TICK_BUFFER_SIZE rows for a streamed pair and TICK_BUFFER_QUOTE_SIZE
+rows for a symbol only quoted over REST (a day of each source's ticks),
+then are overwritten oldest first. A tick therefore costs three array
+stores and a symbol's memory stops growing at its cap. 1d charts read
+the rings as NumPy arrays and aggregate them into 1m, 5m or 15m candles
+when they are requested.
+"""
+import threading
+import time
+from array import array
+from collections import OrderedDict
+import numpy as np
+from config import TICK_BUFFER_SIZE, TICK_BUFFER_QUOTE_SIZE, TICK_BUFFER_MAX_SYMBOLS, TICK_CANDLE_INTERVAL
+from services.history_store import COLUMNS
+
+# Candle interval -> milliseconds
+INTERVALS = {
+    '1m': 60000,
+    '5m': 300000,
+    '15m': 900000
+}
+
+# Width of a daily candle, and the window of the 1d charts
+DAY_MS = 86400000
+
+# Bytes per tick: int64 time, float64 price and float64 volume
+TICK_BYTES = 24
+
+# Rows a new ring starts with; it doubles from there up to its capacity
+INITIAL_TICKS = 1024
+
+
+class TickRing:
+    """Ring of (time, price, traded volume) ticks of one symbol, at most capacity of them
+
+    The arrays hold size rows: they double whenever they are full until
+    they reach capacity, and from then on the oldest tick is overwritten.
+    """
+
+    def __init__(self, capacity, initial=INITIAL_TICKS):
+        self.capacity = capacity
+        self.size = min(initial, capacity)
+        # Typed arrays take a scalar store faster than NumPy; np.frombuffer reads them in place
+        self.ts = array('q', bytes(8 * self.size))  # Epoch milliseconds
+        self.price = array('d', bytes(8 * self.size))
+        self.volume = array('d', bytes(8 * self.size))  # Volume traded since the previous tick
+        self.count = 0  # Ticks appended since the arrays last grew; the next one goes to count % size
+        self.last_ts = None
+        self.last_price = None
+        self.total_volume = None  # Cumulative quote volume at the last tick
+
+    @property
+    def nbytes(self):
+        return (len(self.ts) + len(self.price) + len(self.volume)) * 8
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def reserve(self, capacity):
+        """Let the ring grow to capacity ticks (e.g. once its pair is streamed)"""
+        if capacity <= self.capacity:
+            return
+        if self.count > self.size:
+            # Wrapped: put the oldest tick first, so the arrays can grow at the end
+            split = self.count % self.size
+            self.ts, self.price, self.volume = (column[split:] + column[:split]
+                                                for column in (self.ts, self.price, self.volume))
+            self.count = self.size
+        self.capacity = capacity
+
+    def _grow(self):
+        extra = min(2 * self.size, self.capacity) - self.size
+        for column in (self.ts, self.price, self.volume):
+            column.frombytes(bytes(8 * extra))
+        self.size += extra
+
+    def append(self, ts, price, volume):
+        if self.count == self.size < self.capacity:
+            self._grow()
+        i = self.count % self.size
+        self.ts[i] = ts
+        self.price[i] = price
+        self.volume[i] = volume
+        self.count += 1
+        self.last_ts = ts
+        self.last_price = price
+
+    def copy(self, since_ms=None):
+        """Copies of the (ts, price, volume) columns oldest first, from since_ms on"""
+        columns = (np.frombuffer(self.ts, dtype=np.int64), np.frombuffer(self.price, dtype=np.float64),
+                   np.frombuffer(self.volume, dtype=np.float64))
+        if self.count <= self.size:
+            columns = tuple(column[:self.count].copy() for column in columns)
+        else:
+            split = self.count % self.size
+            columns = tuple(np.concatenate((column[split:], column[:split])) for column in columns)
+        if since_ms is not None:
+            start = int(np.searchsorted(columns[0], since_ms))
+            columns = tuple(column[start:] for column in columns)
+        return columns
+
+
+def aggregate(ts, price, volume, step_ms):
+    """Candle arrays (see history_store.COLUMNS) of time-ordered ticks, one per step_ms bucket"""
+    buckets = ts - ts % step_ms
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.append(starts[1:], len(ts)) - 1
+    return {
+        'ts': buckets[starts],
+        'open': price[starts],
+        'high': np.maximum.reduceat(price, starts),
+        'low': np.minimum.reduceat(price, starts),
+        'close': price[ends],
+        'volume': np.add.reduceat(volume, starts)
+    }
+
+
+class TickBuffer:
+    """Tick rings keyed by symbol, bounded in ticks per symbol and in symbols
+
+    Quotes carry a cumulative volume (the day's volume for stocks, the
+    rolling 24h volume for crypto); each tick keeps its increase over the
+    previous tick, so a candle's volume is what traded within it. A quote
+    that repeats the previous tick's price and volume adds nothing and is
+    skipped.
+    """
+
+    def __init__(self, size=TICK_BUFFER_SIZE, quote_size=TICK_BUFFER_QUOTE_SIZE, max_symbols=TICK_BUFFER_MAX_SYMBOLS,
+                 clock=time.time):
+        self.size = size
+        self.quote_size = min(quote_size, size)
+        self.max_symbols = max_symbols
+        self._clock = clock
+        self._rings = OrderedDict()  # symbol -> TickRing, least recently ticked first
+        self._lock = threading.Lock()
+        self.ticks = 0
+        self.skipped = 0
+        self.evicted = 0
+
+    def record(self, symbol, price, total_volume=None, ts_ms=None, capacity=None):
+        """Append a tick; ts_ms defaults to now, capacity (the ring's cap) to size"""
+        if not price:
+            return
+        ts = int(self._clock() * 1000) if ts_ms is None else int(ts_ms)
+        capacity = self.size if capacity is None else capacity
+        with self._lock:
+            ring = self._rings.get(symbol)
+            if ring is None:
+                ring = self._rings[symbol] = TickRing(capacity)
+                while len(self._rings) > self.max_symbols:
+                    self._rings.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._rings.move_to_end(symbol)
+                ring.reserve(capacity)
+                if price == ring.last_price and total_volume == ring.total_volume:
+                    self.skipped += 1
+                    return
+                # Ticks stay time-ordered even if a REST quote and a stream frame cross
+                if ts < ring.last_ts:
+                    ts = ring.last_ts
+            traded = 0.0
+            if total_volume is not None and ring.total_volume is not None:
+                traded = max(total_volume - ring.total_volume, 0.0)
+            ring.total_volume = total_volume
+            ring.append(ts, price, traded)
+            self.ticks += 1
+
+    def record_quote(self, symbol, price_data):
+        """Append a tick from a quote dictionary (see QuoteCache on_store), in a ring of quote_size"""
+        self.record(symbol, price_data.get('price'), price_data.get('volume'), capacity=self.quote_size)
+
+    def candles(self, symbol, interval=TICK_CANDLE_INTERVAL, since_ms=None):
+        """Candle arrays of a symbol's ticks from since_ms on, or None without ticks"""
+        step_ms = INTERVALS[interval]
+        with self._lock:
+            ring = self._rings.get(symbol)
+            if ring is None or ring.count == 0:
+                return None
+            ts, price, volume = ring.copy(since_ms)
+        if len(ts) == 0:
+            return None
+        return aggregate(ts, price, volume, step_ms)
+
+    def overlay(self, symbol, candles, step_ms, interval=TICK_CANDLE_INTERVAL):
+        """The last day's candles at interval resolution where ticks cover it
+
+        Upstream candles (step_ms wide) that closed before the first ticked
+        candle opened are kept; everything from there on comes from the
+        ticks. Returns candles unchanged if the symbol has no tick within
+        the last day.
+        """
+        ticks = self.candles(symbol, interval, since_ms=int(self._clock() * 1000) - DAY_MS)
+        if ticks is None:
+            return candles
+        keep = candles['ts'] + step_ms <= ticks['ts'][0]
+        return {column: np.concatenate((candles[column][keep], ticks[column])).astype(dtype, copy=False)
+                for column, dtype in COLUMNS.items()}
+
+    def clear(self):
+        """Drop all rings and reset counters"""
+        with self._lock:
+            self._rings.clear()
+            self.ticks = self.skipped = self.evicted = 0
+
+    def stats(self):
+        """Get tick counters and memory held, in total and per symbol
+
+        bytes_per_symbol is the most a streamed pair's ring can hold, and
+        max_bytes the most all rings can hold if every symbol is streamed.
+        """
+        with self._lock:
+            bytes_per_symbol = self.size * TICK_BYTES
+            return {
+                'symbols': len(self._rings),
+                'max_symbols': self.max_symbols,
+                'ticks_per_symbol': self.size,
+                'ticks_per_quoted_symbol': self.quote_size,
+                'bytes_per_symbol': bytes_per_symbol,
+                'bytes': sum(ring.nbytes for ring in self._rings.values()),
+                'max_bytes': bytes_per_symbol * self.max_symbols,
+                'ticks': self.ticks,
+                'skipped': self.skipped,
+                'evicted': self.evicted,
+                'buffered': {symbol: len(ring) for symbol, ring in self._rings.items()}
+            }
+
+
+# Shared tick buffer fed by the quote caches and the ticker stream, read by the 1d charts
+tick_buffer = TickBuffer()
@@ -0,0 +1,49 @@
+"""Watchlist service for the dashboard tabs"""
+from services.stock_service import get_stock_prices
+from services.crypto_service import get_crypto_prices
+from config import POPULAR_STOCKS, POPULAR_CRYPTO, BORSA_ISTANBUL
+
+# Dashboard tab id -> symbols shown on that tab
+WATCHLISTS = {
+    'popular': POPULAR_STOCKS,
+    'crypto': POPULAR_CRYPTO,
+    'borsa': BORSA_ISTANBUL
+}
+
+
+def _display_symbol(watchlist, symbol):
+    """Symbol shown on the price card (crypto pairs drop the quote currency)"""
+    if watchlist == 'crypto':
+        return symbol.replace('/USDT', '')
+    return symbol
+
+
+def get_watchlist_prices(watchlist, timeout=None):
+    """Get prices for every symbol of a dashboard watchlist
+    
+    Args:
+        watchlist: Tab id - 'popular', 'crypto' or 'borsa'
+        timeout: Latency budget in seconds (see get_stock_prices); None waits for every quote
+    
+    Returns:
+        Dictionary of symbol -> price card data. Quotes that missed the budget
+        are marked 'stale' with their 'age', or 'pending' if no price is known
+        yet; symbols without a valid price are omitted.
+    """
+    symbols = WATCHLISTS[watchlist]
+    if watchlist == 'crypto':
+        quotes = get_crypto_prices(symbols, timeout)
+    else:
+        quotes = get_stock_prices(symbols, timeout)
+    
+    results = {}
+    for symbol, name in symbols.items():
+        card = {'name': name, 'symbol': _display_symbol(watchlist, symbol)}
+        price_data = quotes[symbol]
+        if price_data is None:
+            # Still loading in the background; the next request or stream update has it
+            results[symbol] = {**card, 'pending': True}
+        # Only include if no error and price is valid
+        elif 'error' not in price_data and price_data.get('price') and price_data.get('price') != 0:
+            results[symbol] = {**card, **price_data}
+    return results
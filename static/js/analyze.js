@@ -93,7 +93,9 @@ function analyzeStock(symbol, analysisType = 'short_term') {
     errorMessage.classList.add('hidden');
     loadingOverlay.classList.remove('hidden');
 
-    fetch('/api/analyze', {
+    let analysisText = '';
+
+    fetch('/api/analyze/stream', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
@@ -110,17 +112,21 @@ function analyzeStock(symbol, analysisType = 'short_term') {
                 throw new Error(err.error || t('errorNoData'));
             });
         }
-        return response.json();
-    })
-    .then(data => {
-        loadingOverlay.classList.add('hidden');
-        
-        if (data.error) {
-            showError(data.error);
-            return;
-        }
-
-        displayAnalysis(data);
+        // Render the report piece by piece as the model writes it
+        return readEventStream(response, (event, data) => {
+            if (event === 'meta') {
+                loadingOverlay.classList.add('hidden');
+                displayAnalysis({ ...data, analysis: '' });
+            } else if (event === 'chunk') {
+                analysisText += data.text;
+                document.getElementById('analysis-text').innerHTML = formatAnalysisText(analysisText);
+            } else if (event === 'done') {
+                currentAnalysisData.analysis = analysisText;
+                currentAnalysisData.session_id = data.session_id;
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        });
     })
     .catch(error => {
         loadingOverlay.classList.add('hidden');
@@ -129,6 +135,45 @@ function analyzeStock(symbol, analysisType = 'short_term') {
     });
 }
 
+// Parse a Server-Sent Events response body, calling onEvent(event, data) per message
+function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    function dispatch(message) {
+        let event = 'message';
+        let data = '';
+        message.split('\n').forEach(line => {
+            if (line.startsWith('event: ')) {
+                event = line.slice(7);
+            } else if (line.startsWith('data: ')) {
+                data += line.slice(6);
+            }
+        });
+        if (data) {
+            onEvent(event, JSON.parse(data));
+        }
+    }
+
+    function pump() {
+        return reader.read().then(({ done, value }) => {
+            if (done) {
+                return;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                dispatch(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+            }
+            return pump();
+        });
+    }
+
+    return pump();
+}
+
 function displayAnalysis(data) {
     const analysisResult = document.getElementById('analysis-result');
     const symbolName = document.getElementById('symbol-name');
@@ -320,18 +365,36 @@ function askQuestion() {
     // Clear input
     questionInput.value = '';
     
-    fetch('/api/ask-question', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({
-            symbol: currentAnalysisData.symbol,
-            question: question,
-            analysis_text: currentAnalysisData.analysis,
-            price_data: currentAnalysisData.price_data,
-            language: currentLang
-        })
+    let answer = '';
+
+    // The server keeps the report of a session; the full report is only sent without one
+    function send(useSession) {
+        const body = useSession
+            ? { session_id: currentAnalysisData.session_id, question: question, language: currentLang }
+            : {
+                symbol: currentAnalysisData.symbol,
+                question: question,
+                analysis_text: currentAnalysisData.analysis,
+                price_data: currentAnalysisData.price_data,
+                language: currentLang
+            };
+        return fetch('/api/ask-question/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(body)
+        });
+    }
+
+    send(Boolean(currentAnalysisData.session_id))
+    .then(response => {
+        if (response.status === 404 && currentAnalysisData.session_id) {
+            // Session expired: start over with the full report
+            currentAnalysisData.session_id = null;
+            return send(false);
+        }
+        return response;
     })
     .then(response => {
         if (!response.ok) {
@@ -339,12 +402,17 @@ function askQuestion() {
                 throw new Error(err.error || t('errorAnswering'));
             });
         }
-        return response.json();
+        // Update answer in UI as it streams in
+        return readEventStream(response, (event, data) => {
+            if (event === 'chunk') {
+                answer += data.text;
+                updateQuestionAnswer(question, answer);
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        });
     })
-    .then(data => {
-        // Update answer in UI
-        updateQuestionAnswer(question, data.answer);
-        
+    .then(() => {
         // Re-enable input and button
         questionInput.disabled = false;
         askBtn.disabled = false;
@@ -416,8 +484,53 @@ function formatNumber(num) {
     return num.toFixed(2);
 }
 
+// Typed arrays of the columnar history format
+const COLUMN_TYPES = { Int8Array, Int16Array, Int32Array, Float64Array };
+
+function decodeColumn(column) {
+    // Little-endian typed array in base64: deltas after the first value, or the values themselves
+    const bytes = Uint8Array.from(atob(column.data), c => c.charCodeAt(0));
+    const raw = new COLUMN_TYPES[column.type](bytes.buffer);
+    if (column.first === undefined) {
+        return Array.from(raw);
+    }
+    const values = new Array(raw.length + 1);
+    let value = column.first;
+    values[0] = value / column.scale;
+    for (let i = 0; i < raw.length; i++) {
+        value += raw[i];
+        values[i + 1] = value / column.scale;
+    }
+    return values;
+}
+
+function decodeHistory(data) {
+    // Columnar history -> the dates, prices, high, low and volume lists of the JSON format
+    const dateFormat = new Intl.DateTimeFormat('sv-SE', {
+        timeZone: data.tz,
+        year: 'numeric',
+        month: '2-digit',
+        day: '2-digit',
+        ...(data.daily ? {} : { hour: '2-digit', minute: '2-digit', hourCycle: 'h23' })
+    });
+    const times = decodeColumn(data.times);
+    return {
+        symbol: data.symbol,
+        period: data.period,
+        dates: times.map(time => dateFormat.format(new Date(time * data.time_unit))),
+        prices: decodeColumn(data.prices),
+        high: decodeColumn(data.high),
+        low: decodeColumn(data.low),
+        volume: decodeColumn(data.volume)
+    };
+}
+
 function loadChart(symbol, period = '1mo') {
-    fetch(`/api/history/${symbol}?period=${period}`)
+    // One point per pixel of the chart's width (its container's, before the first render sizes the canvas)
+    const canvas = document.getElementById('price-chart');
+    const width = canvas && canvas.parentElement ? Math.round(canvas.parentElement.clientWidth) : 0;
+    const maxPoints = width >= 3 ? `&max_points=${width}` : '';
+    fetch(`/api/history/${symbol}?period=${period}&format=columnar${maxPoints}`)
         .then(response => {
             if (!response.ok) {
                 throw new Error('Chart data not available');
@@ -429,7 +542,7 @@ function loadChart(symbol, period = '1mo') {
                 console.error('Chart error:', data.error);
                 return;
             }
-            renderChart(data);
+            renderChart(data.format === 'columnar' ? decodeHistory(data) : data);
         })
         .catch(error => {
             console.error('Error loading chart:', error);
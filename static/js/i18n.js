@@ -43,6 +43,8 @@ const translations = {
         askBtn: 'Sor',
         volume: 'Hacim:',
         marketCap: 'Piyasa Değeri:',
+        priceUpdating: 'Güncelleniyor...',
+        priceLastUpdate: 'Son güncelleme:',
         
         // Settings Page
         settingsTitle: 'Ayarlar',
@@ -158,6 +160,8 @@ const translations = {
         askBtn: 'Ask',
         volume: 'Volume:',
         marketCap: 'Market Cap:',
+        priceUpdating: 'Updating...',
+        priceLastUpdate: 'Last update:',
         
         // Settings Page
         settingsTitle: 'Settings',
@@ -1,5 +1,15 @@
 // Main page JavaScript
 let updateInterval;
+let priceStream = null;
+
+// Latest prices per tab, kept up to date by the price stream
+const tabPrices = {};
+
+const TAB_GRIDS = {
+    popular: 'popular-grid',
+    crypto: 'crypto-grid',
+    borsa: 'borsa-grid'
+};
 
 document.addEventListener('DOMContentLoaded', function() {
     // Tab switching
@@ -18,50 +28,118 @@ document.addEventListener('DOMContentLoaded', function() {
             btn.classList.add('active');
             document.getElementById(`${tabId}-tab`).classList.add('active');
             
-            // Load data for the active tab
-            loadTabData(tabId);
+            // Show streamed data right away, otherwise load it
+            if (priceStream && tabPrices[tabId] && Object.keys(tabPrices[tabId]).length > 0) {
+                displayPrices(tabPrices[tabId], TAB_GRIDS[tabId]);
+            } else {
+                loadTabData(tabId);
+            }
         });
     });
 
     // Load initial data
     loadTabData('popular');
 
+    // Receive price updates pushed by the server, or poll if streaming is unavailable
+    if (window.EventSource) {
+        startPriceStream();
+    } else {
+        startPolling();
+    }
+});
+
+function getActiveTab() {
+    const activeTab = document.querySelector('.tab-btn.active');
+    return activeTab ? activeTab.getAttribute('data-tab') : null;
+}
+
+function startPolling() {
+    if (updateInterval) {
+        return;
+    }
     // Auto-refresh every 30 seconds
     updateInterval = setInterval(() => {
-        const activeTab = document.querySelector('.tab-btn.active');
-        if (activeTab) {
-            const tabId = activeTab.getAttribute('data-tab');
+        const tabId = getActiveTab();
+        if (tabId) {
             loadTabData(tabId);
         }
     }, 30000);
-});
+}
+
+function startPriceStream() {
+    priceStream = new EventSource('/api/prices/stream');
+
+    priceStream.addEventListener('snapshot', event => {
+        const data = JSON.parse(event.data);
+        Object.entries(data).forEach(([tabId, prices]) => {
+            tabPrices[tabId] = Object.assign(tabPrices[tabId] || {}, prices);
+        });
+        renderActiveTab();
+    });
+
+    priceStream.addEventListener('update', event => {
+        const changes = JSON.parse(event.data);
+        Object.entries(changes).forEach(([tabId, prices]) => {
+            tabPrices[tabId] = Object.assign(tabPrices[tabId] || {}, prices);
+        });
+        if (getActiveTab() in changes) {
+            renderActiveTab();
+        }
+    });
+
+    priceStream.onerror = () => {
+        // EventSource reconnects on its own unless the server refused the stream
+        if (priceStream.readyState === EventSource.CLOSED) {
+            priceStream = null;
+            startPolling();
+        }
+    };
+}
+
+function renderActiveTab() {
+    const tabId = getActiveTab();
+    if (tabId && tabPrices[tabId] && Object.keys(tabPrices[tabId]).length > 0) {
+        displayPrices(tabPrices[tabId], TAB_GRIDS[tabId]);
+    }
+}
+
+// Delay before re-requesting a tab that was served stale quotes; the server refreshes them meanwhile
+const REVALIDATE_DELAY = 1500;
 
-function loadTabData(tabId) {
+function loadTabData(tabId, revalidating = false) {
     let endpoint;
-    let gridId;
+    const gridId = TAB_GRIDS[tabId];
 
     switch(tabId) {
         case 'popular':
             endpoint = '/api/prices/popular';
-            gridId = 'popular-grid';
             break;
         case 'crypto':
             endpoint = '/api/prices/crypto';
-            gridId = 'crypto-grid';
             break;
         case 'borsa':
             endpoint = '/api/prices/borsa-istanbul';
-            gridId = 'borsa-grid';
             break;
     }
 
     const grid = document.getElementById(gridId);
-    grid.innerHTML = `<div class="loading"><i class="fas fa-spinner fa-spin"></i> ${t('loading')}</div>`;
+    if (!revalidating) {
+        grid.innerHTML = `<div class="loading"><i class="fas fa-spinner fa-spin"></i> ${t('loading')}</div>`;
+    }
 
     fetch(endpoint)
         .then(response => response.json())
         .then(data => {
+            tabPrices[tabId] = Object.assign(tabPrices[tabId] || {}, data);
             displayPrices(data, gridId);
+            const outdated = Object.values(data).some(info => info.stale || info.pending);
+            if (outdated && !revalidating) {
+                setTimeout(() => {
+                    if (getActiveTab() === tabId) {
+                        loadTabData(tabId, true);
+                    }
+                }, REVALIDATE_DELAY);
+            }
         })
         .catch(error => {
             console.error('Error:', error);
@@ -89,6 +167,20 @@ function createPriceCard(symbol, info) {
     const card = document.createElement('div');
     card.className = 'price-card';
 
+    if (info.pending) {
+        card.classList.add('pending');
+        card.innerHTML = `
+            <div class="price-card-header">
+                <div>
+                    <div class="price-card-title">${info.name}</div>
+                </div>
+                <div class="price-card-symbol">${symbol}</div>
+            </div>
+            <div class="price-card-status"><i class="fas fa-spinner fa-spin"></i> ${t('priceUpdating')}</div>
+        `;
+        return card;
+    }
+
     const changeClass = info.change_percent >= 0 ? 'positive' : 'negative';
     const changeIcon = info.change_percent >= 0 ? 'fa-arrow-up' : 'fa-arrow-down';
     const changeSign = info.change_percent >= 0 ? '+' : '';
@@ -111,11 +203,25 @@ function createPriceCard(symbol, info) {
         </div>
         ${volume !== 'N/A' ? `<div class="price-card-volume">${t('volume')} ${volume}</div>` : ''}
         ${marketCap ? `<div class="price-card-volume">${t('marketCap')} ${marketCap}</div>` : ''}
+        ${info.stale ? `<div class="price-card-status"><i class="fas fa-clock"></i> ${t('priceLastUpdate')} ${formatAge(info.age)}</div>` : ''}
     `;
 
+    if (info.stale) {
+        card.classList.add('stale');
+    }
+
     return card;
 }
 
+function formatAge(seconds) {
+    if (seconds >= 3600) {
+        return `${Math.floor(seconds / 3600)}h`;
+    } else if (seconds >= 60) {
+        return `${Math.floor(seconds / 60)}m`;
+    }
+    return `${Math.floor(seconds)}s`;
+}
+
 function formatNumber(num) {
     if (num >= 1e12) {
         return (num / 1e12).toFixed(2) + 'T';